@@ -77,10 +77,13 @@ class Settings(BaseSettings):
     ping_interval_seconds: int = Field(10, ge=2)
     ping_timeout_seconds: float = Field(2.0, ge=0.1)
     ping_concurrent_limit: int = Field(50, ge=1, le=2000)
+    ping_shards: int = Field(0, ge=0, le=64) # Processos de ping (0 = tudo no processo do collector)
     log_retention_days: int = Field(30, ge=1)
     
     # --- SNMP ---
     default_snmp_community: str = Field("publicRadionet", description="Default Global Community")
+    snmp_backend: str = Field("native", pattern="^(native|pysnmp)$", description="native = cliente UDP próprio (snmp_client); pysnmp = hlapi")
+    snmp_concurrency: int = Field(100, ge=1, le=1000) # Equipamentos consultados em paralelo pelo snmp_monitor (pysnmp: máx. 30)
     
     # --- Integration ---
     telegram_token: Optional[str] = None
@@ -52,9 +52,31 @@ EXPECTED_SCHEMA = {
             "key": "VARCHAR",
             "value": "TEXT",
         }
+    },
+    "latency_history": {
+        "columns": {
+            "latency": "FLOAT",
+            "packet_loss": "FLOAT",
+            "avg_latency": "FLOAT",
+            "max_latency": "FLOAT",
+            "mdev": "FLOAT",
+            "jitter": "FLOAT",
+            "probes": "INTEGER",
+        }
     }
 }
 
+# Colunas adicionadas depois da criação original das tabelas (create_all não altera tabela existente)
+ADDED_COLUMNS = {
+    "latency_history": {
+        "avg_latency": "DOUBLE PRECISION",
+        "max_latency": "DOUBLE PRECISION",
+        "mdev": "DOUBLE PRECISION",
+        "jitter": "DOUBLE PRECISION",
+        "probes": "INTEGER",
+    },
+}
+
 # Parâmetros obrigatórios que devem existir
 REQUIRED_PARAMETERS = {
     "system_name": "ISP Monitor",
@@ -235,12 +257,20 @@ async def validate_and_repair_database():
     return all_ok
 
 
+async def add_missing_columns(conn):
+    """ALTER TABLE ... ADD COLUMN IF NOT EXISTS para as colunas de ADDED_COLUMNS (idempotente)."""
+    for table, columns in ADDED_COLUMNS.items():
+        for column, sql_type in columns.items():
+            await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {sql_type}"))
+
+
 async def create_tables_if_not_exist():
     """Cria todas as tabelas se não existirem"""
     try:
         logger.info("📦 Verificando existência das tabelas...")
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+            await add_missing_columns(conn)
         logger.success("✅ Tabelas verificadas/criadas")
         return True
     except Exception as e:
@@ -155,6 +155,12 @@ class LatencyHistory(Base):
     latency = Column(Float)
     packet_loss = Column(Float)
     timestamp = Column(Float, index=True)
+    # Estatísticas do vetor de RTT do ciclo (latency = mínimo calibrado)
+    avg_latency = Column(Float, nullable=True)
+    max_latency = Column(Float, nullable=True)
+    mdev = Column(Float, nullable=True)
+    jitter = Column(Float, nullable=True)
+    probes = Column(Integer, nullable=True) # Probes enviados no ciclo (modo adaptativo: 1, 1 + rajada ou a rajada periódica)
 
 class Parameters(Base):
     __tablename__ = "parameters"
@@ -7,7 +7,6 @@ from typing import List, Optional
 import io
 import csv
 import json
-import ipaddress
 import asyncio
 from datetime import datetime, timedelta, timezone
 
@@ -707,7 +706,8 @@ async def get_equipment_wireless_status(eq_id: int, db: AsyncSession = Depends(g
             db_eq.ip, 
             db_eq.brand, 
             db_eq.snmp_community or 'public', 
-            db_eq.snmp_port or 161
+            db_eq.snmp_port or 161,
+            equipment_id=db_eq.id
         )
         
         # Se for rádio transmissor, busca contagem de clientes também
@@ -730,7 +730,9 @@ async def get_equipment_wireless_status(eq_id: int, db: AsyncSession = Depends(g
 async def scan_network_stream(
     ip_range: str,
     snmp_community: str = Query("public"),
-    snmp_port: int = Query(161)
+    snmp_port: int = Query(161),
+    rate: float = Query(300, ge=10, le=5000),
+    window: int = Query(256, ge=1, le=4096)
 ):
     from backend.app.database import AsyncSessionLocal
     """
@@ -739,64 +741,16 @@ async def scan_network_stream(
     - CIDR: 192.168.1.0/24
     - Range: 192.168.1.10-50
     - Multi: 10.0.0.1, 10.0.0.5, 192.168.0.0/24
+    `rate` = probes/s, `window` = probes em voo. Os eventos trazem progress,
+    processed/total, online_count, rate_pps e eta_s.
     """
     try:
-        from backend.app.services.pinger_fast import scan_network
+        from backend.app.services.discovery import DiscoveryEngine
         from backend.app.services.wireless_snmp import detect_brand, detect_equipment_type
-        ips_to_scan = []
-        
-        # Split by comma to support multiple targets
-        targets = [t.strip() for t in ip_range.split(',')]
-        
-        for target in targets:
-            if '/' in target:
-                try:
-                    net = ipaddress.ip_network(target, strict=False)
-                    # Skip network and broadcast for common subnets
-                    if net.prefixlen <= 30:
-                        ips_to_scan.extend([str(ip) for ip in net.hosts()])
-                    else:
-                        ips_to_scan.extend([str(ip) for ip in net])
-                except ValueError as e:
-                    logger.warning(f"CIDR inválido ignorado: {target}")
-            elif '-' in target:
-                try:
-                    if target.count('.') >= 4: # Format 192.168.1.1-192.168.1.10
-                        start_ip, end_ip = target.split('-')
-                    else: # Format 192.168.1.1-50
-                        base = target.rsplit('.', 1)[0]
-                        start_part, end_part = target.rsplit('.', 1)[1].split('-')
-                        start_ip = f"{base}.{start_part}"
-                        end_ip = f"{base}.{end_part}"
-                    
-                    start = ipaddress.IPv4Address(start_ip.strip())
-                    end = ipaddress.IPv4Address(end_ip.strip())
-                    curr = start
-                    while curr <= end:
-                        ips_to_scan.append(str(curr))
-                        curr += 1
-                except ValueError as e:
-                    logger.warning(f"Range inválido ignorado: {target}")
-            else:
-                # Single IP or assume /24 if looks like base
-                try:
-                    target_clean = target.strip()
-                    if target_clean.endswith('.0'):
-                         net = ipaddress.ip_network(f"{target_clean}/24", strict=False)
-                         ips_to_scan.extend([str(ip) for ip in net.hosts()])
-                    else:
-                        ipaddress.IPv4Address(target_clean)
-                        ips_to_scan.append(target_clean)
-                except ValueError:
-                    logger.warning(f"Alvo inválido ignorado: {target}")
 
-        # Unique IPs only and preserve some order
-        ips_to_scan = list(dict.fromkeys(ips_to_scan))
-        
-        # Filter out Gateway IPs (ending in .1) as requested
-        ips_to_scan = [ip for ip in ips_to_scan if not ip.endswith('.1')]
-        
-        if not ips_to_scan:
+        # Faixas viram intervalos (sem lista de IPs em memória); gateways (.1) ficam de fora
+        engine = DiscoveryEngine(ip_range, rate=rate, window=window)
+        if engine.total == 0:
             raise HTTPException(status_code=400, detail="Nenhum IP válido encontrado para escanear.")
 
         # Load existing IPs for "smart" identification
@@ -824,70 +778,16 @@ async def scan_network_stream(
             return result
 
         async def event_generator():
-            sem = asyncio.Semaphore(15)
-            total_ips = len(ips_to_scan)
-            processed_count = 0
-            pending_tasks = set()
-
-            async def detect_worker(res):
-                async with sem:
-                    return await process_item(res)
-
-            async for ping_res in scan_network(ips_to_scan):
-                processed_count += 1
-                
-                # Check for finished tasks (non-blocking)
-                if pending_tasks:
-                    done, pending_tasks = await asyncio.wait(
-                        pending_tasks, 
-                        timeout=0, 
-                        return_when=asyncio.FIRST_COMPLETED
-                    )
-                    for d in done:
-                        try:
-                            res = d.result()
-                            res["progress"] = round((processed_count / total_ips) * 100)
-                            yield f"data: {json.dumps(res)}\n\n"
-                        except Exception: pass
-
-                if ping_res.get("is_online"):
-                    # Start SNMP worker in background
-                    task = asyncio.create_task(detect_worker(ping_res))
-                    pending_tasks.add(task)
-                    
-                    # If we have too many concurrent workers, wait for some to finish
-                    if len(pending_tasks) >= 30:
-                        done, pending_tasks = await asyncio.wait(
-                            pending_tasks,
-                            return_when=asyncio.FIRST_COMPLETED
-                        )
-                        for d in done:
-                            try:
-                                res = d.result()
-                                res["progress"] = round((processed_count / total_ips) * 100)
-                                yield f"data: {json.dumps(res)}\n\n"
-                            except Exception: pass
-                else:
-                    # Offline: yield every 10 IPs to keep connection alive and show progress
-                    if processed_count % 10 == 0 or processed_count == total_ips:
-                        ping_res["progress"] = round((processed_count / total_ips) * 100)
-                        yield f"data: {json.dumps(ping_res)}\n\n"
-
-            # Finalize remaining background tasks
-            if pending_tasks:
-                for completed_task in asyncio.as_completed(pending_tasks):
-                    try:
-                        res = await completed_task
-                        res["progress"] = 100
-                        yield f"data: {json.dumps(res)}\n\n"
-                    except Exception: pass
-            
-            # Ensure 100% progress and close
-            yield f"data: {json.dumps({'progress': 100, 'is_online': False})}\n\n"
+            # Online (já com marca/tipo) + eventos periódicos só de progresso; termina em 100%
+            async for ev in engine.run(enrich=process_item, workers=15):
+                yield f"data: {json.dumps(ev)}\n\n"
+            logger.info(f"[SCAN] {ip_range}: {engine.online} online de {engine.total} endereços ({engine.progress()['rate_pps']} probes/s)")
             yield "event: done\ndata: {}\n\n"
 
         return StreamingResponse(event_generator(), media_type="text/event-stream")
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Scan Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -923,11 +823,24 @@ async def get_latency_history(
         data.append({
             "timestamp": dt_object.isoformat(),
             "latency": round(log.latency) if log.latency is not None else 0,
-            "packet_loss": log.packet_loss
+            "packet_loss": log.packet_loss,
+            "avg_latency": log.avg_latency,
+            "max_latency": log.max_latency,
+            "mdev": log.mdev,
+            "jitter": log.jitter,
+            "probes": log.probes
         })
     
+    # Perda ponderada pelos probes enviados: no modo adaptativo um host saudável manda 1 probe
+    # e um que falhou manda 1 + rajada, então a média simples das amostras ficaria enviesada.
+    # Amostras antigas (sem probes) valem 3, o count fixo da época.
+    weights = [(log.probes or 3, log.packet_loss or 0.0) for log in logs]
+    total_probes = sum(w for w, _ in weights)
+    loss_rate = round(sum(w * loss for w, loss in weights) / total_probes, 4) if total_probes else None
+
     return {
         "data": data,
+        "loss_rate": loss_rate,
         "count": len(data),
         "hours": hours,
         "limit": limit,
@@ -8,6 +8,9 @@ from sqlalchemy import select, func, text
 from backend.app.database import get_db
 from backend.app.models import PingLog, TrafficLog, Alert, Equipment, Tower
 from backend.app.services.cache import cache
+from backend.app.services.perf_metrics import METRICS_FILE
+from backend.app.services.oid_strategy import STRATEGY_FILE
+from backend.app.utils.state_files import load_json, file_age
 from datetime import datetime, timedelta, timezone
 import psutil
 import os
@@ -124,19 +127,71 @@ async def get_system_metrics(db: AsyncSession = Depends(get_db)):
 @router.get("/performance")
 async def get_performance_metrics():
     """
-    Retorna métricas de performance do pinger
+    Retorna métricas de performance do collector (pinger, writer e event loop)
     
-    NOTA: Estas métricas serão implementadas quando o pinger
-    exportar dados de performance (Sprint 2 completo)
+    O collector publica um snapshot em arquivo a cada poucos segundos
+    (services/perf_metrics.py); aqui só lemos o último publicado.
     """
+    snap = load_json(METRICS_FILE)
+    if not snap:
+        return {
+            "status": "unavailable",
+            "message": "Collector ainda não publicou métricas de performance"
+        }
+    
+    age = file_age(METRICS_FILE)
+    hist = snap.get("histograms", {})
+    rates = snap.get("rates_per_s", {})
+    gauges = snap.get("gauges", {})
+    counters = snap.get("counters", {})
+    return {
+        "status": "stale" if age is not None and age > 3 * snap.get("publish_interval_s", 5) else "ok",
+        "age_seconds": round(age, 1) if age is not None else None,
+        "summary": {
+            "ping_cycle_ms": hist.get("ping_cycle_ms"),
+            "probes_sent_per_s": rates.get("probes_sent", 0),
+            "probes_received_per_s": rates.get("probes_received", 0),
+            "results_queue_depth": gauges.get("results_queue_depth"),
+            "db_flush_ms": hist.get("db_flush_ms"),
+            "db_flush_batch_size": hist.get("db_flush_batch_size"),
+            "buffer_drop_events": counters.get("pinger_buffer_drop_events", 0),
+            "event_loop_lag_ms": hist.get("event_loop_lag_ms"),
+            "concurrent_limit_current": gauges.get("ping_concurrent_limit"),
+            "interval_current_seconds": gauges.get("ping_interval_s"),
+        },
+        "raw": snap
+    }
+
+@router.get("/snmp-strategies")
+async def get_snmp_strategies(equipment_id: int | None = None):
+    """
+    Debug: instâncias de OID aprendidas por equipamento (get_wireless_stats)
+    
+    Publicado pelo collector (services/oid_strategy.py). "oid": null = o
+    equipamento não tem a métrica (re-sondado periodicamente).
+    """
+    data = load_json(STRATEGY_FILE)
+    if not data:
+        return {
+            "status": "unavailable",
+            "message": "Collector ainda não publicou estratégias de OID"
+        }
+    
+    devices = data.get("devices", {})
+    if equipment_id is not None:
+        devices = {k: v for k, v in devices.items() if k == str(equipment_id)}
+    
+    summary = {}
+    for entry in data.get("devices", {}).values():
+        for metric, strategy in entry.get("metrics", {}).items():
+            counts = summary.setdefault(metric, {"learned": 0, "absent": 0})
+            counts["learned" if strategy.get("oid") else "absent"] += 1
+    
+    age = file_age(STRATEGY_FILE)
     return {
-        "status": "not_implemented",
-        "message": "Métricas de performance do pinger serão adicionadas em breve",
-        "planned_metrics": [
-            "ping_cycle_time_ms",
-            "ping_avg_latency_ms",
-            "concurrent_limit_current",
-            "interval_current_seconds",
-            "stability_cycles"
-        ]
+        "status": "ok",
+        "age_seconds": round(age, 1) if age is not None else None,
+        "devices_count": len(data.get("devices", {})),
+        "summary": summary,
+        "devices": devices
     }
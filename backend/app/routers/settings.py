@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends
-from typing import Optional
+from typing import Dict, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from backend.app.database import get_db
@@ -9,6 +9,7 @@ from backend.app.dependencies import get_current_admin_user
 from backend.app.config import settings
 from pydantic import BaseModel
 import aiohttp
+import json
 
 router = APIRouter(prefix="/settings", tags=["settings"])
 
@@ -535,6 +536,12 @@ class MonitoringSchedules(BaseModel):
     ping_timeout: int = 1
     ping_down_count: int = 3
     snmp_interval: int = 10
+    # Períodos por classe de métrica do snmp_monitor (snmp_interval = tráfego)
+    snmp_signal_interval: int = 60
+    snmp_clients_interval: int = 120
+    snmp_health_interval: int = 300
+    snmp_type_intervals: Dict[str, Dict[str, int]] = {} # Por tipo de equipamento, ex: {"transmitter": {"clients": 60}}
+    mikrotik_streaming: bool = False # Tráfego contínuo via API (monitor-traffic) nos Mikrotiks
     agent_interval: int = 300
     topology_interval: int = 1800
     daily_report_hour: int = 8
@@ -548,11 +555,23 @@ async def get_monitoring_schedules(db: AsyncSession = Depends(get_db)):
         obj = res.scalar_one_or_none()
         return int(obj.value) if obj else default
 
+    type_param = (await db.execute(select(Parameters).where(Parameters.key == "snmp_type_intervals"))).scalar_one_or_none()
+    try:
+        type_intervals = json.loads(type_param.value) if type_param and type_param.value else {}
+    except ValueError:
+        type_intervals = {}
+    streaming = (await db.execute(select(Parameters).where(Parameters.key == "mikrotik_streaming"))).scalar_one_or_none()
+
     return MonitoringSchedules(
         ping_interval=await get_val("ping_interval", 30),
         ping_timeout=await get_val("ping_timeout", 1),
         ping_down_count=await get_val("ping_down_count", 3),
         snmp_interval=await get_val("snmp_interval", 10),
+        snmp_signal_interval=await get_val("snmp_signal_interval", 60),
+        snmp_clients_interval=await get_val("snmp_clients_interval", 120),
+        snmp_health_interval=await get_val("snmp_health_interval", 300),
+        snmp_type_intervals=type_intervals,
+        mikrotik_streaming=bool(streaming and (streaming.value or '').lower() == 'true'),
         agent_interval=await get_val("agent_check_interval", 300),
         topology_interval=await get_val("topology_interval", 1800),
         daily_report_hour=await get_val("daily_report_hour", 8),
@@ -577,6 +596,11 @@ async def update_monitoring_schedules(
     await upsert("ping_timeout", config.ping_timeout)
     await upsert("ping_down_count", config.ping_down_count)
     await upsert("snmp_interval", config.snmp_interval)
+    await upsert("snmp_signal_interval", config.snmp_signal_interval)
+    await upsert("snmp_clients_interval", config.snmp_clients_interval)
+    await upsert("snmp_health_interval", config.snmp_health_interval)
+    await upsert("snmp_type_intervals", json.dumps(config.snmp_type_intervals))
+    await upsert("mikrotik_streaming", "true" if config.mikrotik_streaming else "false")
     await upsert("agent_check_interval", config.agent_interval)
     await upsert("topology_interval", config.topology_interval)
     await upsert("daily_report_hour", config.daily_report_hour)
@@ -585,3 +609,40 @@ async def update_monitoring_schedules(
     
     await db.commit()
     return {"message": "Cronogramas atualizados. Reinicie o Collector para aplicar."}
+
+# Regras de alerta por grupo do snmp_monitor (ver services/alert_rules.py); lidas a cada ciclo
+@router.get("/alert-rules")
+async def get_alert_rules(db: AsyncSession = Depends(get_db)):
+    param = (await db.execute(select(Parameters).where(Parameters.key == "alert_rules"))).scalar_one_or_none()
+    if param and param.value:
+        try:
+            return json.loads(param.value)
+        except ValueError:
+            return []
+    return []
+
+@router.post("/alert-rules")
+async def update_alert_rules(
+    payload: dict = Body(...),
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_admin_user)
+):
+    from fastapi import HTTPException
+    from backend.app.services.alert_rules import AlertRule
+    rules = payload.get("rules")
+    if not isinstance(rules, list):
+        raise HTTPException(status_code=400, detail="Envie {rules: [...]}")
+    for item in rules:
+        try:
+            AlertRule(item["metric"], item["threshold"], item.get("cooldown_min"), item.get("recovery"), item.get("scope"))
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise HTTPException(status_code=400, detail=f"Regra inválida {item}: {e!r}")
+
+    val = json.dumps(rules)
+    param = (await db.execute(select(Parameters).where(Parameters.key == "alert_rules"))).scalar_one_or_none()
+    if not param:
+        db.add(Parameters(key="alert_rules", value=val))
+    else:
+        param.value = val
+    await db.commit()
+    return {"message": f"{len(rules)} regras de alerta salvas"}
@@ -8,6 +8,8 @@ import psutil
 import time
 from backend.app.services.topology import run_topology_discovery
 from backend.app.dependencies import get_current_user
+from backend.app.services.snmp_breaker import BREAKER_FILE
+from backend.app.utils.state_files import load_json, file_age
 import os
 
 # --- APP RESOURCE TRACKING ---
@@ -118,6 +120,15 @@ async def get_system_health(db: AsyncSession = Depends(get_db)):
             else:
                 snmp_status = "stalled"
         except: pass
+    # 2.1 Circuit breakers do SNMP (publicado pelo collector, services/snmp_breaker.py)
+    breaker_state = load_json(BREAKER_FILE) or {}
+    breaker_devices = breaker_state.get("devices", {})
+    open_breakers = sorted(
+        ({"equipment_id": int(k), **v} for k, v in breaker_devices.items() if v.get("state") == "open"),
+        key=lambda b: b["opened_at"] or 0
+    )
+    breaker_age = file_age(BREAKER_FILE)
+    
     # 3. Database Stats
     start_time = time.time()
     await db.execute(select(func.now()))
@@ -146,7 +157,15 @@ async def get_system_health(db: AsyncSession = Depends(get_db)):
             "last_run": snmp_last_run_iso,
             "total": total_equipments,
             "online": online_equipments,
-            "offline": total_equipments - online_equipments
+            "offline": total_equipments - online_equipments,
+            "circuit_breakers": {
+                "status": "ok" if breaker_state else "unavailable",
+                "age_seconds": round(breaker_age, 1) if breaker_age is not None else None,
+                "threshold": breaker_state.get("threshold"),
+                "open": len(open_breakers),
+                "failing": len(breaker_devices) - len(open_breakers),  # Falhando, ainda abaixo do limite
+                "devices": open_breakers
+            }
         },
         "database": {
             "status": "connected",
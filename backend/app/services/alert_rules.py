@@ -0,0 +1,171 @@
+"""
+Regras de alerta do snmp_monitor (tráfego acima do limite, voltagem baixa).
+
+Antes, para cada resultado o monitor procurava o equipamento numa busca linear
+(`next(... for e in equipments_data ...)`, O(n²) por ciclo) e os limites,
+cooldowns e a recuperação estavam escritos no meio do loop de gravação. Aqui:
+- as regras vêm de duas fontes: por equipamento (colunas max_traffic_in/out,
+  min_voltage_threshold e os intervalos de alerta) e por grupo (Parameters
+  'alert_rules', JSON com escopo por tipo, torre ou marca);
+  a do equipamento vale sobre a do grupo, e entre grupos vale o escopo mais específico;
+- o ciclo vira um snapshot indexado por id ({id: {métrica: valor}}) e cada
+  métrica é avaliada como coluna (ids, valores, limites) numa passada só;
+- cooldown e recuperação são por tipo de alerta (tráfego, voltagem), com o
+  estado nas colunas last_*_alert_sent como antes.
+
+Custo linear no número de equipamentos do ciclo.
+
+Exemplo de 'alert_rules':
+[{"metric": "voltage", "threshold": 11.5, "cooldown_min": 120, "scope": {"equipment_type": "station"}},
+ {"metric": "traffic_in", "threshold": 900, "scope": {"tower_id": 3}, "recovery": true}]
+"""
+import json
+import operator
+from datetime import datetime
+from typing import Dict, List, Optional
+from loguru import logger
+
+# métrica -> (tipo de alerta, comparação que dispara, recuperação por padrão)
+METRICS = {
+    "traffic_in": ("traffic", operator.gt, False),
+    "traffic_out": ("traffic", operator.gt, False),
+    "voltage": ("voltage", operator.le, True),
+}
+# tipo de alerta -> coluna do Equipment com o último envio
+STATE_COLUMNS = {"traffic": "last_traffic_alert_sent", "voltage": "last_voltage_alert_sent"}
+DEFAULT_COOLDOWN_MIN = 360
+SCOPE_KEYS = ("equipment_type", "tower_id", "brand")
+
+
+class AlertRule:
+    __slots__ = ("metric", "threshold", "cooldown_min", "recovery", "scope")
+
+    def __init__(self, metric: str, threshold: float, cooldown_min: Optional[int] = None,
+                 recovery: Optional[bool] = None, scope: Optional[dict] = None):
+        self.metric = metric
+        self.threshold = float(threshold)
+        self.cooldown_min = cooldown_min or DEFAULT_COOLDOWN_MIN
+        self.recovery = METRICS[metric][2] if recovery is None else bool(recovery)
+        self.scope = {k: v for k, v in (scope or {}).items() if k in SCOPE_KEYS}
+
+    def matches(self, eq: dict) -> bool:
+        return all(eq.get(k) == v for k, v in self.scope.items())
+
+
+def equipment_rules(eq: dict) -> Dict[str, AlertRule]:
+    """Regras do cadastro do equipamento (mesmos padrões de antes: cooldown 6h)."""
+    rules = {}
+    for metric, column in (("traffic_in", "max_traffic_in"), ("traffic_out", "max_traffic_out")):
+        if eq.get(column):
+            rules[metric] = AlertRule(metric, eq[column], eq.get("traffic_alert_interval"))
+    if eq.get("min_voltage_threshold") is not None:
+        rules["voltage"] = AlertRule("voltage", eq["min_voltage_threshold"], eq.get("voltage_alert_interval"))
+    return rules
+
+
+def _cooldown_over(last_sent: Optional[datetime], minutes: int, now: datetime) -> bool:
+    if not last_sent:
+        return True
+    if last_sent.tzinfo:
+        last_sent = last_sent.replace(tzinfo=None)  # Comparação com datetime.now() (naive)
+    return (now - last_sent).total_seconds() > minutes * 60
+
+
+class AlertRuleEngine:
+    def __init__(self):
+        self.group_rules: List[AlertRule] = []
+        self._raw: Optional[str] = None
+
+    def configure(self, raw: Optional[str]):
+        """Regras de grupo a partir do JSON de Parameters ('alert_rules'); inválidas são ignoradas."""
+        if raw == self._raw:
+            return
+        self._raw = raw
+        rules = []
+        try:
+            for item in json.loads(raw) if raw else []:
+                try:
+                    rules.append(AlertRule(item["metric"], item["threshold"], item.get("cooldown_min"),
+                                           item.get("recovery"), item.get("scope")))
+                except (KeyError, TypeError, ValueError, AttributeError) as e:
+                    logger.warning(f"[ALERT] Regra ignorada {item}: {e!r}")
+        except ValueError as e:
+            logger.warning(f"[ALERT] alert_rules inválido, ignorado: {e}")
+        # Mais específica primeiro: a primeira que casar ganha
+        self.group_rules = sorted(rules, key=lambda r: -len(r.scope))
+        logger.info(f"[ALERT] {len(self.group_rules)} regras de grupo carregadas")
+
+    def rules_for(self, eq: dict) -> Dict[str, AlertRule]:
+        rules = equipment_rules(eq)
+        for rule in self.group_rules:
+            if rule.metric not in rules and rule.matches(eq):
+                rules[rule.metric] = rule
+        return rules
+
+    def evaluate(self, values: Dict[int, dict], equipments: Dict[int, dict], now: Optional[datetime] = None) -> List[dict]:
+        """
+        `values`: {id: {"traffic_in", "traffic_out", "voltage"}} do ciclo; `equipments`: {id: eq}.
+        Devolve os eventos: {"equipment_id", "kind", "recovery", "breaches": [(métrica, valor, limite)],
+        "current" (recuperação), "column", "value"} (column/value = atualização do estado de cooldown no Equipment).
+        """
+        now = now or datetime.now()
+        rules = {eq_id: self.rules_for(equipments[eq_id]) for eq_id in values if eq_id in equipments}
+
+        breaches: Dict[int, Dict[str, list]] = {}
+        evaluated: Dict[int, Dict[str, tuple]] = {}  # id -> tipo -> (regra, valor) avaliados sem disparar
+        for metric, (kind, compare, _) in METRICS.items():
+            # Coluna da métrica: só equipamentos com valor e regra neste ciclo
+            ids = [i for i, r in rules.items() if metric in r and values[i].get(metric) is not None]
+            vals = [values[i][metric] for i in ids]
+            limits = [rules[i][metric].threshold for i in ids]
+            for eq_id, value, limit, hit in zip(ids, vals, limits, map(compare, vals, limits)):
+                if hit:
+                    breaches.setdefault(eq_id, {}).setdefault(kind, []).append((metric, value, limit))
+                else:
+                    evaluated.setdefault(eq_id, {}).setdefault(kind, (rules[eq_id][metric], value))
+
+        events = []
+        for eq_id, kinds in breaches.items():
+            eq = equipments[eq_id]
+            for kind, hits in kinds.items():
+                column = STATE_COLUMNS[kind]
+                cooldown = rules[eq_id][hits[0][0]].cooldown_min
+                if _cooldown_over(eq.get(column), cooldown, now):
+                    events.append({"equipment_id": eq_id, "kind": kind, "recovery": False, "breaches": hits,
+                                   "column": column, "value": now})
+        for eq_id, kinds in evaluated.items():
+            eq = equipments[eq_id]
+            for kind, (rule, value) in kinds.items():
+                column = STATE_COLUMNS[kind]
+                # Recuperação: nada do tipo disparou, havia alerta pendente e a regra pede aviso
+                if kind not in breaches.get(eq_id, {}) and rule.recovery and eq.get(column):
+                    events.append({"equipment_id": eq_id, "kind": kind, "recovery": True, "breaches": [],
+                                   "current": value, "column": column, "value": None})
+        return events
+
+
+def format_alert(event: dict, eq: dict, templates: dict) -> str:
+    """Mensagem do evento, com os mesmos textos (e o template de tráfego) de antes."""
+    kind, recovery = event["kind"], event["recovery"]
+    if kind == "traffic" and not recovery:
+        lines = []
+        for metric, value, limit in event["breaches"]:
+            if metric == "traffic_in":
+                lines.append(f"⬇️ Download: *{value}* Mbps (Limite: {limit} Mbps)")
+            else:
+                lines.append(f"⬆️ Upload: *{value}* Mbps (Limite: {limit} Mbps)")
+        template = templates.get('telegram_template_traffic')
+        if template:
+            return template.replace("[Device.Name]", eq['name']).replace("[Device.IP]", eq['ip']).replace("[Alert.Lines]", "\n".join(lines))
+        return f"🚨 *TRÁFEGO INTENSO DETECTADO*\n\n📟 *{eq['name']}*\n🌐 IP: {eq['ip']}\n\n" + "\n".join(lines) + "\n\n🔔 Verifique a carga do link."
+    if kind == "traffic":
+        return f"✅ *TRÁFEGO NORMALIZADO*\n\n📟 *{eq['name']}*\n🌐 IP: {eq['ip']}\n\n🕒 {datetime.now().strftime('%H:%M')}"
+    if not recovery:
+        _, cv, threshold = event["breaches"][0]
+        now_str = datetime.now().strftime("%H:%M do dia %d/%m/%Y")
+        return f"🪫 *ALERTA DE BAIXA VOLTAGEM*\n\n📍 *{eq['tower_name']}*\n📟 Rádio: {eq['name']}\n🌐 IP: {eq['ip']}\n\n⚠️ Voltagem Atual: *{cv}V*\n🛑 Limite Crítico: {threshold}V\n\n🕒 Horário: {now_str}\n\n🔔 *Ação Preventiva Necessária!*"
+    now_str = datetime.now().strftime("%H:%M")
+    return f"⚡ *VOLTAGEM NORMALIZADA* ⚡\n\n📍 *{eq['tower_name']}*\n📟 {eq['name']}\n🌐 IP: {eq['ip']}\n\n✅ Voltagem Atual: *{event['current']}V* (Ok)\n\n🕒 {now_str}"
+
+
+alert_rules = AlertRuleEngine()
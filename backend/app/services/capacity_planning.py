@@ -7,8 +7,9 @@ import asyncio
 from datetime import datetime, timedelta
 from sqlalchemy import select, and_, func
 from backend.app.database import AsyncSessionLocal
-from backend.app.models import Equipment, TrafficLog, Parameters, Insight
+from backend.app.models import TrafficLog, Parameters, Insight
 from backend.app.services.notifier import send_notification
+from backend.app.services.device_registry import device_registry
 from loguru import logger
 
 async def analyze_capacity_trends():
@@ -17,21 +18,17 @@ async def analyze_capacity_trends():
     
     warnings = []
     
+    # Get equipment with significant traffic (> 10 Mbps average) AND marked as priority
+    # (registro do collector: last_traffic_in é o do último ciclo do snmp_monitor)
+    await device_registry.ready(follow=False)
+    active_links = [
+        (d["id"], d["name"], d["ip"], d["last_traffic_in"], d["last_traffic_out"])
+        for d in device_registry.all()
+        if d["is_online"] and d["is_priority"]  # Only analyze priority equipment
+        and (d["last_traffic_in"] or 0) > 10  # Only analyze links with real usage
+    ]
+
     async with AsyncSessionLocal() as session:
-        # Get equipment with significant traffic (> 10 Mbps average) AND marked as priority
-        result = await session.execute(
-            select(Equipment.id, Equipment.name, Equipment.ip, Equipment.last_traffic_in, Equipment.last_traffic_out)
-            .where(
-                and_(
-                    Equipment.is_online == True,
-                    Equipment.is_priority == True,  # Only analyze priority equipment
-                    Equipment.last_traffic_in > 10  # Only analyze links with real usage
-                )
-            )
-        )
-        
-        active_links = result.all()
-        
         for eq_id, name, ip, current_in, current_out in active_links:
             # Get traffic history for last 30 days
             thirty_days_ago = datetime.utcnow() - timedelta(days=30)
@@ -0,0 +1,141 @@
+"""
+Change Feed (LISTEN/NOTIFY) para os serviços do collector.
+
+Triggers em `equipments`, `towers` e `network_links` publicam no canal CHANGE_CHANNEL um JSON
+{"table": ..., "op": ..., "id": ...} sempre que uma linha é criada, removida ou
+tem alguma coluna de configuração alterada. Colunas de status escritas pelos
+próprios jobs (is_online, last_ping, tráfego...) NÃO disparam notificação.
+
+Os consumidores se inscrevem com `change_feed.subscribe(callback)`; o callback
+recebe (table, op, id). Após uma reconexão é entregue ("*", "RESYNC", None) para
+que façam uma reconciliação completa (notificações perdidas durante a queda).
+"""
+import asyncio
+import json
+from typing import Callable, Dict, List, Optional
+from loguru import logger
+from backend.app.config import settings
+
+CHANGE_CHANNEL = "isp_monitor_changes"
+
+# Colunas que representam configuração/hierarquia (UPDATE OF ...)
+WATCHED_COLUMNS: Dict[str, List[str]] = {
+    "equipments": ["ip", "name", "parent_id", "tower_id", "is_priority",
+                   # Configuração de coleta/alertas lida pelo device_registry
+                   "mac_address", "brand", "equipment_type", "ssh_user", "ssh_password", "ssh_port",
+                   "snmp_community", "snmp_version", "snmp_port", "snmp_interface_index",
+                   "snmp_traffic_interface_index", "is_mikrotik", "mikrotik_interface", "api_port",
+                   "max_traffic_in", "max_traffic_out", "traffic_alert_interval", "min_voltage_threshold",
+                   "voltage_alert_interval", "voltage_multiplier", "voltage_offset"],
+    "towers": ["ip", "name", "parent_id"],
+    "network_links": ["source_tower_id", "target_tower_id", "source_equipment_id", "target_equipment_id"],
+}
+
+NOTIFY_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION isp_notify_change() RETURNS trigger AS $$
+DECLARE
+    rid INTEGER;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        rid := OLD.id;
+    ELSE
+        rid := NEW.id;
+    END IF;
+    PERFORM pg_notify('{CHANGE_CHANNEL}', json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'id', rid)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def _dsn() -> str:
+    # asyncpg puro (LISTEN precisa de uma conexão dedicada, fora do pool do SQLAlchemy)
+    url = settings.database_url.replace("postgresql+asyncpg://", "postgresql://")
+    return url.replace("localhost", "127.0.0.1")
+
+
+async def install_change_triggers(conn):
+    """Cria/atualiza a função e os triggers de notificação (idempotente). `conn` é asyncpg."""
+    await conn.execute(NOTIFY_FUNCTION_SQL)
+    for table, columns in WATCHED_COLUMNS.items():
+        trigger = f"trg_{table}_notify_change"
+        await conn.execute(f"DROP TRIGGER IF EXISTS {trigger} ON {table}")
+        await conn.execute(
+            f"CREATE TRIGGER {trigger} AFTER INSERT OR DELETE OR UPDATE OF {', '.join(columns)} "
+            f"ON {table} FOR EACH ROW EXECUTE FUNCTION isp_notify_change()"
+        )
+
+
+class ChangeFeed:
+    def __init__(self):
+        self._subscribers: List[Callable[[str, str, Optional[int]], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self.connected = False
+        self.received = 0
+
+    def subscribe(self, callback: Callable[[str, str, Optional[int]], None]):
+        if callback not in self._subscribers:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def _dispatch(self, table: str, op: str, rid: Optional[int]):
+        for cb in list(self._subscribers):
+            try:
+                cb(table, op, rid)
+            except Exception as e:
+                logger.error(f"[CHANGE FEED] Erro no consumidor {cb}: {e}")
+
+    def _on_notify(self, _conn, _pid, _channel, payload: str):
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            return
+        self.received += 1
+        self._dispatch(data.get("table"), data.get("op"), data.get("id"))
+
+    def ensure_started(self):
+        """Inicia o listener em background (ou reinicia se a task morreu)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+            self._task.set_name("Change Feed")
+
+    async def run(self):
+        import asyncpg
+
+        attempt = 0
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(_dsn(), server_settings={"application_name": "isp_monitor_change_feed"})
+                await install_change_triggers(conn)
+                await conn.add_listener(CHANGE_CHANNEL, self._on_notify)
+                self.connected = True
+                attempt = 0
+                logger.info(f"[CHANGE FEED] 📡 Escutando '{CHANGE_CHANNEL}' (sincronização incremental ativa)")
+                # Consumidores podem ter perdido eventos enquanto estávamos desconectados
+                self._dispatch("*", "RESYNC", None)
+
+                while True:
+                    await asyncio.sleep(30)
+                    await conn.fetchval("SELECT 1")  # Keepalive / detecção de queda
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                wait_time = min(5 + attempt * 5, 60)
+                logger.warning(f"[CHANGE FEED] Conexão perdida ({e}). Reconectando em {wait_time}s...")
+                attempt += 1
+                await asyncio.sleep(wait_time)
+            finally:
+                self.connected = False
+                if conn is not None:
+                    try:
+                        await conn.close()
+                    except Exception:
+                        pass
+
+
+# Instância global (uma conexão LISTEN por processo)
+change_feed = ChangeFeed()
@@ -0,0 +1,175 @@
+"""
+Grafo de dependências (topologia) para supressão de alertas.
+
+A hierarquia vem de Equipment.parent_id / Equipment.tower_id, Tower.parent_id
+e dos enlaces (NetworkLink) entre torres. Ela é compilada num Euler tour: cada
+nó ganha um intervalo [tin, tout] que cobre toda a sua subárvore. Quando um nó
+cai, somamos +1 no intervalo dele numa Fenwick tree; "algum ancestral está
+fora?" vira uma consulta pontual em tin[v] — O(log n) por transição, não
+importa quantos saltos acima esteja o backbone.
+"""
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+Key = Tuple[str, int]  # ("equipment" | "tower", id)
+
+
+def compute_parents(equipments: Iterable[Tuple[int, Optional[int], Optional[int]]],
+                    towers: Iterable[Tuple[int, Optional[int]]],
+                    links: Iterable[Tuple[Optional[int], Optional[int], Optional[int], Optional[int]]]) -> Dict[Key, Optional[Key]]:
+    """
+    Monta o mapa nó -> pai.
+
+    - equipments: (id, parent_id, tower_id). O equipamento pai tem precedência; sem ele, a torre.
+    - towers: (id, parent_id).
+    - links: (source_tower_id, target_tower_id, source_equipment_id, target_equipment_id).
+      Torres sem parent_id são penduradas, em largura, na torre vizinha que já está
+      ligada a uma raiz declarada. Se o enlace informa o rádio do lado de cá, a torre
+      remota passa a depender desse rádio (o PtP caiu = a torre remota some junto).
+    """
+    parents: Dict[Key, Optional[Key]] = {}
+    for eid, parent_id, tower_id in equipments:
+        if parent_id:
+            parents[("equipment", eid)] = ("equipment", parent_id)
+        elif tower_id:
+            parents[("equipment", eid)] = ("tower", tower_id)
+        else:
+            parents[("equipment", eid)] = None
+
+    tower_parent: Dict[int, Optional[int]] = {}
+    for tid, parent_id in towers:
+        tower_parent[tid] = parent_id
+        parents[("tower", tid)] = ("tower", parent_id) if parent_id else None
+
+    # Torres ancoradas: declaradas como pai de alguém ou com pai declarado
+    anchored: Set[int] = {tid for tid, pid in tower_parent.items() if pid}
+    anchored.update(pid for pid in tower_parent.values() if pid)
+
+    adjacency: Dict[int, List[Tuple[int, Optional[int]]]] = {}
+    for src_t, dst_t, src_e, dst_e in links:
+        if not src_t or not dst_t or src_t == dst_t:
+            continue
+        adjacency.setdefault(src_t, []).append((dst_t, src_e))
+        adjacency.setdefault(dst_t, []).append((src_t, dst_e))
+
+    queue = deque(sorted(anchored))
+    seen = set(anchored)
+    while queue:
+        near = queue.popleft()
+        for far, near_radio in adjacency.get(near, ()):
+            if far in seen:
+                continue
+            seen.add(far)
+            if tower_parent.get(far) is None:
+                parents[("tower", far)] = ("equipment", near_radio) if near_radio else ("tower", near)
+            queue.append(far)
+    return parents
+
+
+class DependencyGraph:
+    def __init__(self):
+        self._tin: Dict[Key, int] = {}
+        self._tout: Dict[Key, int] = {}
+        self._parent: Dict[Key, Optional[Key]] = {}
+        self._tree: List[int] = [0]  # Fenwick (1-based)
+        self._down: Set[Key] = set()
+
+    def __len__(self):
+        return len(self._tin)
+
+    def build(self, parents: Dict[Key, Optional[Key]], down: Iterable[Key] = ()):
+        """Recompila o Euler tour e reaplica o conjunto de nós fora."""
+        children: Dict[Optional[Key], List[Key]] = {}
+        nodes = set(parents)
+        for node, parent in parents.items():
+            if parent is not None:
+                nodes.add(parent)
+        for node in nodes:
+            parent = parents.get(node)
+            if parent == node:
+                parent = None
+            children.setdefault(parent, []).append(node)
+
+        tin, tout = {}, {}
+        clock = 0
+
+        def walk(root: Key):
+            nonlocal clock
+            stack = [(root, False)]
+            while stack:
+                node, leaving = stack.pop()
+                if leaving:
+                    tout[node] = clock
+                    continue
+                if node in tin:
+                    continue
+                clock += 1
+                tin[node] = clock
+                stack.append((node, True))
+                for child in children.get(node, ()):
+                    if child not in tin:
+                        stack.append((child, False))
+
+        for root in children.get(None, ()):
+            walk(root)
+        # Ciclos (A -> B -> A) não têm raiz: quebra o ciclo no primeiro nó não visitado
+        for node in sorted(nodes - tin.keys()):
+            walk(node)
+
+        self._tin, self._tout = tin, tout
+        self._parent = {n: (p if p != n else None) for n, p in ((n, parents.get(n)) for n in nodes)}
+        self._tree = [0] * (clock + 2)
+        self._down = set()
+        for key in down:
+            self.set_down(key, True)
+
+    # --- Fenwick ---
+    def _add(self, pos: int, delta: int):
+        tree = self._tree
+        n = len(tree)
+        while pos < n:
+            tree[pos] += delta
+            pos += pos & -pos
+
+    def _prefix(self, pos: int) -> int:
+        tree = self._tree
+        total = 0
+        while pos > 0:
+            total += tree[pos]
+            pos -= pos & -pos
+        return total
+
+    # --- Consultas ---
+    def set_down(self, key: Key, down: bool):
+        if key not in self._tin or (key in self._down) == down:
+            return
+        delta = 1 if down else -1
+        if down:
+            self._down.add(key)
+        else:
+            self._down.discard(key)
+        # +1 em [tin, tout]: toda a subárvore "enxerga" a queda
+        self._add(self._tin[key], delta)
+        self._add(self._tout[key] + 1, -delta)
+
+    def is_down(self, key: Key) -> bool:
+        return key in self._down
+
+    def has_down_ancestor(self, key: Key) -> bool:
+        pos = self._tin.get(key)
+        if pos is None:
+            return False
+        return self._prefix(pos) - (1 if key in self._down else 0) > 0
+
+    def down_ancestor(self, key: Key) -> Optional[Key]:
+        """Ancestral fora mais próximo (para log). Só sobe a cadeia se houver algum."""
+        if not self.has_down_ancestor(key):
+            return None
+        node = self._parent.get(key)
+        hops = 0
+        while node is not None and hops < len(self._parent):
+            if node in self._down:
+                return node
+            node = self._parent.get(node)
+            hops += 1
+        return None
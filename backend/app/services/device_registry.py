@@ -0,0 +1,274 @@
+"""
+Registro de equipamentos em memória, compartilhado pelos jobs do collector.
+
+Antes, o snmp_monitor recarregava todo ciclo as linhas de Equipment (com join em
+Tower) e copiava ~25 campos para dicts, e topologia e auditoria de segurança
+faziam cada uma a sua consulta. Aqui há um snapshot único, versionado:
+- carga completa na partida, depois só os ids que o change feed notificar
+  (LISTEN/NOTIFY, ver change_feed.py), e reconciliação completa periódica, ou
+  após um RESYNC (a cada minuto se o change feed estiver fora);
+- `version` só avança quando algo muda de fato; `changed_since(v)` devolve os ids
+  alterados ou removidos depois de v, em O(alterações). Assim cada job refaz os
+  planos derivados só quando precisa;
+- campos de status escritos pelos próprios jobs do collector (is_online pelo
+  Pinger, últimos alertas e tráfego pelo snmp_monitor) entram via `update()`,
+  sem esperar o banco. is_online avança a versão; os demais (LIVE_FIELDS) não,
+  pois mudam todo ciclo e não alteram planos.
+Os dicts devolvidos são do registro: quem precisar acrescentar chaves faz uma cópia.
+"""
+import asyncio
+import bisect
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from loguru import logger
+from sqlalchemy import select
+
+from backend.app.database import AsyncSessionLocal
+from backend.app.models import Equipment, Tower
+from backend.app.services.change_feed import change_feed
+from backend.app.services.perf_metrics import perf_metrics
+
+# Configuração (notificada pelo change feed, ver WATCHED_COLUMNS)
+CONFIG_FIELDS = (
+    "name", "ip", "mac_address", "tower_id", "parent_id", "is_priority", "brand", "equipment_type",
+    "ssh_user", "ssh_password", "ssh_port", "snmp_community", "snmp_version", "snmp_port",
+    "snmp_interface_index", "snmp_traffic_interface_index", "is_mikrotik", "mikrotik_interface", "api_port",
+    "max_traffic_in", "max_traffic_out", "traffic_alert_interval",
+    "min_voltage_threshold", "voltage_alert_interval", "voltage_multiplier", "voltage_offset",
+)
+STATUS_FIELDS = ("is_online",)
+LIVE_FIELDS = ("last_traffic_in", "last_traffic_out", "last_traffic_alert_sent", "last_voltage_alert_sent")
+FIELDS = ("id",) + CONFIG_FIELDS + STATUS_FIELDS + LIVE_FIELDS
+
+FULL_RECONCILE_INTERVAL = 600  # Rede de segurança (notificação perdida, edição fora dos triggers)
+FEED_DOWN_RELOAD = 60          # Sem change feed: recarga completa a cada minuto, como antes
+CHANGE_DEBOUNCE = 0.5
+STATUS_GRACE = 120             # is_online vindo do Pinger vale sobre o banco até ele gravar (flush)
+
+
+class DeviceRegistry:
+    def __init__(self):
+        self._devices: Dict[int, dict] = {}
+        self._towers: Dict[int, str] = {}
+        self._log: List[Tuple[int, int]] = []  # (versão, id), em ordem de versão
+        self._status_at: Dict[int, float] = {}  # id -> quando o status veio de um job (update)
+        self.version = 0
+        self.loaded_at = 0.0
+        self._pending: Set[int] = set()
+        self._pending_towers: Set[int] = set()
+        self._resync_requested = False
+        self._changes = asyncio.Event()
+        self._loaded = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._devices)
+
+    def __contains__(self, eq_id: int) -> bool:
+        return eq_id in self._devices
+
+    # --- Leitura --------------------------------------------------------------
+
+    def get(self, eq_id: int) -> Optional[dict]:
+        return self._devices.get(eq_id)
+
+    def all(self) -> Iterable[dict]:
+        return self._devices.values()
+
+    def tower_name(self, device: dict) -> Optional[str]:
+        return self._towers.get(device.get("tower_id"))
+
+    def changed_since(self, version: int) -> Set[int]:
+        """Ids alterados ou removidos depois de `version` (removido = `get()` devolve None)."""
+        if version >= self.version:
+            return set()
+        start = bisect.bisect_right(self._log, (version, float("inf")))
+        return {eq_id for _, eq_id in self._log[start:]}
+
+    # --- Escrita --------------------------------------------------------------
+
+    def _mark(self, eq_id: int):
+        self.version += 1
+        self._log.append((self.version, eq_id))
+        if len(self._log) > 4 * len(self._devices) + 1000:
+            # Compacta: só a última versão de cada id (continua respondendo changed_since)
+            latest = {}
+            for v, i in self._log:
+                latest[i] = v
+            self._log = sorted((v, i) for i, v in latest.items())
+
+    def _apply(self, eq_id: int, row: Optional[dict]) -> bool:
+        current = self._devices.get(eq_id)
+        if row is None:
+            if current is None:
+                return False
+            del self._devices[eq_id]
+            self._status_at.pop(eq_id, None)
+        elif current is None:
+            self._devices[eq_id] = row
+        else:
+            set_at = self._status_at.get(eq_id)
+            if set_at is not None:
+                if time.monotonic() - set_at < STATUS_GRACE:
+                    row.update((f, current.get(f)) for f in STATUS_FIELDS)  # Banco ainda não recebeu o flush
+                else:
+                    del self._status_at[eq_id]
+            if all(current.get(f) == row[f] for f in FIELDS if f not in LIVE_FIELDS):
+                current.update((f, row[f]) for f in LIVE_FIELDS)  # Só status de ciclo: sem nova versão
+                return False
+            current.update(row)  # Mesmo dict: quem guardou a referência vê o valor novo
+        self._mark(eq_id)
+        return True
+
+    def update(self, eq_id: int, **fields):
+        """Status escrito por um job do collector (ex: Pinger, snmp_monitor), já valendo em memória."""
+        device = self._devices.get(eq_id)
+        if device is None:
+            return
+        changed = any(k not in LIVE_FIELDS and device.get(k) != v for k, v in fields.items())
+        if any(k in STATUS_FIELDS for k in fields):
+            self._status_at[eq_id] = time.monotonic()
+        device.update(fields)
+        if changed:
+            self._mark(eq_id)
+
+    # --- Carga ----------------------------------------------------------------
+
+    async def _fetch(self, ids: Optional[Set[int]] = None) -> Dict[int, dict]:
+        stmt = select(*[getattr(Equipment, f) for f in FIELDS])
+        if ids is not None:
+            stmt = stmt.where(Equipment.id.in_(ids))
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(stmt)).all()
+        return {row.id: dict(row._mapping) for row in rows}
+
+    async def _fetch_towers(self, ids: Optional[Set[int]] = None) -> Dict[int, str]:
+        stmt = select(Tower.id, Tower.name)
+        if ids is not None:
+            stmt = stmt.where(Tower.id.in_(ids))
+        async with AsyncSessionLocal() as session:
+            return {tid: name for tid, name in (await session.execute(stmt)).all()}
+
+    def _apply_towers(self, towers: Dict[int, str], ids: Iterable[int]):
+        renamed = set()
+        for tid in ids:
+            name = towers.get(tid)
+            if self._towers.get(tid) != name:
+                renamed.add(tid)
+                if name is None:
+                    self._towers.pop(tid, None)
+                else:
+                    self._towers[tid] = name
+        # tower_name faz parte do snapshot dos equipamentos da torre
+        if renamed:
+            for device in self._devices.values():
+                if device.get("tower_id") in renamed:
+                    self._mark(device["id"])
+
+    async def full_reload(self):
+        started = time.monotonic()
+        rows = await self._fetch()
+        towers = await self._fetch_towers()
+        before = self.version
+        for eq_id in [i for i in self._devices if i not in rows]:
+            self._apply(eq_id, None)
+        for eq_id, row in rows.items():
+            self._apply(eq_id, row)
+        self._apply_towers(towers, set(towers) | set(self._towers))
+        self.loaded_at = time.time()
+        self._loaded.set()
+        perf_metrics.inc("device_registry_full_reloads")
+        perf_metrics.observe("device_registry_reload_ms", (time.monotonic() - started) * 1000)
+        if self.version != before:
+            logger.info(f"[REGISTRY] {len(self._devices)} equipamentos carregados (versão {self.version})")
+
+    async def apply_changes(self, ids: Set[int], tower_ids: Set[int]):
+        if ids:
+            rows = await self._fetch(ids)
+            for eq_id in ids:
+                self._apply(eq_id, rows.get(eq_id))
+        if tower_ids:
+            self._apply_towers(await self._fetch_towers(tower_ids), tower_ids)
+        perf_metrics.inc("device_registry_incremental", len(ids) + len(tower_ids))
+        logger.debug(f"[REGISTRY] Incremental: {len(ids)} equipamentos, {len(tower_ids)} torres (versão {self.version})")
+
+    def _on_change(self, table: str, op: str, rid):
+        """Callback do change feed (síncrono): só acumula os ids."""
+        if op == "RESYNC":
+            self._resync_requested = True
+        elif table == "equipments" and rid is not None:
+            self._pending.add(rid)
+        elif table == "towers" and rid is not None:
+            self._pending_towers.add(rid)
+        else:
+            return
+        self._changes.set()
+
+    def ensure_started(self):
+        """Inicia o refresh em background (ou reinicia se a task morreu)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+            self._task.set_name("Device Registry")
+
+    async def ready(self, timeout: float = 30.0, follow: bool = True) -> bool:
+        """
+        Garante o refresh rodando e espera a primeira carga. False se o banco não respondeu a tempo.
+        follow=False (jobs que também rodam sob demanda na API): sem o refresh neste processo,
+        só uma carga avulsa se o snapshot tiver mais de FEED_DOWN_RELOAD segundos.
+        """
+        if not follow and (self._task is None or self._task.done()):
+            if time.time() - self.loaded_at >= FEED_DOWN_RELOAD:
+                try:
+                    await asyncio.wait_for(self.full_reload(), timeout)
+                except asyncio.TimeoutError:
+                    return False
+            return True
+        self.ensure_started()
+        if not self._loaded.is_set():
+            try:
+                await asyncio.wait_for(self._loaded.wait(), timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    async def run(self):
+        change_feed.subscribe(self._on_change)
+        last_full = 0.0
+        while True:
+            # Antes de drenar _pending: notificação que chegar durante o await do banco mantém o evento setado
+            self._changes.clear()
+            try:
+                change_feed.ensure_started()
+                reload_every = FULL_RECONCILE_INTERVAL if change_feed.connected else FEED_DOWN_RELOAD
+                if self._resync_requested or time.monotonic() - last_full >= reload_every:
+                    self._resync_requested = False
+                    self._pending.clear()  # Cobertos pela recarga completa
+                    self._pending_towers.clear()
+                    await self.full_reload()
+                    last_full = time.monotonic()
+                elif self._pending or self._pending_towers:
+                    ids, tower_ids = set(self._pending), set(self._pending_towers)
+                    self._pending.clear()
+                    self._pending_towers.clear()
+                    try:
+                        await self.apply_changes(ids, tower_ids)
+                    except Exception:
+                        self._pending |= ids  # Próxima tentativa
+                        self._pending_towers |= tower_ids
+                        raise
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[REGISTRY] Falha ao atualizar o registro: {e}")
+                await asyncio.sleep(5)
+                continue
+
+            timeout = FULL_RECONCILE_INTERVAL if change_feed.connected else FEED_DOWN_RELOAD
+            try:
+                await asyncio.wait_for(self._changes.wait(), timeout=timeout)
+                await asyncio.sleep(CHANGE_DEBOUNCE)  # Agrupa rajadas (ex: importação em massa)
+            except asyncio.TimeoutError:
+                pass
+
+
+device_registry = DeviceRegistry()
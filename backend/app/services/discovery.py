@@ -0,0 +1,287 @@
+"""
+Motor de descoberta de rede (scan) em streaming.
+
+Os alvos (CIDR, faixas e IPs avulsos) viram intervalos de inteiros mesclados:
+um /16 ocupa alguns bytes em vez de 65 mil strings. Os endereços saem numa
+permutação pseudo-aleatória do espaço inteiro (i -> a*i + b mod N), então os
+probes se espalham por todas as sub-redes em vez de varrer uma /24 por vez.
+O envio é cadenciado por um token bucket e limitado por uma janela de probes em
+voo; os hosts online passam por um pool fixo de workers (detecção SNMP) com fila
+limitada, que segura o ping quando o SNMP não dá conta.
+"""
+import asyncio
+import bisect
+import ipaddress
+import math
+import random
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from loguru import logger
+
+from backend.app.services.icmp_engine import get_icmp_engine
+
+DEFAULT_RATE = 300.0      # Probes por segundo
+DEFAULT_WINDOW = 256      # Probes em voo
+DEFAULT_TIMEOUT = 0.8
+SNMP_WORKERS = 15
+PROGRESS_INTERVAL = 0.5   # Segundos entre eventos de progresso
+
+Span = Tuple[int, int, int]  # (versão, primeiro, último) como inteiros
+
+
+def _spans_for(target: str) -> List[Span]:
+    """Um alvo do formulário -> intervalos. Mesmas regras do scanner antigo."""
+    if '/' in target:
+        net = ipaddress.ip_network(target, strict=False)
+        first, last = int(net.network_address), int(net.broadcast_address)
+        if net.version == 4 and net.prefixlen <= 30:
+            first, last = first + 1, last - 1  # Sem rede e broadcast
+        elif net.version == 6 and net.prefixlen <= 126:
+            first += 1  # hosts() do IPv6 pula o anycast do roteador
+        return [(net.version, first, last)]
+    if '-' in target:
+        if target.count('.') >= 4:  # Format 192.168.1.1-192.168.1.10
+            start_ip, end_ip = target.split('-')
+        else:  # Format 192.168.1.1-50
+            base = target.rsplit('.', 1)[0]
+            start_part, end_part = target.rsplit('.', 1)[1].split('-')
+            start_ip, end_ip = f"{base}.{start_part}", f"{base}.{end_part}"
+        start = int(ipaddress.IPv4Address(start_ip.strip()))
+        end = int(ipaddress.IPv4Address(end_ip.strip()))
+        return [(4, start, end)] if start <= end else []
+    if target.endswith('.0'):
+        # Base de rede: assume /24
+        return _spans_for(f"{target}/24")
+    addr = ipaddress.ip_address(target)
+    return [(addr.version, int(addr), int(addr))]
+
+
+class AddressSpace:
+    """Intervalos disjuntos de endereços, indexáveis de 0 a len-1 sem materializar a lista."""
+
+    def __init__(self, spans: Iterable[Span]):
+        merged: List[List[int]] = []
+        for version, first, last in sorted(spans):
+            if merged and merged[-1][0] == version and first <= merged[-1][2] + 1:
+                merged[-1][2] = max(merged[-1][2], last)  # Sobreposição/contíguo: dedup sem set de IPs
+            else:
+                merged.append([version, first, last])
+        self.spans = [tuple(s) for s in merged]
+        self._offsets = []
+        total = 0
+        for _, first, last in self.spans:
+            self._offsets.append(total)
+            total += last - first + 1
+        self.total = total
+
+    @classmethod
+    def parse(cls, spec: str) -> "AddressSpace":
+        spans: List[Span] = []
+        for target in (t.strip() for t in spec.split(',')):
+            if not target:
+                continue
+            try:
+                spans.extend(_spans_for(target))
+            except ValueError:
+                logger.warning(f"Alvo inválido ignorado: {target}")
+        return cls(spans)
+
+    def __len__(self):
+        return self.total
+
+    def at(self, index: int) -> Tuple[int, int]:
+        """(versão, endereço inteiro) da posição `index`."""
+        k = bisect.bisect_right(self._offsets, index) - 1
+        version, first, _ = self.spans[k]
+        return version, first + index - self._offsets[k]
+
+    def permutation(self, seed: Optional[int] = None) -> Iterator[int]:
+        """Todos os índices, uma vez cada, em ordem embaralhada (memória O(1))."""
+        n = self.total
+        if n <= 2:
+            yield from range(n)
+            return
+        rng = random.Random(seed)
+        a = rng.randrange(n // 3, 2 * n // 3) | 1
+        while math.gcd(a, n) != 1:
+            a += 2
+        b = rng.randrange(n)
+        for i in range(n):
+            yield (a * i + b) % n
+
+
+class TokenBucket:
+    """Cadência de envio: `rate` tokens/s com rajada de até `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    async def take(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return
+            await asyncio.sleep((1.0 - self.tokens) / self.rate)
+
+
+async def probe_stream(addresses: Iterable[str], rate: float = DEFAULT_RATE, window: int = DEFAULT_WINDOW,
+                       timeout: float = DEFAULT_TIMEOUT) -> AsyncIterator[Dict]:
+    """
+    Pinga (1 probe) um iterável de IPs consumido sob demanda, cadenciado e com no
+    máximo `window` probes em voo. Os resultados saem na ordem em que ficam prontos.
+    """
+    engine = get_icmp_engine(privileged=True)
+    bucket = TokenBucket(rate, burst=max(1.0, rate / 10))
+    window_sem = asyncio.Semaphore(window)
+    results: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def probe(ip: str):
+        try:
+            if engine:
+                host = await engine.ping(ip, count=1, timeout=timeout)
+            else:
+                from icmplib import async_ping
+                host = await async_ping(ip, count=1, timeout=timeout, privileged=False)
+            await results.put({"ip": ip, "is_online": host.is_alive, "latency": host.avg_rtt, "packet_loss": host.packet_loss})
+        except Exception as e:
+            await results.put({"ip": ip, "is_online": False, "error": str(e)})
+        finally:
+            window_sem.release()
+
+    async def feeder():
+        tasks = set()
+        try:
+            for ip in addresses:
+                await window_sem.acquire()
+                await bucket.take()
+                task = asyncio.create_task(probe(ip))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await results.put(done)
+
+    feeder_task = asyncio.create_task(feeder())
+    try:
+        while True:
+            item = await results.get()
+            if item is done:
+                break
+            yield item
+    finally:
+        feeder_task.cancel()
+
+
+class DiscoveryEngine:
+    """Scan de uma especificação de alvos com progresso (vazão e ETA)."""
+
+    def __init__(self, spec: str, rate: float = DEFAULT_RATE, window: int = DEFAULT_WINDOW,
+                 timeout: float = DEFAULT_TIMEOUT, exclude_gateways: bool = True, seed: Optional[int] = None):
+        self.space = AddressSpace.parse(spec)
+        self.total = len(self.space)
+        self.rate = rate
+        self.window = window
+        self.timeout = timeout
+        self.exclude_gateways = exclude_gateways
+        self.seed = seed
+        self.probed = 0
+        self.skipped = 0
+        self.online = 0
+        self.started_at: Optional[float] = None
+
+    def addresses(self) -> Iterator[str]:
+        for index in self.space.permutation(self.seed):
+            version, value = self.space.at(index)
+            # Gateways (.1) ficam de fora, como no scanner antigo
+            if self.exclude_gateways and version == 4 and value & 0xFF == 1:
+                self.skipped += 1
+                continue
+            yield str(ipaddress.IPv4Address(value) if version == 4 else ipaddress.IPv6Address(value))
+
+    def progress(self) -> Dict:
+        done = self.probed + self.skipped
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        rate = self.probed / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, self.total - done)
+        eta = 0 if not remaining else (round(remaining / rate) if rate > 0 else None)
+        return {
+            "progress": round(done / self.total * 100) if self.total else 100,
+            "processed": done,
+            "total": self.total,
+            "online_count": self.online,
+            "rate_pps": round(rate, 1),
+            "eta_s": eta,
+        }
+
+    async def run(self, enrich: Optional[Callable[[Dict], Awaitable[Dict]]] = None,
+                  workers: int = SNMP_WORKERS) -> AsyncIterator[Dict]:
+        """
+        Gera os hosts online (já enriquecidos por `enrich`, se houver) e, a cada
+        PROGRESS_INTERVAL, um evento só de progresso. Termina com progresso 100%.
+        """
+        self.started_at = time.monotonic()
+        out: asyncio.Queue = asyncio.Queue()
+        enrich_q: asyncio.Queue = asyncio.Queue(maxsize=workers * 4)
+        finished = object()
+
+        async def producer():
+            async for res in probe_stream(self.addresses(), self.rate, self.window, self.timeout):
+                self.probed += 1
+                if not res.get("is_online"):
+                    continue
+                self.online += 1
+                if enrich:
+                    await enrich_q.put(res)  # Fila cheia = SNMP atrasado: segura o ping
+                else:
+                    await out.put(res)
+
+        async def worker():
+            while True:
+                res = await enrich_q.get()
+                if res is finished:
+                    return
+                try:
+                    res = await enrich(res)
+                except Exception as e:
+                    logger.debug(f"[DISCOVERY] Falha ao enriquecer {res.get('ip')}: {e}")
+                await out.put(res)
+
+        async def supervisor():
+            pool = [asyncio.create_task(worker()) for _ in range(workers if enrich else 0)]
+            try:
+                await producer()
+                for _ in pool:
+                    await enrich_q.put(finished)
+                await asyncio.gather(*pool)
+            finally:
+                for task in pool:
+                    task.cancel()
+                await out.put(finished)
+
+        sup = asyncio.create_task(supervisor())
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(out.get(), timeout=PROGRESS_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield self.progress()
+                    continue
+                if item is finished:
+                    break
+                item.update(self.progress())
+                yield item
+            final = self.progress()
+            final["progress"] = 100
+            yield final
+        finally:
+            sup.cancel()
@@ -0,0 +1,181 @@
+"""
+Cache assíncrono de resolução DNS (alvos por hostname, ex: DDNS de clientes).
+
+Compartilhado entre o Pinger e o agente sintético (mesmo processo do collector):
+- respeita o TTL do registro (com dnspython instalado; sem ele, getaddrinfo com TTL padrão);
+- cache negativo: nome que não resolve não é consultado de novo antes de NEGATIVE_TTL;
+- renovação em segundo plano antes de expirar: o caminho quente (`lookup`) nunca
+  espera pelo DNS, só lê o dicionário;
+- falha na renovação mantém o endereço antigo (serve-stale) até a próxima tentativa.
+`version` muda sempre que o endereço escolhido de algum nome muda; o Pinger usa
+isso para ressincronizar os alvos.
+"""
+import asyncio
+import ipaddress
+import re
+import socket
+import time
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from loguru import logger
+
+from backend.app.services.perf_metrics import perf_metrics
+
+try:
+    import dns.asyncresolver
+    import dns.resolver
+    HAS_DNSPYTHON = True
+except ImportError:  # Opcional: sem ele não há TTL real
+    HAS_DNSPYTHON = False
+
+DEFAULT_TTL = 300      # TTL assumido quando o resolvedor não informa (getaddrinfo)
+MIN_TTL = 30           # Piso: TTL 0/baixo de DDNS não vira consulta a cada ciclo
+MAX_TTL = 3600
+NEGATIVE_TTL = 60      # Nome inexistente / falha de resolução
+REFRESH_AHEAD = 0.8    # Renova ao atingir 80% do TTL
+IDLE_EVICT = 3600      # Entrada não usada há mais que isso sai do cache
+QUERY_TIMEOUT = 3.0
+REFRESH_TICK = 1.0
+
+_HOSTNAME_RE = re.compile(r"^(?=.{1,253}$)([A-Za-z0-9_]([A-Za-z0-9_-]{0,61}[A-Za-z0-9])?)(\.[A-Za-z0-9_]([A-Za-z0-9_-]{0,61}[A-Za-z0-9])?)*\.?$")
+
+
+def classify_target(target: str) -> Optional[str]:
+    """'ip' para IP literal, 'host' para hostname válido, None para lixo."""
+    if not target:
+        return None
+    target = target.strip()
+    try:
+        ipaddress.ip_address(target)
+        return "ip"
+    except ValueError:
+        pass
+    # TLD numérica = IP malformado ('10.0.0.256', '124124124'), não hostname
+    if _HOSTNAME_RE.match(target) and not target.rstrip('.').rsplit('.', 1)[-1].isdigit():
+        return "host"
+    return None
+
+
+# Validado uma vez por string: para quem classifica a cada requisição (snmp_client, resolve).
+# O TargetStore guarda o resultado no alvo e chama classify_target direto (sem entrada no cache por IP)
+target_kind = lru_cache(maxsize=65536)(classify_target)
+
+
+class _Entry:
+    __slots__ = ("addresses", "expires", "refresh_at", "last_used")
+
+    def __init__(self, addresses: Tuple[str, ...], ttl: float, now: float):
+        self.addresses = addresses
+        self.expires = now + ttl
+        self.refresh_at = now + ttl * REFRESH_AHEAD if addresses else self.expires
+        self.last_used = now
+
+
+class DnsCache:
+    def __init__(self):
+        self._entries: Dict[str, _Entry] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._resolver = None
+        self.version = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def ensure_started(self):
+        """Sobe o renovador em segundo plano no loop atual (idempotente)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._refresher())
+
+    def lookup(self, host: str) -> Optional[str]:
+        """
+        Caminho quente, sem await: endereço em cache (mesmo vencido, enquanto renova)
+        ou None. Um nome desconhecido dispara a resolução em segundo plano.
+        """
+        if target_kind(host) == "ip":
+            return host
+        now = time.monotonic()
+        entry = self._entries.get(host)
+        if entry is None:
+            self._spawn(host)
+            return None
+        entry.last_used = now
+        if now >= entry.refresh_at:
+            self._spawn(host)
+        return entry.addresses[0] if entry.addresses else None
+
+    async def resolve(self, host: str) -> Optional[str]:
+        """Como `lookup`, mas espera a primeira resolução de um nome ainda não visto."""
+        address = self.lookup(host)
+        if address is not None or host not in self._inflight or host in self._entries:
+            return address
+        await asyncio.shield(self._inflight[host])
+        return self.lookup(host)
+
+    def _spawn(self, host: str):
+        if host in self._inflight:
+            return  # Coalesce: uma consulta por nome por vez
+        self.ensure_started()
+        task = asyncio.get_running_loop().create_task(self._refresh(host))
+        self._inflight[host] = task
+        task.add_done_callback(lambda _, h=host: self._inflight.pop(h, None))
+
+    async def _refresh(self, host: str):
+        now = time.monotonic()
+        old = self._entries.get(host)
+        last_used = old.last_used if old else now
+        try:
+            addresses, ttl = await asyncio.wait_for(self._query(host), timeout=QUERY_TIMEOUT)
+            perf_metrics.inc("dns_queries")
+        except Exception as e:
+            perf_metrics.inc("dns_failures")
+            if old is not None and old.addresses:
+                # Serve-stale: o DNS caiu, o equipamento não; tenta de novo em NEGATIVE_TTL
+                old.refresh_at = now + NEGATIVE_TTL
+                logger.debug(f"[DNS] Falha ao renovar {host} ({e}); mantendo {old.addresses[0]}")
+                return
+            addresses, ttl = (), NEGATIVE_TTL
+            if old is None:  # Só a primeira falha vira warning; as retentativas não poluem o log
+                logger.warning(f"[DNS] {host} não resolve ({e or type(e).__name__}); nova tentativa a cada {NEGATIVE_TTL}s")
+
+        entry = _Entry(addresses, ttl, time.monotonic())
+        entry.last_used = last_used
+        self._entries[host] = entry
+        if (old.addresses[:1] if old else ()) != addresses[:1]:
+            self.version += 1
+            if old is not None and old.addresses and addresses:
+                logger.info(f"[DNS] {host}: {old.addresses[0]} -> {addresses[0]}")
+
+    async def _query(self, host: str) -> Tuple[Tuple[str, ...], float]:
+        """(endereços, ttl). IPv4 primeiro, como o resto do Pinger."""
+        if HAS_DNSPYTHON:
+            if self._resolver is None:
+                self._resolver = dns.asyncresolver.Resolver()
+            for rdtype in ("A", "AAAA"):
+                try:
+                    answer = await self._resolver.resolve(host, rdtype, lifetime=QUERY_TIMEOUT)
+                except dns.resolver.NoAnswer:
+                    continue
+                addresses = tuple(dict.fromkeys(r.address for r in answer))
+                return addresses, min(MAX_TTL, max(MIN_TTL, answer.rrset.ttl))
+            raise LookupError("sem registros A/AAAA")
+
+        infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_DGRAM)
+        infos.sort(key=lambda info: info[0] != socket.AF_INET)
+        addresses = tuple(dict.fromkeys(info[4][0] for info in infos))
+        if not addresses:
+            raise LookupError("sem endereços")
+        return addresses, DEFAULT_TTL
+
+    async def _refresher(self):
+        while True:
+            await asyncio.sleep(REFRESH_TICK)
+            now = time.monotonic()
+            for host, entry in list(self._entries.items()):
+                if now - entry.last_used > IDLE_EVICT:
+                    del self._entries[host]  # Ninguém mais pinga/consulta esse nome
+                elif now >= entry.refresh_at:
+                    self._spawn(host)
+
+
+dns_cache = DnsCache()
@@ -0,0 +1,369 @@
+"""
+Motor ICMP de socket único para o Pinger.
+
+Um socket ICMP por família de endereço (RAW quando há privilégio, DGRAM
+"unprivileged" como fallback no Linux/macOS), registrado no event loop via
+add_reader. Cada probe recebe um par (id, seq) e um timestamp monotônico de
+envio; as respostas são demultiplexadas pelo par, então dezenas de milhares de
+probes podem ficar em voo sem criar sockets ou tasks extras por host.
+
+Requer um event loop com add_reader (Selector). No Windows o collector já força
+WindowsSelectorEventLoopPolicy; se não for possível abrir o socket,
+get_icmp_engine() retorna None e o chamador cai de volta para o icmplib.
+"""
+import asyncio
+import ipaddress
+import math
+import operator
+import os
+import socket
+import struct
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMPV6_ECHO_REQUEST = 128
+ICMPV6_ECHO_REPLY = 129
+
+SOL_RAW = 255
+ICMP_FILTER = 1
+SO_ATTACH_FILTER = 26
+
+MAX_INFLIGHT = 60000  # Limite de probes em voo (espaço de seq é 16 bits por id)
+
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+class HostResult:
+    """Resultado de um host no formato do icmplib.Host (compatível com o código existente)."""
+
+    __slots__ = ("address", "rtts", "packets_sent")
+
+    def __init__(self, address: str, rtts: List[float], packets_sent: int):
+        self.address = address
+        self.rtts = rtts  # ms, somente dos probes respondidos
+        self.packets_sent = packets_sent
+
+    @property
+    def packets_received(self) -> int:
+        return len(self.rtts)
+
+    @property
+    def is_alive(self) -> bool:
+        return bool(self.rtts)
+
+    @property
+    def min_rtt(self) -> float:
+        return round(min(self.rtts), 3) if self.rtts else 0.0
+
+    @property
+    def avg_rtt(self) -> float:
+        return round(sum(self.rtts) / len(self.rtts), 3) if self.rtts else 0.0
+
+    @property
+    def max_rtt(self) -> float:
+        return round(max(self.rtts), 3) if self.rtts else 0.0
+
+    @property
+    def packet_loss(self) -> float:
+        if not self.packets_sent:
+            return 0.0
+        return round(1 - len(self.rtts) / self.packets_sent, 2)
+
+    def __repr__(self):
+        return f"<HostResult {self.address} sent={self.packets_sent} recv={self.packets_received} min={self.min_rtt}ms>"
+
+
+def rtt_stats(rtt_vectors: List[List[float]]) -> Tuple[List[float], List[float], List[float], List[float]]:
+    """
+    Estatísticas de RTT de um lote inteiro, coluna a coluna: (avg, max, mdev, jitter).
+
+    Cada coluna sai de um único map sobre o lote (somatórios em C, sem laço Python
+    por probe). mdev segue o `ping` do Linux (sqrt(E[x²] - E[x]²)); jitter é a média
+    das diferenças absolutas entre probes consecutivos. Sem resposta = NaN; mdev e
+    jitter pedem ao menos 2 respostas (com 1 probe só não há variação a medir).
+    """
+    nan = float("nan")
+    counts = list(map(len, rtt_vectors))
+    sums = list(map(math.fsum, rtt_vectors))
+    sq_sums = [math.fsum(map(operator.mul, v, v)) for v in rtt_vectors]
+    avg = [s / n if n else nan for s, n in zip(sums, counts)]
+    mx = [max(v) if v else nan for v in rtt_vectors]
+    mdev = [math.sqrt(max(0.0, q / n - a * a)) if n > 1 else nan for q, n, a in zip(sq_sums, counts, avg)]
+    jitter = [
+        math.fsum(map(abs, map(operator.sub, v[1:], v))) / (n - 1) if n > 1 else nan
+        for v, n in zip(rtt_vectors, counts)
+    ]
+    return avg, mx, mdev, jitter
+
+
+def _ident_filter(family: int, prefix: int) -> Tuple[bytes, object]:
+    """
+    Programa BPF clássico (Linux) que só aceita echo replies cujo id tem o byte alto
+    `prefix`. Com vários processos (shards) cada socket RAW recebe uma cópia de todo
+    ICMP do host; o filtro descarta no kernel as respostas dos outros shards.
+    """
+    import ctypes
+
+    class SockFilter(ctypes.Structure):
+        _fields_ = [("code", ctypes.c_uint16), ("jt", ctypes.c_uint8), ("jf", ctypes.c_uint8), ("k", ctypes.c_uint32)]
+
+    class SockFprog(ctypes.Structure):
+        _fields_ = [("len", ctypes.c_uint16), ("filter", ctypes.POINTER(SockFilter))]
+
+    if family == socket.AF_INET:
+        # RAW IPv4 entrega o cabeçalho IP: X = 4 * IHL, id em [X + 4]
+        load = [(0xB1, 0, 0, 0), (0x48, 0, 0, 4)]
+    else:
+        # RAW ICMPv6 começa direto no cabeçalho ICMP
+        load = [(0x28, 0, 0, 4)]
+    prog = load + [
+        (0x54, 0, 0, 0xFF00),         # A &= 0xff00
+        (0x15, 0, 1, prefix << 8),    # A == prefix? aceita : descarta
+        (0x06, 0, 0, 0x40000),
+        (0x06, 0, 0, 0),
+    ]
+    insns = (SockFilter * len(prog))(*[SockFilter(*i) for i in prog])
+    fprog = SockFprog(len(prog), insns)
+    # O kernel copia o programa durante o setsockopt: o chamador segura `insns` até lá
+    return bytes(ctypes.string_at(ctypes.addressof(fprog), ctypes.sizeof(fprog))), insns
+
+
+class _FamilySocket:
+    __slots__ = ("family", "sock", "raw", "ident")
+
+    def __init__(self, family, sock, raw, ident):
+        self.family = family
+        self.sock = sock
+        self.raw = raw
+        self.ident = ident
+
+
+class IcmpEngine:
+    def __init__(self, privileged: bool = True, ident_prefix: Optional[int] = None):
+        self.privileged = privileged
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._socks: Dict[int, _FamilySocket] = {}
+        # (family, id, seq) -> (future, sent_at_monotonic, timer)
+        self._pending: Dict[Tuple[int, int, int], Tuple[asyncio.Future, float, asyncio.TimerHandle]] = {}
+        # Com prefixo (shards do pinger) o byte alto do id é fixo e só o byte baixo gira
+        self.ident_prefix = ident_prefix
+        if ident_prefix is None:
+            self._ident = os.getpid() & 0xFFFF
+        else:
+            self._ident = ((ident_prefix & 0xFF) << 8) | (os.getpid() & 0xFF)
+        self._seq = 0
+        self._inflight = None
+        self.sent = 0
+        self.received = 0
+
+    # --- Sockets ---
+    def _open(self, family: int) -> _FamilySocket:
+        fs = self._socks.get(family)
+        if fs:
+            return fs
+        proto = socket.IPPROTO_ICMP if family == socket.AF_INET else socket.IPPROTO_ICMPV6
+        sock, raw = None, False
+        if self.privileged:
+            try:
+                sock = socket.socket(family, socket.SOCK_RAW, proto)
+                raw = True
+            except PermissionError:
+                sock = None
+        if sock is None:
+            # Unprivileged ICMP (Linux: net.ipv4.ping_group_range / macOS)
+            sock = socket.socket(family, socket.SOCK_DGRAM, proto)
+        sock.setblocking(False)
+        if raw and family == socket.AF_INET and sys.platform.startswith("linux"):
+            # ICMP_FILTER: o socket RAW só recebe echo replies (não enche o buffer com o resto do tráfego ICMP)
+            try:
+                sock.setsockopt(SOL_RAW, ICMP_FILTER, struct.pack("I", ~(1 << ICMP_ECHO_REPLY) & 0xFFFFFFFF))
+            except OSError:
+                pass
+        if raw and self.ident_prefix is not None and sys.platform.startswith("linux"):
+            try:
+                fprog, _insns = _ident_filter(family, self.ident_prefix & 0xFF)
+                sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+            except OSError as e:
+                logger.debug(f"[ICMP] Filtro BPF por id indisponível: {e}")
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
+        except OSError:
+            pass
+        self.loop.add_reader(sock.fileno(), self._on_readable, family)
+        # No DGRAM o kernel reescreve o id com a "porta" do socket: casamos só por seq
+        fs = _FamilySocket(family, sock, raw, self._ident if raw else 0)
+        self._socks[family] = fs
+        logger.info(f"[ICMP] Socket {'RAW' if raw else 'DGRAM'} aberto para {'IPv4' if family == socket.AF_INET else 'IPv6'}")
+        return fs
+
+    def start(self):
+        """Abre o socket IPv4 (obrigatório) e IPv6 (opcional) no loop corrente."""
+        self.loop = asyncio.get_running_loop()
+        self._inflight = asyncio.Semaphore(MAX_INFLIGHT)
+        self._open(socket.AF_INET)
+        try:
+            self._open(socket.AF_INET6)
+        except OSError as e:
+            logger.debug(f"[ICMP] IPv6 indisponível: {e}")
+
+    def close(self):
+        for fs in self._socks.values():
+            try:
+                self.loop.remove_reader(fs.sock.fileno())
+            except Exception:
+                pass
+            fs.sock.close()
+        self._socks.clear()
+        for fut, _, timer in self._pending.values():
+            timer.cancel()
+            if not fut.done():
+                fut.set_result(None)
+        self._pending.clear()
+
+    # --- Envio / Recebimento ---
+    def _next_key(self, fs: _FamilySocket) -> Tuple[int, int, int]:
+        for _ in range(0x10000):
+            self._seq = (self._seq + 1) & 0xFFFF
+            if self._seq == 0 and fs.raw:
+                # Espaço de seq esgotado: gira o id (somente RAW, o DGRAM fixa o id)
+                if self.ident_prefix is None:
+                    self._ident = (self._ident + 1) & 0xFFFF
+                else:
+                    self._ident = (self._ident & 0xFF00) | ((self._ident + 1) & 0xFF)
+                fs.ident = self._ident
+            key = (fs.family, fs.ident, self._seq)
+            if key not in self._pending:
+                return key
+        raise RuntimeError("ICMP: sem sequências livres")
+
+    def _build(self, family: int, ident: int, seq: int, payload: bytes) -> bytes:
+        icmp_type = ICMP_ECHO_REQUEST if family == socket.AF_INET else ICMPV6_ECHO_REQUEST
+        header = struct.pack("!BBHHH", icmp_type, 0, 0, ident, seq)
+        if family == socket.AF_INET6:
+            return header + payload  # checksum do ICMPv6 é calculado pelo kernel
+        csum = _checksum(header + payload)
+        return struct.pack("!BBHHH", icmp_type, 0, csum, ident, seq) + payload
+
+    def _on_readable(self, family: int):
+        fs = self._socks.get(family)
+        if not fs:
+            return
+        reply_type = ICMP_ECHO_REPLY if family == socket.AF_INET else ICMPV6_ECHO_REPLY
+        while True:
+            try:
+                data, _addr = fs.sock.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            received_at = time.monotonic()
+            # RAW IPv4 (e DGRAM no macOS) entrega o cabeçalho IP junto
+            if family == socket.AF_INET and data and (data[0] >> 4) == 4:
+                data = data[(data[0] & 0x0F) * 4:]
+            if len(data) < 8 or data[0] != reply_type:
+                continue
+            _, _, _, ident, seq = struct.unpack("!BBHHH", data[:8])
+            key = (family, ident if fs.raw else 0, seq)
+            entry = self._pending.pop(key, None)
+            if not entry:
+                continue
+            fut, sent_at, timer = entry
+            timer.cancel()
+            self.received += 1
+            if not fut.done():
+                fut.set_result((received_at - sent_at) * 1000.0)
+
+    def _expire(self, key):
+        entry = self._pending.pop(key, None)
+        if entry and not entry[0].done():
+            entry[0].set_result(None)
+
+    async def probe(self, address: str, timeout: float = 2.0, payload_size: int = 32) -> Optional[float]:
+        """Envia um echo request e retorna o RTT em ms (None em timeout/erro)."""
+        try:
+            family = socket.AF_INET6 if ipaddress.ip_address(address).version == 6 else socket.AF_INET
+        except ValueError:
+            return None
+        fs = self._socks.get(family)
+        if not fs:
+            return None
+
+        async with self._inflight:
+            key = self._next_key(fs)
+            packet = self._build(family, key[1] or self._ident, key[2], b"\x00" * payload_size)
+            dest = (address, 0) if family == socket.AF_INET else (address, 0, 0, 0)
+            fut = self.loop.create_future()
+            sent_at = time.monotonic()
+            timer = self.loop.call_later(timeout, self._expire, key)
+            self._pending[key] = (fut, sent_at, timer)
+            try:
+                try:
+                    fs.sock.sendto(packet, dest)
+                except BlockingIOError:
+                    await self.loop.sock_sendto(fs.sock, packet, dest)
+                    # Reenvio atrasado: o RTT conta a partir do envio efetivo
+                    self._pending[key] = (fut, time.monotonic(), timer)
+            except OSError as e:
+                self._pending.pop(key, None)
+                timer.cancel()
+                logger.debug(f"[ICMP] Falha ao enviar para {address}: {e}")
+                return None
+            self.sent += 1
+            return await fut
+
+    async def ping(self, address: str, count: int = 3, interval: float = 0.05,
+                   timeout: float = 2.0, payload_size: int = 32) -> HostResult:
+        waits = []
+        for i in range(count):
+            if i:
+                await asyncio.sleep(interval)
+            waits.append(asyncio.ensure_future(self.probe(address, timeout, payload_size)))
+        rtts = [r for r in await asyncio.gather(*waits) if r is not None]
+        return HostResult(address, rtts, count)
+
+    async def multiping(self, addresses: List[str], count: int = 3, interval: float = 0.05,
+                        timeout: float = 2.0, payload_size: int = 32, **_ignored) -> List[HostResult]:
+        """Mesma assinatura básica do icmplib.async_multiping (resultados na ordem da entrada)."""
+        return list(await asyncio.gather(*[
+            self.ping(addr, count, interval, timeout, payload_size) for addr in addresses
+        ]))
+
+    def stats(self) -> Dict[str, int]:
+        return {"sent": self.sent, "received": self.received, "inflight": len(self._pending)}
+
+
+# Shared engine (um por processo/event loop)
+_icmp_engine = None
+_icmp_engine_failed = False
+
+
+def get_icmp_engine(privileged: bool = True, ident_prefix: Optional[int] = None) -> Optional[IcmpEngine]:
+    """Retorna o motor compartilhado ou None se o loop/SO não suportar (fallback icmplib)."""
+    global _icmp_engine, _icmp_engine_failed
+    loop = asyncio.get_running_loop()
+    if _icmp_engine is not None and _icmp_engine.loop is loop:
+        return _icmp_engine
+    if _icmp_engine_failed:
+        return None
+    engine = IcmpEngine(privileged=privileged, ident_prefix=ident_prefix)
+    try:
+        engine.start()
+    except (OSError, NotImplementedError) as e:
+        logger.warning(f"[ICMP] Motor de socket único indisponível ({e}). Usando icmplib.")
+        engine.close()
+        _icmp_engine_failed = True
+        return None
+    _icmp_engine = engine
+    return engine
@@ -1,45 +1,32 @@
-from librouteros import connect
 import asyncio
+from backend.app.services.routeros_pool import routeros_pool, RouterOsError
 
 async def get_mikrotik_live_traffic(ip: str, user: str, password: str, interface: str, port: int = 8728):
     """
     Connects to Mikrotik API and gets live interface traffic.
     Returns (rx_mbps, tx_mbps) or None.
     Uses /interface/monitor-traffic which returns CURRENT bits-per-second.
+    A sessão autenticada vem do routeros_pool (reaproveitada entre ciclos: um round trip por leitura).
     """
-    def _fetch():
-        try:
-            # Connect
-            api = connect(username=user, password=password, host=ip, port=port, timeout=5)
-            
-            # Request traffic for interface
-            # cmd uses named arguments as keyword args in librouteros
-            # /interface/monitor-traffic interface=<name> once
-            items = list(api(cmd='/interface/monitor-traffic', interface=interface, once=True))
-            
-            api.close()
-            
-            if items:
-                # Items is a list of dicts. We want first one.
-                stats = items[0]
-                # 'rx-bits-per-second' is Download (In)
-                # 'tx-bits-per-second' is Upload (Out)
-                rx_bps = int(stats.get('rx-bits-per-second', 0))
-                tx_bps = int(stats.get('tx-bits-per-second', 0))
-                
-                # Convert to Mbps
-                rx_mbps = rx_bps / 1_000_000
-                tx_mbps = tx_bps / 1_000_000
-                
-                return (round(rx_mbps, 2), round(tx_mbps, 2))
-            
-            return None
-        except Exception as e:
-            # print(f"Mikrotik API Error ({ip}): {e}")
-            return None
-
     try:
-        # librouteros block IO, so run in thread
-        return await asyncio.to_thread(_fetch)
-    except:
+        # /interface/monitor-traffic interface=<name> once
+        items = await routeros_pool.call(ip, user, password, '/interface/monitor-traffic',
+                                         port=port, interface=interface, once=True)
+        if items:
+            # Items is a list of dicts. We want first one.
+            stats = items[0]
+            # 'rx-bits-per-second' is Download (In)
+            # 'tx-bits-per-second' is Upload (Out)
+            rx_bps = int(stats.get('rx-bits-per-second', 0))
+            tx_bps = int(stats.get('tx-bits-per-second', 0))
+
+            # Convert to Mbps
+            rx_mbps = rx_bps / 1_000_000
+            tx_mbps = tx_bps / 1_000_000
+
+            return (round(rx_mbps, 2), round(tx_mbps, 2))
+
+        return None
+    except (RouterOsError, ConnectionError, OSError, asyncio.TimeoutError, ValueError):
+        # Mikrotik API Error: sem leitura neste ciclo (SNMP assume)
         return None
@@ -0,0 +1,206 @@
+"""
+Tráfego contínuo dos Mikrotiks pela API (modo streaming do snmp_monitor).
+
+No modo normal, o ciclo lê uma amostra de rx/tx de uma interface (monitor-traffic
+once) por equipamento. Com Parameters 'mikrotik_streaming' = 'true', cada
+Mikrotik com API configurada ganha uma assinatura longa na sessão do
+routeros_pool:
+- /interface/monitor-traffic sem `once`, cobrindo todas as interfaces de
+  `mikrotik_interface` (lista separada por vírgula; a primeira é a principal),
+  uma amostra por segundo por interface;
+- /system/resource/print e /system/health/print com interval=, na mesma sessão.
+As amostras ficam em memória. O ciclo do monitor usa a última para o estado do
+equipamento e alertas (sem ir à rede), e drena as demais para o mesmo throttle
+do TrafficLog. Sem amostra há STALE_AFTER segundos, a assinatura é refeita; enquanto
+não volta, o equipamento segue pelo caminho normal (once/SNMP).
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+
+from backend.app.services.perf_metrics import perf_metrics
+from backend.app.services.routeros_pool import routeros_pool
+
+STREAM_PARAM = "mikrotik_streaming"
+RESOURCE_INTERVAL = 10   # s: /system/resource e /system/health
+STALE_AFTER = 10         # s sem amostra de tráfego: assinatura caiu
+RESTART_BACKOFF = 30     # s entre tentativas de reassinar
+MAX_SAMPLES = 900        # por equipamento entre dois ciclos (5 interfaces x 3 min)
+
+
+def _mbps(value) -> float:
+    try:
+        return round(int(value) / 1_000_000, 2)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _percent_used(free, total) -> Optional[int]:
+    try:
+        free, total = float(free), float(total)
+    except (TypeError, ValueError):
+        return None
+    return round(100 * (1 - free / total)) if total > 0 else None
+
+
+class _Stream:
+    __slots__ = ("eq_id", "signature", "interfaces", "task", "traffic", "resource", "sensors", "samples", "last_sample")
+
+    def __init__(self, eq_id: int, signature: tuple, interfaces: List[str]):
+        self.eq_id = eq_id
+        self.signature = signature
+        self.interfaces = interfaces
+        self.task: Optional[asyncio.Task] = None
+        self.traffic: Dict[int, Tuple[float, float]] = {}  # índice (1 = principal) -> (rx, tx) Mbps
+        self.resource: dict = {}   # cpu_usage, memory_usage, disk_usage
+        self.sensors: dict = {}    # voltage, temperature, cpu-temperature (/system/health)
+        self.samples = deque(maxlen=MAX_SAMPLES)  # (epoch, índice, rx, tx)
+        self.last_sample = 0.0
+
+    def on_traffic(self, attrs: dict):
+        name = attrs.get('name')
+        idx = self.interfaces.index(name) + 1 if name in self.interfaces else 1
+        rx, tx = _mbps(attrs.get('rx-bits-per-second')), _mbps(attrs.get('tx-bits-per-second'))
+        now = time.time()
+        self.traffic[idx] = (rx, tx)
+        self.samples.append((now, idx, rx, tx))
+        self.last_sample = now
+        perf_metrics.inc("mikrotik_stream_samples")
+
+    def on_resource(self, attrs: dict):
+        if attrs.get('cpu-load') not in (None, ''):
+            self.resource['cpu_usage'] = int(attrs['cpu-load'])
+        memory = _percent_used(attrs.get('free-memory'), attrs.get('total-memory'))
+        if memory is not None:
+            self.resource['memory_usage'] = memory
+        disk = _percent_used(attrs.get('free-hdd-space'), attrs.get('total-hdd-space'))
+        if disk is not None:
+            self.resource['disk_usage'] = disk
+
+    def on_health(self, attrs: dict):
+        # v6: uma linha com os campos (voltage=24.1 temperature=35); v7: uma linha por sensor (name/value)
+        if 'name' in attrs and 'value' in attrs:
+            fields = {attrs['name']: attrs['value']}
+        else:
+            fields = attrs
+        for key in ('voltage', 'temperature', 'cpu-temperature'):
+            if fields.get(key) not in (None, ''):
+                try:
+                    self.sensors[key] = round(float(fields[key]), 1)
+                except ValueError:
+                    pass
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() - self.last_sample < STALE_AFTER
+
+
+class MikrotikStreams:
+    def __init__(self):
+        self.enabled = False
+        self._streams: Dict[int, _Stream] = {}
+        self._metrics_registered = False
+
+    def __len__(self):
+        return len(self._streams)
+
+    def configure(self, params: Dict[str, Optional[str]]):
+        enabled = (params.get(STREAM_PARAM) or 'false').lower() == 'true'
+        if enabled != self.enabled:
+            logger.info(f"[ROUTEROS] Streaming de tráfego {'ligado' if enabled else 'desligado'}")
+            self.enabled = enabled
+
+    @staticmethod
+    def eligible(eq: dict) -> bool:
+        return bool(eq.get("is_mikrotik") and eq.get("mikrotik_interface") and eq.get("ssh_user"))
+
+    def sync(self, equipments: List[dict]):
+        """Uma assinatura por Mikrotik elegível e online; cadastro mudou = reassina, saiu = encerra."""
+        if not self._metrics_registered:
+            self._metrics_registered = True
+            perf_metrics.gauge_fn("mikrotik_streams", lambda: len(self._streams))
+            perf_metrics.gauge_fn("mikrotik_streams_fresh", lambda: sum(1 for s in self._streams.values() if s.fresh))
+        wanted = {}
+        if self.enabled:
+            for eq in equipments:
+                if self.eligible(eq):
+                    interfaces = [i.strip() for i in eq["mikrotik_interface"].split(',') if i.strip()]
+                    signature = (eq["ip"], eq.get("api_port") or 8728, eq["ssh_user"], eq.get("ssh_password") or '', tuple(interfaces))
+                    wanted[eq["id"]] = (signature, interfaces)
+        for eq_id in [k for k, s in self._streams.items() if wanted.get(k, (None,))[0] != s.signature]:
+            self._streams.pop(eq_id).task.cancel()
+        for eq_id, (signature, interfaces) in wanted.items():
+            if eq_id not in self._streams:
+                stream = _Stream(eq_id, signature, interfaces)
+                stream.task = asyncio.create_task(self._run(stream))
+                self._streams[eq_id] = stream
+
+    async def _run(self, stream: _Stream):
+        ip, port, user, password, interfaces = stream.signature
+        while True:
+            session, tags = None, []
+            try:
+                session = await routeros_pool.session(ip, user, password, port)
+                tag, traffic_done = session.listen('/interface/monitor-traffic', stream.on_traffic,
+                                                   interface=",".join(interfaces))
+                tags.append(tag)
+                tags.append(session.listen('/system/resource/print', stream.on_resource, interval=RESOURCE_INTERVAL)[0])
+                tags.append(session.listen('/system/health/print', stream.on_health, interval=RESOURCE_INTERVAL)[0])
+                stream.last_sample = time.time()  # Prazo da primeira amostra
+                logger.debug(f"[ROUTEROS] Streaming de {ip}: {','.join(interfaces)}")
+                while True:
+                    await asyncio.wait([traffic_done], timeout=STALE_AFTER / 2)
+                    if traffic_done.done():
+                        traffic_done.result()  # Trap (interface inexistente...) ou sessão caiu
+                        raise ConnectionError("monitor-traffic encerrado")
+                    if not stream.fresh:
+                        session.close()  # Sessão muda (NAT/rota caiu sem RST): a próxima é nova
+                        raise asyncio.TimeoutError("sem amostras")
+            except asyncio.CancelledError:
+                if session is not None and not session.closed:
+                    for tag in tags:
+                        session.cancel(tag)
+                raise
+            except Exception as e:
+                perf_metrics.inc("mikrotik_stream_restarts")
+                logger.debug(f"[ROUTEROS] Streaming de {ip} interrompido: {e!r}; nova tentativa em {RESTART_BACKOFF}s")
+                if session is not None and not session.closed:
+                    for tag in tags:
+                        session.cancel(tag)
+            stream.last_sample = 0.0
+            await asyncio.sleep(RESTART_BACKOFF)
+
+    def traffic(self, eq_id: int) -> Optional[Tuple[float, float]]:
+        """(rx, tx) Mbps da interface principal, se a assinatura está viva."""
+        stream = self._streams.get(eq_id)
+        if stream is None or not stream.fresh:
+            return None
+        return stream.traffic.get(1)
+
+    def health(self, eq_id: int) -> Optional[dict]:
+        stream = self._streams.get(eq_id)
+        if stream is None or not stream.fresh or not (stream.resource or stream.sensors):
+            return None
+        sensors = stream.sensors
+        return {'cpu_usage': stream.resource.get('cpu_usage'), 'memory_usage': stream.resource.get('memory_usage'),
+                'disk_usage': stream.resource.get('disk_usage'), 'voltage': sensors.get('voltage'),
+                'temperature': sensors.get('temperature', sensors.get('cpu-temperature'))}
+
+    def drain(self) -> Dict[int, List[tuple]]:
+        """Amostras acumuladas desde o último ciclo: {eq_id: [(epoch, índice, rx, tx)]}."""
+        out = {}
+        for eq_id, stream in self._streams.items():
+            if stream.samples:
+                out[eq_id] = list(stream.samples)
+                stream.samples.clear()
+        return out
+
+    def stop_all(self):
+        for stream in self._streams.values():
+            stream.task.cancel()
+        self._streams.clear()
+
+
+mikrotik_streams = MikrotikStreams()
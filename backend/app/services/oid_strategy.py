@@ -0,0 +1,115 @@
+"""
+Cache aprendido de estratégia de OID por equipamento (get_wireless_stats).
+
+Sem cache, cada métrica (sinal, CCQ) percorre todas as OIDs da marca tentando
+.0, a OID pura, .1 e um walk, em série: 20+ idas e voltas por estação até achar.
+Aqui fica guardada a instância exata que respondeu, por equipamento e
+sysObjectID/firmware; no ciclo seguinte é um GET só. A sondagem completa só volta
+depois de MISS_LIMIT falhas seguidas, e um equipamento sem a métrica também é
+lembrado (re-sondado a cada NEGATIVE_RETRY ciclos).
+
+O collector persiste o cache em data/state (restart não reaprende tudo); a API só
+lê o arquivo (/metrics/snmp-strategies).
+"""
+import asyncio
+import copy
+import time
+from typing import Dict, Optional
+from loguru import logger
+
+from backend.app.utils.state_files import atomic_write_json, load_json
+
+STRATEGY_FILE = "snmp_oid_strategies.json"
+MISS_LIMIT = 3          # Falhas seguidas na instância aprendida antes de re-sondar
+NEGATIVE_RETRY = 20     # Ciclos até re-sondar uma métrica que o equipamento não tem
+SAVE_INTERVAL = 60.0
+STALE_AFTER = 7 * 86400  # Equipamento não consultado há uma semana sai do arquivo
+SYS_OIDS = ['1.3.6.1.2.1.1.2.0', '1.3.6.1.2.1.1.1.0']  # sysObjectID, sysDescr (firmware)
+
+
+class OidStrategyCache:
+    def __init__(self):
+        # device -> {"fingerprint": [sysObjectID, sysDescr] | None, "seen": ts, "metrics": {metric: estratégia}}
+        # estratégia = {"oid": instância exata | None (sem a métrica), "misses": n, "hits": n, "learned_at": ts}
+        self.devices: Dict[str, dict] = {}
+        self.persistent = False
+        self._dirty = False
+        self._saved_at = 0.0
+
+    def load(self):
+        """Collector: recupera o que já foi aprendido e passa a persistir."""
+        data = load_json(STRATEGY_FILE, {}) or {}
+        self.devices = data.get("devices", {})
+        self.persistent = True
+        if self.devices:
+            logger.info(f"[SNMP] Estratégias de OID carregadas para {len(self.devices)} equipamentos")
+
+    def _device(self, device: str) -> dict:
+        entry = self.devices.get(device)
+        if entry is None:
+            entry = self.devices[device] = {"fingerprint": None, "seen": 0, "metrics": {}}
+        entry["seen"] = time.time()
+        return entry
+
+    def get(self, device: str, metric: str) -> Optional[dict]:
+        return self._device(device)["metrics"].get(metric)
+
+    def peek(self, device: str, metric: str) -> Optional[dict]:
+        """Como get, sem marcar o equipamento como visto (compilação do plano de coleta)."""
+        entry = self.devices.get(device)
+        return entry["metrics"].get(metric) if entry else None
+
+    def hit(self, strategy: dict):
+        strategy["misses"] = 0
+        strategy["hits"] = strategy.get("hits", 0) + 1
+
+    def miss(self, strategy: dict) -> bool:
+        """Conta uma falha; True quando é hora de re-sondar."""
+        strategy["misses"] = strategy.get("misses", 0) + 1
+        limit = MISS_LIMIT if strategy.get("oid") else NEGATIVE_RETRY
+        return strategy["misses"] >= limit
+
+    def learn(self, device: str, metric: str, oid: Optional[str]):
+        metrics = self._device(device)["metrics"]
+        old = metrics.get(metric)
+        if old is None or old.get("oid") != oid:
+            self._dirty = True
+            if oid:
+                logger.debug(f"[SNMP] {device}: {metric} aprendido em {oid}")
+        metrics[metric] = {"oid": oid, "misses": 0, "hits": 0, "learned_at": time.time()}
+
+    def check_fingerprint(self, device: str, fingerprint: Optional[list]) -> bool:
+        """Guarda o sysObjectID/firmware; se mudou (troca de firmware/equipamento), esquece tudo. True = mudou."""
+        entry = self._device(device)
+        if fingerprint is None or entry["fingerprint"] == fingerprint:
+            return False
+        changed = entry["fingerprint"] is not None
+        if changed:
+            logger.info(f"[SNMP] {device}: sysObjectID/firmware mudou, reaprendendo OIDs")
+            entry["metrics"].clear()
+        entry["fingerprint"] = fingerprint
+        self._dirty = True
+        return changed
+
+    def snapshot(self) -> dict:
+        # Cópia: a gravação roda em thread enquanto o loop segue mexendo no cache
+        return {"saved_at": time.time(), "devices": copy.deepcopy(self.devices)}
+
+    async def save_if_due(self, force: bool = False):
+        if not self.persistent or not (self._dirty or force):
+            return
+        now = time.time()
+        if not force and now - self._saved_at < SAVE_INTERVAL:
+            return
+        for device in [d for d, e in self.devices.items() if now - e.get("seen", 0) > STALE_AFTER]:
+            del self.devices[device]
+        self._dirty = False
+        self._saved_at = now
+        try:
+            await asyncio.to_thread(atomic_write_json, STRATEGY_FILE, self.snapshot())
+        except Exception as e:
+            self._dirty = True
+            logger.warning(f"[SNMP] Falha ao salvar estratégias de OID: {e}")
+
+
+oid_strategies = OidStrategyCache()
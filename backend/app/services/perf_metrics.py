@@ -0,0 +1,155 @@
+"""
+Métricas de performance do collector (em memória, publicadas em arquivo).
+
+Os serviços só incrementam contadores/histogramas em memória (custo de uma
+soma); a cada PUBLISH_INTERVAL o publisher serializa um snapshot para
+`data/state/collector_metrics.json`, lido pela API em /api/metrics/performance.
+Nada é gravado no banco.
+"""
+import asyncio
+import bisect
+import time
+from typing import Callable, Dict, Optional
+from loguru import logger
+from backend.app.utils.state_files import atomic_write_json
+
+METRICS_FILE = "collector_metrics.json"
+PUBLISH_INTERVAL = 5.0
+LAG_SAMPLE_INTERVAL = 0.5
+
+# Buckets padrão em ms (limite superior de cada faixa)
+DEFAULT_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "count", "total", "min", "max", "last")
+
+    def __init__(self, bounds=DEFAULT_BUCKETS_MS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # último = +Inf
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.last: Optional[float] = None
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.last = value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimativa pelo limite superior do bucket (suficiente para painel)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= rank:
+                return min(float(self.bounds[i]), self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict:
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 2) if self.count else None,
+            "min": round(self.min, 2) if self.min is not None else None,
+            "max": round(self.max, 2) if self.max is not None else None,
+            "last": round(self.last, 2) if self.last is not None else None,
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {("+Inf" if i == len(self.bounds) else str(self.bounds[i])): c for i, c in enumerate(self.counts) if c},
+        }
+
+
+class PerfMetrics:
+    def __init__(self):
+        self.started_at = time.time()
+        self.counters: Dict[str, int] = {}
+        self.gauges: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self._gauge_fns: Dict[str, Callable[[], float]] = {}
+        self._last_counters: Dict[str, int] = {}
+        self._last_publish = time.monotonic()
+
+    # --- API dos serviços (baratas, chamadas no caminho quente) ---
+    def inc(self, name: str, value: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float):
+        self.gauges[name] = value
+
+    def gauge_fn(self, name: str, fn: Callable[[], float]):
+        """Gauge avaliado só no momento da publicação (ex: tamanho de fila)."""
+        self._gauge_fns[name] = fn
+
+    def observe(self, name: str, value: float, buckets=DEFAULT_BUCKETS_MS):
+        h = self.histograms.get(name)
+        if h is None:
+            h = self.histograms[name] = Histogram(buckets)
+        h.observe(value)
+
+    # --- Publicação ---
+    def snapshot(self) -> Dict:
+        now = time.monotonic()
+        elapsed = max(now - self._last_publish, 1e-6)
+        rates = {
+            name: round((value - self._last_counters.get(name, 0)) / elapsed, 2)
+            for name, value in self.counters.items()
+        }
+        self._last_counters = dict(self.counters)
+        self._last_publish = now
+
+        gauges = dict(self.gauges)
+        for name, fn in list(self._gauge_fns.items()):
+            try:
+                gauges[name] = fn()
+            except Exception:
+                gauges[name] = None
+        return {
+            "published_at": time.time(),
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "publish_interval_s": PUBLISH_INTERVAL,
+            "counters": dict(self.counters),
+            "rates_per_s": rates,
+            "gauges": gauges,
+            "histograms": {name: h.snapshot() for name, h in self.histograms.items()},
+        }
+
+
+# Registro global do processo (collector)
+perf_metrics = PerfMetrics()
+
+
+async def _loop_lag_monitor():
+    """Atraso do event loop: quanto um sleep curto acorda depois do previsto."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LAG_SAMPLE_INTERVAL)
+        lag_ms = max(0.0, (loop.time() - start - LAG_SAMPLE_INTERVAL) * 1000)
+        perf_metrics.observe("event_loop_lag_ms", lag_ms)
+        perf_metrics.set_gauge("event_loop_lag_ms", round(lag_ms, 2))
+
+
+async def metrics_publisher():
+    """Task do collector: mede o lag do loop e publica o snapshot a cada PUBLISH_INTERVAL."""
+    logger.info(f"[METRICS] 📈 Publicando métricas de performance a cada {PUBLISH_INTERVAL:.0f}s")
+    lag_task = asyncio.create_task(_loop_lag_monitor())
+    try:
+        while True:
+            await asyncio.sleep(PUBLISH_INTERVAL)
+            try:
+                snap = perf_metrics.snapshot()
+                await asyncio.to_thread(atomic_write_json, METRICS_FILE, snap)
+            except Exception as e:
+                logger.warning(f"[METRICS] Falha ao publicar métricas: {e}")
+    finally:
+        lag_task.cancel()
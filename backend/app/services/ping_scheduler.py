@@ -0,0 +1,160 @@
+"""
+Agendador por alvo para o Pinger (heap de vencimentos).
+
+Em vez de disparar todos os alvos de uma vez a cada PING_INTERVAL, cada alvo
+tem o seu próprio "próximo vencimento". A fase inicial de cada alvo é derivada
+do hash do IP, espalhando os probes uniformemente ao longo do intervalo, e cada
+sub-rede (/24 em IPv4, /64 em IPv6) é cadenciada para não receber rajadas.
+"""
+import heapq
+import ipaddress
+import time
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+SUBNET_BURST = 0.25  # segundos de rajada tolerados por sub-rede
+
+
+def subnet_key(ip: str) -> str:
+    """Chave de cadência: /24 para IPv4, /64 para IPv6, o próprio alvo para nomes."""
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return ip
+    prefix = 24 if addr.version == 4 else 64
+    return str(ipaddress.ip_network(f"{ip}/{prefix}", strict=False))
+
+
+class PingScheduler:
+    """
+    Heap de (fire_at, seq, ip, due) usando relógio monotônico.
+
+    - `due` é o instante em que o probe deveria sair;
+    - `fire_at` pode ser empurrado para frente pela cadência da sub-rede;
+    - entradas antigas são invalidadas pelo `seq` (remoção preguiçosa).
+    """
+
+    def __init__(self, interval: float = 10.0, fast_interval: float = 5.0, subnet_rate: float = 50.0):
+        self.interval = float(interval)
+        self.fast_interval = float(fast_interval)
+        self.subnet_rate = float(subnet_rate)  # probes/s por sub-rede
+
+        self._heap: List[Tuple[float, int, str, float]] = []
+        self._live: Dict[str, int] = {}  # ip -> seq da entrada válida
+        self._seq = 0
+        self._subnet_next: Dict[str, float] = {}
+        self._subnet_cache: Dict[str, str] = {}
+
+        # Atraso (lateness) entre o vencimento e o disparo real do probe
+        self.fired = 0
+        self.lateness_last = 0.0
+        self.lateness_max = 0.0
+        self.lateness_avg = 0.0  # média móvel exponencial
+
+    def configure(self, interval: float, fast_interval: float, subnet_rate: float):
+        self.interval = max(0.5, float(interval))
+        self.fast_interval = max(0.5, min(float(fast_interval), self.interval))
+        self.subnet_rate = max(1.0, float(subnet_rate))
+
+    def __len__(self):
+        return len(self._live)
+
+    def _push(self, fire_at: float, ip: str, due: float):
+        self._seq += 1
+        self._live[ip] = self._seq
+        heapq.heappush(self._heap, (fire_at, self._seq, ip, due))
+
+    def _phase(self, ip: str) -> float:
+        # Fase determinística: o mesmo IP cai sempre no mesmo ponto do intervalo
+        return (zlib.crc32(ip.encode()) / 0xFFFFFFFF) * self.interval
+
+    def sync(self, ips: Iterable[str], now: Optional[float] = None):
+        """Adiciona alvos novos (com fase espalhada) e descarta os removidos."""
+        now = time.monotonic() if now is None else now
+        wanted = set(ips)
+        for ip in list(self._live.keys()):
+            if ip not in wanted:
+                del self._live[ip]
+                self._subnet_cache.pop(ip, None)
+        for ip in wanted:
+            if ip not in self._live:
+                due = now + self._phase(ip)
+                self._push(due, ip, due)
+        # Compacta o heap quando as entradas mortas dominam
+        if len(self._heap) > 2 * len(self._live) + 1024:
+            self._heap = [e for e in self._heap if self._live.get(e[2]) == e[1]]
+            heapq.heapify(self._heap)
+
+    def expedite(self, ip: str, now: Optional[float] = None):
+        """Antecipa o próximo probe de um alvo (ex: acabou de falhar)."""
+        if ip not in self._live:
+            return
+        now = time.monotonic() if now is None else now
+        due = now + self.fast_interval * 0.5
+        self._push(due, ip, due)
+
+    def next_fire_in(self, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        while self._heap and self._live.get(self._heap[0][2]) != self._heap[0][1]:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return self.interval
+        return max(0.0, self._heap[0][0] - now)
+
+    def pop_due(self, now: float, limit: int, interval_for: Callable[[str], float]) -> List[Tuple[str, float]]:
+        """
+        Retorna até `limit` alvos vencidos como (ip, due) e já reagenda o próximo
+        vencimento de cada um mantendo a fase (slots perdidos são pulados).
+        """
+        out = []
+        heap = self._heap
+        min_gap = 1.0 / self.subnet_rate
+        while heap and heap[0][0] <= now and len(out) < limit:
+            fire_at, seq, ip, due = heapq.heappop(heap)
+            if self._live.get(ip) != seq:
+                continue  # entrada obsoleta
+
+            key = self._subnet_cache.get(ip)
+            if key is None:
+                key = self._subnet_cache[ip] = subnet_key(ip)
+            # GCRA: cada sub-rede tem um "horário teórico" do próximo probe;
+            # tolera uma pequena rajada (SUBNET_BURST) para caber no tick do worker.
+            slot = self._subnet_next.get(key, 0.0)
+            if slot > now + SUBNET_BURST:
+                # Sub-rede saturada: empurra o disparo, preservando o `due` original
+                self._push(slot - SUBNET_BURST, ip, due)
+                continue
+            self._subnet_next[key] = max(slot, now) + min_gap
+
+            out.append((ip, due))
+            step = interval_for(ip)
+            nxt = due + step
+            if nxt <= now:
+                nxt += ((now - nxt) // step + 1) * step
+            self._push(nxt, ip, nxt)
+
+        if len(self._subnet_next) > 4 * len(self._live) + 1024:
+            self._subnet_next = {k: v for k, v in self._subnet_next.items() if v > now}
+        return out
+
+    def record_fire(self, due: float, fired_at: float) -> float:
+        """Registra o atraso de um probe em relação ao seu vencimento."""
+        lateness = max(0.0, fired_at - due)
+        self.fired += 1
+        self.lateness_last = lateness
+        if lateness > self.lateness_max:
+            self.lateness_max = lateness
+        self.lateness_avg = lateness if self.fired == 1 else (self.lateness_avg * 0.98 + lateness * 0.02)
+        return lateness
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "targets": len(self._live),
+            "fired": self.fired,
+            "lateness_last_ms": round(self.lateness_last * 1000, 1),
+            "lateness_avg_ms": round(self.lateness_avg * 1000, 1),
+            "lateness_max_ms": round(self.lateness_max * 1000, 1),
+            "interval_s": self.interval,
+            "fast_interval_s": self.fast_interval,
+            "subnet_rate_pps": self.subnet_rate,
+        }
@@ -4,14 +4,25 @@ import asyncio
 import time
 import tempfile
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Iterable
 from icmplib import async_multiping
 from sqlalchemy import text, select, insert
 from loguru import logger
 from backend.app.database import async_session_factory
 from backend.app.config import settings
-from backend.app.models import Equipment, Tower, Alert, Parameters
+from backend.app.models import Equipment, Tower, Alert, Parameters, NetworkLink
 from backend.app.services.notifier import send_notification
+from backend.app.services.ping_scheduler import PingScheduler
+from backend.app.services.icmp_engine import get_icmp_engine
+from backend.app.services.pinger_shards import ShardPool, build_batch, probe_hosts, burst_slot, FLAG_FAST, FLAG_FULL, ESCALATION_COUNT, FULL_BURST_EVERY
+from backend.app.services.change_feed import change_feed
+from backend.app.services.device_registry import device_registry
+from backend.app.services.target_store import TargetStore, ResultBatch
+from backend.app.services.dependency_graph import DependencyGraph, compute_parents
+from backend.app.services.perf_metrics import perf_metrics
+from backend.app.services.spool import spool_rows
+from backend.app.services.dns_cache import dns_cache, target_kind
+from backend.app.services.discovery import probe_stream, DEFAULT_RATE as DISCOVERY_RATE, DEFAULT_WINDOW as DISCOVERY_WINDOW
 
 # Configurações Dinâmicas (Serão atualizadas pelo load_configs)
 BATCH_SIZE = 50 
@@ -19,65 +30,154 @@ WRITE_BUFFER_SIZE = 500
 WRITE_INTERVAL = 3.0    
 PING_TIMEOUT = settings.ping_timeout_seconds
 PING_INTERVAL = settings.ping_interval_seconds
+PING_FAST_INTERVAL = None # Intervalo para alvos suspeitos/offline/prioritários (None = metade do PING_INTERVAL)
+PING_SUBNET_RATE = 50     # Probes por segundo por sub-rede (/24)
+PING_ADAPTIVE_PROBES = True # 1 probe por host saudável, rajada só quando ele falha
+PING_ESCALATION_COUNT = ESCALATION_COUNT
+PING_FULL_BURST_EVERY = FULL_BURST_EVERY # Adaptativo: rajada completa a cada N ciclos (max/mdev/jitter); 0 = nunca
 DOWN_COUNT = 3
+FULL_RECONCILE_INTERVAL = 600 # Reconciliação completa (rede de segurança do change feed)
+CHANGE_DEBOUNCE = 0.5          # Agrupa notificações próximas em um único SELECT
+FLUSH_SIZE_BUCKETS = (10, 50, 100, 250, 500, 1000, 2500, 5000)
+FLUSH_TIMEOUT = 15.0           # Flush mais lento que isso = banco travado, desvia para o spool
+DB_RETRY_INTERVAL = 10.0       # Após uma falha, tempo gravando só no spool antes de tentar o banco
+LATENCY_SPOOL_COLUMNS = ["equipment_id", "latency", "packet_loss", "timestamp", "avg_latency", "max_latency", "mdev", "jitter", "probes"]
+ALERT_SPOOL_COLUMNS = ["device_type", "device_name", "device_ip", "message", "timestamp"]
+HEARTBEAT_INTERVAL = 60        # Sem transição, last_ping/last_latency só são regravados a cada N segundos
+
+EQUIPMENT_TARGET_COLUMNS = (Equipment.ip, Equipment.id, Equipment.name, Equipment.is_online, Equipment.parent_id, Equipment.tower_id, Equipment.is_priority)
+TOWER_TARGET_COLUMNS = (Tower.ip, Tower.id, Tower.name, Tower.is_online, Tower.parent_id)
 
 class PingerService:
     def __init__(self):
-        self.targets: Dict[str, Dict] = {} # IP -> {id, name, status, fail_count}
+        self.targets = TargetStore() # IP -> Target (__slots__), com índice (type, id) -> ip
         self.config: Dict[str, str] = {}
-        self.results_queue = asyncio.Queue()
-        self.id_to_ip = {}
+        self.results_queue = asyncio.Queue() # Um ResultBatch por chunk de ping
         self.running = True
+        self.scheduler = PingScheduler()
+        self.targets_version = 0 # Incrementado a cada sincronização de alvos
+        self._pending_changes = {"equipments": set(), "towers": set(), "network_links": set()} # Ids notificados pelo change feed
+        self._changes_event = asyncio.Event()
+        self._resync_requested = False
+        self.graph = DependencyGraph() # Topologia para supressão de alertas
+        self.links = [] # (source_tower_id, target_tower_id, source_equipment_id, target_equipment_id)
+        self._graph_dirty = True
+        self.write_counters: Dict[str, int] = {} # Volume de escrita acumulado (linhas por tabela)
+        self.last_flush_writes: Dict[str, int] = {}
+        self._db_retry_at = 0.0 # Enquanto > agora, os flushes vão direto para o spool
+        self._host_addrs: Dict[str, str] = {} # Endereço resolvido -> hostname do alvo (alvos por nome/DDNS)
+
+    def _upsert_equipment(self, row):
+        ip, eid, name, is_online, parent_id, tower_id, is_priority = row
+        self.targets.upsert(ip, "equipment", eid, name, is_online, parent_id, tower_id, bool(is_priority))
+
+    def _upsert_tower(self, row):
+        ip, tid, name, is_online, parent_id = row
+        self.targets.upsert(ip, "tower", tid, name, is_online, parent_id)
+
+    async def _full_reload(self):
+        """Reconciliação completa (rede de segurança do change feed)."""
+        keys = set()
+        async with async_session_factory() as session:
+            # Carregar Equipamentos
+            res_eq = await session.execute(
+                select(*EQUIPMENT_TARGET_COLUMNS).where(Equipment.ip != None)
+            )
+            eqs = res_eq.all()
+            # Carregar Torres
+            res_tw = await session.execute(
+                select(*TOWER_TARGET_COLUMNS).where(Tower.ip != None)
+            )
+            tws = res_tw.all()
+            await self._load_links(session)
+
+        # Sem await daqui em diante: o worker nunca vê o store pela metade
+        for row in eqs:
+            self._upsert_equipment(row)
+            keys.add(("equipment", row[1]))
+        for row in tws:
+            self._upsert_tower(row)
+            keys.add(("tower", row[1]))
+        self.targets.retain(keys)
+        self.targets_version += 1
+        self._graph_dirty = True
+        logger.debug(f"Targets synchronized: {len(eqs)} equipments, {len(tws)} towers.")
+
+    async def _load_links(self, session):
+        res = await session.execute(
+            select(NetworkLink.source_tower_id, NetworkLink.target_tower_id, NetworkLink.source_equipment_id, NetworkLink.target_equipment_id)
+        )
+        self.links = [tuple(row) for row in res.all()]
+        self._graph_dirty = True
+
+    async def apply_changes(self, changes: Dict[str, set]):
+        """Aplica somente os ids alterados (vindos do change feed) ao mapa de alvos."""
+        async with async_session_factory() as session:
+            eq_rows, tw_rows = {}, {}
+            if changes.get("equipments"):
+                res = await session.execute(
+                    select(*EQUIPMENT_TARGET_COLUMNS).where(Equipment.id.in_(changes["equipments"]), Equipment.ip != None)
+                )
+                eq_rows = {row[1]: row for row in res.all()}
+            if changes.get("towers"):
+                res = await session.execute(
+                    select(*TOWER_TARGET_COLUMNS).where(Tower.id.in_(changes["towers"]), Tower.ip != None)
+                )
+                tw_rows = {row[1]: row for row in res.all()}
+            if changes.get("network_links"):
+                await self._load_links(session) # Poucos enlaces: recarrega todos
+
+        for kind, ids, rows, upsert in (
+            ("equipment", changes.get("equipments", ()), eq_rows, self._upsert_equipment),
+            ("tower", changes.get("towers", ()), tw_rows, self._upsert_tower),
+        ):
+            for oid in ids:
+                row = rows.get(oid)
+                if row is None:
+                    self.targets.remove(kind, oid) # Removido ou sem IP
+                else:
+                    upsert(row)
+
+        self.targets_version += 1
+        self._graph_dirty = True
+        logger.debug(f"Targets updated incrementally: {len(changes.get('equipments', ()))} equipments, {len(changes.get('towers', ()))} towers.")
+
+    def _on_change(self, table: str, op: str, rid):
+        """Callback do change feed (síncrono): só acumula os ids para o load_targets."""
+        if op == "RESYNC":
+            self._resync_requested = True
+        elif table in self._pending_changes and rid is not None:
+            self._pending_changes[table].add(rid)
+        else:
+            return
+        self._changes_event.set()
 
     async def load_targets(self):
+        change_feed.subscribe(self._on_change)
+        last_full = 0.0
         while self.running:
+            # Antes de drenar _pending_changes: notificação que chegar durante o await do banco mantém o evento setado
+            self._changes_event.clear()
             try:
-                new_targets = {}
-                id_to_ip = {} # Maps (type, id) -> ip for lookups
-                
-                async with async_session_factory() as session:
-                    # Carregar Equipamentos
-                    res_eq = await session.execute(
-                        select(Equipment.ip, Equipment.id, Equipment.name, Equipment.is_online, Equipment.parent_id, Equipment.tower_id)
-                        .where(Equipment.ip != None)
-                    )
-                    eqs = res_eq.all()
-                    for row in eqs:
-                        ip, eid, name, is_online, parent_id, tower_id = row
-                        prev = self.targets.get(ip, {})
-                        new_targets[ip] = {
-                            "type": "equipment",
-                            "id": eid, 
-                            "name": name, 
-                            "status": is_online,
-                            "fail_count": prev.get("fail_count", 0),
-                            "parent_id": parent_id,
-                            "tower_id": tower_id
-                        }
-                        id_to_ip[("equipment", eid)] = ip
-                    
-                    # Carregar Torres
-                    res_tw = await session.execute(
-                        select(Tower.ip, Tower.id, Tower.name, Tower.is_online, Tower.parent_id)
-                        .where(Tower.ip != None)
-                    )
-                    tws = res_tw.all()
-                    for row in tws:
-                        ip, tid, name, is_online, parent_id = row
-                        prev = self.targets.get(ip, {})
-                        new_targets[ip] = {
-                            "type": "tower",
-                            "id": tid, 
-                            "name": name, 
-                            "status": is_online,
-                            "fail_count": prev.get("fail_count", 0),
-                            "parent_id": parent_id
-                        }
-                        id_to_ip[("tower", tid)] = ip
-
-                self.targets = new_targets # Swap (Atomic)
-                self.id_to_ip = id_to_ip
-                logger.debug(f"Targets synchronized: {len(eqs)} equipments, {len(tws)} towers.")
+                change_feed.ensure_started()
+                if self._resync_requested or time.monotonic() - last_full >= FULL_RECONCILE_INTERVAL:
+                    self._resync_requested = False
+                    # Eventos acumulados ficam cobertos pela recarga completa
+                    for ids in self._pending_changes.values():
+                        ids.clear()
+                    await self._full_reload()
+                    last_full = time.monotonic()
+                elif any(self._pending_changes.values()):
+                    changes = {table: set(ids) for table, ids in self._pending_changes.items()}
+                    for ids in self._pending_changes.values():
+                        ids.clear()
+                    try:
+                        await self.apply_changes(changes)
+                    except Exception:
+                        # Devolve os ids para a próxima tentativa
+                        for table, ids in changes.items():
+                            self._pending_changes[table].update(ids)
+                        raise
             except Exception as e:
                 if "no such table" in str(e).lower():
                     logger.warning("⏳ Aguardando inicialização do Banco de Dados...")
@@ -86,7 +186,15 @@ class PingerService:
                     await asyncio.sleep(5)
                     continue
             
-            await asyncio.sleep(60) # Recarregar a cada 1 minuto
+            # Sem change feed (banco fora / sem LISTEN) volta ao polling de 1 minuto
+            timeout = FULL_RECONCILE_INTERVAL if change_feed.connected else 60
+            if not change_feed.connected:
+                last_full = 0.0
+            try:
+                await asyncio.wait_for(self._changes_event.wait(), timeout=timeout)
+                await asyncio.sleep(CHANGE_DEBOUNCE) # Agrupa rajadas (ex: importação em massa)
+            except asyncio.TimeoutError:
+                pass
 
     async def load_configs(self):
         """Carrega configurações de alerta e templates periodicamente."""
@@ -98,336 +206,552 @@ class PingerService:
                     self.config = params
                     
                     # Atualizar variáveis globais do serviço
-                    global PING_INTERVAL, PING_TIMEOUT, DOWN_COUNT
+                    global PING_INTERVAL, PING_TIMEOUT, DOWN_COUNT, PING_FAST_INTERVAL, PING_SUBNET_RATE, HEARTBEAT_INTERVAL
+                    global PING_ADAPTIVE_PROBES, PING_ESCALATION_COUNT, PING_FULL_BURST_EVERY
                     if "ping_interval" in params:
                         PING_INTERVAL = int(params["ping_interval"])
+                    if "ping_fast_interval" in params:
+                        PING_FAST_INTERVAL = float(params["ping_fast_interval"])
+                    if "ping_subnet_rate" in params:
+                        PING_SUBNET_RATE = float(params["ping_subnet_rate"])
                     if "ping_timeout" in params:
                         PING_TIMEOUT = int(params["ping_timeout"])
                     if "ping_down_count" in params:
                         DOWN_COUNT = int(params["ping_down_count"])
+                    if "ping_heartbeat_interval" in params:
+                        HEARTBEAT_INTERVAL = float(params["ping_heartbeat_interval"])
+                    if "ping_probe_mode" in params:
+                        PING_ADAPTIVE_PROBES = params["ping_probe_mode"] != "fixed"
+                    if "ping_escalation_count" in params:
+                        PING_ESCALATION_COUNT = max(3, min(5, int(params["ping_escalation_count"])))
+                    if "ping_full_burst_every" in params:
+                        PING_FULL_BURST_EVERY = max(0, int(params["ping_full_burst_every"]))
             except Exception as e:
                 logger.error(f"Error loading configs: {e}")
                 await asyncio.sleep(5) # Retry faster if failed
                 continue
             await asyncio.sleep(60)
 
+    def target_for(self, addr: str):
+        """Alvo de um endereço pingado (IP literal ou resolvido de um hostname)."""
+        t = self.targets.get(addr)
+        if t is None and self._host_addrs:
+            host = self._host_addrs.get(addr)
+            t = self.targets.get(host) if host else None
+        return t
+
+    def probe_targets(self) -> Dict[str, object]:
+        """
+        Endereço a pingar -> alvo. Hostnames saem do cache DNS sem await (nome ainda
+        não resolvido entra quando o cache mudar de versão); IP literal vence colisão.
+        """
+        probes = {}
+        host_addrs = {}
+        for t in self.targets:
+            if t.kind == "ip":
+                probes[t.ip] = t
+            elif t.kind == "host":
+                addr = dns_cache.lookup(t.ip)
+                if addr and addr not in self.targets:
+                    probes.setdefault(addr, t)
+                    host_addrs[addr] = t.ip
+        self._host_addrs = host_addrs
+        return probes
+
+    def interval_for(self, ip: str) -> float:
+        """Intervalo do próximo probe: curto para suspeitos, offline e prioritários."""
+        t = self.target_for(ip)
+        if t and (t.fail_count > 0 or t.status is False or t.priority):
+            return self.scheduler.fast_interval
+        return self.scheduler.interval
+
     async def ping_worker(self):
-        logger.info("Ping Worker Started (Zabbix-Style Engine)")
+        logger.info("Ping Worker Started (Per-Target Scheduler)")
         
         # Zabbix Architecture: Fixed Pool of Pingers (Workers)
         # We simulate this using a Semaphore to limit concurrent "multiping" batches.
         # Window's socket limit is strict, so we stay well below.
         
-        MAX_CONCURRENT_PINGS = 50 # Equivalent to "StartPingers"
-        pool_sem = asyncio.Semaphore(5) # Allow 5 batches parallel (5 * 10 IPs = 50 inflight)
+        # Motor ICMP de socket único: um socket por família, respostas demultiplexadas por (id, seq).
+        # Sem ele (Windows sem admin / loop Proactor) voltamos ao icmplib com o pool pequeno.
+        engine = get_icmp_engine(privileged=True)
+        if engine:
+            multiping = engine.multiping
+            MAX_CONCURRENT_PINGS = settings.ping_concurrent_limit # Lotes simultâneos (10 IPs cada)
+        else:
+            multiping = async_multiping
+            MAX_CONCURRENT_PINGS = 5 # Allow 5 batches parallel (5 * 10 IPs = 50 inflight)
+        pool_sem = asyncio.Semaphore(MAX_CONCURRENT_PINGS)
+        BATCH_SIZE = 10
+        MAX_PENDING_BATCHES = 200 # Backpressure: não tira mais alvos do heap se o pool estiver atolado
+        inflight = set()
+        synced_version = -1
+        dns_version = -1
+        perf_metrics.set_gauge("ping_concurrent_limit", MAX_CONCURRENT_PINGS)
+        perf_metrics.gauge_fn("ping_inflight_batches", lambda: len(inflight))
 
         async def worker_task(targets_chunk):
             async with pool_sem:
+                # Atraso real do disparo em relação ao vencimento de cada alvo
+                fired_at = time.monotonic()
+                lateness = {ip: self.scheduler.record_fire(due, fired_at) for ip, due in targets_chunk}
+                for late in lateness.values():
+                    perf_metrics.observe("ping_sched_lateness_ms", late * 1000)
                 try:
                     # Using RAW Sockets (privileged=True) for real ICMP RTT
-                    # Count=2, Interval=0.05s for stability
-                    results = await async_multiping(
-                        targets_chunk, 
-                        count=3,        
-                        interval=0.05,  
-                        timeout=float(PING_TIMEOUT), 
-                        payload_size=32,
-                        privileged=True 
+                    # Adaptativo: 1 probe, rajada de 3-5 só para quem não respondeu (prioritários sempre rajada,
+                    # os demais a cada PING_FULL_BURST_EVERY ciclos para não zerar max/mdev/jitter)
+                    ips = [ip for ip, _ in targets_chunk]
+                    full = {ip for ip in ips if (t := self.target_for(ip)) is not None and t.priority}
+                    results, escalated = await probe_hosts(
+                        multiping, ips, float(PING_TIMEOUT), PING_ADAPTIVE_PROBES, PING_ESCALATION_COUNT, full,
+                        PING_FULL_BURST_EVERY, burst_slot(PING_INTERVAL)
                     )
-                    
-                    # Calibração V4: Estabilização de "Piso"
-                    OVERHEAD_COMPENSATION = 2.8
-                    
-                    for host in results:
-                        raw_lat = host.min_rtt
-                        clean_lat = max(0.0, raw_lat - OVERHEAD_COMPENSATION) if host.is_alive else 0
-                        
-                        # ANTI-JITTER: Se for muito baixo (<2ms), crava em 1ms para parar de oscilar no gráfico
-                        if host.is_alive and clean_lat < 2.0: 
-                            clean_lat = 1.0
-
-                        await self.results_queue.put({
-                            "ip": host.address,
-                            "is_online": host.is_alive,
-                            "latency": round(clean_lat, 1),
-                            "packet_loss": host.packet_loss,
-                            "timestamp": time.time()
-                        })
+                    perf_metrics.observe("ping_cycle_ms", (time.monotonic() - fired_at) * 1000)
+                    perf_metrics.inc("probe_escalations", escalated)
+                    perf_metrics.inc("probes_sent", sum(h.packets_sent for h in results))
+                    perf_metrics.inc("probes_received", sum(h.packets_received for h in results))
+                    await self.results_queue.put(build_batch(results, lateness))
                 except Exception as e:
                     logger.error(f"Pinger Batch Error (continuing): {e}")
 
+        last_lateness_log = time.monotonic()
         while self.running:
-            cycle_start = time.time()
-            
-            # Snapshot targets
-            all_targets = [ip for ip in self.targets.keys() if self.is_valid_target(ip)]
-            
-            if not all_targets:
+            fast = PING_FAST_INTERVAL if PING_FAST_INTERVAL else max(2.0, PING_INTERVAL / 2)
+            self.scheduler.configure(PING_INTERVAL, fast, PING_SUBNET_RATE)
+
+            # Sincroniza o heap somente quando o mapa de alvos (ou algum nome resolvido) mudou
+            if synced_version != self.targets_version or dns_version != dns_cache.version:
+                dns_version = dns_cache.version
+                self.scheduler.sync(self.probe_targets())
+                synced_version = self.targets_version
+
+            if not len(self.scheduler):
                 await asyncio.sleep(2)
                 continue
 
-            # Chunk targets into small batches for the "Pool"
-            BATCH_SIZE = 10 
-            tasks = []
-            
-            for i in range(0, len(all_targets), BATCH_SIZE):
-                chunk = all_targets[i : i + BATCH_SIZE]
-                tasks.append(asyncio.create_task(worker_task(chunk)))
-            
-            if tasks:
-                await asyncio.gather(*tasks)
+            now = time.monotonic()
+            free_batches = MAX_PENDING_BATCHES - len(inflight)
+            if free_batches > 0:
+                due = self.scheduler.pop_due(now, free_batches * BATCH_SIZE, self.interval_for)
+                for i in range(0, len(due), BATCH_SIZE):
+                    task = asyncio.create_task(worker_task(due[i : i + BATCH_SIZE]))
+                    inflight.add(task)
+                    task.add_done_callback(inflight.discard)
 
-            # Accurate Interval Control (Uses Global Dynamic Interval)
-            elapsed = time.time() - cycle_start
-            sleep_time = max(0.5, float(PING_INTERVAL) - elapsed) # Respect configured interval
-            
-            # logger.debug(f"Ping Cycle: {len(all_targets)} hosts in {elapsed:.2f}s. Sleeping {sleep_time:.2f}s")
-            await asyncio.sleep(sleep_time)
+            if now - last_lateness_log >= 60:
+                st = self.scheduler.stats()
+                logger.debug(f"Ping Scheduler: {st['targets']} alvos, atraso médio {st['lateness_avg_ms']}ms, máx {st['lateness_max_ms']}ms")
+                last_lateness_log = now
 
-    def is_valid_target(self, target: str) -> bool:
-        """Simple check to avoid passing garbage to pinger"""
-        if not target or len(target) < 7: return False
-        # Avoid simple names that aren't IPs if we don't have DNS
-        # For now, simplistic check: assume IP if it has digits and dots
-        # Proper way: try ipaddress.ip_address(target)
+            # Dorme até o próximo vencimento (com teto para reagir a mudanças de alvos/config)
+            await asyncio.sleep(min(max(self.scheduler.next_fire_in(), 0.01), 0.25))
+
+    async def shard_ping_worker(self, shards: int):
+        """
+        Modo multi-processo: os shards agendam e pingam a própria fatia de alvos;
+        este processo só distribui as fatias e recebe os lotes para o db_writer.
+        """
+        if not ensure_singleton(exit_on_conflict=False):
+            logger.error("[PINGER] Outra instância do Pinger já está rodando. Shards não iniciados; pingando no processo atual.")
+            return await self.ping_worker()
+
+        def on_batch(batch: ResultBatch):
+            for late in batch.lateness:
+                perf_metrics.observe("ping_sched_lateness_ms", late * 1000)
+            self.results_queue.put_nowait(batch)
+
+        pool = ShardPool(shards, on_batch)
+        pool.start()
+        register_singleton_children(pool.pids())
+        perf_metrics.set_gauge("ping_shards", shards)
+        perf_metrics.gauge_fn("ping_targets", pool.targets_count)
+        perf_metrics.gauge_fn("ping_shard_restarts", lambda: pool.restarts)
+        synced_version = -1
+        dns_version = -1
         try:
-            ipaddress.ip_address(target)
-            return True
-        except ValueError:
-            # Could be a hostname, let it pass if it looks reasonable?
-            # For this system, we focus on IPs mostly.
-            # If '124124124' is passed, it fails here.
-            return False
+            while self.running:
+                fast = PING_FAST_INTERVAL if PING_FAST_INTERVAL else max(2.0, PING_INTERVAL / 2)
+                pool.configure(PING_INTERVAL, fast, PING_SUBNET_RATE, float(PING_TIMEOUT), PING_ADAPTIVE_PROBES,
+                               PING_ESCALATION_COUNT, PING_FULL_BURST_EVERY)
+                if synced_version != self.targets_version or dns_version != dns_cache.version:
+                    dns_version = dns_cache.version
+                    # Offline/prioritários começam no intervalo curto; suspeitos o próprio shard detecta
+                    pool.assign({
+                        addr: (FLAG_FAST if t.priority or t.status is False else 0) | (FLAG_FULL if t.priority else 0)
+                        for addr, t in self.probe_targets().items()
+                    })
+                    synced_version = self.targets_version
+                if pool.check():
+                    register_singleton_children(pool.pids())
+                await asyncio.sleep(1.0)
+        finally:
+            await asyncio.to_thread(pool.stop)
+
+    def is_valid_target(self, target: str) -> bool:
+        """IP literal ou hostname bem formado (validação em cache; os alvos já guardam em Target.kind)"""
+        return target_kind(target) is not None
 
     async def db_writer(self):
         logger.info("DB Writer Started (Bulk Postgres)")
-        buffer = []
+        buffer = [] # Lista de ResultBatch
+        buffered = 0 # Total de amostras no buffer
         last_flush = time.time()
         while self.running:
             try:
                 try:
-                    item = await asyncio.wait_for(self.results_queue.get(), timeout=0.5)
-                    buffer.append(item)
+                    batch = await asyncio.wait_for(self.results_queue.get(), timeout=0.5)
+                    buffer.append(batch)
+                    buffered += len(batch)
                     
                     # 🛡️ PROTEÇÃO: Limite de segurança para evitar 10GB de RAM se o banco travar
-                    if len(buffer) > 5000:
-                        logger.warning("⚠️ Buffer do Pinger saturado! Descartando logs antigos para preservar memória.")
-                        buffer = buffer[-2000:] # Mantém apenas os 2000 mais recentes
+                    if buffered > 5000:
+                        logger.warning("⚠️ Buffer do Pinger saturado! Desviando as amostras mais antigas para o spool em disco.")
+                        perf_metrics.inc("pinger_buffer_drop_events")
+                        spill = []
+                        while buffered > 2000: # Mantém apenas os ~2000 mais recentes em memória
+                            spill.append(buffer.pop(0))
+                            buffered -= len(spill[-1])
+                        await self.flush_buffer(spill, spool_only=True)
                 except asyncio.TimeoutError:
                     pass 
 
                 current_time = time.time()
-                if buffer and (len(buffer) >= WRITE_BUFFER_SIZE or (current_time - last_flush) >= WRITE_INTERVAL):
+                if buffer and (buffered >= WRITE_BUFFER_SIZE or (current_time - last_flush) >= WRITE_INTERVAL):
                     try:
                         await self.flush_buffer(buffer)
                     finally:
                         # ✅ CORREÇÃO CRÍTICA: Limpar buffer mesmo em caso de erro no flush
                         buffer = []
+                        buffered = 0
                         last_flush = current_time
             except Exception as e:
                 logger.error(f"Writer loop error: {e}")
                 await asyncio.sleep(1)
 
-    async def flush_buffer(self, buffer: List[dict]):
+    def _ensure_graph(self):
+        """Recompila o grafo de dependências se a hierarquia mudou desde a última vez."""
+        if not self._graph_dirty:
+            return
+        targets = list(self.targets)
+        parents = compute_parents(
+            ((t.id, t.parent_id, t.tower_id) for t in targets if t.type == "equipment"),
+            ((t.id, t.parent_id) for t in targets if t.type == "tower"),
+            self.links
+        )
+        self.graph.build(parents, down=((t.type, t.id) for t in targets if t.status is False))
+        self._graph_dirty = False
+        logger.debug(f"Dependency graph rebuilt: {len(self.graph)} nodes, {len(self.links)} links.")
+
+    async def flush_buffer(self, buffer: List[ResultBatch], spool_only: bool = False):
+        """
+        Processa um lote de resultados: flap protection, transições, supressão e escrita.
+        Com o banco lento/fora (ou spool_only) o histórico e os alertas vão para o spool em
+        disco; o status atual não precisa de spool (saved_* não avança e é regravado depois).
+        """
         if not buffer: return
-        try:
-            async with async_session_factory() as session:
-                update_list = []
-                latency_inserts = []
-                alerts_to_send = []
-                
-                for item in buffer:
-                    target_info = self.targets.get(item['ip'])
-                    if not target_info: continue
-                    
-                    eq_id = target_info['id']
-                    old_status = target_info['status']
-                    raw_new_status = item['is_online']
-                    
-                    # --- FLAP PROTECTION LOGIC ---
-                    if not raw_new_status:
-                        # Falhou o ping
-                        target_info['fail_count'] = target_info.get('fail_count', 0) + 1
-                    else:
-                        # Sucesso no ping
-                        target_info['fail_count'] = 0
-
-                    # Somente muda para OFFLINE se falhar a quantidade de vezes configurada
-                    if target_info['fail_count'] >= DOWN_COUNT:
-                        new_status = False
-                    elif raw_new_status:
-                        # Se deu online uma vez, já considera online (recuperação rápida)
-                        new_status = True
-                    else:
-                        # Ainda em "queda livre" mas não atingiu limite, mantém status anterior
-                        new_status = old_status
-
-                    # Detect Change
-                    if old_status is not None and old_status != new_status:
-                        # Status Mudou Efetivamente!
-                        target_info['status'] = new_status # Atualiza memoria IMEDIATAMENTE
-                        
-                        device_name = target_info['name']
-                        msg_type = "OFFLINE 🔴" if not new_status else "ONLINE 🟢"
-                        
-                        # Prepare Alert message
-                        tmpl_key = "telegram_template_down" if not new_status else "telegram_template_up"
-                        template = self.config.get(tmpl_key)
-                        
-                        if template:
-                            message = template.replace("{name}", device_name).replace("{ip}", item['ip'])
-                            # Suporte para o novo formato de template
-                            now_dt = datetime.now()
-                            message = message.replace("[Device.Name]", device_name).replace("[Device.IP]", item['ip'])
-                            message = message.replace("[Date]", now_dt.strftime("%d/%m/%Y")).replace("[Time]", now_dt.strftime("%H:%M"))
-                        else:
-                            message = f"Dispositivo {device_name} ({item['ip']}) está {msg_type}"
-                        
-                        logger.info(f"STATUS CHANGE: {item['ip']} is now {msg_type}. Message: {message}")
-                        
-                        # --- TOPOLOGY SUPPRESSION ---
-                        is_suppressed = False
-                        if not new_status: # Only suppress OFFLINE alerts
-                            # 1. Check Parent Equipment
-                            pid = target_info.get("parent_id")
-                            if pid:
-                                parent_ip = self.id_to_ip.get(("equipment", pid))
-                                if parent_ip and not self.targets.get(parent_ip, {}).get("status", True):
-                                    is_suppressed = True
-                                    logger.info(f"[SUPPRESSION] Silent alert for {device_name} ({item['ip']}) - Parent Equipment {parent_ip} is down.")
-
-                            # 2. Check Tower
-                            tid = target_info.get("tower_id")
-                            if tid and not is_suppressed:
-                                tower_ip = self.id_to_ip.get(("tower", tid))
-                                if tower_ip and not self.targets.get(tower_ip, {}).get("status", True):
-                                    is_suppressed = True
-                                    logger.info(f"[SUPPRESSION] Silent alert for {device_name} ({item['ip']}) - Tower {tower_ip} is down.")
-                            
-                            # 3. Check Tower Parent (Backbone)
-                            if target_info["type"] == "tower" and target_info.get("parent_id") and not is_suppressed:
-                                t_pid = target_info["parent_id"]
-                                t_parent_ip = self.id_to_ip.get(("tower", t_pid))
-                                if t_parent_ip and not self.targets.get(t_parent_ip, {}).get("status", True):
-                                    is_suppressed = True
-                                    logger.info(f"[SUPPRESSION] Silent alert for Tower {device_name} - Backbone Tower {t_parent_ip} is down.")
-
-                        if not is_suppressed:
-                            alerts_to_send.append({
-                                "device_type": "equipment",
-                                "device_name": device_name,
-                                "device_ip": item['ip'],
-                                "message": message
-                            })
-                        
-                        # Add to DB Alert table (Always log to DB for history, but maybe mark as suppressed?)
-                        await session.execute(
-                            insert(Alert).values(
-                                device_type=target_info["type"],
-                                device_name=device_name,
-                                device_ip=item['ip'],
-                                message=message + (" (Silenciado por topologia)" if is_suppressed else ""),
-                                timestamp=datetime.utcnow()
-                            )
-                        )
-
-                    update_list.append({
-                        "p_id": eq_id,
-                        "p_online": item['is_online'],
-                        "p_last_ping": item['timestamp'],
-                        "p_latency": None
-                    })
-                    if item['is_online']:
-                        latency_val = round(item['latency'])
-                        latency_inserts.append({
-                            "eid": eq_id,
-                            "lat": latency_val,
-                            "loss": item['packet_loss'],
-                            "ts": item['timestamp']
-                        })
-                        update_list[-1]["p_latency"] = latency_val
-                
-                if update_list:
-                    await session.execute(
-                        text("UPDATE equipments SET is_online = :p_online, last_ping = :p_last_ping, last_latency = :p_latency WHERE id = :p_id"),
-                        update_list
-                    )
-                if latency_inserts:
-                     # 🛡️ PROTEÇÃO CONTRA FOREIGN KEY VIOLATION: Só insere se o equipamento ainda existir no banco
-                     await session.execute(
-                        text("""
-                            INSERT INTO latency_history (equipment_id, latency, packet_loss, timestamp) 
-                            SELECT :eid, :lat, :loss, :ts
-                            WHERE EXISTS (SELECT 1 FROM equipments WHERE id = :eid)
-                        """),
-                        latency_inserts
-                    )
-                
-                await session.commit()
-                
-                # Send Out of Session Notifications (Async)
-                if alerts_to_send:
-                    for alert in alerts_to_send:
-                        asyncio.create_task(send_notification(
-                            message=alert['message'],
-                            telegram_token=self.config.get("telegram_token"),
-                            telegram_chat_id=self.config.get("telegram_chat_id"),
-                            telegram_enabled=(self.config.get("telegram_enabled") != "false"),
-                            whatsapp_enabled=(self.config.get("whatsapp_enabled") == "true"),
-                            whatsapp_target=self.config.get("whatsapp_target"),
-                            whatsapp_target_group=self.config.get("whatsapp_target_group")
-                        ))
-                    logger.info(f"🚨 Enviados {len(alerts_to_send)} alertas!")
-
-                logger.debug(f"Flushed {len(buffer)} records to DB.")
-        except Exception as e:
-            logger.error(f"Failed to flush to DB: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+        flush_started = time.monotonic()
+        pending_writes = {} # (type, id) -> (target, ts, latency)
+        latency_inserts = []
+        alerts_to_send = []
+        alert_rows = []
+        transitions = []
+        self._ensure_graph()
+        
+        for ip, is_online, latency, packet_loss, ts, stats in iter_results(buffer):
+            target_info = self.target_for(ip)
+            if not target_info: continue
+
+            eq_id = target_info.id
+            old_status = target_info.status
+            raw_new_status = is_online
+
+            # --- FLAP PROTECTION LOGIC ---
+            if not raw_new_status:
+                # Falhou o ping
+                target_info.fail_count += 1
+                if target_info.fail_count == 1:
+                    # Suspeito: antecipa a confirmação em vez de esperar o intervalo cheio
+                    self.scheduler.expedite(ip)
+            else:
+                # Sucesso no ping
+                target_info.fail_count = 0
+
+            # Somente muda para OFFLINE se falhar a quantidade de vezes configurada
+            if target_info.fail_count >= DOWN_COUNT:
+                new_status = False
+            elif raw_new_status:
+                # Se deu online uma vez, já considera online (recuperação rápida)
+                new_status = True
+            else:
+                # Ainda em "queda livre" mas não atingiu limite, mantém status anterior
+                new_status = old_status
+
+            # Detect Change
+            if old_status is None:
+                # Estado desconhecido no banco: assume o primeiro resultado sem alertar
+                target_info.status = new_status if new_status is not None else raw_new_status
+                # Pai que já nasce fora também suprime os filhos (sem esperar uma oscilação)
+                self.graph.set_down((target_info.type, target_info.id), not target_info.status)
+            elif old_status != new_status:
+                # Status Mudou Efetivamente!
+                target_info.status = new_status # Atualiza memoria IMEDIATAMENTE
+                self.graph.set_down((target_info.type, target_info.id), not new_status)
+                transitions.append((target_info, ip, new_status))
+            if target_info.status != old_status and target_info.type == "equipment":
+                # Demais jobs do collector (snmp_monitor...) veem o novo status sem esperar o flush
+                device_registry.update(eq_id, is_online=bool(target_info.status))
+
+            # --- WRITE PATH: só transições e heartbeats ---
+            # Uma linha por alvo por flush (a última amostra vence)
+            if self.targets.write_due(target_info, ts, HEARTBEAT_INTERVAL):
+                pending_writes[(target_info.type, eq_id)] = (target_info, ts, round(latency) if is_online else None)
+            if is_online and target_info.type == "equipment":
+                latency_inserts.append((eq_id, round(latency), packet_loss, ts, *_stat_values(stats)))
+
+        # Segunda passada: o grafo já conhece todas as quedas deste lote,
+        # então um filho processado antes do pai também é silenciado.
+        for target_info, ip, new_status in transitions:
+            device_name = target_info.name
+            msg_type = "OFFLINE 🔴" if not new_status else "ONLINE 🟢"
+
+            # Prepare Alert message
+            tmpl_key = "telegram_template_down" if not new_status else "telegram_template_up"
+            template = self.config.get(tmpl_key)
+
+            if template:
+                message = template.replace("{name}", device_name).replace("{ip}", ip)
+                # Suporte para o novo formato de template
+                now_dt = datetime.now()
+                message = message.replace("[Device.Name]", device_name).replace("[Device.IP]", ip)
+                message = message.replace("[Date]", now_dt.strftime("%d/%m/%Y")).replace("[Time]", now_dt.strftime("%H:%M"))
+            else:
+                message = f"Dispositivo {device_name} ({ip}) está {msg_type}"
+
+            logger.info(f"STATUS CHANGE: {ip} is now {msg_type}. Message: {message}")
+
+            # --- TOPOLOGY SUPPRESSION ---
+            # Qualquer ancestral fora (equipamento pai, torre, backbone, rádio do enlace)
+            is_suppressed = False
+            if not new_status: # Only suppress OFFLINE alerts
+                culprit = self.graph.down_ancestor((target_info.type, target_info.id))
+                if culprit:
+                    is_suppressed = True
+                    culprit_ip = self.targets.ip_for(*culprit) or f"#{culprit[1]}"
+                    logger.info(f"[SUPPRESSION] Silent alert for {device_name} ({ip}) - Upstream {culprit[0]} {culprit_ip} is down.")
+
+            if not is_suppressed:
+                alerts_to_send.append({
+                    "device_type": "equipment",
+                    "device_name": device_name,
+                    "device_ip": ip,
+                    "message": message
+                })
+
+            # Add to DB Alert table (Always log to DB for history, but maybe mark as suppressed?)
+            alert_rows.append({
+                "device_type": target_info.type,
+                "device_name": device_name,
+                "device_ip": ip,
+                "message": message + (" (Silenciado por topologia)" if is_suppressed else ""),
+                "timestamp": datetime.utcnow()
+            })
+
+        samples = sum(len(b) for b in buffer)
+        eq_writes = [w for k, w in pending_writes.items() if k[0] == "equipment"]
+        tw_writes = [w for k, w in pending_writes.items() if k[0] == "tower"]
+
+        written = False
+        if not spool_only and time.monotonic() >= self._db_retry_at:
+            try:
+                await asyncio.wait_for(
+                    self._write_db(eq_writes, tw_writes, latency_inserts, alert_rows),
+                    timeout=FLUSH_TIMEOUT
+                )
+                written = True
+            except Exception as e:
+                # Banco lento ou fora: não insiste a cada flush, vai para o spool por DB_RETRY_INTERVAL
+                self._db_retry_at = time.monotonic() + DB_RETRY_INTERVAL
+                perf_metrics.inc("db_flush_errors")
+                logger.error(f"Failed to flush to DB: {e!r}. Gravando no spool (nova tentativa em {DB_RETRY_INTERVAL}s).")
+
+        if written:
+            if self._db_retry_at:
+                logger.info("✅ Banco respondendo novamente: Pinger voltou a gravar direto.")
+                self._db_retry_at = 0.0
+            # Só depois do commit: o que foi gravado vira a referência para o próximo flush
+            for t, ts, _ in pending_writes.values():
+                self.targets.mark_saved(t, ts)
+            self.last_flush_writes = {
+                "samples": samples,
+                "equipment_rows": len(eq_writes),
+                "tower_rows": len(tw_writes),
+                "history_rows": len(latency_inserts),
+                "transitions": len(transitions),
+            }
+            for key, value in self.last_flush_writes.items():
+                self.write_counters[key] = self.write_counters.get(key, 0) + value
+                perf_metrics.inc(f"db_write_{key}", value)
+            self.write_counters["flushes"] = self.write_counters.get("flushes", 0) + 1
+            perf_metrics.observe("db_flush_ms", (time.monotonic() - flush_started) * 1000)
+            perf_metrics.observe("db_flush_batch_size", samples, buckets=FLUSH_SIZE_BUCKETS)
+            logger.debug(f"Flushed {samples} samples to DB: {len(eq_writes)} equipment rows, {len(tw_writes)} tower rows, {len(latency_inserts)} history rows.")
+        else:
+            spool_rows("pinger", "latency_history", LATENCY_SPOOL_COLUMNS, latency_inserts)
+            spool_rows("pinger", "alerts", ALERT_SPOOL_COLUMNS, [[r[c] for c in ALERT_SPOOL_COLUMNS] for r in alert_rows])
+            perf_metrics.inc("pinger_spooled_samples", samples)
+
+        # Send Out of Session Notifications (Async)
+        if alerts_to_send:
+            for alert in alerts_to_send:
+                asyncio.create_task(send_notification(
+                    message=alert['message'],
+                    telegram_token=self.config.get("telegram_token"),
+                    telegram_chat_id=self.config.get("telegram_chat_id"),
+                    telegram_enabled=(self.config.get("telegram_enabled") != "false"),
+                    whatsapp_enabled=(self.config.get("whatsapp_enabled") == "true"),
+                    whatsapp_target=self.config.get("whatsapp_target"),
+                    whatsapp_target_group=self.config.get("whatsapp_target_group")
+                ))
+            logger.info(f"🚨 Enviados {len(alerts_to_send)} alertas!")
+
+    async def _write_db(self, eq_writes, tw_writes, latency_inserts, alert_rows):
+        async with async_session_factory() as session:
+            if eq_writes:
+                # Set-based: um único UPDATE ... FROM unnest(...) por tabela
+                await session.execute(
+                    text("""
+                        UPDATE equipments AS e
+                        SET is_online = v.online, last_ping = v.last_ping, last_latency = v.latency
+                        FROM unnest(CAST(:ids AS INTEGER[]), CAST(:online AS BOOLEAN[]),
+                                    CAST(:last_ping AS DOUBLE PRECISION[]), CAST(:latency AS INTEGER[]))
+                             AS v(id, online, last_ping, latency)
+                        WHERE e.id = v.id
+                    """),
+                    {
+                        "ids": [t.id for t, _, _ in eq_writes],
+                        "online": [bool(t.status) for t, _, _ in eq_writes],
+                        "last_ping": [ts for _, ts, _ in eq_writes],
+                        "latency": [lat for _, _, lat in eq_writes],
+                    }
+                )
+            if tw_writes:
+                await session.execute(
+                    text("""
+                        UPDATE towers AS t
+                        SET is_online = v.online, last_checked = to_timestamp(v.checked) AT TIME ZONE 'UTC'
+                        FROM unnest(CAST(:ids AS INTEGER[]), CAST(:online AS BOOLEAN[]), CAST(:checked AS DOUBLE PRECISION[]))
+                             AS v(id, online, checked)
+                        WHERE t.id = v.id
+                    """),
+                    {
+                        "ids": [t.id for t, _, _ in tw_writes],
+                        "online": [bool(t.status) for t, _, _ in tw_writes],
+                        "checked": [ts for _, ts, _ in tw_writes],
+                    }
+                )
+            if latency_inserts:
+                # 🛡️ PROTEÇÃO CONTRA FOREIGN KEY VIOLATION: Só insere se o equipamento ainda existir no banco
+                await session.execute(
+                    text("""
+                        INSERT INTO latency_history (equipment_id, latency, packet_loss, timestamp,
+                                                     avg_latency, max_latency, mdev, jitter, probes)
+                        SELECT v.eid, v.lat, v.loss, v.ts, v.avg, v.mx, v.mdev, v.jitter, v.probes
+                        FROM unnest(CAST(:eids AS INTEGER[]), CAST(:lats AS INTEGER[]),
+                                    CAST(:losses AS DOUBLE PRECISION[]), CAST(:tss AS DOUBLE PRECISION[]),
+                                    CAST(:avgs AS DOUBLE PRECISION[]), CAST(:maxs AS DOUBLE PRECISION[]),
+                                    CAST(:mdevs AS DOUBLE PRECISION[]), CAST(:jitters AS DOUBLE PRECISION[]),
+                                    CAST(:probes AS INTEGER[]))
+                             AS v(eid, lat, loss, ts, avg, mx, mdev, jitter, probes)
+                        WHERE EXISTS (SELECT 1 FROM equipments WHERE id = v.eid)
+                    """),
+                    {
+                        "eids": [r[0] for r in latency_inserts],
+                        "lats": [r[1] for r in latency_inserts],
+                        "losses": [r[2] for r in latency_inserts],
+                        "tss": [r[3] for r in latency_inserts],
+                        "avgs": [r[4] for r in latency_inserts],
+                        "maxs": [r[5] for r in latency_inserts],
+                        "mdevs": [r[6] for r in latency_inserts],
+                        "jitters": [r[7] for r in latency_inserts],
+                        "probes": [r[8] for r in latency_inserts],
+                    }
+                )
+
+            if alert_rows:
+                await session.execute(insert(Alert), alert_rows)
+
+            await session.commit()
 
     async def start(self):
         logger.info("Starting ISP Monitor Pinger Service (Turbo V2)...")
-        await asyncio.gather(self.load_targets(), self.load_configs(), self.ping_worker(), self.db_writer())
+        perf_metrics.gauge_fn("results_queue_depth", self.results_queue.qsize)
+        perf_metrics.gauge_fn("ping_targets", lambda: len(self.scheduler))
+        perf_metrics.gauge_fn("ping_interval_s", lambda: self.scheduler.interval)
+        perf_metrics.gauge_fn("ping_fast_interval_s", lambda: self.scheduler.fast_interval)
+        perf_metrics.gauge_fn("ping_lateness_avg_ms", lambda: round(self.scheduler.lateness_avg * 1000, 1))
+        perf_metrics.gauge_fn("dns_cache_entries", lambda: len(dns_cache))
+        pinging = self.shard_ping_worker(settings.ping_shards) if settings.ping_shards > 0 else self.ping_worker()
+        await asyncio.gather(self.load_targets(), self.load_configs(), pinging, self.db_writer())
+
+def iter_results(buffer: List[ResultBatch]):
+    """Achata os lotes em (ip, is_online, latency, packet_loss, timestamp, (avg, max, mdev, jitter, probes))."""
+    for batch in buffer:
+        ts = batch.timestamp
+        for (ip, is_online, latency, packet_loss), stats in zip(batch.rows(), batch.stats()):
+            yield ip, is_online, latency, packet_loss, ts, stats
 
-import ipaddress
+def _stat_values(stats):
+    """NaN (sem dado) vira NULL no banco/spool; o resto vai com 2 casas (probes 0 = desconhecido)."""
+    *floats, probes = stats
+    return (*(None if v != v else round(v, 2) for v in floats), probes or None)
 
 # --- Utility Functions (Legacy Compatibility) ---
-async def scan_network(ips: List[str], chunk_size: int = 255):
+async def scan_network(ips: Iterable[str], rate: float = DISCOVERY_RATE, window: int = DISCOVERY_WINDOW):
     """
-    Realiza ping em uma lista de IPs e gera resultados de forma ultra-rápida.
+    Realiza ping em uma lista (ou gerador) de IPs e gera resultados conforme ficam prontos.
+    Cadenciado (token bucket) e com janela limitada de probes em voo; para faixas grandes
+    use o DiscoveryEngine, que nem materializa a lista de IPs.
     """
-    # Processamos em pedaços para não explodir a memória se a lista for gigante (ex: /16)
-    for i in range(0, len(ips), chunk_size):
-        chunk = ips[i : i + chunk_size]
+    async for result in probe_stream(ips, rate=rate, window=window):
+        yield result
+
+
+PINGER_LOCK_FILE = os.path.join(tempfile.gettempdir(), "isp_monitor_pinger.lock")
+
+def _read_lock():
+    """Lock: 1ª linha = PID do Pinger; demais = PIDs dos shards de ping (modo multi-processo)."""
+    with open(PINGER_LOCK_FILE, "r") as f:
+        pids = [int(line) for line in f.read().split()]
+    if not pids:
+        raise ValueError("lock vazio")
+    return pids[0], pids[1:]
+
+def _reap_orphan_shards(pids):
+    """Shards de uma instância que morreu sem encerrar os filhos (kill -9, crash)."""
+    import psutil
+    for pid in pids:
         try:
-            # privileged=False usa sockets UDP para ping (padrão no Windows sem root)
-            # count=1 e timeout curto para velocidade máxima de descoberta
-            results = await async_multiping(
-                chunk, 
-                count=1, 
-                interval=0.01, 
-                timeout=0.8, 
-                privileged=False
-            )
-            for host in results:
-                yield {
-                    "ip": host.address,
-                    "is_online": host.is_alive,
-                    "latency": host.avg_rtt,
-                    "packet_loss": host.packet_loss
-                }
-        except Exception as e:
-            logger.error(f"Rede inacessível ou erro no scan: {e}")
-            # Em caso de erro crítico no chunk, assume offline para não travar
-            for ip in chunk:
-                yield {"ip": ip, "is_online": False, "error": str(e)}
-
-
-def ensure_singleton():
-    """Garante que apenas uma instância do Pinger rode por vez (Windows/Linux Safe)."""
+            proc = psutil.Process(pid)
+            # PID reaproveitado por outro programa? Só mata filhos do multiprocessing
+            if "multiprocessing" not in " ".join(proc.cmdline()):
+                continue
+            print(f"⚠️ Aviso: Encerrando shard de ping órfão (PID {pid}).")
+            proc.terminate()
+            proc.wait(timeout=3)
+        except psutil.TimeoutExpired:
+            proc.kill()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+
+def ensure_singleton(exit_on_conflict: bool = True) -> bool:
+    """
+    Garante que apenas uma instância do Pinger rode por vez (Windows/Linux Safe).
+    Com exit_on_conflict=False (modo shards dentro do collector) retorna False em vez de sair.
+    """
     import psutil
     
-    lock_file = os.path.join(tempfile.gettempdir(), "isp_monitor_pinger.lock")
+    lock_file = PINGER_LOCK_FILE
     
     try:
         current_pid = os.getpid()
@@ -435,15 +759,19 @@ def ensure_singleton():
         # Check if lock exists
         if os.path.exists(lock_file):
             try:
-                with open(lock_file, "r") as f:
-                    old_pid = int(f.read().strip())
+                old_pid, old_shards = _read_lock()
                 
+                if old_pid == current_pid:
+                    return True # Já somos o dono (ex: Pinger reiniciado pelo supervisor)
                 # Check if process is actually running
                 if psutil.pid_exists(old_pid):
                     print(f"⚠️ Erro: Já existe uma instância do Pinger rodando (PID {old_pid})!")
-                    sys.exit(0)
+                    if exit_on_conflict:
+                        sys.exit(0)
+                    return False
                 else:
                     print(f"⚠️ Aviso: Lock file encontrado (PID {old_pid}), mas processo não existe. Removendo trava staled.")
+                    _reap_orphan_shards(old_shards)
                     os.remove(lock_file)
             except (ValueError, OSError):
                 # File corrupted or empty, force remove
@@ -461,14 +789,25 @@ def ensure_singleton():
             try:
                 # Only remove if it contains OUR pid (safety check)
                 if os.path.exists(lock_file):
-                    with open(lock_file, "r") as f:
-                        if int(f.read().strip()) == current_pid:
-                            os.remove(lock_file)
+                    if _read_lock()[0] == current_pid:
+                        os.remove(lock_file)
             except: pass
         atexit.register(cleanup)
         
     except Exception as e:
         logger.error(f"Singleton lock error: {e}")
+    return True
+
+def register_singleton_children(pids: List[int]):
+    """Anota os PIDs dos shards no lock, para a próxima instância limpar órfãos."""
+    try:
+        if _read_lock()[0] != os.getpid():
+            return
+        with open(PINGER_LOCK_FILE, "w") as f:
+            f.write("\n".join(str(p) for p in [os.getpid(), *pids]))
+    except (ValueError, OSError) as e:
+        logger.warning(f"Singleton lock: não foi possível registrar os shards: {e}")
+
 if __name__ == "__main__":
     ensure_singleton()
     
@@ -0,0 +1,455 @@
+"""
+Pinger multi-processo (shards).
+
+Com `PING_SHARDS` > 0 o collector sobe N processos de ping. Cada shard é dono de
+uma fatia dos alvos escolhida por hash consistente (jump hash da sub-rede do
+alvo): incluir/remover alvos não embaralha os demais, mudar N move só ~1/N das
+sub-redes, e a cadência por /24 do PingScheduler continua exata porque uma
+sub-rede inteira fica sempre no mesmo shard.
+
+Cada shard roda o próprio PingScheduler + IcmpEngine (id ICMP com byte alto
+próprio e filtro BPF no socket RAW, então nenhum shard processa as respostas dos
+outros) e devolve ResultBatch empacotados em colunas por um pipe. O processo do
+collector continua sendo o único escritor: flap protection, grafo de
+dependências, alertas e banco ficam no PingerService.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+import zlib
+from typing import Callable, Dict, List, Optional
+from loguru import logger
+
+from backend.app.services.icmp_engine import HostResult, get_icmp_engine, rtt_stats
+from backend.app.services.ping_scheduler import PingScheduler, subnet_key
+from backend.app.services.target_store import ResultBatch
+
+OVERHEAD_COMPENSATION = 2.8  # Calibração V4: Estabilização de "Piso"
+PROBE_COUNT = 3               # Rajada completa (modo fixo e alvos prioritários)
+PROBE_INTERVAL = 0.05
+ESCALATION_COUNT = 3          # Modo adaptativo: probes extras quando o primeiro se perde (3-5)
+FULL_BURST_EVERY = 10         # Modo adaptativo: rajada completa a cada N ciclos por alvo (0 = nunca)
+CHUNK_SIZE = 10               # IPs por multiping
+MAX_PENDING_CHUNKS = 200      # Backpressure: não tira mais alvos do heap se o pool estiver atolado
+SHARD_CONCURRENT_CHUNKS = 50  # Lotes simultâneos por shard
+STATS_INTERVAL = 5.0
+OUTBOX_SIZE = 2000            # Lotes aguardando o escritor antes de descartar
+
+MSG_BATCH = ord("B")
+MSG_STATS = ord("S")
+
+# Flags por alvo enviadas aos shards
+FLAG_FAST = 1  # Intervalo curto (offline/prioritário)
+FLAG_FULL = 2  # Sempre rajada completa, mesmo no modo adaptativo (prioritário)
+
+
+def burst_slot(interval: float) -> int:
+    """Número do ciclo corrente (relógio / intervalo), a fase da rajada periódica."""
+    return int(time.time() // max(interval, 1.0))
+
+
+def burst_due(ip: str, slot: int, every: int = FULL_BURST_EVERY) -> bool:
+    """Rajada periódica: cada alvo numa fase própria (crc32), para a frota não rajar toda no mesmo ciclo."""
+    return every > 0 and (zlib.crc32(ip.encode()) + slot) % every == 0
+
+
+async def probe_hosts(multiping, addresses: List[str], timeout: float, adaptive: bool = True,
+                      escalation: int = ESCALATION_COUNT, full=frozenset(),
+                      burst_every: int = FULL_BURST_EVERY, slot: int = 0):
+    """
+    Pinga um chunk e retorna (resultados, escalados).
+
+    Modo adaptativo: 1 probe para cada host; quem não responde recebe na hora uma
+    rajada de `escalation` probes, e só conta como falha (fail_count) se a rajada
+    inteira se perder, igual ao count=3 antigo. O resultado mesclado soma os
+    probes enviados nas duas fases, então packet_loss = perdidos / enviados de fato.
+    Alvos em `full` (e o modo fixo) recebem a rajada completa direto.
+
+    Com 1 probe não há max/mdev/jitter (NaN -> NULL em latency_history): por isso
+    cada alvo também recebe a rajada completa num ciclo a cada `burst_every`
+    (fase por alvo em burst_due, `slot` = burst_slot do chamador). As colunas de
+    jitter passam a ter 1 amostra a cada N ciclos por host saudável, em vez de
+    nenhuma; burst_every=0 desliga (só prioritários e escalados têm jitter).
+    """
+    if not adaptive:
+        full_ips, single_ips = addresses, []
+    else:
+        full_ips, single_ips = [], []
+        for ip in addresses:
+            if ip in full or burst_due(ip, slot, burst_every):
+                full_ips.append(ip)
+            else:
+                single_ips.append(ip)
+
+    async def burst(ips, count):
+        if not ips:
+            return []
+        return await multiping(ips, count=count, interval=PROBE_INTERVAL, timeout=timeout,
+                               payload_size=32, privileged=True)
+
+    full_res, single_res = await asyncio.gather(burst(full_ips, PROBE_COUNT), burst(single_ips, 1))
+    missed = [h.address for h in single_res if not h.is_alive]
+    if not missed:
+        return list(full_res) + list(single_res), 0
+
+    retry = {h.address: h for h in await burst(missed, max(3, min(5, escalation)))}
+    results = list(full_res)
+    for h in single_res:
+        r = retry.get(h.address)
+        if r is None:
+            results.append(h)
+        else:
+            # Só as respostas da rajada têm RTT; o probe inicial perdido entra no total enviado
+            results.append(HostResult(h.address, list(r.rtts), h.packets_sent + r.packets_sent))
+    return results, len(missed)
+
+
+def build_batch(results, lateness: Dict[str, float]) -> ResultBatch:
+    """Converte o resultado de um multiping em ResultBatch (latência calibrada + estatísticas de RTT)."""
+    batch = ResultBatch(time.time())
+    # avg/max/mdev/jitter do lote todo de uma vez (mdev e jitter não dependem do offset)
+    avgs, maxs, mdevs, jitters = rtt_stats([host.rtts for host in results])
+    for host, avg, mx, mdev, jitter in zip(results, avgs, maxs, mdevs, jitters):
+        raw_lat = host.min_rtt
+        clean_lat = max(0.0, raw_lat - OVERHEAD_COMPENSATION) if host.is_alive else 0
+
+        # ANTI-JITTER: Se for muito baixo (<2ms), crava em 1ms para parar de oscilar no gráfico
+        if host.is_alive and clean_lat < 2.0:
+            clean_lat = 1.0
+
+        if host.is_alive:
+            # Mesma calibração do min, sem deixar avg/max abaixo do valor exibido
+            avg = round(max(clean_lat, avg - OVERHEAD_COMPENSATION), 1)
+            mx = round(max(avg, mx - OVERHEAD_COMPENSATION), 1)
+        batch.append(host.address, host.is_alive, round(clean_lat, 1), host.packet_loss, lateness.get(host.address, 0.0),
+                     (avg, mx, mdev, jitter, host.packets_sent))
+    return batch
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash (Lamping & Veach): bucket estável em [0, buckets)."""
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+def shard_for(ip: str, shards: int) -> int:
+    if shards <= 1:
+        return 0
+    return jump_hash(zlib.crc32(subnet_key(ip).encode()), shards)
+
+
+# ---------------------------------------------------------------------------
+# Lado do shard (processo filho)
+# ---------------------------------------------------------------------------
+class _ShardRunner:
+    def __init__(self, index: int, cmd_conn, res_conn, ident_prefix: int):
+        self.index = index
+        self.cmd_conn = cmd_conn
+        self.res_conn = res_conn
+        self.ident_prefix = ident_prefix
+        self.scheduler = PingScheduler()
+        self.fast = set()  # Prioritários/offline segundo o escritor
+        self.full = set()  # Prioritários: rajada completa no modo adaptativo
+        self.fails: Dict[str, int] = {}
+        self.timeout = 2.0
+        self.adaptive = True
+        self.escalation = ESCALATION_COUNT
+        self.burst_every = FULL_BURST_EVERY
+        self.escalated = 0
+        self.outbox: "queue.Queue[bytes]" = queue.Queue(maxsize=OUTBOX_SIZE)
+        self.stopped = asyncio.Event()
+        self.sent = 0
+        self.received = 0
+        self.dropped = 0
+        self.cycle_ms: List[float] = []
+
+    # --- Comandos do escritor ---
+    def _apply(self, msg):
+        kind = msg[0]
+        if kind == "targets":
+            targets: Dict[str, int] = msg[1]
+            self.scheduler.sync(targets.keys())
+            self.fast = {ip for ip, flags in targets.items() if flags & FLAG_FAST}
+            self.full = {ip for ip, flags in targets.items() if flags & FLAG_FULL}
+            for ip in [ip for ip in self.fails if ip not in targets]:
+                del self.fails[ip]
+        elif kind == "config":
+            cfg = msg[1]
+            self.scheduler.configure(cfg["interval"], cfg["fast_interval"], cfg["subnet_rate"])
+            self.timeout = float(cfg["timeout"])
+            self.adaptive = bool(cfg.get("adaptive", True))
+            self.escalation = int(cfg.get("escalation", ESCALATION_COUNT))
+            self.burst_every = int(cfg.get("burst_every", FULL_BURST_EVERY))
+        elif kind == "stop":
+            self.stopped.set()
+
+    def _command_reader(self, loop):
+        while True:
+            try:
+                msg = self.cmd_conn.recv()
+            except (EOFError, OSError):
+                # Escritor morreu: o shard não sobrevive sozinho
+                loop.call_soon_threadsafe(self.stopped.set)
+                return
+            loop.call_soon_threadsafe(self._apply, msg)
+            if msg[0] == "stop":
+                return
+
+    def _sender(self, loop):
+        while True:
+            data = self.outbox.get()
+            if data is None:
+                return
+            try:
+                self.res_conn.send_bytes(data)
+            except (BrokenPipeError, OSError):
+                loop.call_soon_threadsafe(self.stopped.set)
+                return
+
+    def _emit(self, data: bytes):
+        try:
+            self.outbox.put_nowait(data)
+        except queue.Full:
+            self.dropped += 1
+
+    def interval_for(self, ip: str) -> float:
+        if self.fails.get(ip) or ip in self.fast:
+            return self.scheduler.fast_interval
+        return self.scheduler.interval
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        threading.Thread(target=self._command_reader, args=(loop,), daemon=True).start()
+        threading.Thread(target=self._sender, args=(loop,), daemon=True).start()
+
+        engine = get_icmp_engine(privileged=True, ident_prefix=self.ident_prefix)
+        if engine:
+            multiping = engine.multiping
+        else:
+            from icmplib import async_multiping as multiping
+        pool_sem = asyncio.Semaphore(SHARD_CONCURRENT_CHUNKS if engine else 5)
+        inflight = set()
+
+        async def ping_chunk(chunk):
+            async with pool_sem:
+                fired_at = time.monotonic()
+                lateness = {ip: self.scheduler.record_fire(due, fired_at) for ip, due in chunk}
+                try:
+                    results, escalated = await probe_hosts(multiping, [ip for ip, _ in chunk], self.timeout,
+                                                           self.adaptive, self.escalation, self.full,
+                                                           self.burst_every, burst_slot(self.scheduler.interval))
+                    self.escalated += escalated
+                except Exception as e:
+                    logger.error(f"[PINGER SHARD {self.index}] Batch Error (continuing): {e}")
+                    return
+                if len(self.cycle_ms) < 4096:
+                    self.cycle_ms.append((time.monotonic() - fired_at) * 1000)
+                for host in results:
+                    self.sent += host.packets_sent
+                    self.received += host.packets_received
+                    if host.is_alive:
+                        self.fails.pop(host.address, None)
+                    else:
+                        n = self.fails[host.address] = self.fails.get(host.address, 0) + 1
+                        if n == 1:
+                            # Suspeito: antecipa a confirmação (o escritor decide o status)
+                            self.scheduler.expedite(host.address)
+                self._emit(bytes((MSG_BATCH,)) + build_batch(results, lateness).pack())
+
+        last_stats = time.monotonic()
+        while not self.stopped.is_set():
+            now = time.monotonic()
+            free = MAX_PENDING_CHUNKS - len(inflight)
+            if len(self.scheduler) and free > 0:
+                due = self.scheduler.pop_due(now, free * CHUNK_SIZE, self.interval_for)
+                for i in range(0, len(due), CHUNK_SIZE):
+                    task = asyncio.create_task(ping_chunk(due[i : i + CHUNK_SIZE]))
+                    inflight.add(task)
+                    task.add_done_callback(inflight.discard)
+
+            if now - last_stats >= STATS_INTERVAL:
+                st = self.scheduler.stats()
+                stats = {"sent": self.sent, "received": self.received, "dropped": self.dropped, "escalated": self.escalated,
+                         "cycle_ms": self.cycle_ms, "targets": st["targets"], "lateness_avg_ms": st["lateness_avg_ms"],
+                         "inflight": len(inflight)}
+                self._emit(bytes((MSG_STATS,)) + json.dumps(stats).encode())
+                self.sent = self.received = self.dropped = self.escalated = 0
+                self.cycle_ms = []
+                last_stats = now
+
+            try:
+                await asyncio.wait_for(self.stopped.wait(), timeout=min(max(self.scheduler.next_fire_in(), 0.01), 0.25))
+            except asyncio.TimeoutError:
+                pass
+
+        for task in list(inflight):
+            task.cancel()
+        try:
+            self.outbox.put_nowait(None)
+        except queue.Full:
+            pass  # Fila cheia: o _sender já saiu (pipe quebrado), ninguém para acordar
+
+
+def shard_main(index: int, cmd_conn, res_conn, ident_prefix: int):
+    """Ponto de entrada do processo filho (precisa ser importável: multiprocessing spawn)."""
+    # O spawn reimporta o __main__ do pai (e o config): sinks de arquivo com rotação ficariam
+    # abertos em N+1 processos no mesmo arquivo (no Windows a rotação quebra). Shard: só stderr
+    logger.remove()
+    logger.add(sys.stderr, level="INFO")
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    try:
+        asyncio.run(_ShardRunner(index, cmd_conn, res_conn, ident_prefix).run())
+    except KeyboardInterrupt:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Lado do escritor (processo do collector)
+# ---------------------------------------------------------------------------
+class ShardPool:
+    """Sobe e supervisiona os shards; entrega cada ResultBatch recebido a `on_batch` no event loop."""
+
+    def __init__(self, shards: int, on_batch: Callable[[ResultBatch], None]):
+        self.shards = shards
+        self.on_batch = on_batch
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._procs: List[Optional[multiprocessing.Process]] = [None] * shards
+        self._cmd = [None] * shards
+        self._slices: List[Dict[str, int]] = [{} for _ in range(shards)]
+        self._config: Optional[Dict] = None
+        self.shard_stats: List[Dict] = [{} for _ in range(shards)]
+        self.restarts = 0
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        for i in range(self.shards):
+            self._spawn(i)
+        logger.info(f"[PINGER] 🧩 {self.shards} shards de ping iniciados (PIDs {self.pids()})")
+
+    def _ident_prefix(self, index: int) -> int:
+        # Byte alto do id ICMP: distinto entre os shards do mesmo pool
+        return (os.getpid() * 31 + index) & 0xFF
+
+    def _spawn(self, index: int):
+        ctx = multiprocessing.get_context("spawn")
+        cmd_r, cmd_w = ctx.Pipe(duplex=False)
+        res_r, res_w = ctx.Pipe(duplex=False)
+        proc = ctx.Process(target=shard_main, args=(index, cmd_r, res_w, self._ident_prefix(index)),
+                           name=f"pinger-shard-{index}", daemon=True)
+        proc.start()
+        cmd_r.close()
+        res_w.close()
+        self._procs[index] = proc
+        self._cmd[index] = cmd_w
+        threading.Thread(target=self._reader, args=(index, res_r), daemon=True, name=f"pinger-shard-{index}-reader").start()
+        if self._config is not None:
+            self._send(index, ("config", self._config))
+        self._send(index, ("targets", self._slices[index]))
+
+    def _reader(self, index: int, conn):
+        """Thread por shard: o recv é bloqueante (e pipes do Windows não entram no selector)."""
+        while True:
+            try:
+                data = conn.recv_bytes()
+            except (EOFError, OSError):
+                conn.close()
+                return
+            try:
+                if data[0] == MSG_BATCH:
+                    self.loop.call_soon_threadsafe(self.on_batch, ResultBatch.unpack(data[1:]))
+                elif data[0] == MSG_STATS:
+                    self.loop.call_soon_threadsafe(self._on_stats, index, json.loads(data[1:]))
+            except RuntimeError:
+                return  # Loop fechado (encerrando)
+
+    def _on_stats(self, index: int, stats: Dict):
+        from backend.app.services.perf_metrics import perf_metrics
+        perf_metrics.inc("probes_sent", stats.get("sent", 0))
+        perf_metrics.inc("probes_received", stats.get("received", 0))
+        perf_metrics.inc("probe_escalations", stats.get("escalated", 0))
+        if stats.get("dropped"):
+            perf_metrics.inc("ping_shard_dropped_batches", stats["dropped"])
+        for ms in stats.pop("cycle_ms", ()):
+            perf_metrics.observe("ping_cycle_ms", ms)
+        perf_metrics.set_gauge(f"ping_shard_{index}_targets", stats.get("targets", 0))
+        perf_metrics.set_gauge(f"ping_shard_{index}_lateness_avg_ms", stats.get("lateness_avg_ms", 0))
+        self.shard_stats[index] = stats
+
+    def _send(self, index: int, msg):
+        conn = self._cmd[index]
+        if conn is None:
+            return
+        try:
+            conn.send(msg)
+        except (BrokenPipeError, OSError):
+            pass  # check() recria o shard e reenvia o estado
+
+    def assign(self, targets: Dict[str, int]):
+        """Distribui {ip: FLAG_*} entre os shards; só reenvia as fatias que mudaram."""
+        slices: List[Dict[str, int]] = [{} for _ in range(self.shards)]
+        for ip, flags in targets.items():
+            slices[shard_for(ip, self.shards)][ip] = flags
+        for i, part in enumerate(slices):
+            if part != self._slices[i]:
+                self._slices[i] = part
+                self._send(i, ("targets", part))
+
+    def configure(self, interval: float, fast_interval: float, subnet_rate: float, timeout: float,
+                  adaptive: bool = True, escalation: int = ESCALATION_COUNT, burst_every: int = FULL_BURST_EVERY):
+        cfg = {"interval": interval, "fast_interval": fast_interval, "subnet_rate": subnet_rate, "timeout": timeout,
+               "adaptive": adaptive, "escalation": escalation, "burst_every": burst_every}
+        if cfg != self._config:
+            self._config = cfg
+            for i in range(self.shards):
+                self._send(i, ("config", cfg))
+
+    def check(self) -> bool:
+        """Recria shards que morreram. Retorna True se algum foi reiniciado."""
+        restarted = False
+        for i, proc in enumerate(self._procs):
+            if proc is not None and not proc.is_alive():
+                logger.error(f"[PINGER] ⚠️ Shard {i} (PID {proc.pid}) morreu com código {proc.exitcode}. Reiniciando...")
+                try:
+                    self._cmd[i].close()
+                except Exception:
+                    pass
+                self.restarts += 1
+                self._spawn(i)
+                restarted = True
+        return restarted
+
+    def pids(self) -> List[int]:
+        return [p.pid for p in self._procs if p is not None]
+
+    def targets_count(self) -> int:
+        return sum(len(s) for s in self._slices)
+
+    def stop(self):
+        for i in range(self.shards):
+            self._send(i, ("stop",))
+        deadline = time.monotonic() + 3.0
+        for proc in self._procs:
+            if proc is None:
+                continue
+            proc.join(timeout=max(0.0, deadline - time.monotonic()))
+            if proc.is_alive():
+                proc.terminate()
+        for conn in self._cmd:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        self._procs = [None] * self.shards
+        self._cmd = [None] * self.shards
+        logger.info("[PINGER] Shards de ping encerrados.")
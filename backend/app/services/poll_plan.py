@@ -0,0 +1,144 @@
+"""
+Plano de coleta SNMP por equipamento (snmp_monitor).
+
+Antes, cada função (get_wireless_stats, get_connected_clients_count,
+get_health_stats, get_snmp_interface_traffic) fazia os próprios getCmd em série:
+vários RTTs por equipamento, e o ciclo crescia com o número de OIDs. Aqui o plano
+junta todas as OIDs escalares que essas funções vão ler num GET só (ou poucos,
+respeitando o tamanho máximo de PDU, disparados em paralelo). O resultado
+({oid: valor}) volta para as mesmas funções via `prefetched`, que demultiplexam
+com a lógica de sempre e só vão à rede para o que o plano não cobre (walks,
+equipamento que não respondeu ao plano). O GET vai na versão/comunidade
+memorizada (snmp_profiles); num agente v1, que derruba o PDU inteiro por uma OID
+inexistente (noSuchName), a OID culpada sai do pacote e fica lembrada.
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+from loguru import logger
+
+from backend.app.services.snmp import snmp_command, traffic_plan_oids, NO_SUCH_NAME
+from backend.app.services.snmp_profiles import snmp_profiles, REVALIDATE_INTERVAL, V1, V2C
+from backend.app.services.wireless_snmp import wireless_plan_oids, clients_plan_oids, health_plan_oids
+from backend.app.services.poll_schedule import METRIC_CLASSES
+from backend.app.services.perf_metrics import perf_metrics
+
+WIRELESS_BRANDS = ('ubiquiti', 'intelbras', 'mikrotik', 'mimosa')
+HEALTH_BRANDS = ('mikrotik', 'ubiquiti', 'intelbras')
+MAX_PDU_BYTES = 1200   # Estimativa da resposta; fica abaixo de 1 datagrama sem fragmentar
+PDU_OVERHEAD = 60      # Cabeçalho SNMP + comunidade
+VARBIND_OVERHEAD = 20  # Sequência + tipo/valor (Counter64 no pior caso)
+PLAN_TIMEOUT = 2.0
+V1_MAX_RETRIES = 6     # noSuchName por ciclo; as OIDs recusadas ficam lembradas
+
+_V1_MISSING: Dict[str, Tuple[float, Set[str]]] = {}
+
+
+def compile_poll_plan(eq: dict) -> List[str]:
+    """
+    OIDs escalares (sem repetição, em ordem) que o ciclo do snmp_monitor vai ler
+    deste equipamento; só as classes vencidas em eq["due"] (poll_schedule), ou todas.
+    """
+    brand = eq.get("brand")
+    due = METRIC_CLASSES if eq.get("due") is None else eq["due"]
+    oids: List[str] = []
+    if brand in WIRELESS_BRANDS:
+        if "signal" in due:
+            oids += wireless_plan_oids(brand, eq.get("id"), eq.get("snmp_interface_index"))
+        if "clients" in due and eq.get("equipment_type") == 'transmitter':
+            oids += clients_plan_oids(brand)
+        if "health" in due and brand in HEALTH_BRANDS:
+            oids += health_plan_oids(brand)
+    # Tráfego pela API MikroTik não usa SNMP (se a API falhar, o caminho antigo assume)
+    if "traffic" in due and not (eq.get("is_mikrotik") and eq.get("mikrotik_interface")):
+        interface_idx = eq.get("snmp_traffic_interface_index") or eq.get("snmp_interface_index") or 1
+        memo = snmp_profiles.current(eq.get("ip"), eq.get("snmp_port") or 161, eq.get("snmp_community"))
+        oids += traffic_plan_oids(brand, interface_idx, memo[1] if memo else None)
+    return list(dict.fromkeys(oids))
+
+
+def split_pdus(oids: List[str]) -> List[List[str]]:
+    """Divide as OIDs em PDUs que cabem em MAX_PDU_BYTES (estimativa por tamanho codificado)."""
+    pdus, current, size = [], [], PDU_OVERHEAD
+    for oid in oids:
+        cost = len(oid.split('.')) + VARBIND_OVERHEAD
+        if current and size + cost > MAX_PDU_BYTES:
+            pdus.append(current)
+            current, size = [], PDU_OVERHEAD
+        current.append(oid)
+        size += cost
+    if current:
+        pdus.append(current)
+    return pdus
+
+
+def _v1_missing(key: str) -> Set[str]:
+    """OIDs que o agente v1 recusou (noSuchName), reaprendidas a cada REVALIDATE_INTERVAL."""
+    entry = _V1_MISSING.get(key)
+    if entry is None or time.time() - entry[0] > REVALIDATE_INTERVAL:
+        entry = _V1_MISSING[key] = (time.time(), set())
+    return entry[1]
+
+
+async def _get_pdu(ip, community, port, mp_model, oids, out: Dict[str, Any], missing: Set[str]) -> bool:
+    pending = list(oids)
+    for _ in range(V1_MAX_RETRIES + 1):
+        if not pending:
+            return True
+        # v2c: OID inexistente volta noSuch* sem derrubar o PDU
+        errorIndication, errorStatus, errorIndex, varBinds = await snmp_command(
+            'get', ip, port, community, mp_model, pending, PLAN_TIMEOUT
+        )
+        if errorIndication:
+            return False
+        if not errorStatus:
+            for oid, varBind in zip(pending, varBinds):
+                out[oid] = varBind[1]
+            return True
+        status = str(errorStatus.prettyPrint())
+        if status == 'noSuchName' and mp_model == V1 and 0 < int(errorIndex) <= len(pending):
+            # v1 derruba o PDU inteiro por uma OID: tira a culpada (e lembra) e repete
+            oid = pending.pop(int(errorIndex) - 1)
+            missing.add(oid)
+            out[oid] = NO_SUCH_NAME
+            continue
+        if status == 'tooBig' and len(pending) > 1:
+            # Agente com buffer menor que a estimativa: divide ao meio
+            half = len(pending) // 2
+            first, second = await asyncio.gather(
+                _get_pdu(ip, community, port, mp_model, pending[:half], out, missing),
+                _get_pdu(ip, community, port, mp_model, pending[half:], out, missing),
+            )
+            return first or second
+        return False
+    return False
+
+
+async def fetch_poll_plan(ip, community, port, oids: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    Executa o plano na versão/comunidade memorizada (snmp_profiles; v2c se
+    desconhecida): {oid: valor bruto do pysnmp}. None se nenhum PDU voltou
+    (equipamento fora, versão errada): as funções seguem pelo caminho antigo.
+    """
+    if not oids:
+        return None
+    memo = snmp_profiles.current(ip, port, community)
+    comm, mp_model = memo if memo else (community, V2C)
+    out: Dict[str, Any] = {}
+    missing = _v1_missing(snmp_profiles.key(ip, port)) if mp_model == V1 else set()
+    for oid in missing.intersection(oids):
+        out[oid] = NO_SUCH_NAME
+    pdus = split_pdus([oid for oid in oids if oid not in missing])
+    try:
+        results = await asyncio.gather(*[_get_pdu(ip, comm, port, mp_model, pdu, out, missing) for pdu in pdus])
+    except Exception as e:
+        logger.debug(f"[SNMP] Poll plan error {ip}: {e}")
+        results = [False]
+    perf_metrics.inc("snmp_plan_pdus", len(pdus))
+    perf_metrics.inc("snmp_plan_varbinds", len(oids))
+    if pdus and not any(results):
+        perf_metrics.inc("snmp_plan_failures")
+        return None
+    if memo is None:
+        snmp_profiles.confirm(ip, port, community, comm, mp_model) # O plano em v2c respondeu
+    return out
@@ -0,0 +1,109 @@
+"""
+Frequência de coleta por classe de métrica (snmp_monitor).
+
+Antes, todo equipamento online tinha tráfego, sinal/CCQ, clientes e saúde
+(CPU/temperatura/voltagem) lidos a cada snmp_interval, mas voltagem e
+temperatura quase não mudam. Aqui cada classe tem o próprio período (tráfego =
+snmp_interval, sinal 60s, clientes 120s, saúde 300s), ajustável em Parameters e
+por tipo de equipamento (snmp_type_intervals, ex: {"transmitter": {"clients": 60}}).
+O monitor roda no menor período (tick); a cada tick, as classes vencidas de cada
+equipamento entram juntas no plano de coleta (um GET combinado), e equipamento
+sem nada vencido não vai à rede.
+
+Na primeira coleta as classes lentas ganham uma fase por equipamento, para a
+saúde de todos não cair no mesmo tick. Os últimos valores de cada equipamento
+ficam em `latest`, para o traffic log continuar levando sinal/CPU/voltagem
+nos ciclos em que essas classes não foram lidas.
+"""
+import json
+from typing import Dict, Iterable, Optional, Set
+from loguru import logger
+
+METRIC_CLASSES = ("traffic", "signal", "clients", "health")
+DEFAULT_PERIODS = {"traffic": 30, "signal": 60, "clients": 120, "health": 300}
+PARAM_KEYS = {"traffic": "snmp_interval", "signal": "snmp_signal_interval",
+              "clients": "snmp_clients_interval", "health": "snmp_health_interval"}
+TYPE_PARAM = "snmp_type_intervals"
+MIN_PERIOD = 5
+SNAPSHOT_FIELDS = ("signal_dbm", "ccq", "connected_clients", "cpu_usage", "memory_usage",
+                   "disk_usage", "temperature", "voltage")
+GOLDEN = 0.6180339887  # Fase por id: espalha bem ids sequenciais
+
+
+class PollSchedule:
+    def __init__(self):
+        self.periods: Dict[str, int] = dict(DEFAULT_PERIODS)
+        self.by_type: Dict[str, Dict[str, int]] = {}
+        self._next_due: Dict[int, Dict[str, float]] = {}
+        self.latest: Dict[int, dict] = {}
+
+    @staticmethod
+    def param_keys():
+        return list(PARAM_KEYS.values()) + [TYPE_PARAM]
+
+    def configure(self, params: Dict[str, Optional[str]]):
+        """Períodos a partir de Parameters (valores em texto). Chave ausente ou inválida = padrão."""
+        periods = {}
+        for cls, key in PARAM_KEYS.items():
+            try:
+                periods[cls] = max(MIN_PERIOD, int(params[key]))
+            except (KeyError, TypeError, ValueError):
+                periods[cls] = DEFAULT_PERIODS[cls]
+        by_type: Dict[str, Dict[str, int]] = {}
+        raw = params.get(TYPE_PARAM)
+        if raw:
+            try:
+                for eq_type, overrides in json.loads(raw).items():
+                    by_type[eq_type] = {cls: max(MIN_PERIOD, int(v)) for cls, v in overrides.items() if cls in PARAM_KEYS}
+            except (ValueError, TypeError, AttributeError) as e:
+                logger.warning(f"[SNMP] {TYPE_PARAM} inválido, ignorado: {e}")
+        if periods == self.periods and by_type == self.by_type:
+            return
+        shortened = any(self.period_for(t, c, periods, by_type) < self.period_for(t, c)
+                        for t in set(self.by_type) | set(by_type) | {None} for c in METRIC_CLASSES)
+        self.periods, self.by_type = periods, by_type
+        logger.info(f"[SNMP] Períodos de coleta: {self.periods}" + (f" | por tipo: {self.by_type}" if by_type else ""))
+        if shortened:
+            self._next_due.clear()  # Período menor vale já: tudo vence no próximo tick
+
+    def period_for(self, equipment_type: Optional[str], cls: str, periods=None, by_type=None) -> int:
+        periods = self.periods if periods is None else periods
+        by_type = self.by_type if by_type is None else by_type
+        return by_type.get(equipment_type, {}).get(cls, periods[cls])
+
+    @property
+    def tick(self) -> int:
+        """Intervalo do loop do monitor: o menor período configurado."""
+        return min([*self.periods.values(), *(v for o in self.by_type.values() for v in o.values())])
+
+    def due(self, eq_id: int, now: float) -> Set[str]:
+        slots = self._next_due.get(eq_id)
+        if slots is None:
+            return set(METRIC_CLASSES)  # Primeira vez: tudo
+        slack = self.tick / 2  # O tick atrasa um pouco a cada ciclo; sem folga, a classe pularia um tick inteiro
+        return {cls for cls in METRIC_CLASSES if now + slack >= slots.get(cls, 0)}
+
+    def mark(self, eq_id: int, equipment_type: Optional[str], classes: Iterable[str], now: float):
+        """Classes coletadas agora (com ou sem resposta): próxima vez daqui a um período."""
+        slots = self._next_due.setdefault(eq_id, {})
+        for cls in classes:
+            period = self.period_for(equipment_type, cls)
+            if cls not in slots and period > self.tick:
+                period *= 0.5 + ((eq_id * GOLDEN) % 1) / 2
+            slots[cls] = now + period
+
+    def remember(self, eq_id: int, updates: dict) -> dict:
+        """Junta os valores lidos agora aos últimos conhecidos do equipamento."""
+        snapshot = self.latest.setdefault(eq_id, {})
+        for field in SNAPSHOT_FIELDS:
+            if updates.get(field) is not None:
+                snapshot[field] = updates[field]
+        return snapshot
+
+    def forget(self, active_ids: Set[int]):
+        for store in (self._next_due, self.latest):
+            for eq_id in [k for k in store if k not in active_ids]:
+                del store[eq_id]
+
+
+poll_schedule = PollSchedule()
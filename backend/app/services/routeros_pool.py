@@ -0,0 +1,368 @@
+"""
+Pool de sessões da API do RouterOS (porta 8728) para o collector.
+
+Antes, cada leitura de tráfego via API abria uma conexão librouteros, fazia
+login, rodava um comando e fechava, tudo dentro de asyncio.to_thread: TCP +
+login a cada ciclo e o pool de threads padrão limitando quantos Mikrotiks
+cabiam em paralelo. Aqui:
+- protocolo da API em asyncio puro (palavras com prefixo de tamanho), sem threads;
+- uma sessão autenticada por (host, porta, usuário), reaproveitada entre ciclos:
+  no regime normal, cada leitura custa um round trip;
+- comandos com .tag: vários comandos simultâneos na mesma sessão, a resposta é
+  entregue por tag (é o que permite monitor-traffic contínuo no mesmo socket);
+- limite de comandos simultâneos por host, sessão parada há muito tempo passa
+  por um /system/identity/print antes de ser usada, sessões ociosas são fechadas;
+- conexão que caiu entre ciclos é refeita uma vez, de forma transparente;
+- falha de login deixa o host em espera (AUTH_BACKOFF) para não travar a conta
+  do equipamento com tentativas a cada ciclo.
+"""
+import asyncio
+import hashlib
+import itertools
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from loguru import logger
+
+from backend.app.services.perf_metrics import perf_metrics
+
+CONNECT_TIMEOUT = 5.0
+CALL_TIMEOUT = 5.0
+MAX_INFLIGHT_PER_HOST = 4   # Comandos simultâneos por equipamento (todos na mesma sessão)
+HEALTH_CHECK_AFTER = 120    # Sessão parada há mais que isso é testada antes de usar
+IDLE_TIMEOUT = 600          # Sessão sem uso há mais que isso é fechada
+SWEEP_INTERVAL = 60
+AUTH_BACKOFF = 300          # Login recusado: não tenta de novo antes disso
+
+
+class RouterOsError(Exception):
+    """!trap do RouterOS (comando recusado, login inválido...). A sessão continua válida."""
+
+
+class RouterOsAuthError(RouterOsError):
+    pass
+
+
+# --- Protocolo -------------------------------------------------------------
+
+def encode_length(n: int) -> bytes:
+    if n < 0x80:
+        return bytes((n,))
+    if n < 0x4000:
+        return (n | 0x8000).to_bytes(2, 'big')
+    if n < 0x200000:
+        return (n | 0xC00000).to_bytes(3, 'big')
+    if n < 0x10000000:
+        return (n | 0xE0000000).to_bytes(4, 'big')
+    return b'\xf0' + n.to_bytes(4, 'big')
+
+
+def encode_sentence(words) -> bytes:
+    out = bytearray()
+    for word in words:
+        data = word.encode('utf-8')
+        out += encode_length(len(data))
+        out += data
+    out += b'\x00'
+    return bytes(out)
+
+
+async def read_sentence(reader: asyncio.StreamReader) -> List[str]:
+    words = []
+    while True:
+        b = (await reader.readexactly(1))[0]
+        if b < 0x80:
+            n = b
+        elif b < 0xC0:
+            n = int.from_bytes(bytes((b & 0x3F,)) + await reader.readexactly(1), 'big')
+        elif b < 0xE0:
+            n = int.from_bytes(bytes((b & 0x1F,)) + await reader.readexactly(2), 'big')
+        elif b < 0xF0:
+            n = int.from_bytes(bytes((b & 0x0F,)) + await reader.readexactly(3), 'big')
+        else:
+            n = int.from_bytes(await reader.readexactly(4), 'big')
+        if n == 0:
+            return words
+        words.append((await reader.readexactly(n)).decode('utf-8', 'replace'))
+
+
+def parse_reply(words: List[str]) -> Tuple[str, dict, Optional[str]]:
+    """['!re', '=rx=1', '.tag=3'] -> ('!re', {'rx': '1'}, '3')"""
+    attrs, tag = {}, None
+    for word in words[1:]:
+        if word.startswith('='):
+            key, _, value = word[1:].partition('=')
+            attrs[key] = value
+        elif word.startswith('.tag='):
+            tag = word[5:]
+    return (words[0] if words else ''), attrs, tag
+
+
+def compose_words(cmd: str, args: dict) -> List[str]:
+    words = [cmd]
+    for key, value in args.items():
+        if value is True:
+            value = 'yes'
+        elif value is False:
+            value = 'no'
+        words.append(f"={key.replace('_', '-')}={value}")
+    return words
+
+
+# --- Sessão ----------------------------------------------------------------
+
+class _Call:
+    __slots__ = ("rows", "future", "trap", "on_row")
+
+    def __init__(self, future: asyncio.Future, on_row: Optional[Callable[[dict], None]] = None):
+        self.rows: List[dict] = []
+        self.future = future
+        self.trap: Optional[str] = None
+        self.on_row = on_row
+
+
+class RouterOsSession:
+    """Uma conexão autenticada; comandos com tag, respostas roteadas por um leitor único."""
+
+    def __init__(self, key: tuple, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.key = key
+        self.reader = reader
+        self.writer = writer
+        self.last_used = time.monotonic()
+        self._tags = itertools.count(1)
+        self._pending: Dict[str, _Call] = {}
+        self._closed = False
+        self._reader_task = asyncio.create_task(self._read_loop())
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def busy(self) -> int:
+        return len(self._pending)
+
+    async def _read_loop(self):
+        error: Exception = ConnectionError("sessão RouterOS fechada")
+        try:
+            while True:
+                reply, attrs, tag = parse_reply(await read_sentence(self.reader))
+                if reply == '!fatal':
+                    error = ConnectionError(f"!fatal: {next(iter(attrs.values()), '')}")
+                    break
+                call = self._pending.get(tag)
+                if call is None:
+                    continue  # Resposta de comando já abandonado (timeout/cancelado)
+                if reply == '!re':
+                    if call.on_row is not None:
+                        call.on_row(attrs)
+                    else:
+                        call.rows.append(attrs)
+                elif reply == '!trap':
+                    call.trap = attrs.get('message', 'trap')
+                elif reply == '!done':
+                    del self._pending[tag]
+                    if attrs:
+                        call.rows.append(attrs)  # Ex: '=ret=' do login antigo
+                    if not call.future.done():
+                        if call.trap is not None:
+                            call.future.set_exception(RouterOsError(call.trap))
+                        else:
+                            call.future.set_result(call.rows)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+            error = ConnectionError(f"conexão RouterOS perdida: {e!r}")
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._fail_all(error)
+
+    def _fail_all(self, error: Exception):
+        self._closed = True
+        pending, self._pending = self._pending, {}
+        for call in pending.values():
+            if not call.future.done():
+                call.future.set_exception(error)
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+    async def call(self, cmd: str, timeout: float = CALL_TIMEOUT, **args) -> List[dict]:
+        """Roda `cmd` e devolve as linhas (!re). !trap vira RouterOsError; timeout fecha a sessão."""
+        if self._closed:
+            raise ConnectionError("sessão RouterOS fechada")
+        tag = str(next(self._tags))
+        call = _Call(asyncio.get_running_loop().create_future())
+        self._pending[tag] = call
+        self.last_used = time.monotonic()
+        self.writer.write(encode_sentence(compose_words(cmd, args) + [f".tag={tag}"]))
+        try:
+            return await asyncio.wait_for(call.future, timeout)
+        except asyncio.TimeoutError:
+            # Sem resposta: estado do socket desconhecido, não reaproveita
+            self.close()
+            raise
+        finally:
+            self._pending.pop(tag, None)
+            self.last_used = time.monotonic()
+
+    def listen(self, cmd: str, on_row: Callable[[dict], None], **args) -> Tuple[str, asyncio.Future]:
+        """
+        Comando contínuo (monitor-traffic sem once, print com interval=): cada !re vai
+        para `on_row` assim que chega. Devolve (tag, future); o future termina quando o
+        comando acaba (/cancel, !trap ou queda da sessão).
+        """
+        if self._closed:
+            raise ConnectionError("sessão RouterOS fechada")
+        tag = str(next(self._tags))
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())  # Sem "exception never retrieved"
+        self._pending[tag] = _Call(future, on_row)
+        self.last_used = time.monotonic()
+        self.writer.write(encode_sentence(compose_words(cmd, args) + [f".tag={tag}"]))
+        return tag, future
+
+    def cancel(self, tag: str):
+        """Encerra um comando contínuo (/cancel); a resposta não é esperada."""
+        call = self._pending.pop(tag, None)
+        if call is not None and not call.future.done():
+            call.future.cancel()
+        if not self._closed:
+            self.writer.write(encode_sentence(['/cancel', f'=tag={tag}']))
+
+    async def login(self, user: str, password: str):
+        try:
+            rows = await self.call('/login', name=user, password=password)
+            if rows and 'ret' in rows[-1]:
+                # RouterOS anterior ao 6.43: desafio MD5
+                challenge = bytes.fromhex(rows[-1]['ret'])
+                digest = hashlib.md5(b'\x00' + password.encode() + challenge).hexdigest()
+                await self.call('/login', name=user, response='00' + digest)
+        except RouterOsError as e:
+            raise RouterOsAuthError(str(e)) from None
+
+    def close(self):
+        if not self._closed:
+            self._reader_task.cancel()
+            self._fail_all(ConnectionError("sessão RouterOS fechada"))
+
+
+# --- Pool ------------------------------------------------------------------
+
+class RouterOsPool:
+    def __init__(self):
+        self._sessions: Dict[tuple, RouterOsSession] = {}
+        self._connecting: Dict[tuple, asyncio.Lock] = {}
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+        self._auth_failed: Dict[tuple, Tuple[float, str]] = {}
+        self._last_sweep = time.monotonic()
+        self._metrics_registered = False
+
+    def __len__(self):
+        return len(self._sessions)
+
+    async def _connect(self, key: tuple, password: str) -> RouterOsSession:
+        host, port, user = key
+        failed_at, failed_password = self._auth_failed.get(key, (0.0, None))
+        # Só a mesma senha recusada espera; senha corrigida no cadastro vale na hora
+        if failed_password == password and time.monotonic() - failed_at < AUTH_BACKOFF:
+            raise RouterOsAuthError(f"login recusado em {host} (aguardando {AUTH_BACKOFF}s)")
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), CONNECT_TIMEOUT)
+        session = RouterOsSession(key, reader, writer)
+        try:
+            await session.login(user, password)
+        except RouterOsAuthError as e:
+            self._auth_failed[key] = (time.monotonic(), password)
+            logger.warning(f"[ROUTEROS] Login recusado em {host}:{port} ({user}): {e}")
+            session.close()
+            raise
+        except BaseException:
+            session.close()
+            raise
+        self._auth_failed.pop(key, None)
+        perf_metrics.inc("routeros_connects")
+        return session
+
+    async def _session(self, key: tuple, password: str) -> Tuple[RouterOsSession, bool]:
+        """(sessão, reaproveitada?). Um connect por chave por vez, mesmo com várias chamadas esperando."""
+        session = self._sessions.get(key)
+        if session and not session.closed:
+            return session, True
+        lock = self._connecting.setdefault(key, asyncio.Lock())
+        async with lock:
+            session = self._sessions.get(key)
+            if session and not session.closed:
+                return session, True
+            session = await self._connect(key, password)
+            self._sessions[key] = session
+            return session, False
+
+    async def _healthy(self, session: RouterOsSession) -> bool:
+        if time.monotonic() - session.last_used < HEALTH_CHECK_AFTER or session.busy:
+            return True
+        try:
+            await session.call('/system/identity/print', timeout=2.0)
+            return True
+        except (asyncio.TimeoutError, ConnectionError, OSError, RouterOsError):
+            session.close()
+            perf_metrics.inc("routeros_health_failures")
+            return False
+
+    def _sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        for key, session in list(self._sessions.items()):
+            if session.closed or (not session.busy and now - session.last_used > IDLE_TIMEOUT):
+                session.close()
+                del self._sessions[key]
+                self._connecting.pop(key, None)
+        for key in [k for k, (t, _) in self._auth_failed.items() if now - t > AUTH_BACKOFF]:
+            del self._auth_failed[key]
+
+    async def _acquire(self, host: str, user: str, password: str, port: int) -> Tuple[RouterOsSession, bool]:
+        self._register_metrics()
+        self._sweep()
+        key = (host, port, user or '')
+        session, reused = await self._session(key, password or '')
+        if reused and not await self._healthy(session):
+            session, reused = await self._session(key, password or '')
+        return session, reused
+
+    async def session(self, host: str, user: str, password: str, port: int = 8728) -> RouterOsSession:
+        """Sessão autenticada do pool (para quem precisa de comandos longos, ex: monitor-traffic contínuo)."""
+        return (await self._acquire(host, user, password, port))[0]
+
+    async def call(self, host: str, user: str, password: str, cmd: str, port: int = 8728,
+                   timeout: float = CALL_TIMEOUT, **args) -> List[dict]:
+        """Roda um comando no equipamento pela sessão do pool (abre/autentica só se preciso)."""
+        limit = self._limits.get(host)
+        if limit is None:
+            limit = self._limits[host] = asyncio.Semaphore(MAX_INFLIGHT_PER_HOST)
+        async with limit:
+            session, reused = await self._acquire(host, user, password, port)
+            perf_metrics.inc("routeros_calls")
+            if reused:
+                perf_metrics.inc("routeros_reused")
+            try:
+                return await session.call(cmd, timeout=timeout, **args)
+            except ConnectionError:
+                if not reused:
+                    raise
+                # Conexão caiu entre ciclos (reboot, NAT expirou): uma nova tentativa com sessão nova
+                session, _ = await self._session(session.key, password or '')
+                return await session.call(cmd, timeout=timeout, **args)
+
+    def _register_metrics(self):
+        if not self._metrics_registered:
+            self._metrics_registered = True
+            perf_metrics.gauge_fn("routeros_sessions", lambda: len(self._sessions))
+
+    def close_all(self):
+        for session in self._sessions.values():
+            session.close()
+        self._sessions.clear()
+        self._connecting.clear()
+
+
+routeros_pool = RouterOsPool()
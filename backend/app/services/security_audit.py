@@ -7,9 +7,10 @@ import asyncio
 from datetime import datetime
 from sqlalchemy import select
 from backend.app.database import AsyncSessionLocal
-from backend.app.models import Equipment, Parameters, Insight
+from backend.app.models import Parameters, Insight
 from backend.app.services.snmp import _snmp_get
 from backend.app.services.notifier import send_notification
+from backend.app.services.device_registry import device_registry
 from loguru import logger
 
 # Default credentials to check
@@ -90,14 +91,15 @@ async def run_security_audit():
     
     vulnerabilities = []
     
+    # Get all online priority equipment (registro do collector, sem consulta própria)
+    await device_registry.ready(follow=False)
+    devices = [
+        (d["id"], d["ip"], d["name"], d["ssh_port"], d["brand"])
+        for d in device_registry.all()
+        if d["is_online"] and d["is_priority"]  # Only priority equipment
+    ]
+
     async with AsyncSessionLocal() as session:
-        # Get all online priority equipment
-        result = await session.execute(
-            select(Equipment.id, Equipment.ip, Equipment.name, Equipment.ssh_port, Equipment.brand)
-            .where(Equipment.is_online == True, Equipment.is_priority == True)  # Only priority equipment
-        )
-        devices = result.all()
-        
         for eq_id, ip, name, ssh_port, brand in devices:
             device_issues = []
             
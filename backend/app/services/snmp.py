@@ -1,7 +1,19 @@
 import asyncio
 import time
-from pysnmp.hlapi.asyncio import CommunityData, UdpTransportTarget, ContextData, ObjectType, ObjectIdentity, getCmd, nextCmd, SnmpEngine
+from typing import Any, Dict, List
+from pysnmp.hlapi.asyncio import CommunityData, UdpTransportTarget, ContextData, ObjectType, ObjectIdentity, getCmd, nextCmd, bulkCmd, SnmpEngine
+from pysnmp.proto.rfc1905 import EndOfMibView
 from loguru import logger
+from backend.app.config import settings
+from backend.app.services.snmp_profiles import snmp_profiles, VERSION_NAMES, V1
+from backend.app.services.snmp_client import snmp_client, PDU_TYPES, EndOfMibView as NativeEndOfMibView
+from backend.app.services.perf_metrics import perf_metrics
+
+NO_SUCH_NAME = object() # Valor no `prefetched` para OID que o agente v1 recusou (noSuchName)
+BULK_REPETITIONS = 25   # Linhas por GETBULK (max-repetitions)
+BULK_MAX_ROWS = 1000    # Trava de segurança por walk (agente com OID que não avança)
+IF_DESCR = '1.3.6.1.2.1.2.2.1.2'
+NATIVE_SNMP = settings.snmp_backend == "native"
 
 # Shared engine to avoid overhead
 _snmp_engine = None
@@ -12,75 +24,152 @@ def get_shared_engine():
         _snmp_engine = SnmpEngine()
     return _snmp_engine
 
-async def _snmp_get(ip, community, oids, port=161, timeout=1.0):
-    """Internal helper to try SNMP get with v2c then v1"""
-    # Try SNMPv2c first
-    try:
-        engine = get_shared_engine()
-        errorIndication, errorStatus, errorIndex, varBinds = await getCmd(
-            engine,
-            CommunityData(community, mpModel=1), # v2c
-            UdpTransportTarget((ip, port), timeout=timeout, retries=0),
-            ContextData(),
-            *[ObjectType(ObjectIdentity(oid)) for oid in oids]
-        )
-        if not errorIndication and not errorStatus:
-            return varBinds
-    except Exception as e:
-        logger.debug(f"[SNMP] v2c Get Error {ip}: {e}")
+def _flat_varbinds(table):
+    """Tabela do pysnmp (linhas de varBinds, ou já achatada) -> varBinds em ordem de linha."""
+    flat = []
+    for row in table or []:
+        if isinstance(row, ObjectType) or (isinstance(row, tuple) and len(row) == 2 and not isinstance(row[0], (list, tuple, ObjectType))):
+            flat.append(row)
+        else:
+            flat.extend(row)
+    return flat
 
-    # Try SNMPv1 fallback
-    try:
-        engine = get_shared_engine()
-        errorIndication, errorStatus, errorIndex, varBinds = await getCmd(
-            engine,
-            CommunityData(community, mpModel=0), # v1
-            UdpTransportTarget((ip, port), timeout=timeout, retries=0),
-            ContextData(),
-            *[ObjectType(ObjectIdentity(oid)) for oid in oids]
-        )
-        if not errorIndication and not errorStatus:
+async def snmp_command(kind, ip, port, community, mp_model, oids, timeout=1.0, retries=0, max_repetitions=0):
+    """
+    Um PDU ('get', 'next' ou 'bulk') -> (errorIndication, errorStatus, errorIndex, varBinds),
+    com varBinds achatado em (nome, valor). Cliente nativo (snmp_client, um socket
+    só) ou o hlapi do pysnmp, conforme settings.snmp_backend.
+    """
+    if NATIVE_SNMP:
+        return await snmp_client.request(ip, port, community, mp_model, PDU_TYPES[kind], oids,
+                                         timeout=timeout, retries=retries, max_repetitions=max_repetitions)
+    engine = get_shared_engine()
+    auth = CommunityData(community, mpModel=mp_model)
+    target = UdpTransportTarget((ip, port), timeout=timeout, retries=retries)
+    varBinds = [ObjectType(ObjectIdentity(oid)) for oid in oids]
+    if kind == 'get':
+        return await getCmd(engine, auth, target, ContextData(), *varBinds)
+    if kind == 'next':
+        errorIndication, errorStatus, errorIndex, table = await nextCmd(engine, auth, target, ContextData(), *varBinds)
+    else:
+        errorIndication, errorStatus, errorIndex, table = await bulkCmd(engine, auth, target, ContextData(), 0, max_repetitions, *varBinds)
+    return errorIndication, errorStatus, errorIndex, _flat_varbinds(table)
+
+async def _snmp_request(ip, community, port, send, label):
+    """
+    Tenta (comunidade, versão) na ordem do perfil memorizado (snmp_profiles).
+    `send(community, mpModel)` -> (respondeu, varBinds). Uma resposta, mesmo com
+    erro (noSuchName do v1), encerra: a versão funciona, a OID é que não existe.
+    """
+    attempts, discovery = snmp_profiles.attempts(ip, port, community)
+    for i, (comm, mp_model) in enumerate(attempts):
+        try:
+            answered, varBinds = await send(comm, mp_model)
+        except Exception as e:
+            logger.debug(f"[SNMP] {VERSION_NAMES[mp_model]} {label} Error {ip}: {e}")
+            continue
+        if answered:
+            if discovery or i > 0:
+                snmp_profiles.confirm(ip, port, community, comm, mp_model)
             return varBinds
-    except Exception as e:
-        logger.debug(f"[SNMP] v1 Get Error {ip}: {e}")
-    
+    if discovery:
+        snmp_profiles.postpone(ip, port, community)
     return None
 
+async def _snmp_get(ip, community, oids, port=161, timeout=1.0, prefetched=None):
+    """Internal helper: SNMP get na versão/comunidade memorizada do equipamento (v2c e depois v1 se desconhecida)"""
+    # Plano de coleta (poll_plan): valores já trazidos no GET combinado do equipamento
+    if prefetched is not None and all(oid in prefetched for oid in oids):
+        if any(prefetched[oid] is NO_SUCH_NAME for oid in oids):
+            return None # Equipamento v1: o GET inteiro falharia com noSuchName
+        return [(oid, prefetched[oid]) for oid in oids]
+
+    async def send(comm, mp_model):
+        errorIndication, errorStatus, errorIndex, varBinds = await snmp_command('get', ip, port, comm, mp_model, oids, timeout)
+        if errorIndication:
+            return False, None
+        return True, (None if errorStatus else varBinds)
+
+    return await _snmp_request(ip, community, port, send, "Get")
+
 async def _snmp_next(ip, community, root_oid, port=161, timeout=1.0):
-    """Internal helper to try SNMP walk/next with v2c then v1"""
-    # Try SNMPv2c
-    try:
-        engine = get_shared_engine()
-        errorIndication, errorStatus, errorIndex, varBinds = await nextCmd(
-            engine,
-            CommunityData(community, mpModel=1),
-            UdpTransportTarget((ip, port), timeout=timeout, retries=0),
-            ContextData(),
-            ObjectType(ObjectIdentity(root_oid)),
-            lexicographicMode=False
-        )
-        if not errorIndication and not errorStatus and varBinds:
-            return varBinds
-    except Exception as e:
-        logger.debug(f"[SNMP] v2c Next Error {ip}: {e}")
+    """Internal helper: SNMP walk/next na versão/comunidade memorizada do equipamento"""
+    async def send(comm, mp_model):
+        errorIndication, errorStatus, errorIndex, varBinds = await snmp_command('next', ip, port, comm, mp_model, [root_oid], timeout)
+        if errorIndication:
+            return False, None
+        return True, ([varBinds] if not errorStatus and varBinds else None) # Uma linha, no formato de tabela do nextCmd
 
-    # Try SNMPv1
-    try:
-        engine = get_shared_engine()
-        errorIndication, errorStatus, errorIndex, varBinds = await nextCmd(
-            engine,
-            CommunityData(community, mpModel=0),
-            UdpTransportTarget((ip, port), timeout=timeout, retries=0),
-            ContextData(),
-            ObjectType(ObjectIdentity(root_oid)),
-            lexicographicMode=False
-        )
-        if not errorIndication and not errorStatus and varBinds:
-            return varBinds
-    except Exception as e:
-        logger.debug(f"[SNMP] v1 Next Error {ip}: {e}")
+    return await _snmp_request(ip, community, port, send, "Next")
 
-    return None
+async def bulk_walk(ip, community, columns: List[str], port=161, timeout=2.0,
+                    max_repetitions=BULK_REPETITIONS, max_rows=BULK_MAX_ROWS) -> Dict[str, List[Any]]:
+    """
+    Walk de uma ou mais colunas de tabela, juntas: {índice: [valor por coluna]}.
+    O índice é o sufixo da OID depois da coluna ('3' no ifDescr, 't.p.r' no LLDP),
+    na ordem do walk; coluna sem a linha fica None.
+
+    v2c: GETBULK com todas as colunas ativas, `max_repetitions` linhas por ida e
+    volta (uma tabela de 200 interfaces são ~8 pacotes, não 200). v1: GETNEXT com
+    todas as colunas no mesmo PDU (uma linha por ida e volta). Versão/comunidade
+    pelo perfil memorizado (snmp_profiles), como _snmp_get.
+    """
+    roots = [c.strip('.') for c in columns]
+    rows: Dict[str, List[Any]] = {}
+    cursor = {root: root for root in roots}  # Última OID vista por coluna ainda ativa
+    repetitions = max(1, int(max_repetitions))
+    requests = 0
+
+    while cursor and len(rows) < max_rows:
+        active = list(cursor)
+        oids = [cursor[root] for root in active]
+
+        async def send(comm, mp_model):
+            errorIndication, errorStatus, errorIndex, table = await snmp_command(
+                'next' if mp_model == V1 else 'bulk', ip, port, comm, mp_model, oids, timeout,
+                retries=1, max_repetitions=repetitions
+            )
+            if errorIndication:
+                return False, None
+            return True, (mp_model, errorStatus, errorIndex, table)
+
+        reply = await _snmp_request(ip, community, port, send, "Bulk")
+        requests += 1
+        if reply is None:
+            break
+        mp_model, errorStatus, errorIndex, table = reply
+        if errorStatus:
+            status = str(errorStatus.prettyPrint())
+            if status == 'noSuchName' and mp_model == V1 and 0 < int(errorIndex) <= len(active):
+                # v1: fim da MIB derruba o PDU pela coluna que acabou; as outras seguem
+                del cursor[active[int(errorIndex) - 1]]
+                continue
+            if status == 'tooBig' and repetitions > 1:
+                repetitions //= 2  # Agente com buffer pequeno: menos linhas por pacote
+                continue
+            break
+
+        flat = table
+        if not flat:
+            break
+        finished = set()
+        for i, varBind in enumerate(flat):
+            root = active[i % len(active)]  # Resposta vem linha a linha, na ordem das colunas pedidas
+            if root in finished:
+                continue
+            name, val = varBind[0], varBind[1]
+            oid = str(name.getOid() if hasattr(name, 'getOid') else name)
+            if isinstance(val, (EndOfMibView, NativeEndOfMibView)) or not oid.startswith(root + '.') or oid == cursor[root]:
+                finished.add(root)
+                continue
+            rows.setdefault(oid[len(root) + 1:], [None] * len(roots))[roots.index(root)] = val
+            cursor[root] = oid
+        for root in finished:
+            del cursor[root]
+
+    perf_metrics.inc("snmp_bulk_requests", requests)
+    perf_metrics.inc("snmp_bulk_rows", len(rows))
+    return rows
 
 async def detect_brand(ip, community, port=161):
     """
@@ -150,13 +239,9 @@ async def get_snmp_uptime(ip: str, community: str = "public", port: int = 161) -
     Returns uptime in ticks (1/100s).
     """
     async def _snmp_get():
-        engine = get_shared_engine()
-        errorIndication, errorStatus, errorIndex, varBinds = await getCmd(
-            engine,
-            CommunityData(community, mpModel=0),  # v1
-            UdpTransportTarget((ip, port), timeout=4, retries=2),
-            ContextData(),
-            ObjectType(ObjectIdentity('1.3.6.1.2.1.1.3.0')) # sysUpTime
+        errorIndication, errorStatus, errorIndex, varBinds = await snmp_command(
+            'get', ip, port, community, 0,  # v1
+            ['1.3.6.1.2.1.1.3.0'], timeout=4, retries=2 # sysUpTime
         )
         
         if errorIndication or errorStatus:
@@ -174,99 +259,74 @@ async def get_snmp_uptime(ip: str, community: str = "public", port: int = 161) -
     except Exception:
         return None
 
-async def get_snmp_interface_traffic(ip: str, community: str = "public", port: int = 161, interface_index: int = 1, brand: str = None):
+def traffic_oid_pairs(brand: str, interface_index: int, mp_model: int = None):
     """
-    Get In/Out Octets for a specific interface.
-    Returns (in_bytes, out_bytes) or None.
-    
-    1. Tries 64-bit counters (ifHCInOctets/ifHCOutOctets) via SNMP v2c (Preferred for Gibabit+).
-    2. Fallback to 32-bit counters (ifInOctets/ifOutOctets) via SNMP v1.
-    3. Special support for Ubiquiti LTU (AirFiber 5XHD) private OIDs.
+    (oid_in, oid_out, mpModel, timeout, retries) na ordem em que get_snmp_interface_traffic tenta.
+    Com a versão memorizada do equipamento (`mp_model`): agente v1 pula os pares só-v2c
+    (Counter64), e o par de 32 bits vai na versão que responde.
     """
-    from pysnmp.hlapi.asyncio import CommunityData, UdpTransportTarget, ContextData, ObjectType, ObjectIdentity, getCmd
-    
+    pairs = []
     # --- GENERIC UBIQUITI PRIVATE MIB STRATEGY ---
-    if brand == 'ubiquiti':
-        # List of potential counter pairs (In, Out) for UBNT devices
-        ubnt_strategies = []
-        
+    if brand == 'ubiquiti' and mp_model != V1:
         # 1. LTU / AirFiber 5XHD (Specifically for our virtual index)
         if interface_index == 1000:
-            ubnt_strategies.append(('1.3.6.1.4.1.41112.1.10.1.5.3.0', '1.3.6.1.4.1.41112.1.10.1.5.1.0')) # LTU Wireless
-        
+            pairs.append(('1.3.6.1.4.1.41112.1.10.1.5.3.0', '1.3.6.1.4.1.41112.1.10.1.5.1.0', 1, 3, 1)) # LTU Wireless
         # 2. AirFiber Classic (AF24, AF5 - from User MIB)
-        ubnt_strategies.append((f'1.3.6.1.4.1.41112.1.3.3.1.66.{interface_index}', f'1.3.6.1.4.1.41112.1.3.3.1.64.{interface_index}'))
-        
+        pairs.append((f'1.3.6.1.4.1.41112.1.3.3.1.66.{interface_index}', f'1.3.6.1.4.1.41112.1.3.3.1.64.{interface_index}', 1, 3, 1))
         # 3. AirMAX AC Station Table (Counter64 from MIB)
         # ubntStaRxBytes: .1.3.6.1.4.1.41112.1.4.7.1.14, ubntStaTxBytes: .1.3.6.1.4.1.41112.1.4.7.1.13
-        ubnt_strategies.append((f'1.3.6.1.4.1.41112.1.4.7.1.14.{interface_index}', f'1.3.6.1.4.1.41112.1.4.7.1.13.{interface_index}'))
-        
-        engine = get_shared_engine()
-        for oid_in, oid_out in ubnt_strategies:
-            try:
-                errorIndication, errorStatus, errorIndex, varBinds = await getCmd(
-                    engine,
-                    CommunityData(community, mpModel=1), # v2c preferred
-                    UdpTransportTarget((ip, port), timeout=3, retries=1),
-                    ContextData(),
-                    ObjectType(ObjectIdentity(oid_in)),
-                    ObjectType(ObjectIdentity(oid_out))
-                )
-                if not errorIndication and not errorStatus and varBinds and len(varBinds) >= 2:
-                    # Verify they are actual numbers
-                    res_in, res_out = varBinds[0][1], varBinds[1][1]
-                    if str(res_in) != "" and str(res_out) != "":
-                        return (int(res_in), int(res_out))
-            except Exception as e:
-                logger.debug(f"[SNMP] Ubiquiti Strategy Error: {e}")
-                continue
+        pairs.append((f'1.3.6.1.4.1.41112.1.4.7.1.14.{interface_index}', f'1.3.6.1.4.1.41112.1.4.7.1.13.{interface_index}', 1, 3, 1))
 
     # Standard OIDs (RFC1213 / IF-MIB)
-    # 32-bit
-    oid_in_32 = f'1.3.6.1.2.1.2.2.1.10.{interface_index}'
-    oid_out_32 = f'1.3.6.1.2.1.2.2.1.16.{interface_index}'
-    # 64-bit (High Capacity)
-    oid_in_64 = f'1.3.6.1.2.1.31.1.1.1.6.{interface_index}'
-    oid_out_64 = f'1.3.6.1.2.1.31.1.1.1.10.{interface_index}'
+    # 1. 64-bit (High Capacity, v2c) - IF-MIB standard
+    if mp_model != V1:
+        pairs.append((f'1.3.6.1.2.1.31.1.1.1.6.{interface_index}', f'1.3.6.1.2.1.31.1.1.1.10.{interface_index}', 1, 4, 2))
+    # 2. Fallback para 32-bit (v1)
+    pairs.append((f'1.3.6.1.2.1.2.2.1.10.{interface_index}', f'1.3.6.1.2.1.2.2.1.16.{interface_index}', V1 if mp_model is None else mp_model, 2, 1))
+    return pairs
 
-    engine = get_shared_engine()
-    
-    # 1. Tentar 64-bit (v2c) - IF-MIB standard
-    try:
-        errorIndication, errorStatus, errorIndex, varBinds = await getCmd(
-            engine,
-            CommunityData(community, mpModel=1), # v2c
-            UdpTransportTarget((ip, port), timeout=4, retries=2),
-            ContextData(),
-            ObjectType(ObjectIdentity(oid_in_64)),
-            ObjectType(ObjectIdentity(oid_out_64))
-        )
-        
-        if not errorIndication and not errorStatus and varBinds and len(varBinds) >= 2:
-             return (int(varBinds[0][1]), int(varBinds[1][1]))
-    except Exception as e:
-        logger.debug(f"[SNMP] 64-bit Get Error: {e}")
+def traffic_plan_oids(brand: str, interface_index: int, mp_model: int = None):
+    return [oid for pair in traffic_oid_pairs(brand, interface_index, mp_model) for oid in pair[:2]]
 
-    # 2. Fallback para 32-bit (v1)
-    try:
-        errorIndication, errorStatus, errorIndex, varBinds = await getCmd(
-            engine,
-            CommunityData(community, mpModel=0), # v1
-            UdpTransportTarget((ip, port), timeout=2, retries=1),
-            ContextData(),
-            ObjectType(ObjectIdentity(oid_in_32)),
-            ObjectType(ObjectIdentity(oid_out_32))
-        )
-        
-        if not errorIndication and not errorStatus and varBinds and len(varBinds) >= 2:
-             return (int(varBinds[0][1]), int(varBinds[1][1]))
-    except Exception as e:
-        logger.debug(f"[SNMP] 32-bit Get Error: {e}")
+async def get_snmp_interface_traffic(ip: str, community: str = "public", port: int = 161, interface_index: int = 1, brand: str = None, prefetched=None):
+    """
+    Get In/Out Octets for a specific interface.
+    Returns (in_bytes, out_bytes) or None.
+    
+    1. Special support for Ubiquiti LTU (AirFiber 5XHD) private OIDs.
+    2. Tries 64-bit counters (ifHCInOctets/ifHCOutOctets) via SNMP v2c (Preferred for Gibabit+).
+    3. Fallback to 32-bit counters (ifInOctets/ifOutOctets) via SNMP v1.
+    Com `prefetched` (poll_plan), os pares já trazidos no GET combinado não vão à rede.
+    """
+    memo = snmp_profiles.current(ip, port, community) # (comunidade, versão) que o equipamento responde
+    comm = memo[0] if memo else community
+    for oid_in, oid_out, mp_model, timeout, retries in traffic_oid_pairs(brand, interface_index, memo[1] if memo else None):
+        ubnt = oid_in.startswith('1.3.6.1.4.1.41112')
+        try:
+            if prefetched is not None and oid_in in prefetched and oid_out in prefetched:
+                if prefetched[oid_in] is NO_SUCH_NAME or prefetched[oid_out] is NO_SUCH_NAME:
+                    continue
+                varBinds = [(oid_in, prefetched[oid_in]), (oid_out, prefetched[oid_out])]
+            else:
+                errorIndication, errorStatus, errorIndex, varBinds = await snmp_command(
+                    'get', ip, port, comm, mp_model, [oid_in, oid_out], timeout, retries
+                )
+                if errorIndication or errorStatus:
+                    continue
+            if varBinds and len(varBinds) >= 2:
+                res_in, res_out = varBinds[0][1], varBinds[1][1]
+                # Verify they are actual numbers (UBNT devolve vazio em vez de erro)
+                if ubnt and (str(res_in) == "" or str(res_out) == ""):
+                    continue
+                return (int(res_in), int(res_out))
+        except Exception as e:
+            logger.debug(f"[SNMP] Traffic Get Error {ip} ({oid_in}): {e}")
+            continue
         
     return None
 async def get_snmp_interfaces(ip: str, community: str = "public", port: int = 161):
     """
-    Lists all interfaces (index and description) using SNMP walk on ifDescr.
+    Lists all interfaces (index and description) using a bulk walk on ifDescr.
     """
     interfaces = []
     
@@ -277,40 +337,11 @@ async def get_snmp_interfaces(ip: str, community: str = "public", port: int = 16
     if brand == 'ubiquiti':
          interfaces.append({"index": 1000, "name": "Wireless (UBNT AirFiber/LTU)"})
 
-    root_oid = '1.3.6.1.2.1.2.2.1.2' # ifDescr
-    
     try:
-        engine = get_shared_engine()
-        # Try v2c first, fallback to v1
-        for version in [1, 0]: # 1=v2c, 0=v1
-            auth = CommunityData(community, mpModel=version)
-            target = UdpTransportTarget((ip, port), timeout=2, retries=1)
-            
-            curr_oid = ObjectIdentity(root_oid)
-            found_version = False
-            
-            while True:
-                errorIndication, errorStatus, errorIndex, varBinds = await nextCmd(
-                    engine, auth, target, ContextData(),
-                    ObjectType(curr_oid),
-                    lexicographicMode=False
-                )
-                
-                if errorIndication or errorStatus or not varBinds or len(varBinds) == 0 or len(varBinds[0]) == 0:
-                    break
-                
-                found_version = True
-                oid, val = varBinds[0][0]
-                
-                if not str(oid).startswith(root_oid):
-                    break
-                    
-                idx = str(oid).split('.')[-1]
-                interfaces.append({"index": int(idx), "name": str(val)})
-                curr_oid = oid
-                
-            if found_version:
-                break
+        rows = await bulk_walk(ip, community, [IF_DESCR], port)
+        for index, (name,) in rows.items():
+            if index.isdigit():
+                interfaces.append({"index": int(index), "name": str(name)})
     except Exception as e:
         logger.warning(f"[SNMP] Error scanning interfaces for {ip}: {e}")
         
@@ -0,0 +1,200 @@
+"""
+Circuit breaker de SNMP por equipamento (snmp_monitor).
+
+Equipamento que responde ping mas não responde SNMP (agente travado, comunidade
+trocada, ACL) segura uma vaga do semáforo por até 15s em todo ciclo: v2c, depois
+v1, e as estratégias de OID de cada métrica, cada uma esperando o timeout. Alguns
+desses empurram o ciclo para o limite global de 300s.
+
+Depois de FAILURE_THRESHOLD polls seguidos sem resposta o disjuntor abre: o
+equipamento sai do polling completo e recebe só um GET de sysUpTime (um PDU,
+PROBE_TIMEOUT), em backoff exponencial (PROBE_BASE, dobrando até PROBE_MAX).
+Respondeu: fecha, e o próximo ciclo já faz o polling completo. Trocar IP, porta ou
+comunidade no cadastro também fecha (nova chance com a configuração nova).
+
+O collector publica o estado em data/state (BREAKER_FILE) para o /system/health
+da API e o recupera no restart (um equipamento morto não volta a custar 3 ciclos).
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+
+from backend.app.services.snmp import snmp_command
+from backend.app.services.snmp_profiles import snmp_profiles, V1, V2C
+from backend.app.services.perf_metrics import perf_metrics
+from backend.app.utils.state_files import atomic_write_json, load_json
+
+BREAKER_FILE = "snmp_breakers.json"
+FAILURE_THRESHOLD = 3   # Polls seguidos sem resposta até abrir
+PROBE_BASE = 60         # s até a primeira sonda; dobra a cada sonda sem resposta
+PROBE_MAX = 1800
+PROBE_TIMEOUT = 2.0
+PUBLISH_INTERVAL = 15.0
+SYS_UPTIME_OID = '1.3.6.1.2.1.1.3.0'
+
+
+class _Breaker:
+    __slots__ = ("ip", "signature", "failures", "opened_at", "backoff", "next_probe", "probes")
+
+    def __init__(self, ip: str, signature: Tuple):
+        self.ip = ip
+        self.signature = signature
+        self.failures = 0                         # Polls/sondas seguidos sem resposta
+        self.opened_at: Optional[float] = None    # None = fechado (polling completo)
+        self.backoff = PROBE_BASE
+        self.next_probe = 0.0
+        self.probes = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def to_dict(self) -> dict:
+        return {"ip": self.ip, "signature": list(self.signature), "failures": self.failures,
+                "state": "open" if self.is_open else "closed", "opened_at": self.opened_at,
+                "backoff_s": self.backoff if self.is_open else None,
+                "next_probe_at": self.next_probe if self.is_open else None, "probes": self.probes}
+
+
+class SnmpBreakers:
+    def __init__(self):
+        self._breakers: Dict[int, _Breaker] = {}
+        self.persistent = False
+        self._dirty = False
+        self._published_at = 0.0
+
+    @staticmethod
+    def _signature(eq: dict) -> Tuple:
+        return (eq["ip"], eq.get("snmp_port") or 161, eq.get("snmp_community"))
+
+    def load(self):
+        """Collector: recupera os disjuntores abertos e passa a publicar o estado."""
+        data = load_json(BREAKER_FILE, {}) or {}
+        for key, entry in (data.get("devices") or {}).items():
+            if entry.get("state") != "open":
+                continue
+            try:
+                b = _Breaker(entry["ip"], tuple(entry["signature"]))
+                b.failures = int(entry["failures"])
+                b.opened_at = float(entry["opened_at"])
+                b.backoff = int(entry["backoff_s"])
+                b.next_probe = float(entry["next_probe_at"])
+                b.probes = int(entry.get("probes") or 0)
+            except (KeyError, TypeError, ValueError):
+                continue
+            self._breakers[int(key)] = b
+        self.persistent = True
+        self._dirty = True  # Publica já no primeiro ciclo (a API vê o estado mesmo sem falhas)
+        perf_metrics.gauge_fn("snmp_breakers_open", lambda: self.open_count)
+        if self._breakers:
+            logger.info(f"[SNMP] {len(self._breakers)} equipamentos com circuit breaker aberto recuperados")
+
+    @property
+    def open_count(self) -> int:
+        return sum(1 for b in self._breakers.values() if b.is_open)
+
+    def _get(self, eq: dict) -> Optional[_Breaker]:
+        b = self._breakers.get(eq["id"])
+        if b is not None and b.signature != self._signature(eq):
+            # Cadastro mudou: o estado antigo não diz nada sobre a configuração nova
+            del self._breakers[eq["id"]]
+            self._dirty = True
+            if b.is_open:
+                logger.info(f"[SNMP] {eq['ip']}: cadastro SNMP alterado, circuit breaker fechado")
+            return None
+        return b
+
+    def is_open(self, eq: dict) -> bool:
+        b = self._get(eq)
+        return b is not None and b.is_open
+
+    def record(self, eq: dict, answered: bool):
+        """Resultado de um poll completo (disjuntor fechado)."""
+        b = self._get(eq)
+        if answered:
+            if b is not None:
+                del self._breakers[eq["id"]]
+                self._dirty = True
+            return
+        if b is None:
+            b = self._breakers[eq["id"]] = _Breaker(eq["ip"], self._signature(eq))
+        b.failures += 1
+        self._dirty = True
+        if not b.is_open and b.failures >= FAILURE_THRESHOLD:
+            now = time.time()
+            b.opened_at, b.backoff, b.next_probe = now, PROBE_BASE, now + PROBE_BASE
+            perf_metrics.inc("snmp_breaker_trips")
+            logger.warning(f"[SNMP] {eq['ip']} sem resposta SNMP em {b.failures} polls seguidos: "
+                           f"polling suspenso, sondando sysUpTime (a cada {PROBE_BASE}s, até {PROBE_MAX}s)")
+
+    def probes_due(self, equipments: List[dict], now: float) -> List[dict]:
+        due = []
+        for eq in equipments:
+            b = self._get(eq)
+            if b is not None and b.is_open and now >= b.next_probe:
+                due.append(eq)
+        return due
+
+    async def _probe(self, eq: dict) -> bool:
+        """Um GET de sysUpTime na versão/comunidade memorizada: qualquer resposta (mesmo erro) conta."""
+        ip, port, community = self._signature(eq)
+        memo = snmp_profiles.current(ip, port, community)
+        comm, mp_model = memo if memo else (community, V1 if eq.get("snmp_version") == 1 else V2C)
+        try:
+            errorIndication, _, _, _ = await snmp_command('get', ip, port, comm, mp_model, [SYS_UPTIME_OID],
+                                                          timeout=PROBE_TIMEOUT)
+            return not errorIndication
+        except Exception as e:
+            logger.debug(f"[SNMP] Sonda de {ip} falhou: {e}")
+            return False
+
+    async def probe_all(self, equipments: List[dict], sem: asyncio.Semaphore) -> int:
+        """Sonda os equipamentos com disjuntor aberto e sonda vencida; devolve quantos fecharam."""
+        async def one(eq):
+            async with sem:
+                return await self._probe(eq)
+
+        results = await asyncio.gather(*[one(eq) for eq in equipments])
+        now, closed = time.time(), 0
+        for eq, answered in zip(equipments, results):
+            b = self._breakers.get(eq["id"])
+            if b is None:
+                continue
+            perf_metrics.inc("snmp_breaker_probes")
+            b.probes += 1
+            self._dirty = True
+            if answered:
+                del self._breakers[eq["id"]]
+                closed += 1
+                logger.info(f"[SNMP] {eq['ip']} voltou a responder SNMP após {now - b.opened_at:.0f}s: polling completo retomado")
+            else:
+                b.failures += 1
+                b.backoff = min(b.backoff * 2, PROBE_MAX)
+                b.next_probe = now + b.backoff
+        return closed
+
+    def forget(self, eq_id: int):
+        """Equipamento removido do cadastro."""
+        if self._breakers.pop(eq_id, None) is not None:
+            self._dirty = True
+
+    async def publish_if_due(self, force: bool = False):
+        if not self.persistent or not (self._dirty or force):
+            return
+        now = time.time()
+        if not force and now - self._published_at < PUBLISH_INTERVAL:
+            return
+        self._dirty = False
+        self._published_at = now
+        try:
+            data = {"updated_at": now, "threshold": FAILURE_THRESHOLD, "probe_base_s": PROBE_BASE,
+                    "probe_max_s": PROBE_MAX,
+                    "devices": {str(eq_id): b.to_dict() for eq_id, b in self._breakers.items()}}
+            await asyncio.to_thread(atomic_write_json, BREAKER_FILE, data)
+        except Exception as e:
+            self._dirty = True
+            logger.warning(f"[SNMP] Falha ao publicar estado dos circuit breakers: {e}")
+
+
+snmp_breakers = SnmpBreakers()
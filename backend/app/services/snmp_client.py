@@ -0,0 +1,420 @@
+"""
+Cliente SNMP v1/v2c enxuto sobre um socket UDP só (asyncio DatagramProtocol).
+
+O hlapi do pysnmp monta ObjectIdentity/UdpTransportTarget/CommunityData a cada
+chamada, resolve MIB e codifica via pyasn1: boa parte da CPU do snmp_monitor ia
+nisso, e por isso a concorrência ficava presa em 30. Aqui:
+- BER só dos tipos que usamos (INTEGER, OCTET STRING, NULL, OID, IpAddress,
+  Counter32/64, Gauge32, TimeTicks e as exceções noSuch*/endOfMibView);
+- o varbind (OID + NULL) de cada OID é codificado uma vez e fica em cache;
+- todas as requisições saem do mesmo socket e as respostas voltam pelo
+  request-id, aceitas só se vierem do IP/porta consultado e com a mesma
+  comunidade (como o pysnmp conferia);
+- timeouts num heap (um único timer do loop, no prazo mais próximo), não um
+  wait_for por requisição.
+
+Os valores decodificados imitam o que o pysnmp devolve (int(), str(),
+prettyPrint(), asOctets()), então o resto do código não muda. O backend é
+escolhido em settings.snmp_backend (snmp.snmp_command).
+"""
+import asyncio
+import heapq
+import random
+import socket
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+
+from backend.app.services.dns_cache import dns_cache, target_kind
+from backend.app.services.perf_metrics import perf_metrics
+
+GET, GETNEXT, RESPONSE, GETBULK = 0xA0, 0xA1, 0xA2, 0xA5
+PDU_TYPES = {"get": GET, "next": GETNEXT, "bulk": GETBULK}
+
+ERROR_NAMES = ["noError", "tooBig", "noSuchName", "badValue", "readOnly", "genErr", "noAccess", "wrongType",
+               "wrongLength", "wrongEncoding", "wrongValue", "noCreation", "inconsistentValue",
+               "resourceUnavailable", "commitFailed", "undoFailed", "authorizationError", "notWritable",
+               "inconsistentName"]
+
+
+# --- Valores (compatíveis com o uso que o código faz dos tipos do pysnmp) ---
+
+class Integer(int):
+    tag = 0x02
+
+    def prettyPrint(self):
+        return str(int(self))
+
+
+class Counter32(Integer):
+    tag = 0x41
+
+
+class Gauge32(Integer):
+    tag = 0x42
+
+
+class TimeTicks(Integer):
+    tag = 0x43
+
+
+class Counter64(Integer):
+    tag = 0x46
+
+
+class ErrorStatus(int):
+    def prettyPrint(self):
+        return ERROR_NAMES[self] if 0 <= self < len(ERROR_NAMES) else str(int(self))
+
+
+class OctetString(bytes):
+    tag = 0x04
+
+    def asOctets(self):
+        return bytes(self)
+
+    def __str__(self):
+        return self.decode('latin-1')  # Mesmo encoding do pyasn1
+
+    def prettyPrint(self):
+        if all(32 <= b <= 126 for b in self):
+            return self.decode('latin-1')
+        return '0x' + self.hex()
+
+
+class IpAddress(OctetString):
+    tag = 0x40
+
+    def prettyPrint(self):
+        return '.'.join(map(str, self)) if len(self) == 4 else super().prettyPrint()
+
+
+class Opaque(OctetString):
+    tag = 0x44
+
+
+class ObjectName(str):
+    tag = 0x06
+
+    def prettyPrint(self):
+        return str(self)
+
+
+class Null(bytes):
+    """NULL e as exceções do v2c: str() vazio e int() falha, como no pysnmp."""
+    tag = 0x05
+    label = ''
+
+    def __new__(cls):
+        return super().__new__(cls, b'')
+
+    def __str__(self):
+        return ''
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+    def prettyPrint(self):
+        return self.label
+
+
+class NoSuchObject(Null):
+    tag = 0x80
+    label = 'No Such Object currently exists at this OID'
+
+
+class NoSuchInstance(Null):
+    tag = 0x81
+    label = 'No Such Instance currently exists at this OID'
+
+
+class EndOfMibView(Null):
+    tag = 0x82
+    label = 'No more variables left in this MIB View'
+
+
+_INT_TYPES = {t.tag: t for t in (Counter32, Gauge32, TimeTicks, Counter64)}
+_OCTET_TYPES = {t.tag: t for t in (OctetString, IpAddress, Opaque)}
+_NULL_TYPES = {t.tag: t for t in (Null, NoSuchObject, NoSuchInstance, EndOfMibView)}
+
+
+# --- BER ---
+
+def _len(n: int) -> bytes:
+    if n < 0x80:
+        return bytes((n,))
+    body = n.to_bytes((n.bit_length() + 7) // 8, 'big')
+    return bytes((0x80 | len(body),)) + body
+
+
+def _tlv(tag: int, payload: bytes) -> bytes:
+    return bytes((tag,)) + _len(len(payload)) + payload
+
+
+def _int(tag: int, value: int, signed: bool = True) -> bytes:
+    size = (value.bit_length() + (8 if signed else 7)) // 8 or 1
+    if not signed and value >> (size * 8 - 1):
+        size += 1  # Unsigned com o bit alto ligado: zero na frente
+    return _tlv(tag, int(value).to_bytes(size, 'big', signed=signed))
+
+
+@lru_cache(maxsize=16384)
+def encode_oid(oid: str) -> bytes:
+    parts = [int(x) for x in oid.strip('.').split('.')]
+    if len(parts) < 2:
+        parts.append(0)
+    body = bytearray()
+    for sub in [parts[0] * 40 + parts[1]] + parts[2:]:
+        chunk = [sub & 0x7F]
+        sub >>= 7
+        while sub:
+            chunk.append(0x80 | (sub & 0x7F))
+            sub >>= 7
+        body.extend(reversed(chunk))
+    return _tlv(0x06, bytes(body))
+
+
+@lru_cache(maxsize=16384)
+def _null_varbind(oid: str) -> bytes:
+    """Varbind de requisição (OID, NULL), codificado uma vez por OID."""
+    return _tlv(0x30, encode_oid(oid) + b'\x05\x00')
+
+
+def encode_value(value) -> bytes:
+    if isinstance(value, Null):
+        return bytes((value.tag, 0))
+    if isinstance(value, ObjectName):
+        return encode_oid(value)
+    if isinstance(value, OctetString):
+        return _tlv(value.tag, bytes(value))
+    if isinstance(value, Integer) and value.tag != 0x02:
+        return _int(value.tag, value, signed=False)
+    if isinstance(value, int):
+        return _int(0x02, value)
+    if isinstance(value, str):
+        value = value.encode('latin-1', 'replace')
+    return _tlv(0x04, bytes(value))
+
+
+def encode_varbind(oid: str, value) -> bytes:
+    return _tlv(0x30, encode_oid(oid) + encode_value(value))
+
+
+def encode_message(version: int, community: str, pdu_type: int, request_id: int, a: int, b: int,
+                   varbinds: List[bytes]) -> bytes:
+    """Mensagem completa; `a`/`b` = errorStatus/errorIndex (nonRepeaters/maxRepetitions no GETBULK)."""
+    pdu = _int(0x02, request_id) + _int(0x02, a) + _int(0x02, b) + _tlv(0x30, b''.join(varbinds))
+    body = _int(0x02, version) + _tlv(0x04, community.encode('latin-1', 'replace')) + _tlv(pdu_type, pdu)
+    return _tlv(0x30, body)
+
+
+def encode_request(mp_model: int, community: str, pdu_type: int, request_id: int, oids: List[str],
+                   non_repeaters: int = 0, max_repetitions: int = 0) -> bytes:
+    varbinds = [_null_varbind(oid) for oid in oids]
+    if pdu_type == GETBULK:
+        return encode_message(mp_model, community, pdu_type, request_id, non_repeaters, max_repetitions, varbinds)
+    return encode_message(mp_model, community, pdu_type, request_id, 0, 0, varbinds)
+
+
+def _read(data: bytes, pos: int) -> Tuple[int, int, int]:
+    """(tag, início do conteúdo, fim) do TLV em `pos`."""
+    tag = data[pos]
+    n = data[pos + 1]
+    pos += 2
+    if n & 0x80:
+        size = n & 0x7F
+        n = int.from_bytes(data[pos:pos + size], 'big')
+        pos += size
+    end = pos + n
+    if end > len(data):
+        raise ValueError("TLV truncado")
+    return tag, pos, end
+
+
+def decode_oid(raw: bytes) -> ObjectName:
+    parts, sub = [], 0
+    for byte in raw:
+        sub = (sub << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            parts.append(sub)
+            sub = 0
+    first = parts[0] if parts else 0
+    head = [min(first // 40, 2), first - 40 * min(first // 40, 2)]
+    return ObjectName('.'.join(map(str, head + parts[1:])))
+
+
+def decode_value(tag: int, raw: bytes):
+    if tag == 0x02:
+        return Integer(int.from_bytes(raw, 'big', signed=True))
+    if tag in _INT_TYPES:
+        return _INT_TYPES[tag](int.from_bytes(raw, 'big', signed=False))
+    if tag in _OCTET_TYPES:
+        return _OCTET_TYPES[tag](raw)
+    if tag == 0x06:
+        return decode_oid(raw)
+    if tag in _NULL_TYPES:
+        return _NULL_TYPES[tag]()
+    return OctetString(raw)  # Tipo desconhecido: bytes crus
+
+
+def decode_message(data: bytes):
+    """-> (versão, comunidade, tipo do PDU, request-id, a, b, [(ObjectName, valor)])."""
+    _, pos, _ = _read(data, 0)
+    _, s, e = _read(data, pos)
+    version = int.from_bytes(data[s:e], 'big')
+    _, s, pos = _read(data, e)
+    community = data[s:pos].decode('latin-1')
+    pdu_type, pos, _ = _read(data, pos)
+    fields = []
+    for _ in range(3):
+        _, s, pos = _read(data, pos)
+        fields.append(int.from_bytes(data[s:pos], 'big', signed=True))
+    _, pos, end = _read(data, pos)
+    varbinds = []
+    while pos < end:
+        _, s, pos = _read(data, pos)
+        _, os_, oe = _read(data, s)
+        tag, vs, ve = _read(data, oe)
+        varbinds.append((decode_oid(data[os_:oe]), decode_value(tag, data[vs:ve])))
+    return version, community, pdu_type, fields[0], fields[1], fields[2], varbinds
+
+
+# --- Cliente ---
+
+def _same_host(received: str, sent: str) -> bool:
+    """Origem do datagrama == destino da requisição (IPv6 pode voltar em outra grafia ou com %escopo)."""
+    if received == sent:
+        return True
+    try:
+        family = socket.AF_INET6 if ':' in sent else socket.AF_INET
+        return socket.inet_pton(family, received.split('%', 1)[0]) == socket.inet_pton(family, sent.split('%', 1)[0])
+    except (OSError, ValueError):
+        return False
+
+
+class _Endpoint(asyncio.DatagramProtocol):
+    def __init__(self, client: "SnmpClient"):
+        self.client = client
+
+    def datagram_received(self, data, addr):
+        self.client._on_response(data, addr)
+
+    def error_received(self, exc):
+        logger.debug(f"[SNMP] Socket do cliente nativo: {exc}")
+
+
+class SnmpClient:
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._transports: Dict[int, asyncio.DatagramTransport] = {}
+        self._opening: Dict[int, asyncio.Future] = {}
+        self._pending: Dict[int, Tuple[asyncio.Future, str, int, str]] = {}  # request-id -> (future, ip, porta, comunidade)
+        self._timers: List[Tuple[float, int]] = []  # heap (prazo, request-id); resolvidos saem quando vencem
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._next_id = random.randrange(1, 1 << 30)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _reset_if_new_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            for transport in self._transports.values():
+                transport.close()
+            self._loop = loop
+            self._transports, self._opening, self._pending, self._timers, self._timer = {}, {}, {}, [], None
+
+    async def _endpoint(self, family: int) -> asyncio.DatagramTransport:
+        transport = self._transports.get(family)
+        if transport is not None and not transport.is_closing():
+            return transport
+        if family in self._opening:
+            return await asyncio.shield(self._opening[family])
+        opening = self._opening[family] = self._loop.create_future()
+        try:
+            local = ('::', 0) if family == socket.AF_INET6 else ('0.0.0.0', 0)
+            transport, _ = await self._loop.create_datagram_endpoint(lambda: _Endpoint(self), local_addr=local)
+            self._transports[family] = transport
+            opening.set_result(transport)
+            return transport
+        except Exception as e:
+            opening.set_exception(e)
+            opening.exception()  # Já entregue a quem espera; evita o aviso de exceção não lida
+            raise
+        finally:
+            self._opening.pop(family, None)
+
+    def _new_id(self) -> int:
+        self._next_id = self._next_id + 1 if self._next_id < (1 << 31) - 1 else 1
+        return self._next_id
+
+    def _arm(self, request_id: int, deadline: float):
+        heapq.heappush(self._timers, (deadline, request_id))
+        if self._timers[0][1] == request_id:  # Novo prazo mais próximo: reagenda o único timer
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = self._loop.call_at(deadline, self._expire)
+
+    def _expire(self):
+        self._timer = None
+        now = self._loop.time()
+        while self._timers and self._timers[0][0] <= now:
+            _, request_id = heapq.heappop(self._timers)
+            entry = self._pending.pop(request_id, None)
+            if entry is not None and not entry[0].done():
+                entry[0].set_result(None)
+        if self._timers:
+            self._timer = self._loop.call_at(self._timers[0][0], self._expire)
+
+    def _on_response(self, data: bytes, addr):
+        try:
+            _, community, pdu_type, request_id, status, index, varbinds = decode_message(data)
+        except Exception:
+            perf_metrics.inc("snmp_native_bad_packets")
+            return
+        entry = self._pending.get(request_id)
+        if entry is None or entry[0].done() or pdu_type != RESPONSE:
+            return  # Atrasada (já deu timeout) ou duplicada
+        future, address, port, sent_community = entry
+        if addr[1] != port or not _same_host(addr[0], address) or community != sent_community:
+            # Request-id casou mas a origem ou a comunidade não: datagrama de outro (ou forjado), a requisição segue esperando
+            perf_metrics.inc("snmp_native_foreign_packets")
+            return
+        del self._pending[request_id]
+        future.set_result((ErrorStatus(status), Integer(index), varbinds))
+
+    async def request(self, ip: str, port: int, community: str, mp_model: int, pdu_type: int, oids: List[str],
+                      timeout: float = 1.0, retries: int = 0, non_repeaters: int = 0, max_repetitions: int = 0):
+        """
+        Um PDU: (errorIndication, errorStatus, errorIndex, varBinds), como o
+        getCmd do pysnmp; varBinds é a lista achatada de (ObjectName, valor).
+        """
+        self._reset_if_new_loop()
+        address = ip
+        if target_kind(ip) == "host":
+            address = await dns_cache.resolve(ip)
+            if address is None:
+                return "nameResolutionFailed", ErrorStatus(0), Integer(0), []
+        family = socket.AF_INET6 if ':' in address else socket.AF_INET
+        transport = await self._endpoint(family)
+        sent_community = community.encode('latin-1', 'replace').decode('latin-1')  # Como sai no pacote
+        for attempt in range(retries + 1):
+            request_id = self._new_id()
+            message = encode_request(mp_model, community, pdu_type, request_id, oids, non_repeaters, max_repetitions)
+            future = self._loop.create_future()
+            self._pending[request_id] = (future, address, port, sent_community)
+            self._arm(request_id, self._loop.time() + timeout)
+            perf_metrics.inc("snmp_native_requests")
+            try:
+                transport.sendto(message, (address, port))
+                reply = await future
+            finally:
+                self._pending.pop(request_id, None)
+            if reply is not None:
+                status, index, varbinds = reply
+                return None, status, index, varbinds
+            perf_metrics.inc("snmp_native_timeouts")
+        return "requestTimedOut", ErrorStatus(0), Integer(0), []
+
+
+snmp_client = SnmpClient()
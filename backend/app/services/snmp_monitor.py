@@ -1,12 +1,25 @@
 import asyncio
+import time
 from datetime import datetime, timezone
 from sqlalchemy import select, insert, update
 from backend.app.database import AsyncSessionLocal
-from backend.app.models import Equipment, TrafficLog, Tower, SignalLog
+from backend.app.models import Equipment, TrafficLog, SignalLog
 from backend.app.services.mikrotik_api import get_mikrotik_live_traffic
-from backend.app.services.snmp import get_snmp_interface_traffic
+from backend.app.services.mikrotik_stream import mikrotik_streams, STREAM_PARAM
+from backend.app.services.snmp import get_snmp_interface_traffic, NATIVE_SNMP
 from backend.app.services.wireless_snmp import get_wireless_stats, get_health_stats, get_connected_clients_count
 from backend.app.services.notifier import send_notification
+from backend.app.services.spool import spool_rows
+from backend.app.services.oid_strategy import oid_strategies
+from backend.app.services.snmp_profiles import snmp_profiles
+from backend.app.services.snmp_breaker import snmp_breakers
+from backend.app.services.poll_plan import compile_poll_plan, fetch_poll_plan
+from backend.app.services.poll_schedule import poll_schedule, METRIC_CLASSES
+from backend.app.services.alert_rules import alert_rules, format_alert
+from backend.app.services.device_registry import device_registry, LIVE_FIELDS
+from backend.app.services.perf_metrics import perf_metrics
+from backend.app.config import settings
+from backend.app.utils.state_files import atomic_write_json, load_json
 from loguru import logger
 
 # Config
@@ -15,23 +28,139 @@ SNMP_INTERVAL = 30 # Default (will be updated by job)
 # Armazena último valor salvo para evitar logs duplicados
 snmp_last_logged = {}  # eq_id -> {"in": mbps, "out": mbps, "signal": dbm, "ccq": %, "time": timestamp}
 signal_last_logged = {} # eq_id -> {"signal": dbm, "ccq": %, "time": timestamp}
+stream_last_logged = {} # (eq_id, interface_index) -> idem snmp_last_logged, interfaces extras do streaming
+
+# Colunas gravadas no spool quando o banco não aceita o ciclo
+TRAFFIC_SPOOL_COLUMNS = ["equipment_id", "in_mbps", "out_mbps", "interface_index", "signal_dbm", "cpu_usage",
+                         "memory_usage", "disk_usage", "temperature", "voltage", "timestamp"]
+SIGNAL_SPOOL_COLUMNS = ["equipment_id", "rssi", "ccq", "timestamp"]
+
+# Throttle dos logs: passado esse tempo, o próximo valor é gravado de qualquer jeito
+TRAFFIC_LOG_PERIOD = 600
+SIGNAL_LOG_PERIOD = 120
+
+# Warm start: contadores e throttles sobrevivem ao restart do collector
+WARM_STATE_FILE = "snmp_warm_state.json"
+WARM_SAVE_INTERVAL = 60.0
+WARM_COUNTER_MAX_AGE = 300  # Contador mais velho: a primeira taxa seria a média do tempo parado
+_warm_saved_at = 0.0
+
+
+def _traffic_log_due(last_log, in_mbps: float, out_mbps: float, now: float) -> bool:
+    """Throttle do TrafficLog: primeiro valor, a cada TRAFFIC_LOG_PERIOD ou variação > 10%."""
+    if last_log is None:
+        return True
+    if now - last_log.get("time", 0) > TRAFFIC_LOG_PERIOD:
+        return True
+    if last_log.get("in") is not None:
+        in_variation = abs(in_mbps - last_log["in"]) / max(last_log["in"], 0.1)
+        out_variation = abs(out_mbps - last_log["out"]) / max(last_log["out"], 0.1)
+        return in_variation > 0.1 or out_variation > 0.1
+    return False
+
+
+def _traffic_log_row(eq_id, in_mbps, out_mbps, if_idx, snapshot: dict, timestamp: datetime) -> dict:
+    return {
+        "equipment_id": eq_id,
+        "in_mbps": in_mbps,
+        "out_mbps": out_mbps,
+        "interface_index": if_idx,
+        "signal_dbm": snapshot.get("signal_dbm"),
+        "cpu_usage": snapshot.get("cpu_usage"),
+        "memory_usage": snapshot.get("memory_usage"),
+        "disk_usage": snapshot.get("disk_usage"),
+        "temperature": snapshot.get("temperature"),
+        "voltage": snapshot.get("voltage"),
+        "timestamp": timestamp  # Sem timezone para compatibilidade
+    }
+
+
+def _snmp_answered(res):
+    """
+    Resultado do poll para o circuit breaker: True respondeu, False não, None sem SNMP neste tick.
+    Só o que veio por SNMP conta (snmp_ok): tráfego/saúde da API do Mikrotik (streaming ou once) não
+    dizem nada sobre o agente SNMP, que seguiria custando os timeouts do plano e do wireless.
+    """
+    if res == "TIMEOUT":
+        return False
+    if not isinstance(res, dict):
+        return None  # Crash (ERROR/exceção): não diz nada sobre o agente SNMP
+    return res.get("snmp_ok")
+
+
+def _warm_state_snapshot(previous_counters: dict) -> dict:
+    return {
+        "saved_at": time.time(),
+        "counters": {f"{eq_id}:{idx}": list(v) for (eq_id, idx), v in previous_counters.items()},
+        "traffic_logged": {str(k): dict(v) for k, v in snmp_last_logged.items()},
+        "signal_logged": {str(k): dict(v) for k, v in signal_last_logged.items()},
+    }
+
+
+def load_warm_state(previous_counters: dict):
+    """Recarrega o estado salvo, descartando o que já venceu (contador velho, throttle expirado)."""
+    data = load_json(WARM_STATE_FILE, {}) or {}
+    now = time.time()
+    try:
+        for key, (ts, in_bytes, out_bytes) in data.get("counters", {}).items():
+            if now - ts <= WARM_COUNTER_MAX_AGE:
+                eq_id, idx = key.split(":")
+                previous_counters[(int(eq_id), int(idx))] = (ts, in_bytes, out_bytes)
+        for eq_id, entry in data.get("traffic_logged", {}).items():
+            if now - entry.get("time", 0) <= TRAFFIC_LOG_PERIOD:
+                snmp_last_logged[int(eq_id)] = entry
+        for eq_id, entry in data.get("signal_logged", {}).items():
+            if now - entry.get("time", 0) <= SIGNAL_LOG_PERIOD:
+                signal_last_logged[int(eq_id)] = entry
+    except (ValueError, TypeError, AttributeError) as e:
+        logger.warning(f"[SNMP] Estado de warm start inválido, ignorado: {e}")
+        return
+    if previous_counters:
+        logger.info(f"[SNMP] Warm start: {len(previous_counters)} contadores recuperados "
+                    f"(salvos há {now - data.get('saved_at', now):.0f}s)")
+
+
+async def save_warm_state_if_due(previous_counters: dict, force: bool = False):
+    global _warm_saved_at
+    now = time.time()
+    if not force and now - _warm_saved_at < WARM_SAVE_INTERVAL:
+        return
+    _warm_saved_at = now
+    try:
+        # Snapshot no loop (cópia rasa por entrada), gravação em thread
+        await asyncio.to_thread(atomic_write_json, WARM_STATE_FILE, _warm_state_snapshot(previous_counters))
+    except Exception as e:
+        logger.warning(f"[SNMP] Falha ao salvar o estado de warm start: {e}")
+
+
+def _save_warm_state_on_exit(previous_counters: dict):
+    try:
+        atomic_write_json(WARM_STATE_FILE, _warm_state_snapshot(previous_counters))
+    except Exception as e:
+        logger.warning(f"[SNMP] Falha ao salvar o estado de warm start na parada: {e}")
 
 async def snmp_monitor_job():
     """
     Dedicated job for Traffic polling (SNMP + Mikrotik API) AND Wireless Stats.
     Parallelized for high performance (Semaphore limited).
     """
-    import time
     logger.info(f"[TRAFFIC] Monitor de Tráfego/Wireless iniciado (Intervalo base: {SNMP_INTERVAL}s)...")
     
     # Limit Concurrency to avoid network flood and CPU spikes
-    # Reduzido de 50 para 30 em Windows por limitações de sockets
-    sem = asyncio.Semaphore(30) 
+    # pysnmp: reduzido de 50 para 30 em Windows (CPU/sockets); o cliente nativo usa um socket só
+    sem = asyncio.Semaphore(settings.snmp_concurrency if NATIVE_SNMP else min(30, settings.snmp_concurrency))
     
     # Cache for bandwidth calculation (SNMP only)
     previous_counters = {} 
+    online_devices = {}   # id -> dict do device_registry (online, com IP)
+    registry_version = -1
     
-    interval = 30
+    load_warm_state(previous_counters) # Taxas já no primeiro ciclo após o restart
+    # Parada do collector ou crash da task: grava o estado na saída
+    asyncio.current_task().add_done_callback(lambda _: _save_warm_state_on_exit(previous_counters))
+    oid_strategies.load() # Instâncias de OID aprendidas (restart não re-sonda tudo)
+    snmp_profiles.load() # Versão/comunidade SNMP que cada equipamento responde
+    snmp_breakers.load() # Equipamentos sem resposta SNMP: só sondagem até voltarem
     
     async def fetch_device_data(eq_data):
         """
@@ -40,36 +169,60 @@ async def snmp_monitor_job():
         eq_data is a dictionary copy of the object to avoid detached instance issues.
         """
         async with sem:
-            result = {"id": eq_data["id"], "updates": {}, "log": None}
+            result = {"id": eq_data["id"], "updates": {}, "log": None, "snmp_ok": None}
             
             try:
                 ip = eq_data["ip"]
                 brand = eq_data.get("brand")
                 community = eq_data.get("snmp_community")
                 port = eq_data.get("snmp_port") or 161
+                due = eq_data.get("due") or METRIC_CLASSES # Classes vencidas neste tick (poll_schedule)
+                started = time.monotonic()
+
+                # Mikrotik em streaming: tráfego e saúde já estão em memória, fora do plano SNMP
+                stream_traffic = mikrotik_streams.traffic(eq_data["id"])
+                stream_health = mikrotik_streams.health(eq_data["id"])
+                streamed = {cls for cls, value in (("traffic", stream_traffic), ("health", stream_health)) if value}
+                plan_eq = {**eq_data, "due": set(due) - streamed} if streamed else eq_data
+                snmp_off = eq_data.get("snmp_off") # Circuit breaker aberto: só a API do Mikrotik
+
+                # --- POLL PLAN ---
+                # As OIDs escalares das classes vencidas (wireless, clientes, saúde, tráfego) num GET combinado;
+                # as funções abaixo leem de `prefetched` e só vão à rede para walks/fallbacks
+                plan_oids = [] if snmp_off else compile_poll_plan(plan_eq)
+                prefetched = await fetch_poll_plan(ip, community, port, plan_oids)
+                if plan_oids:
+                    result["snmp_ok"] = prefetched is not None
                 
                 # --- WIRELESS / FIBER STATS ---
-                if brand in ['ubiquiti', 'intelbras', 'mikrotik', 'mimosa']:
+                if brand in ['ubiquiti', 'intelbras', 'mikrotik', 'mimosa'] and not snmp_off:
                     try:
-                        w_stats = await get_wireless_stats(
-                            ip, brand, community, port, 
-                            interface_index=eq_data.get("snmp_interface_index"),
-                            equipment_type=eq_data.get("equipment_type")
-                        )
-                        if w_stats['signal_dbm'] is not None:
-                            result["updates"]["signal_dbm"] = w_stats['signal_dbm']
-                            result["updates"]["ccq"] = w_stats['ccq']
+                        if "signal" in due:
+                            w_stats = await get_wireless_stats(
+                                ip, brand, community, port, 
+                                interface_index=eq_data.get("snmp_interface_index"),
+                                equipment_type=eq_data.get("equipment_type"),
+                                equipment_id=eq_data["id"],
+                                prefetched=prefetched
+                            )
+                            if w_stats['signal_dbm'] is not None:
+                                result["updates"]["signal_dbm"] = w_stats['signal_dbm']
+                                result["updates"]["ccq"] = w_stats['ccq']
+                                result["snmp_ok"] = True
                         
-                        if eq_data.get("equipment_type") == 'transmitter': 
-                            clients = await get_connected_clients_count(ip, brand, community, port)
+                        if "clients" in due and eq_data.get("equipment_type") == 'transmitter': 
+                            clients = await get_connected_clients_count(ip, brand, community, port, prefetched=prefetched)
                             if clients is not None:
                                  result["updates"]["connected_clients"] = clients
+                                 result["snmp_ok"] = True
                                  # logger.debug(f"[SNMP] Clients for {ip}: {clients}") # Log verboso removido
                         
                         # --- HEALTH STATS (CPU, Temp, Voltage) ---
-                        if brand in ['mikrotik', 'ubiquiti', 'intelbras']:
+                        if "health" in due and brand in ['mikrotik', 'ubiquiti', 'intelbras']:
                             try:
-                                h_stats = await get_health_stats(ip, brand, community, port)
+                                h_stats = stream_health or await get_health_stats(ip, brand, community, port, prefetched=prefetched)
+                                if not stream_health and any(v is not None for v in h_stats.values()):
+                                    result["snmp_ok"] = True
                                 if h_stats['cpu_usage'] is not None:
                                     result["updates"]["cpu_usage"] = h_stats['cpu_usage']
                                 if h_stats.get('memory_usage') is not None:
@@ -91,13 +244,18 @@ async def snmp_monitor_job():
                         logger.debug(f"[SNMP] Wireless stats error for {ip}: {e}")
 
                 # --- TRAFFIC ---
+                if "traffic" not in due:
+                    perf_metrics.observe("snmp_device_poll_ms", (time.monotonic() - started) * 1000)
+                    return result
+
                 # A) Mikrotik API
                 if eq_data.get("is_mikrotik") and eq_data.get("mikrotik_interface"):
-                    traffic_data = await get_mikrotik_live_traffic(
+                    # Streaming: última amostra da assinatura; senão, uma leitura (once) da interface principal
+                    traffic_data = stream_traffic or await get_mikrotik_live_traffic(
                         ip=ip,
                         user=eq_data.get("ssh_user"),
                         password=eq_data.get("ssh_password"),
-                        interface=eq_data.get("mikrotik_interface"),
+                        interface=eq_data.get("mikrotik_interface").split(',')[0].strip(),
                         port=eq_data.get("api_port") or 8728
                     )
                     if traffic_data:
@@ -108,8 +266,12 @@ async def snmp_monitor_job():
                         return result # Done for this device
                 
                 # B) SNMP
+                if snmp_off:
+                    return result
                 interface_idx = eq_data.get("snmp_traffic_interface_index") or eq_data.get("snmp_interface_index") or 1
-                traffic = await get_snmp_interface_traffic(ip, community, port, interface_idx, brand=brand)
+                traffic = await get_snmp_interface_traffic(ip, community, port, interface_idx, brand=brand, prefetched=prefetched)
+                perf_metrics.observe("snmp_device_poll_ms", (time.monotonic() - started) * 1000)
+                result["snmp_ok"] = bool(traffic or result["snmp_ok"])
                 
                 if traffic:
                     in_bytes, out_bytes = traffic
@@ -147,8 +309,7 @@ async def snmp_monitor_job():
 
     while True:
         try:
-            # 1. Fetch Candidates and Notif Config
-            equipments_data = [] # List of dicts
+            # 1. Notif Config (equipamentos vêm do device_registry)
             async with AsyncSessionLocal() as session:
                 from backend.app.models import Parameters
                 # Notification Config
@@ -156,73 +317,103 @@ async def snmp_monitor_job():
                     select(Parameters).where(Parameters.key.in_([
                         'telegram_token', 'telegram_chat_id', 'telegram_enabled',
                         'whatsapp_enabled', 'whatsapp_target', 'whatsapp_target_group',
-                        'telegram_template_traffic'
+                        'telegram_template_traffic', 'alert_rules', STREAM_PARAM, *poll_schedule.param_keys()
                     ]))
                 )
                 notif_config = {p.key: p.value for p in params_res.scalars().all()}
+                poll_schedule.configure(notif_config) # Períodos por classe de métrica (snmp_interval = tráfego)
+                alert_rules.configure(notif_config.get('alert_rules')) # Regras de alerta por grupo (tipo/torre/marca)
+                mikrotik_streams.configure(notif_config) # Tráfego contínuo via API nos Mikrotiks
+
+            # Equipamentos do device_registry (memória, atualizado pelo change feed): nada de SELECT por ciclo.
+            # A lista de online só é remendada com o que mudou desde a última versão vista
+            if not await device_registry.ready():
+                logger.warning("[SNMP] Registro de equipamentos ainda não carregado (banco indisponível?)")
+                await asyncio.sleep(5)
+                continue
+            for eq_id in device_registry.changed_since(registry_version):
+                dev = device_registry.get(eq_id)
+                if dev and dev["is_online"] and dev["ip"]:
+                    online_devices[eq_id] = dev
+                    # Versão do cadastro é o ponto de partida; o que o equipamento responder prevalece
+                    snmp_profiles.seed(dev["ip"], dev["snmp_port"] or 161, dev["snmp_community"], dev["snmp_version"])
+                else:
+                    online_devices.pop(eq_id, None)
+                    if dev is None:
+                        snmp_breakers.forget(eq_id)
+            registry_version = device_registry.version
+
+            now_ts = time.time()
+            # Cópia por ciclo: "due"/"tower_name" não vão para o dict do registro
+            equipments_data = [
+                {**dev, "tower_name": device_registry.tower_name(dev) or "Desconhecida", "due": poll_schedule.due(eq_id, now_ts)}
+                for eq_id, dev in online_devices.items()
+            ]
+
+            mikrotik_streams.sync(equipments_data) # Assinaturas só para Mikrotiks online
 
-                # Equipments with Tower names
-                res = await session.execute(
-                    select(Equipment, Tower.name.label("tower_name"))
-                    .outerjoin(Tower, Equipment.tower_id == Tower.id)
-                    .where(Equipment.is_online == True)
-                )
-                rows = res.all()
-                for row in rows:
-                    eq = row.Equipment
-                    tower_name = row.tower_name or "Desconhecida"
-                    if not eq.ip: continue
-                    # Copy data to dict to avoid session detach issues during async gather
-                    equipments_data.append({
-                        "id": eq.id, "name": eq.name, "ip": eq.ip, "brand": eq.brand, 
-                        "snmp_community": eq.snmp_community, "snmp_port": eq.snmp_port,
-                        "ssh_user": eq.ssh_user, "ssh_password": eq.ssh_password,
-                        "is_mikrotik": eq.is_mikrotik, "mikrotik_interface": eq.mikrotik_interface,
-                        "api_port": eq.api_port, 
-                        "snmp_interface_index": eq.snmp_interface_index,
-                        "snmp_traffic_interface_index": eq.snmp_traffic_interface_index,
-                        "equipment_type": eq.equipment_type,
-                        "max_traffic_in": eq.max_traffic_in,
-                        "max_traffic_out": eq.max_traffic_out,
-                        "traffic_alert_interval": eq.traffic_alert_interval,
-                        "last_traffic_alert_sent": eq.last_traffic_alert_sent,
-                        "min_voltage_threshold": eq.min_voltage_threshold,
-                        "voltage_alert_interval": eq.voltage_alert_interval,
-                        "last_voltage_alert_sent": eq.last_voltage_alert_sent,
-                        "voltage_multiplier": eq.voltage_multiplier,
-                        "voltage_offset": eq.voltage_offset,
-                        "tower_name": tower_name
-                    })
-            
-            
             if not equipments_data:
                 await asyncio.sleep(5)
                 continue
             
-            logger.info(f"[SNMP] 🔄 Processando {len(equipments_data)} equipamentos online...")
+            # Circuit breaker aberto (SNMP morto): fora do polling, só a sonda de sysUpTime quando vencer.
+            # As classes continuam vencidas no poll_schedule: ao fechar, o próximo ciclo faz o poll completo
+            breaker_open = [eq for eq in equipments_data if snmp_breakers.is_open(eq)]
+            probe_data = snmp_breakers.probes_due(breaker_open, now_ts)
+            if breaker_open:
+                skipped = {eq["id"] for eq in breaker_open}
+                equipments_polled = [eq for eq in equipments_data if eq["id"] not in skipped]
+                # Mikrotik com API: o tráfego segue pela API (once/streaming), sem tocar no SNMP
+                equipments_polled += [{**eq, "due": {"traffic"}, "snmp_off": True} for eq in breaker_open
+                                      if "traffic" in eq["due"] and eq.get("is_mikrotik") and eq.get("mikrotik_interface")]
+            else:
+                equipments_polled = equipments_data
+
+            # Só vai à rede quem tem alguma classe vencida; as classes vencidas saem juntas no mesmo plano
+            due_data = [eq for eq in equipments_polled if eq["due"]]
+            for eq in due_data:
+                poll_schedule.mark(eq["id"], eq["equipment_type"], eq["due"], now_ts)
+                for cls in eq["due"]:
+                    perf_metrics.inc(f"snmp_poll_{cls}")
+            logger.info(f"[SNMP] 🔄 Processando {len(due_data)} de {len(equipments_data)} equipamentos online..."
+                        + (f" ({len(breaker_open)} com circuit breaker aberto, {len(probe_data)} sondados)" if breaker_open else ""))
 
             # 2. Run Parallel Fetching (With 4s timeout per device inside, 5m global)
             async def fetch_with_timeout(eq_dict):
                 try:
                     # Aumentado para 15s pois alguns equipamentos são mais lentos quando sob carga
-                    return await asyncio.wait_for(fetch_device_data(eq_dict), timeout=15.0)
+                    res = await asyncio.wait_for(fetch_device_data(eq_dict), timeout=15.0)
                 except asyncio.TimeoutError:
                     # Logar em modo debug para não encher o log, mas permitir rastrear se necessário
                     if eq_dict['ip'] == '192.168.106.62': # Log específico para o teste do usuário
                         logger.warning(f"[SNMP] Timeout persistente em {eq_dict['ip']} (limite 15s)")
-                    return "TIMEOUT"
+                    res = "TIMEOUT"
                 except Exception as e:
                     logger.debug(f"[SNMP] Crash polling {eq_dict['ip']}: {e}")
-                    return "ERROR"
+                    res = "ERROR"
+                answered = _snmp_answered(res)
+                if answered is not None and not eq_dict.get("snmp_off"):
+                    snmp_breakers.record(eq_dict, answered)
+                return res
 
-            tasks = [asyncio.create_task(fetch_with_timeout(eq)) for eq in equipments_data]
+            task_eq = {asyncio.create_task(fetch_with_timeout(eq)): eq for eq in due_data}
+            tasks = list(task_eq)
+            # Sondas dos disjuntores abertos em paralelo (um GET cada, pelo mesmo semáforo)
+            probe_task = asyncio.create_task(snmp_breakers.probe_all(probe_data, sem)) if probe_data else None
             
             # Smart Gathering: Use wait() instead of valid_for(gather) to avoid losing ALL data on timeout
-            done, pending = await asyncio.wait(tasks, timeout=300.0)
+            done, pending = await asyncio.wait(tasks, timeout=300.0) if tasks else (set(), set())
 
             # Cancel pending tasks (slow devices) to free resources
             for p in pending:
                 p.cancel()
+                if not task_eq[p].get("snmp_off"):
+                    snmp_breakers.record(task_eq[p], False)
+
+            if probe_task is not None:
+                closed = await probe_task
+                if closed:
+                    logger.info(f"[SNMP] {closed} equipamentos voltaram a responder SNMP (circuit breaker fechado)")
                 
             # Coletar resultados das tarefas concluídas
             raw_results = []
@@ -253,7 +444,7 @@ async def snmp_monitor_job():
             if timeouts > 0 or errors > 0:
                     logger.warning(f"[SNMP] Ciclo concluído com falhas: {timeouts} Timeouts, {errors} Erros, {len(results)} Sucessos.")
             else:
-                    logger.info(f"[SNMP] ✅ Processamento concluído: {len(results)} sucessos de {len(equipments_data)}")
+                    logger.info(f"[SNMP] ✅ Processamento concluído: {len(results)} sucessos de {len(due_data)}")
 
             # Removido bloco except asyncio.TimeoutError pois asyncio.wait não lança essa exceção
             # O controle de fluxo segue naturalmente para salvar os 'results' obtidos
@@ -268,6 +459,18 @@ async def snmp_monitor_job():
                 signal_logs_buffer = []  # List of dicts for Table SignalLog
                 
                 updates_count = 0
+                upd_by_id = {}           # id -> dict de updates_buffer
+                cycle_values = {}        # id -> {traffic_in, traffic_out, voltage}
+
+                # 📈 Streaming (Mikrotik API): amostras por segundo desde o último ciclo, pelo mesmo throttle.
+                # Antes dos resultados: a última amostra também chega como res["log"] e não duplica
+                for eq_id, samples in mikrotik_streams.drain().items():
+                    snapshot = poll_schedule.latest.get(eq_id, {})
+                    for ts, if_idx, in_mbps, out_mbps in samples:
+                        tracking, key = (snmp_last_logged, eq_id) if if_idx == 1 else (stream_last_logged, (eq_id, if_idx))
+                        if _traffic_log_due(tracking.get(key), in_mbps, out_mbps, ts):
+                            traffic_logs_buffer.append(_traffic_log_row(eq_id, in_mbps, out_mbps, if_idx, snapshot, datetime.fromtimestamp(ts)))
+                            tracking[key] = {"in": in_mbps, "out": out_mbps, "time": ts, "signal": snapshot.get("signal_dbm")}
                 
                 for res in results:
                     if not res or not res["updates"]: continue
@@ -298,6 +501,11 @@ async def snmp_monitor_job():
 
                     upd_data["id"] = res["id"] # PK for bind
                     updates_buffer.append(upd_data)
+                    upd_by_id[res["id"]] = upd_data
+                    # Valores do ciclo para as regras de alerta (voltagem só quando a saúde foi lida)
+                    cycle_values[res["id"]] = {"voltage": upd_data.get("voltage")}
+                    # Últimos valores conhecidos: o traffic log leva sinal/saúde mesmo quando a classe não venceu neste tick
+                    snapshot = poll_schedule.remember(res["id"], upd_data)
                     
                     # ✅ CORTEX v3.0: Logging de Sinal (RSSI/CCQ) para análise física
                     if "signal_dbm" in upd_data and upd_data["signal_dbm"] is not None:
@@ -313,7 +521,7 @@ async def snmp_monitor_job():
                         else:
                             last_sig = signal_last_logged[eq_id]
                             time_since = current_time - last_sig["time"]
-                            if time_since > 120: # 2 minutos
+                            if time_since > SIGNAL_LOG_PERIOD: # 2 minutos
                                 should_log_signal = True
                             elif abs(curr_sig - last_sig["signal"]) >= 2:
                                 should_log_signal = True
@@ -343,183 +551,77 @@ async def snmp_monitor_job():
                         eq_id = res["id"]
                         current_time = time.time()
                         
-                        should_log_traffic = False
-                        
                         # Verificar se deve logar (Lógica puramente em memória)
-                        if eq_id not in snmp_last_logged:
-                            should_log_traffic = True
-                        else:
-                            last_log = snmp_last_logged[eq_id]
-                            time_since_last = current_time - last_log.get("time", 0)
-                            
-                            # 1. Periodo de 10 min
-                            if time_since_last > 600:
-                                should_log_traffic = True
-                            # 2. Variação > 10%
-                            elif last_log.get("in") is not None:
-                                in_variation = abs(in_mbps - last_log["in"]) / max(last_log["in"], 0.1)
-                                out_variation = abs(out_mbps - last_log["out"]) / max(last_log["out"], 0.1)
-                                if in_variation > 0.1 or out_variation > 0.1:
-                                    should_log_traffic = True
-                         
-                        if should_log_traffic:
-                            traffic_logs_buffer.append({
-                                "equipment_id": eq_id,
-                                "in_mbps": in_mbps,
-                                "out_mbps": out_mbps,
-                                "interface_index": if_idx,
-                                "signal_dbm": res["updates"].get("signal_dbm"),
-                                "cpu_usage": res["updates"].get("cpu_usage"),
-                                "memory_usage": res["updates"].get("memory_usage"),
-                                "disk_usage": res["updates"].get("disk_usage"),
-                                "temperature": res["updates"].get("temperature"),
-                                "voltage": res["updates"].get("voltage"),
-                                "timestamp": datetime.now()  # Sem timezone para compatibilidade
-                            })
+                        if _traffic_log_due(snmp_last_logged.get(eq_id), in_mbps, out_mbps, current_time):
+                            traffic_logs_buffer.append(_traffic_log_row(eq_id, in_mbps, out_mbps, if_idx, snapshot, datetime.now()))
                             # Atualizar tracking
                             snmp_last_logged[eq_id] = {
                                 "in": in_mbps,
                                 "out": out_mbps,
                                 "time": current_time,
-                                "signal": res["updates"].get("signal_dbm")
+                                "signal": snapshot.get("signal_dbm")
                             }
 
+                        cycle_values[eq_id].update(traffic_in=in_mbps, traffic_out=out_mbps)
 
-                        # ✅ ALERTAS DE TRÁFEGO
-                        # Find equipment data from original list
-                        eq_data = next((e for e in equipments_data if e["id"] == eq_id), None)
-                        if not eq_data:
-                            continue
-                            
-                        max_in = eq_data.get("max_traffic_in")
-                        max_out = eq_data.get("max_traffic_out")
-                        
-                        if (max_in or max_out):
-                            is_over = False
-                            alert_lines = []
-                            
-                            if max_in and in_mbps > max_in:
-                                is_over = True
-                                alert_lines.append(f"⬇️ Download: *{in_mbps}* Mbps (Limite: {max_in} Mbps)")
-                            if max_out and out_mbps > max_out:
-                                is_over = True
-                                alert_lines.append(f"⬆️ Upload: *{out_mbps}* Mbps (Limite: {max_out} Mbps)")
-                                
-                            if is_over:
-                                # Cooldown check (Dynamic per equipment, default 6h)
-                                last_alert = eq_data.get("last_traffic_alert_sent")
-                                interval_min = eq_data.get("traffic_alert_interval") or 360
-                                can_send = False
-                                
-                                if not last_alert:
-                                    can_send = True
-                                else:
-                                    # Ensure last_alert is naive for comparison with datetime.now()
-                                    if last_alert.tzinfo:
-                                        last_alert = last_alert.replace(tzinfo=None)
-                                    
-                                    if (datetime.now() - last_alert).total_seconds() > (interval_min * 60):
-                                        can_send = True
-                                
-                                if can_send:
-                                    template = notif_config.get('telegram_template_traffic')
-                                    if template:
-                                        alert_msg = template.replace("[Device.Name]", eq_data['name']).replace("[Device.IP]", eq_data['ip']).replace("[Alert.Lines]", "\n".join(alert_lines))
-                                    else:
-                                        alert_msg = f"🚨 *TRÁFEGO INTENSO DETECTADO*\n\n📟 *{eq_data['name']}*\n🌐 IP: {eq_data['ip']}\n\n" + "\n".join(alert_lines) + "\n\n🔔 Verifique a carga do link."
-                                    
-                                    # Enviar notificação (background task para não travar loop)
-                                    asyncio.create_task(send_notification(
-                                        message=alert_msg,
-                                        telegram_token=notif_config.get('telegram_token'),
-                                        telegram_chat_id=notif_config.get('telegram_chat_id'),
-                                        telegram_enabled=notif_config.get('telegram_enabled', 'true').lower() == 'true',
-                                        whatsapp_enabled=notif_config.get('whatsapp_enabled', 'false').lower() == 'true',
-                                        whatsapp_target=notif_config.get('whatsapp_target'),
-                                        whatsapp_target_group=notif_config.get('whatsapp_target_group')
-                                    ))
-                                    
-                                    # Atualizar no DB via buffer
-                                    upd_data["last_traffic_alert_sent"] = datetime.now()
-
-                        # ✅ ALERTAS DE VOLTAGEM
-                        cv = res["updates"].get("voltage")
-                        threshold = eq_data.get("min_voltage_threshold")
-                        
-                        if cv is not None and threshold is not None and cv <= threshold:
-                            # Cooldown check
-                            last_alert_v = eq_data.get("last_voltage_alert_sent")
-                            interval_v = eq_data.get("voltage_alert_interval") or 360
-                            can_send_v = False
-                            
-                            if not last_alert_v:
-                                can_send_v = True
-                            else:
-                                if last_alert_v.tzinfo:
-                                    last_alert_v = last_alert_v.replace(tzinfo=None)
-                                if (datetime.now() - last_alert_v).total_seconds() > (interval_v * 60):
-                                    can_send_v = True
-                                    
-                            if can_send_v:
-                                now_str = datetime.now().strftime("%H:%M do dia %d/%m/%Y")
-                                alert_msg = f"🪫 *ALERTA DE BAIXA VOLTAGEM*\n\n📍 *{eq_data['tower_name']}*\n📟 Rádio: {eq_data['name']}\n🌐 IP: {eq_data['ip']}\n\n⚠️ Voltagem Atual: *{cv}V*\n🛑 Limite Crítico: {threshold}V\n\n🕒 Horário: {now_str}\n\n🔔 *Ação Preventiva Necessária!*"
-                                
-                                logger.info(f"[ALERT] Enviando alerta de VOLTAGEM para {eq_data['ip']} ({cv}V <= {threshold}V)")
-                                
-                                asyncio.create_task(send_notification(
-                                    message=alert_msg,
-                                    telegram_token=notif_config.get('telegram_token'),
-                                    telegram_chat_id=notif_config.get('telegram_chat_id'),
-                                    telegram_enabled=notif_config.get('telegram_enabled', 'true').lower() == 'true',
-                                    whatsapp_enabled=notif_config.get('whatsapp_enabled', 'false').lower() == 'true',
-                                    whatsapp_target=notif_config.get('whatsapp_target'),
-                                    whatsapp_target_group=notif_config.get('whatsapp_target_group')
-                                ))
-                                
-                                # Atualizar no DB via buffer
-                                upd_data["last_voltage_alert_sent"] = datetime.now()
-                        
-                        elif cv is not None and threshold is not None and cv > threshold:
-                            # ✅ RECOVERY: Se a voltagem normalizou, avisa e reseta o timer
-                            last_alert_v = eq_data.get("last_voltage_alert_sent")
-                            if last_alert_v:
-                                # Send Recovery Notification
-                                now_str = datetime.now().strftime("%H:%M")
-                                recovery_msg = f"⚡ *VOLTAGEM NORMALIZADA* ⚡\n\n📍 *{eq_data['tower_name']}*\n📟 {eq_data['name']}\n🌐 IP: {eq_data['ip']}\n\n✅ Voltagem Atual: *{cv}V* (Ok)\n\n🕒 {now_str}"
-                                
-                                asyncio.create_task(send_notification(
-                                    message=recovery_msg,
-                                    telegram_token=notif_config.get('telegram_token'),
-                                    telegram_chat_id=notif_config.get('telegram_chat_id'),
-                                    telegram_enabled=notif_config.get('telegram_enabled', 'true').lower() == 'true',
-                                    whatsapp_enabled=notif_config.get('whatsapp_enabled', 'false').lower() == 'true',
-                                    whatsapp_target=notif_config.get('whatsapp_target'),
-                                    whatsapp_target_group=notif_config.get('whatsapp_target_group')
-                                ))
-                                
-                                # Reset alert timer so next drop triggers immediately
-                                upd_data["last_voltage_alert_sent"] = None
+                # ✅ ALERTAS (tráfego e voltagem): uma passada pelo ciclo inteiro, indexada por id
+                eq_by_id = {e["id"]: e for e in equipments_data}
+                for ev in alert_rules.evaluate(cycle_values, eq_by_id):
+                    eq_data = eq_by_id[ev["equipment_id"]]
+                    if ev["kind"] == "voltage" and not ev["recovery"]:
+                        _, cv, threshold = ev["breaches"][0]
+                        logger.info(f"[ALERT] Enviando alerta de VOLTAGEM para {eq_data['ip']} ({cv}V <= {threshold}V)")
+
+                    # Enviar notificação (background task para não travar loop)
+                    asyncio.create_task(send_notification(
+                        message=format_alert(ev, eq_data, notif_config),
+                        telegram_token=notif_config.get('telegram_token'),
+                        telegram_chat_id=notif_config.get('telegram_chat_id'),
+                        telegram_enabled=notif_config.get('telegram_enabled', 'true').lower() == 'true',
+                        whatsapp_enabled=notif_config.get('whatsapp_enabled', 'false').lower() == 'true',
+                        whatsapp_target=notif_config.get('whatsapp_target'),
+                        whatsapp_target_group=notif_config.get('whatsapp_target_group')
+                    ))
+
+                    # Atualizar no DB via buffer (envio = agora; recuperação zera o timer)
+                    upd_by_id[ev["equipment_id"]][ev["column"]] = ev["value"]
+
+                # Tráfego e estado dos alertas já valendo no registro (próximo ciclo e outros jobs)
+                for eq_id, upd_data in upd_by_id.items():
+                    live = {k: upd_data[k] for k in LIVE_FIELDS if k in upd_data}
+                    if live:
+                        device_registry.update(eq_id, **live)
                 
                 # Execute Batch Operations
-                if updates_buffer:
-                    await session.execute(update(Equipment), updates_buffer)
-                    updates_count = len(updates_buffer)
+                try:
+                    if updates_buffer:
+                        await session.execute(update(Equipment), updates_buffer)
+                        updates_count = len(updates_buffer)
+                        
+                    if traffic_logs_buffer:
+                        await session.execute(insert(TrafficLog), traffic_logs_buffer)
                     
-                if traffic_logs_buffer:
-                    await session.execute(insert(TrafficLog), traffic_logs_buffer)
-                
-                if signal_logs_buffer:
-                    await session.execute(insert(SignalLog), signal_logs_buffer)
-                
-                # --- UPDATE HEARTBEAT FOR HEALTH CHECK ---
-                from sqlalchemy import text
-                await session.execute(text("""
-                    INSERT INTO parameters (key, value) 
-                    VALUES ('snmp_monitor_last_run', :now) 
-                    ON CONFLICT (key) DO UPDATE SET value = :now
-                """), {"now": datetime.now().isoformat()})
-
-                await session.commit()
+                    if signal_logs_buffer:
+                        await session.execute(insert(SignalLog), signal_logs_buffer)
+                    
+                    # --- UPDATE HEARTBEAT FOR HEALTH CHECK ---
+                    from sqlalchemy import text
+                    await session.execute(text("""
+                        INSERT INTO parameters (key, value) 
+                        VALUES ('snmp_monitor_last_run', :now) 
+                        ON CONFLICT (key) DO UPDATE SET value = :now
+                    """), {"now": datetime.now().isoformat()})
+
+                    await session.commit()
+                except Exception:
+                    # 💾 Banco fora/lento: o histórico do ciclo vai para o spool e é reaplicado depois.
+                    # O estado atual (updates_buffer) não é guardado: o próximo ciclo o sobrescreve.
+                    spool_rows("snmp", "traffic_logs", TRAFFIC_SPOOL_COLUMNS,
+                               [[r.get(c) for c in TRAFFIC_SPOOL_COLUMNS] for r in traffic_logs_buffer])
+                    spool_rows("snmp", "signal_logs", SIGNAL_SPOOL_COLUMNS,
+                               [[r.get(c) for c in SIGNAL_SPOOL_COLUMNS] for r in signal_logs_buffer])
+                    logger.warning(f"[SNMP] 💾 Falha ao gravar o ciclo: {len(traffic_logs_buffer)} traffic logs e {len(signal_logs_buffer)} signal logs enviados ao spool.")
+                    raise
                 if updates_count > 0:
                     logger.info(f"[SNMP] Updated {updates_count} devices, {len(traffic_logs_buffer)} traffic logs, {len(signal_logs_buffer)} signal logs.")
 
@@ -532,6 +634,9 @@ async def snmp_monitor_job():
                 for k in keys_to_remove:
                     del snmp_last_logged[k]
                 
+                for k in [k for k in stream_last_logged if k[0] not in active_ids]:
+                    del stream_last_logged[k]
+
                 # Cleanup 1.1: Signal Cache
                 sig_keys_to_remove = [k for k in signal_last_logged.keys() if k not in active_ids]
                 for k in sig_keys_to_remove:
@@ -543,20 +648,19 @@ async def snmp_monitor_job():
                 for k in cnt_keys_to_remove:
                     del previous_counters[k]
 
+                # Cleanup 3: Agenda por classe e últimos valores
+                poll_schedule.forget(active_ids)
+
         except Exception as e:
             logger.error(f"[SNMP] Batch update error: {e}")
+
+        await save_warm_state_if_due(previous_counters)
+        await oid_strategies.save_if_due()
+        await snmp_profiles.save_if_due()
+        await snmp_breakers.publish_if_due()
         
-        # Read interval from database (with fallback)
-        try:
-            async with AsyncSessionLocal() as session:
-                from backend.app.models import Parameters
-                res = await session.execute(select(Parameters).where(Parameters.key == "snmp_interval"))
-                param = res.scalar_one_or_none()
-                interval = int(param.value) if param else SNMP_INTERVAL
-        except:
-            interval = SNMP_INTERVAL
-        
-        await asyncio.sleep(interval)
+        # Tick = menor período por classe (tráfego = snmp_interval, lido do banco no início do ciclo)
+        await asyncio.sleep(poll_schedule.tick)
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,126 @@
+"""
+Versão SNMP e comunidade que funcionam, memorizadas por equipamento.
+
+Sem isso, _snmp_get/_snmp_next sempre tentam v2c e depois v1: num rádio só-v1
+cada requisição espera o timeout inteiro do v2c antes da tentativa que
+funciona. Aqui a combinação (comunidade, versão) que respondeu fica guardada por
+ip:porta e as requisições vão direto nela. O ponto de partida é v2c e depois
+v1, e o que responder fica; Equipment.snmp_version só semeia o perfil quando é
+v2c (1 é o default da coluna: não dá para distinguir de "v1 de propósito", e um
+rádio v2c que também responde v1 ficaria sem contadores HC até a revalidação).
+
+A cada REVALIDATE_INTERVAL uma requisição refaz a descoberta com v2c na frente
+(firmware novo pode ter ganho v2c) e 'public' como comunidade alternativa.
+
+O collector persiste os perfis em data/state; a API usa só a memória.
+"""
+import asyncio
+import copy
+import time
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+
+from backend.app.utils.state_files import atomic_write_json, load_json
+
+PROFILE_FILE = "snmp_profiles.json"
+REVALIDATE_INTERVAL = 3600
+SAVE_INTERVAL = 60.0
+STALE_AFTER = 7 * 86400
+V1, V2C = 0, 1  # mpModel do pysnmp
+VERSION_NAMES = {V1: "v1", V2C: "v2c"}
+
+
+class SnmpProfiles:
+    def __init__(self):
+        # "ip:porta" -> {"configured": comunidade do cadastro, "community": a que respondeu,
+        #                "mp_model": 0|1, "validated_at": ts, "source": "model"|"learned"}
+        self.profiles: Dict[str, dict] = {}
+        self.persistent = False
+        self._dirty = False
+        self._saved_at = 0.0
+
+    @staticmethod
+    def key(ip: str, port: int) -> str:
+        return f"{ip}:{port or 161}"
+
+    def load(self):
+        """Collector: recupera os perfis aprendidos e passa a persistir."""
+        data = load_json(PROFILE_FILE, {}) or {}
+        # Perfis "model" v1 de versões anteriores vinham do default da coluna: refaz a descoberta
+        self.profiles = {k: p for k, p in data.get("profiles", {}).items()
+                         if not (p.get("source") == "model" and p.get("mp_model") == V1)}
+        self.persistent = True
+        if self.profiles:
+            logger.info(f"[SNMP] Perfis de versão/comunidade carregados para {len(self.profiles)} equipamentos")
+
+    def seed(self, ip: str, port: int, community: str, snmp_version: Optional[int]):
+        """Cadastro v2c como ponto de partida: vale até a primeira revalidação (v1/default: descoberta v2c -> v1)."""
+        key = self.key(ip, port)
+        p = self.profiles.get(key)
+        if p is not None and p["configured"] == community:
+            return
+        if snmp_version != 2:
+            return
+        self.profiles[key] = {"configured": community, "community": community,
+                              "mp_model": V2C,
+                              "validated_at": time.time(), "source": "model"}
+        self._dirty = True
+
+    def current(self, ip: str, port: int, community: str) -> Optional[Tuple[str, int]]:
+        """(comunidade, mpModel) memorizados para a comunidade do cadastro, ou None."""
+        p = self.profiles.get(self.key(ip, port))
+        if p is None or p["configured"] != community:
+            return None
+        return p["community"], p["mp_model"]
+
+    def attempts(self, ip: str, port: int, community: str) -> Tuple[List[Tuple[str, int]], bool]:
+        """
+        Ordem das tentativas (comunidade, mpModel) e se esta é uma rodada de
+        descoberta. Com perfil válido: o memorizado e, se ele não responder, a
+        outra versão (o mesmo custo de antes no pior caso).
+        """
+        p = self.profiles.get(self.key(ip, port))
+        if p is not None and p["configured"] == community and time.time() - p["validated_at"] < REVALIDATE_INTERVAL:
+            return [(p["community"], p["mp_model"]), (p["community"], 1 - p["mp_model"])], False
+        if p is None or p["configured"] != community:
+            return [(community, V2C), (community, V1)], True  # Primeiro contato: v2c na frente, como antes
+        # Revalidação: v2c na frente e 'public' por último (comunidade trocada no equipamento)
+        communities = [community] + (['public'] if community != 'public' else [])
+        return [(c, v) for c in communities for v in (V2C, V1)], True
+
+    def confirm(self, ip: str, port: int, configured: str, community: str, mp_model: int):
+        key = self.key(ip, port)
+        old = self.profiles.get(key)
+        if old is None or old["community"] != community or old["mp_model"] != mp_model:
+            self._dirty = True
+            before = f"{VERSION_NAMES[old['mp_model']]}" if old else "?"
+            extra = f" (comunidade '{community}')" if community != configured else ""
+            logger.info(f"[SNMP] {key}: {before} -> {VERSION_NAMES[mp_model]}{extra}")
+        self.profiles[key] = {"configured": configured, "community": community, "mp_model": mp_model,
+                              "validated_at": time.time(), "source": "learned"}
+
+    def postpone(self, ip: str, port: int, community: str):
+        """Descoberta sem resposta (equipamento fora): mantém o perfil e só tenta de novo no próximo intervalo."""
+        p = self.profiles.get(self.key(ip, port))
+        if p is not None and p["configured"] == community:
+            p["validated_at"] = time.time()
+
+    async def save_if_due(self, force: bool = False):
+        if not self.persistent or not (self._dirty or force):
+            return
+        now = time.time()
+        if not force and now - self._saved_at < SAVE_INTERVAL:
+            return
+        for key in [k for k, p in self.profiles.items() if now - p["validated_at"] > STALE_AFTER]:
+            del self.profiles[key]
+        self._dirty = False
+        self._saved_at = now
+        try:
+            data = {"saved_at": now, "profiles": copy.deepcopy(self.profiles)}
+            await asyncio.to_thread(atomic_write_json, PROFILE_FILE, data)
+        except Exception as e:
+            self._dirty = True
+            logger.warning(f"[SNMP] Falha ao salvar perfis SNMP: {e}")
+
+
+snmp_profiles = SnmpProfiles()
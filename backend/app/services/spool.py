@@ -0,0 +1,407 @@
+"""
+Spool em disco para quando o PostgreSQL está lento ou fora do ar.
+
+Arquivos de segmento pré-alocados e mapeados em memória (mmap), append-only.
+Cada registro é [len:u32][crc32:u32][payload JSON]; um `len` zerado marca o fim
+dos dados do segmento. Um cursor (segmento, offset) persistido em arquivo diz
+até onde o conteúdo já foi reaplicado no banco, então o que sobrar após uma
+queda do collector é reaplicado na próxima subida (entrega "pelo menos uma vez").
+
+O uso de disco é limitado: acima de `max_bytes` os segmentos mais antigos são
+descartados (e contabilizados). O replay roda no collector (spool_replayer) e
+insere os registros em lote assim que o banco volta. Erro de conexão segura o
+lote para a próxima tentativa; erro de dados (coluna removida, constraint) faz o
+lote ser refeito registro a registro, e o registro recusado vai para o
+dead-letter (DEAD_LETTER_FILE no diretório do spool) em vez de travar a fila.
+
+Formato do payload: {"table": <tabela>, "columns": [...], "rows": [[...], ...]}
+"""
+import asyncio
+import json
+import mmap
+import os
+import struct
+import zlib
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+from sqlalchemy import DateTime, insert, select
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from backend.app.utils.state_files import STATE_DIR
+from backend.app.services.perf_metrics import perf_metrics
+
+SPOOL_ROOT = os.path.join(os.path.dirname(STATE_DIR), "spool")
+SEGMENT_SIZE = 8 * 1024 * 1024      # 8 MB por segmento
+MAX_SPOOL_BYTES = 512 * 1024 * 1024 # Teto de disco por spool
+REPLAY_BATCH = 200                  # Registros (lotes) por transação de replay
+REPLAY_INTERVAL = 5                 # Segundos entre tentativas de replay
+REPLAY_BACKOFF = 30                 # Espera após falha (banco ainda fora)
+DEAD_LETTER_FILE = "dead-letter.jsonl"
+DEAD_LETTER_MAX_BYTES = 64 * 1024 * 1024
+
+_HEADER = struct.Struct("<II")
+
+
+class Spool:
+    def __init__(self, name: str, segment_size: int = SEGMENT_SIZE, max_bytes: int = MAX_SPOOL_BYTES):
+        self.name = name
+        self.dir = os.path.join(SPOOL_ROOT, name)
+        self.segment_size = segment_size
+        self.max_bytes = max(max_bytes, 2 * segment_size)
+        os.makedirs(self.dir, exist_ok=True)
+
+        self.appended = 0
+        self.replayed = 0
+        self.dropped_records = 0
+        self.dropped_segments = 0
+        self.corrupt_records = 0
+        self.dead_records = 0
+
+        self._segments: List[int] = sorted(
+            int(f[4:-4]) for f in os.listdir(self.dir) if f.startswith("seg-") and f.endswith(".log")
+        )
+        self._cursor: Tuple[int, int] = self._load_cursor()
+        self._active_seq: Optional[int] = None
+        self._active_file = None
+        self._active_mm: Optional[mmap.mmap] = None
+        self._write_pos = 0
+
+        if self._segments:
+            # Reabre o último segmento e acha o fim dos dados válidos (escrita rasgada é descartada)
+            self._open_active(self._segments[-1], create=False)
+            self._write_pos = self._scan_end(self._active_mm)
+        if self._cursor[0] not in self._segments:
+            self._cursor = (self._segments[0], 0) if self._segments else (0, 0)
+        if self.has_pending():
+            logger.warning(f"[SPOOL] 💾 '{name}': {self.pending_bytes() // 1024} KB pendentes de uma execução anterior serão reaplicados.")
+
+    # --- Arquivos ---
+    def _path(self, seq: int) -> str:
+        return os.path.join(self.dir, f"seg-{seq:012d}.log")
+
+    def _load_cursor(self) -> Tuple[int, int]:
+        try:
+            with open(os.path.join(self.dir, "cursor"), "r") as f:
+                data = json.load(f)
+            return int(data["segment"]), int(data["offset"])
+        except (OSError, ValueError, KeyError):
+            return (0, 0)
+
+    def _save_cursor(self):
+        tmp = os.path.join(self.dir, "cursor.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"segment": self._cursor[0], "offset": self._cursor[1]}, f)
+        os.replace(tmp, os.path.join(self.dir, "cursor"))
+
+    def _open_active(self, seq: int, create: bool):
+        path = self._path(seq)
+        f = open(path, "w+b" if create else "r+b")
+        if create:
+            f.truncate(self.segment_size)
+        self._active_file = f
+        self._active_mm = mmap.mmap(f.fileno(), 0)
+        self._active_seq = seq
+
+    def _close_active(self):
+        if self._active_mm is not None:
+            self._active_mm.flush()
+            self._active_mm.close()
+            self._active_file.close()
+        self._active_mm = None
+        self._active_file = None
+
+    def _iter_records(self, mm, start: int, end: int):
+        """Gera (offset_do_próximo, payload) a partir de `start` até um len zerado/fim/CRC inválido."""
+        pos = start
+        while pos + _HEADER.size <= end:
+            length, crc = _HEADER.unpack_from(mm, pos)
+            if length == 0:
+                return
+            body_start = pos + _HEADER.size
+            if body_start + length > end:
+                return
+            payload = mm[body_start:body_start + length]
+            if zlib.crc32(payload) != crc:
+                self.corrupt_records += 1
+                return
+            pos = body_start + length
+            yield pos, payload
+
+    def _scan_end(self, mm) -> int:
+        pos = 0
+        for pos, _ in self._iter_records(mm, 0, len(mm)):
+            pass
+        return pos
+
+    def _roll(self):
+        self._close_active()
+        seq = (self._segments[-1] + 1) if self._segments else 1
+        self._open_active(seq, create=True)
+        self._segments.append(seq)
+        self._write_pos = 0
+        if self._cursor == (0, 0):
+            self._cursor = (seq, 0)
+        self._enforce_limit()
+
+    def _enforce_limit(self):
+        while len(self._segments) * self.segment_size > self.max_bytes and len(self._segments) > 1:
+            oldest = self._segments.pop(0)
+            if self._cursor[0] <= oldest:
+                # Ainda não reaplicado: perda contabilizada
+                self.dropped_segments += 1
+                perf_metrics.inc(f"spool_{self.name}_dropped_segments")
+                logger.error(f"[SPOOL] ⚠️ '{self.name}' atingiu {self.max_bytes // (1024 * 1024)} MB: descartando segmento {oldest} não reaplicado.")
+                self._cursor = (self._segments[0], 0)
+                self._save_cursor()
+            try:
+                os.remove(self._path(oldest))
+            except OSError:
+                pass
+
+    # --- Escrita ---
+    def append(self, record: Dict) -> bool:
+        payload = json.dumps(record, separators=(",", ":"), default=str).encode()
+        need = _HEADER.size + len(payload)
+        if need + _HEADER.size > self.segment_size:
+            self.dropped_records += 1
+            perf_metrics.inc(f"spool_{self.name}_dropped_records")
+            logger.error(f"[SPOOL] Registro de {len(payload)} bytes maior que o segmento; descartado.")
+            return False
+        try:
+            if self._active_mm is None or self._write_pos + need + _HEADER.size > self.segment_size:
+                self._roll()
+            mm = self._active_mm
+            # Corpo primeiro, cabeçalho por último: um crash no meio deixa len=0 (fim)
+            mm[self._write_pos + _HEADER.size:self._write_pos + need] = payload
+            _HEADER.pack_into(mm, self._write_pos, len(payload), zlib.crc32(payload))
+            self._write_pos += need
+        except OSError as e:
+            self.dropped_records += 1
+            perf_metrics.inc(f"spool_{self.name}_dropped_records")
+            logger.error(f"[SPOOL] Falha ao gravar no spool '{self.name}': {e}")
+            return False
+        self.appended += 1
+        perf_metrics.inc(f"spool_{self.name}_appended")
+        return True
+
+    # --- Leitura / Replay ---
+    def has_pending(self) -> bool:
+        if self._active_seq is None:
+            return False
+        return self._cursor < (self._active_seq, self._write_pos)
+
+    def pending_bytes(self) -> int:
+        if not self.has_pending():
+            return 0
+        seg, off = self._cursor
+        full = sum(1 for s in self._segments if seg < s < self._active_seq)
+        if seg == self._active_seq:
+            return self._write_pos - off
+        return (self.segment_size - off) + full * self.segment_size + self._write_pos
+
+    def read_batch(self, max_records: int = REPLAY_BATCH) -> Tuple[List[Tuple[Tuple[int, int], Dict]], Tuple[int, int]]:
+        """
+        Lê até `max_records` a partir do cursor: ([(posição após o registro, registro)], token).
+        O cursor só avança em commit(token).
+        """
+        records: List[Tuple[Tuple[int, int], Dict]] = []
+        seg, off = self._cursor
+        token = (seg, off)
+        for s in [s for s in self._segments if s >= seg]:
+            start = off if s == seg else 0
+            if s == self._active_seq:
+                mm, end, temp = self._active_mm, self._write_pos, None
+            else:
+                temp = open(self._path(s), "rb")
+                mm = mmap.mmap(temp.fileno(), 0, access=mmap.ACCESS_READ)
+                end = len(mm)
+            try:
+                for pos, payload in self._iter_records(mm, start, end):
+                    token = (s, pos)
+                    try:
+                        records.append((token, json.loads(payload)))
+                    except ValueError:
+                        self.corrupt_records += 1
+                    if len(records) >= max_records:
+                        return records, token
+            finally:
+                if temp is not None:
+                    mm.close()
+                    temp.close()
+            if s != self._active_seq:
+                # Segmento antigo consumido até o fim: o próximo começa do zero
+                nxt = [x for x in self._segments if x > s]
+                if nxt:
+                    token = (nxt[0], 0)
+        return records, token
+
+    def commit(self, token: Tuple[int, int], count: int):
+        self._cursor = token
+        self._save_cursor()
+        self.replayed += count
+        perf_metrics.inc(f"spool_{self.name}_replayed", count)
+        for s in [s for s in self._segments if s < token[0]]:
+            self._segments.remove(s)
+            try:
+                os.remove(self._path(s))
+            except OSError:
+                pass
+
+    def dead_letter(self, record: Dict, error: Exception):
+        """Registro que o banco recusou: guarda para inspeção manual e segue a fila."""
+        self.dead_records += 1
+        perf_metrics.inc(f"spool_{self.name}_dead_records")
+        path = os.path.join(self.dir, DEAD_LETTER_FILE)
+        try:
+            if os.path.exists(path) and os.path.getsize(path) >= DEAD_LETTER_MAX_BYTES:
+                return
+            line = json.dumps({"at": datetime.now().isoformat(), "error": str(error)[:500], "record": record},
+                              separators=(",", ":"), default=str)
+            with open(path, "a") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            logger.error(f"[SPOOL] Falha ao gravar dead-letter de '{self.name}': {e}")
+
+    def stats(self) -> Dict:
+        return {
+            "segments": len(self._segments),
+            "pending_bytes": self.pending_bytes(),
+            "appended": self.appended,
+            "replayed": self.replayed,
+            "dropped_records": self.dropped_records,
+            "dropped_segments": self.dropped_segments,
+            "corrupt_records": self.corrupt_records,
+            "dead_records": self.dead_records,
+        }
+
+    def close(self):
+        self._close_active()
+
+
+# --- Registro de spools do processo ---
+_spools: Dict[str, Spool] = {}
+
+
+def get_spool(name: str) -> Spool:
+    sp = _spools.get(name)
+    if sp is None:
+        sp = _spools[name] = Spool(name)
+        perf_metrics.gauge_fn(f"spool_{name}_pending_bytes", sp.pending_bytes)
+        perf_metrics.gauge_fn(f"spool_{name}_segments", lambda: len(sp._segments))
+    return sp
+
+
+def spool_rows(spool_name: str, table: str, columns: List[str], rows: List[list]) -> bool:
+    """Atalho dos writers: grava um lote de linhas de `table` no spool."""
+    if not rows:
+        return True
+    return get_spool(spool_name).append({"table": table, "columns": columns, "rows": rows})
+
+
+def _replay_models():
+    from backend.app.models import LatencyHistory, Alert, TrafficLog, SignalLog
+    return {m.__tablename__: m for m in (LatencyHistory, Alert, TrafficLog, SignalLog)}
+
+
+async def _replay(session, records: List[Dict]):
+    from backend.app.models import Equipment
+    models = _replay_models()
+    by_table: Dict[str, List[Dict]] = {}
+    for rec in records:
+        model = models.get(rec.get("table"))
+        if model is None:
+            continue
+        cols = rec["columns"]
+        date_cols = {c for c in cols if c in model.__table__.c and isinstance(model.__table__.c[c].type, DateTime)}
+        for row in rec["rows"]:
+            item = dict(zip(cols, row))
+            for c in date_cols:
+                if isinstance(item.get(c), str):
+                    item[c] = datetime.fromisoformat(item[c])
+            by_table.setdefault(rec["table"], []).append(item)
+
+    # Equipamentos removidos durante a queda não podem quebrar o lote (FK)
+    eq_ids = {r["equipment_id"] for rows in by_table.values() for r in rows if r.get("equipment_id") is not None}
+    existing = set()
+    if eq_ids:
+        res = await session.execute(select(Equipment.id).where(Equipment.id.in_(eq_ids)))
+        existing = {row[0] for row in res.all()}
+
+    for table, rows in by_table.items():
+        if "equipment_id" in models[table].__table__.c:
+            rows = [r for r in rows if r.get("equipment_id") is None or r["equipment_id"] in existing]
+        # Registros gravados antes de uma coluna nova existir: completa com NULL (o executemany exige as mesmas chaves)
+        keys = set().union(*rows) if rows else set()
+        for r in rows:
+            for k in keys - r.keys():
+                r[k] = None
+        if rows:
+            await session.execute(insert(models[table]), rows)
+
+
+def _is_connection_error(e: Exception) -> bool:
+    """Banco fora ou conexão caída (o lote volta depois) x registro que o banco recusa (nunca vai entrar)."""
+    if isinstance(e, (OperationalError, InterfaceError, OSError)):
+        return True
+    return isinstance(e, DBAPIError) and e.connection_invalidated
+
+
+async def _replay_batch(sp: Spool, session_factory, entries: List[Tuple[Tuple[int, int], Dict]], token: Tuple[int, int]):
+    """Um lote numa transação; erro de dados refaz registro a registro e manda o recusado para o dead-letter."""
+    try:
+        if entries:
+            async with session_factory() as session:
+                await _replay(session, [rec for _, rec in entries])
+                await session.commit()
+        sp.commit(token, len(entries))
+        return
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        if _is_connection_error(e):
+            raise
+        logger.warning(f"[SPOOL] Lote de '{sp.name}' recusado pelo banco ({e}); reaplicando registro a registro.")
+
+    for pos, rec in entries:
+        try:
+            async with session_factory() as session:
+                await _replay(session, [rec])
+                await session.commit()
+            sp.commit(pos, 1)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if _is_connection_error(e):
+                raise  # O cursor já está no último registro aplicado: retoma dali
+            logger.error(f"[SPOOL] Registro de '{sp.name}' (tabela {rec.get('table')}, {len(rec.get('rows') or [])} linhas) "
+                         f"descartado para o dead-letter: {e}")
+            sp.dead_letter(rec, e)
+            sp.commit(pos, 0)
+    sp.commit(token, 0)  # Registros ilegíveis / fim de segmento depois do último registro
+
+
+async def spool_replayer():
+    """Task do collector: reaplica os spools no banco assim que ele aceitar escritas."""
+    from backend.app.database import AsyncSessionLocal
+    logger.info("[SPOOL] 💾 Replay de spool iniciado")
+    for name in (os.listdir(SPOOL_ROOT) if os.path.isdir(SPOOL_ROOT) else []):
+        if os.path.isdir(os.path.join(SPOOL_ROOT, name)):
+            get_spool(name) # Recupera spools pendentes de execuções anteriores
+    while True:
+        wait = REPLAY_INTERVAL
+        for sp in list(_spools.values()):
+            try:
+                while sp.has_pending():
+                    entries, token = sp.read_batch()
+                    if not entries and token == sp._cursor:
+                        break
+                    await _replay_batch(sp, AsyncSessionLocal, entries, token)
+                    if not sp.has_pending():
+                        logger.info(f"[SPOOL] ✅ Spool '{sp.name}' reaplicado por completo ({sp.replayed} lotes no total).")
+                    await asyncio.sleep(0) # Não monopoliza o loop em spools grandes
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[SPOOL] Replay de '{sp.name}' adiado (banco indisponível?): {e}")
+                wait = REPLAY_BACKOFF
+        await asyncio.sleep(wait)
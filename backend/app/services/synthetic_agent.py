@@ -6,6 +6,7 @@ from sqlalchemy import select, func, delete
 from backend.app.database import AsyncSessionLocal
 from backend.app.models import SyntheticLog, Baseline, PingLog, MonitorTarget, Parameters
 from backend.app.services.telegram import send_telegram_alert
+from backend.app.services.dns_cache import dns_cache
 
 # --- CONFIG ---
 # Default fallback configs if not in DB
@@ -84,15 +85,20 @@ async def check_ping(target: str) -> dict:
     try:
         # Strip protocol if present for ping
         host = target.replace("https://", "").replace("http://", "").split("/")[0]
+        # Cache DNS compartilhado com o Pinger (TTL + cache negativo): não resolve a cada chamada
+        address = await dns_cache.resolve(host)
+        if address is None:
+            return {"success": False, "latency": None}
         # Prefer privileged=True for better accuracy as seen in pinger_fast.py
         try:
-            result = await async_ping(host, count=2, timeout=2, privileged=True)
+            result = await async_ping(address, count=2, timeout=2, privileged=True)
         except Exception:
             # Fallback for environments where raw sockets are not allowed
-            result = await async_ping(host, count=2, timeout=2, privileged=False)
+            result = await async_ping(address, count=2, timeout=2, privileged=False)
         
         if result.is_alive:
-            return {"success": True, "latency": round(result.avg_rtt)}
+            # jitter do icmplib: média das diferenças entre RTTs consecutivos (0 com uma resposta só)
+            return {"success": True, "latency": round(result.avg_rtt), "jitter": round(result.jitter)}
         else:
              return {"success": False, "latency": None}
     except Exception as e:
@@ -243,6 +249,7 @@ async def run_priority_test_cycle():
                     test_type=t.type,
                     target=t.target,
                     latency_ms=res.get("latency"),
+                    jitter_ms=res.get("jitter"),
                     success=res.get("success", False),
                     timestamp=datetime.utcnow()
                 )
@@ -306,6 +313,7 @@ async def run_single_test_cycle():
                     test_type=t.type,
                     target=t.target,
                     latency_ms=round(res.get("latency")) if res.get("latency") else 0,
+                    jitter_ms=res.get("jitter"),
                     success=res.get("success"),
                     timestamp=datetime.utcnow()
                 )
@@ -411,6 +419,7 @@ async def synthetic_agent_job():
                         "type": t_type,
                         "target": t_target,
                         "latency": res.get("latency"),
+                        "jitter": res.get("jitter"),
                         "success": res.get("success")
                     })
                 
@@ -423,6 +432,7 @@ async def synthetic_agent_job():
                         test_type=r["type"],
                         target=r["target"],
                         latency_ms=round(r["latency"]) if r["latency"] else 0,
+                        jitter_ms=r.get("jitter"),
                         success=r["success"],
                         timestamp=datetime.utcnow() # Naive for Postgres
                     )
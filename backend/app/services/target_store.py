@@ -0,0 +1,242 @@
+"""
+Estado compacto dos alvos do Pinger.
+
+Cada alvo é um registro com __slots__ (sem __dict__ por instância) e recebe um
+índice denso estável enquanto existir; os índices liberados são reaproveitados.
+O registro só leva o que o caminho quente lê; o controle do write path (último
+status gravado e quando) fica em colunas `array` do store, indexadas pelo índice.
+Os resultados de ping trafegam em lotes (ResultBatch) com colunas `array`, um
+item na fila por chunk em vez de um dict por host.
+"""
+import struct
+from array import array
+from itertools import repeat
+from typing import Dict, Iterator, List, Optional, Tuple
+from backend.app.services.dns_cache import classify_target
+
+NAN = float("nan")
+_STATUS_CODE = {None: -1, False: 0, True: 1}
+_BATCH_HEADER = struct.Struct("<dII")  # timestamp, n, bytes dos ips
+
+
+class Target:
+    __slots__ = ("idx", "ip", "kind", "type", "id", "name", "status", "fail_count", "parent_id", "tower_id", "priority")
+
+    def __init__(self, idx: int, ip: str, type: str, id: int, name: str, status: Optional[bool],
+                 parent_id: Optional[int] = None, tower_id: Optional[int] = None, priority: bool = False):
+        self.idx = idx
+        self.ip = ip
+        self.kind = classify_target(ip)  # 'ip' | 'host' | None (inválido): validado uma vez, na carga
+        self.type = type
+        self.id = id
+        self.name = name
+        self.status = status
+        self.fail_count = 0
+        self.parent_id = parent_id
+        self.tower_id = tower_id
+        self.priority = priority
+
+    def __repr__(self):
+        return f"<Target {self.type}:{self.id} {self.ip} status={self.status} fails={self.fail_count}>"
+
+
+class TargetStore:
+    """IP -> Target, com índice type -> id -> ip e slots densos."""
+
+    def __init__(self):
+        self._by_ip: Dict[str, Target] = {}
+        self._by_key: Dict[str, Dict[int, str]] = {}  # Por tipo: sem uma tupla (type, id) por alvo
+        self._slots: List[Optional[Target]] = []
+        self._free: List[int] = []
+        # Último estado persistido no banco, por índice (escrita só em transição ou heartbeat)
+        self._saved_status = array("b")
+        self._saved_at = array("d")
+
+    def __len__(self):
+        return len(self._by_ip)
+
+    def __contains__(self, ip: str) -> bool:
+        return ip in self._by_ip
+
+    def __iter__(self) -> Iterator[Target]:
+        return iter(self._by_ip.values())
+
+    def get(self, ip: str) -> Optional[Target]:
+        return self._by_ip.get(ip)
+
+    def at(self, idx: int) -> Optional[Target]:
+        return self._slots[idx] if 0 <= idx < len(self._slots) else None
+
+    def ips(self):
+        return self._by_ip.keys()
+
+    def ip_for(self, type: str, id: int) -> Optional[str]:
+        ids = self._by_key.get(type)
+        return ids.get(id) if ids is not None else None
+
+    def write_due(self, t: Target, ts: float, heartbeat: float) -> bool:
+        """Status mudou desde a última gravação, ou o heartbeat venceu."""
+        i = t.idx
+        return _STATUS_CODE[t.status] != self._saved_status[i] or ts - self._saved_at[i] >= heartbeat
+
+    def mark_saved(self, t: Target, ts: float):
+        """Chamado depois do commit: o que foi gravado vira a referência do próximo flush."""
+        if self._slots[t.idx] is t:  # Removido/substituído durante o flush: o índice já é de outro
+            self._saved_status[t.idx] = _STATUS_CODE[t.status]
+            self._saved_at[t.idx] = ts
+
+    def _alloc(self) -> int:
+        if self._free:
+            return self._free.pop()
+        self._slots.append(None)
+        self._saved_status.append(-1)
+        self._saved_at.append(0.0)
+        return len(self._slots) - 1
+
+    def _release(self, t: Target):
+        del self._by_ip[t.ip]
+        ids = self._by_key.get(t.type)
+        if ids is not None and ids.get(t.id) == t.ip:
+            del ids[t.id]
+        self._slots[t.idx] = None
+        self._free.append(t.idx)
+
+    def upsert(self, ip: str, type: str, id: int, name: str, status: Optional[bool],
+               parent_id: Optional[int] = None, tower_id: Optional[int] = None, priority: bool = False) -> Target:
+        """
+        Cria ou atualiza o alvo. Se o mesmo objeto (type, id) já está no IP, o status
+        e o fail_count em memória são preservados (são mais recentes que o banco).
+        """
+        ids = self._by_key.setdefault(type, {})
+        old_ip = ids.get(id)
+        if old_ip is not None and old_ip != ip:
+            self.remove(type, id)  # IP trocado: o histórico de falhas não migra
+
+        t = self._by_ip.get(ip)
+        if t is not None and (t.type != type or t.id != id):
+            # IP duplicado entre objetos: o último a ser carregado vence (comportamento antigo)
+            self._release(t)
+            t = None
+        if t is None:
+            t = Target(self._alloc(), ip, type, id, name, status, parent_id, tower_id, priority)
+            self._slots[t.idx] = t
+            self._saved_status[t.idx] = _STATUS_CODE[status]  # Veio do banco: já está gravado
+            self._saved_at[t.idx] = 0.0
+            self._by_ip[ip] = t
+        else:
+            t.name = name
+            t.parent_id = parent_id
+            t.tower_id = tower_id
+            t.priority = priority
+        ids[id] = ip
+        return t
+
+    def remove(self, type: str, id: int) -> Optional[Target]:
+        ip = self.ip_for(type, id)
+        if ip is None:
+            return None
+        t = self._by_ip.get(ip)
+        if t is not None and t.type == type and t.id == id:
+            self._release(t)
+            return t
+        del self._by_key[type][id]
+        return None
+
+    def retain(self, keys):
+        """Remove todos os alvos cujo (type, id) não está em `keys` (reconciliação completa)."""
+        for t in [t for t in self._by_ip.values() if (t.type, t.id) not in keys]:
+            self._release(t)
+        # Compacta a lista de slots quando o fim dela está vazio
+        while self._slots and self._slots[-1] is None:
+            self._slots.pop()
+        n = len(self._slots)
+        del self._saved_status[n:]
+        del self._saved_at[n:]
+        if self._free:
+            self._free = [i for i in self._free if i < n]
+
+
+class ResultBatch:
+    """Resultados de um chunk de ping em colunas (um item por chunk na results_queue)."""
+
+    __slots__ = ("ips", "online", "latency", "loss", "lateness", "_stats", "timestamp")
+
+    def __init__(self, timestamp: float):
+        self.ips: List[str] = []
+        self.online = array("B")
+        self.latency = array("d")
+        self.loss = array("d")
+        self.lateness = array("d")
+        # Estatísticas do vetor de RTT (avg, max, mdev, jitter em "d"; probes enviados em "B"),
+        # criadas só no primeiro append que as traz: lote sem estatística não paga 5 colunas
+        self._stats: Optional[Tuple[array, array, array, array, array]] = None
+        self.timestamp = timestamp
+
+    def append(self, ip: str, is_online: bool, latency: float, loss: float, lateness: float = 0.0,
+               stats: Optional[Tuple[float, float, float, float, int]] = None):
+        """`stats` = (avg, max, mdev, jitter, probes); sem ele a linha fica NaN/0 (NaN = sem dado)."""
+        self.ips.append(ip)
+        self.online.append(1 if is_online else 0)
+        self.latency.append(latency)
+        self.loss.append(loss)
+        self.lateness.append(lateness)
+        if stats is not None:
+            cols = self._stat_columns(len(self.ips) - 1)
+            avg, mx, mdev, jitter, probes = stats
+            cols[0].append(avg)
+            cols[1].append(mx)
+            cols[2].append(mdev)
+            cols[3].append(jitter)
+            cols[4].append(min(probes, 255))
+
+    def _stat_columns(self, n: int):
+        """Colunas de estatística com pelo menos n linhas (completa com NaN/0)."""
+        if self._stats is None:
+            self._stats = (array("d"), array("d"), array("d"), array("d"), array("B"))
+        missing = n - len(self._stats[4])
+        if missing > 0:
+            fill = array("d", [NAN]) * missing
+            for col in self._stats[:4]:
+                col.extend(fill)
+            self._stats[4].extend(bytes(missing))
+        return self._stats
+
+    def __len__(self):
+        return len(self.ips)
+
+    def rows(self):
+        """Itera (ip, is_online, latency, packet_loss)."""
+        return zip(self.ips, map(bool, self.online), self.latency, self.loss)
+
+    def stats(self):
+        """Itera (avg, max, mdev, jitter, probes), alinhado com rows()."""
+        if self._stats is None:
+            return repeat((NAN, NAN, NAN, NAN, 0), len(self.ips))
+        return zip(*self._stat_columns(len(self.ips)))
+
+    # --- Serialização compacta (shards do pinger -> processo escritor) ---
+    def pack(self) -> bytes:
+        n = len(self.ips)
+        avg, mx, mdev, jitter, probes = self._stat_columns(n)
+        ips = "\n".join(self.ips).encode()
+        parts = [_BATCH_HEADER.pack(self.timestamp, n, len(ips)), ips, self.online.tobytes(), probes.tobytes()]
+        parts.extend(col.tobytes() for col in (self.latency, self.loss, self.lateness, avg, mx, mdev, jitter))
+        return b"".join(parts)
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "ResultBatch":
+        ts, n, ips_len = _BATCH_HEADER.unpack_from(data)
+        batch = cls(ts)
+        avg, mx, mdev, jitter, probes = batch._stat_columns(0)
+        pos = _BATCH_HEADER.size
+        batch.ips = data[pos:pos + ips_len].decode().split("\n") if n else []
+        pos += ips_len
+        batch.online.frombytes(data[pos:pos + n])
+        pos += n
+        probes.frombytes(data[pos:pos + n])
+        pos += n
+        width = 8 * n
+        for col in (batch.latency, batch.loss, batch.lateness, avg, mx, mdev, jitter):
+            col.frombytes(data[pos:pos + width])
+            pos += width
+        return batch
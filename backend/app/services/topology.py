@@ -1,11 +1,11 @@
 import asyncio
 import networkx as nx
-from backend.app.models import Equipment, NetworkLink, Tower
+from backend.app.models import NetworkLink
 from backend.app.database import AsyncSessionLocal
 from sqlalchemy import select, delete
-from sqlalchemy.orm import selectinload
 from loguru import logger
 from backend.app.services.wireless_snmp import get_snmp_value, get_snmp_walk_first, detect_equipment_name, get_neighbors_data
+from backend.app.services.device_registry import device_registry
 import math
 
 class TopologyBuilder:
@@ -19,32 +19,34 @@ class TopologyBuilder:
         """
         logger.info("[TOPOLOGY] Iniciando descoberta de topologia...")
         try:
-            # 1. Carregar todos os equipamentos
-            result = await self.db.execute(select(Equipment).options(selectinload(Equipment.tower)))
-            equipments = result.scalars().all()
+            # 1. Carregar todos os equipamentos (snapshot do registro do collector, sem consulta própria)
+            if not await device_registry.ready(follow=False):
+                logger.warning("[TOPOLOGY] Registro de equipamentos indisponível.")
+                return
+            equipments = list(device_registry.all())
             
             if not equipments:
                 logger.warning("[TOPOLOGY] Nenhum equipamento para analisar.")
                 return
 
             # Map IP/MAC -> Equipment ID
-            eq_map = {e.ip: e for e in equipments if e.ip}
-            mac_map = {e.mac_address: e for e in equipments if e.mac_address} # Se tiver MAC cadastrado, ótimo
+            eq_map = {e["ip"]: e for e in equipments if e["ip"]}
+            mac_map = {e["mac_address"]: e for e in equipments if e["mac_address"]} # Se tiver MAC cadastrado, ótimo
 
             # 2. Descobrir vizinhos (Crawler)
             new_links = []
             
             for eq in equipments:
-                if not eq.ip or not eq.is_online:
+                if not eq["ip"] or not eq["is_online"]:
                     continue
                     
-                logger.debug(f"[TOPOLOGY] Analisando vizinhos de {eq.name} ({eq.ip})")
+                logger.debug(f"[TOPOLOGY] Analisando vizinhos de {eq['name']} ({eq['ip']})")
                 
                 # Tentar extrair vizinhos via SNMP LLDP
                 neighbors = await self.get_lldp_neighbors(eq)
                 
                 if neighbors:
-                    logger.info(f"[TOPOLOGY] {eq.name} vê: {neighbors}")
+                    logger.info(f"[TOPOLOGY] {eq['name']} vê: {neighbors}")
                     
                     for neigh_key in neighbors:
                         # neigh_key pode ser IP ou MAC
@@ -56,10 +58,10 @@ class TopologyBuilder:
                         # Tentar achar por MAC (TODO: converter string format)
                         # elif neigh_key in mac_map: target_eq = mac_map[neigh_key]
                         
-                        if target_eq and target_eq.id != eq.id:
+                        if target_eq and target_eq["id"] != eq["id"]:
                             # Link encontrado!
                             # Adicionar a lista (evitar duplicatas A->B e B->A)
-                            link = tuple(sorted((eq.id, target_eq.id)))
+                            link = tuple(sorted((eq["id"], target_eq["id"])))
                             new_links.append(link)
                             
             # 3. Atualizar Banco de Dados (Links)
@@ -81,40 +83,35 @@ class TopologyBuilder:
         finally:
             await self.db.close()
 
-    async def get_lldp_neighbors(self, eq: Equipment):
+    async def get_lldp_neighbors(self, eq: dict):
         """
         Busca vizinhos via SNMP (LLDP-MIB ou Mikrotik MNDP).
         Retorna lista de IPs dos vizinhos.
         """
         neighbors_data = []
         try:
-            raw_data = await get_neighbors_data(eq.ip, eq.brand, eq.snmp_community, eq.snmp_port)
+            raw_data = await get_neighbors_data(eq["ip"], eq["brand"], eq["snmp_community"], eq["snmp_port"])
             neighbors_data = [n['ip'] for n in raw_data if n.get('ip')]
             
         except Exception as e:
-            logger.warning(f"Erro lendo vizinhos de {eq.ip}: {e}")
+            logger.warning(f"Erro lendo vizinhos de {eq['ip']}: {e}")
             
         return neighbors_data
 
     async def ensure_link(self, eq_id_1, eq_id_2):
         try:
-            # Buscar equipamentos para verificar suas torres
-            stmt = select(Equipment).where(Equipment.id.in_([eq_id_1, eq_id_2]))
-            result = await self.db.execute(stmt)
-            eqs = result.scalars().all()
-            
-            if len(eqs) < 2: return
+            # Torres dos equipamentos (registro em memória)
+            e1 = device_registry.get(eq_id_1)
+            e2 = device_registry.get(eq_id_2)
             
-            # Identificar quem é quem (para garantir acesso correto via índices se necessário, mas aqui só precisamos dos objetos)
-            e1 = eqs[0]
-            e2 = eqs[1]
+            if e1 is None or e2 is None: return
             
             # Se estão na mesma torre ou algum não tem torre, ignorar
-            if not e1.tower_id or not e2.tower_id: return
-            if e1.tower_id == e2.tower_id: return
+            if not e1["tower_id"] or not e2["tower_id"]: return
+            if e1["tower_id"] == e2["tower_id"]: return
             
-            t1_id = e1.tower_id
-            t2_id = e2.tower_id
+            t1_id = e1["tower_id"]
+            t2_id = e2["tower_id"]
             
             # Verificar se já existe link (em qualquer direção)
             stmt_link = select(NetworkLink).where(
@@ -126,12 +123,12 @@ class TopologyBuilder:
                 return # Já existe
                 
             # Criar novo Link
-            logger.success(f"[TOPOLOGY] DETECTADO NOVO LINK: Torre {t1_id} <-> Torre {t2_id} (Via {e1.name} e {e2.name})")
+            logger.success(f"[TOPOLOGY] DETECTADO NOVO LINK: Torre {t1_id} <-> Torre {t2_id} (Via {e1['name']} e {e2['name']})")
             new_link = NetworkLink(
                 source_tower_id=t1_id, 
                 target_tower_id=t2_id, 
-                source_equipment_id=e1.id,
-                target_equipment_id=e2.id,
+                source_equipment_id=e1["id"],
+                target_equipment_id=e2["id"],
                 type="wireless"
             )
             self.db.add(new_link)
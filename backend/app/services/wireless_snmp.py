@@ -1,4 +1,6 @@
-from backend.app.services.snmp import get_shared_engine, _snmp_get, _snmp_next, detect_brand, detect_equipment_name
+from backend.app.services.snmp import _snmp_get, _snmp_next, bulk_walk, detect_brand, detect_equipment_name
+from backend.app.services.oid_strategy import oid_strategies, SYS_OIDS
+from backend.app.services.perf_metrics import perf_metrics
 
 def decode_snmp_ip(val):
     """Decodes SNMP binary IP address or OctetString to dot-decimal string or MAC."""
@@ -117,8 +119,8 @@ OIDS = {
     }
 }
 
-async def get_snmp_value(ip, community, oid, port=161, timeout=2.0):
-    varBinds = await _snmp_get(ip, community, [oid], port, timeout=timeout)
+async def get_snmp_value(ip, community, oid, port=161, timeout=2.0, prefetched=None):
+    varBinds = await _snmp_get(ip, community, [oid], port, timeout=timeout, prefetched=prefetched)
     if not varBinds: return None
     val = varBinds[0][1]
     try: return int(val)
@@ -135,58 +137,53 @@ async def get_snmp_walk_first(ip, community, root_oid, port=161, timeout=2.0):
 
 async def snmp_walk_list(ip, community, root_oid, port=161, timeout=2.0):
     """Executes a Walk and returns ALL values found as a list of raw objects."""
-    results = []
     try:
-        from pysnmp.hlapi.asyncio import nextCmd, CommunityData, UdpTransportTarget, ContextData, ObjectType, ObjectIdentity
-        engine = get_shared_engine()
-        auth = CommunityData(community, mpModel=1)
-        target = UdpTransportTarget((ip, port), timeout=timeout, retries=1)
-        curr_oid = ObjectIdentity(root_oid)
-        safety_counter = 0
-        while safety_counter < 1000:
-            safety_counter += 1
-            try:
-                errorIndication, errorStatus, errorIndex, varBindTable = await nextCmd(
-                    engine, auth, target, ContextData(), ObjectType(curr_oid), lexicographicMode=False
-                )
-                if errorIndication or errorStatus or not varBindTable: break
-                for varBinds in varBindTable:
-                    for oid, val in varBinds:
-                        if not str(oid).startswith(root_oid): return results
-                        results.append(val) # Store raw object
-                        curr_oid = oid
-            except: break
-    except: pass
-    return results
+        rows = await bulk_walk(ip, community, [root_oid], port, timeout=timeout)
+        return [vals[0] for vals in rows.values()]
+    except: return []
+
+MNDP_IP = '1.3.6.1.4.1.14988.1.1.11.1.1.3'
+MNDP_NAME = '1.3.6.1.4.1.14988.1.1.11.1.1.6'
+LLDP_MAN_ADDR = '1.0.8802.1.1.2.1.4.2.1.3'  # lldpRemManAddrTable (índice: timeMark.porta.remIndex.subtipo.endereço)
+LLDP_SYS_NAME = '1.0.8802.1.1.2.1.4.1.1.9'  # lldpRemSysName (índice: timeMark.porta.remIndex)
+
+def _lldp_index_ip(index):
+    """Endereço de gerência IPv4 que o LLDP leva no próprio índice (subtipo 1, 4 octetos)."""
+    parts = index.split('.')
+    if len(parts) == 9 and parts[3] == '1' and parts[4] == '4':
+        return '.'.join(parts[5:])
+    return None
 
 async def get_neighbors_data(ip, brand, community, port=161):
     """Tries to get neighbor IPs/MACs via MNDP or LLDP."""
     neighbors = []
     try:
         if brand.lower() == 'mikrotik':
-            ips = await snmp_walk_list(ip, community, '1.3.6.1.4.1.14988.1.1.11.1.1.3', port)
-            names = await snmp_walk_list(ip, community, '1.3.6.1.4.1.14988.1.1.11.1.1.6', port)
-            for i, raw_ip in enumerate(ips):
+            # IP e nome na mesma tabela: um walk só, linhas casadas pelo índice
+            rows = await bulk_walk(ip, community, [MNDP_IP, MNDP_NAME], port)
+            for raw_ip, raw_name in rows.values():
                  remote_ip = decode_snmp_ip(raw_ip)
                  if remote_ip and remote_ip != '0.0.0.0':
-                     name = str(names[i]) if i < len(names) else None
+                     name = str(raw_name) if raw_name is not None else None
                      neighbors.append({'ip': remote_ip, 'name': name})
                      
         elif brand.lower() == 'ubiquiti':
             try:
-                lldp_ips = await snmp_walk_list(ip, community, '1.0.8802.1.1.2.1.4.2.1.3', port)
-                lldp_names = await snmp_walk_list(ip, community, '1.0.8802.1.1.2.1.4.1.1.9', port)
-                for i, raw_ip in enumerate(lldp_ips):
-                    remote_ip = decode_snmp_ip(raw_ip)
+                # Tabelas diferentes: o índice do endereço começa com o índice do vizinho
+                rows = await bulk_walk(ip, community, [LLDP_MAN_ADDR, LLDP_SYS_NAME], port)
+                names = {index: vals[1] for index, vals in rows.items() if vals[1] is not None}
+                for index, (raw_ip, _) in rows.items():
+                    if raw_ip is None: continue
+                    remote_ip = _lldp_index_ip(index) or decode_snmp_ip(raw_ip)
                     if remote_ip and remote_ip != '0.0.0.0':
-                        name = str(lldp_names[i]) if i < len(lldp_names) else None
-                        neighbors.append({'ip': remote_ip, 'name': name})
+                        name = names.get('.'.join(index.split('.')[:3]))
+                        neighbors.append({'ip': remote_ip, 'name': str(name) if name is not None else None})
             except: pass
 
         if not neighbors:
-             generic_raw = await snmp_walk_list(ip, community, '1.0.8802.1.1.2.1.4.2.1.3', port)
-             for raw_ip in generic_raw:
-                 remote_ip = decode_snmp_ip(raw_ip)
+             rows = await bulk_walk(ip, community, [LLDP_MAN_ADDR], port)
+             for index, (raw_ip,) in rows.items():
+                 remote_ip = _lldp_index_ip(index) or decode_snmp_ip(raw_ip)
                  if remote_ip and remote_ip != '0.0.0.0' and remote_ip not in [n['ip'] for n in neighbors]:
                      neighbors.append({'ip': remote_ip, 'name': 'Neighbor'})
     except Exception as e:
@@ -194,15 +191,101 @@ async def get_neighbors_data(ip, brand, community, port=161):
         logger.warning(f"Error getting neighbors for {ip}: {e}")
     return neighbors
 
-async def get_wireless_stats(ip, brand, community, port=161, interface_index=None, equipment_type=None):
+async def _walk_first_instance(ip, community, root_oid, port=161, timeout=2.0):
+    """Como get_snmp_walk_first, mas devolve também a instância exata que respondeu: (oid, valor)."""
+    varBinds = await _snmp_next(ip, community, root_oid, port, timeout=timeout)
+    if not varBinds: return None, None
+    for varBind in varBinds:
+        vb = varBind[0] if isinstance(varBind, (list, tuple)) else varBind
+        name = vb[0].getOid() if hasattr(vb[0], 'getOid') else vb[0]
+        if not str(name).startswith(root_oid + '.'): continue
+        try: return str(name), int(vb[1])
+        except: pass
+    return None, None
+
+def _as_signal(val):
+    # Validação de sinal Realista: -100 a -10 dBm
+    # Isso evita que códigos de status (ex: 1, 2, 5) sejam confundidos com sinal
+    if not isinstance(val, (int, float)) or val == 0: return None
+    candidate = int(val) if val < 0 else -int(val)
+    return candidate if -100 <= candidate <= -10 else None
+
+def _as_ccq(val):
+    return int(val) if isinstance(val, (int, float)) else None
+
+def _probe_instances(oid):
+    return (f"{oid}.0", oid, f"{oid}.1")
+
+async def _probe_metric(ip, community, port, candidates, accept, prefetched=None):
+    """Sondagem completa (o caminho antigo): .0, pura, .1 e walk para cada OID. Retorna (instância, valor)."""
+    for oid in candidates:
+        for instance in _probe_instances(oid):
+            val = await get_snmp_value(ip, community, instance, port, prefetched=prefetched)
+            if isinstance(val, (int, float)):
+                break # Primeira instância que responde decide esta OID
+        else:
+            instance, val = await _walk_first_instance(ip, community, oid, port) # Índices dinâmicos
+        if instance and accept(val) is not None:
+            return instance, accept(val)
+    return None, None
+
+async def _learned_metric(ip, community, port, device, metric, candidates, accept, prefetched=None):
+    """
+    Valor da métrica pela estratégia aprendida (1 GET na instância exata). Só
+    re-sonda tudo após MISS_LIMIT falhas seguidas (ou periodicamente, se o
+    equipamento não tem a métrica); na re-sondagem confere sysObjectID/firmware.
+    """
+    if device is None:
+        return (await _probe_metric(ip, community, port, candidates, accept, prefetched))[1]
+    strategy = oid_strategies.get(device, metric)
+    if strategy is not None:
+        if strategy["oid"]:
+            value = accept(await get_snmp_value(ip, community, strategy["oid"], port, prefetched=prefetched))
+            if value is not None:
+                oid_strategies.hit(strategy)
+                perf_metrics.inc("snmp_strategy_hits")
+                return value
+        if not oid_strategies.miss(strategy):
+            return None
+
+    perf_metrics.inc("snmp_strategy_probes")
+    sys_binds = await _snmp_get(ip, community, SYS_OIDS, port)
+    if sys_binds:
+        oid_strategies.check_fingerprint(device, [str(sys_binds[0][1]), str(sys_binds[1][1])[:120]])
+    instance, value = await _probe_metric(ip, community, port, candidates, accept, prefetched)
+    oid_strategies.learn(device, metric, instance)
+    return value
+
+def _mikrotik_if_signal_oid(interface_index):
+    # mtxrWlStatSignalStrength OID .1.3.6.1.4.1.14988.1.1.1.1.1.4 + index
+    return f'1.3.6.1.4.1.14988.1.1.1.1.1.4.{interface_index}'
+
+def wireless_plan_oids(brand, equipment_id=None, interface_index=None):
+    """OIDs escalares que get_wireless_stats vai ler neste ciclo (para o GET combinado do poll_plan)."""
+    brand_key = (brand or '').lower()
+    oids = []
+    if brand_key == 'mikrotik' and interface_index:
+        oids.append(_mikrotik_if_signal_oid(interface_index))
+    if brand_key not in OIDS:
+        return oids
+    for metric in ('signal', 'ccq'):
+        candidates = OIDS[brand_key].get(metric, [])
+        strategy = oid_strategies.peek(str(equipment_id), metric) if equipment_id is not None else None
+        if strategy is None:
+            # Ainda não aprendido: a sondagem inteira (menos os walks) vai no mesmo pacote
+            oids.extend(instance for oid in candidates for instance in _probe_instances(oid))
+        elif strategy["oid"]:
+            oids.append(strategy["oid"])
+    return oids
+
+async def get_wireless_stats(ip, brand, community, port=161, interface_index=None, equipment_type=None, equipment_id=None, prefetched=None):
     stats = {'signal_dbm': None, 'ccq': None}
     brand_key = brand.lower()
     
     # 1. Tentar busca direta por índice se fornecido (MikroTik Wireless Interface Table)
     if brand_key == 'mikrotik' and interface_index:
         try:
-            # mtxrWlStatSignalStrength OID .1.3.6.1.4.1.14988.1.1.1.1.1.4 + index
-            val_dbm = await get_snmp_value(ip, community, f'1.3.6.1.4.1.14988.1.1.1.1.1.4.{interface_index}', port)
+            val_dbm = await get_snmp_value(ip, community, _mikrotik_if_signal_oid(interface_index), port, prefetched=prefetched)
             if not val_dbm:
                 # Tentativa secundária mtxrWlRtabSignalStrength (Tabela de Registro)
                 val_dbm = await get_snmp_walk_first(ip, community, f'1.3.6.1.4.1.14988.1.1.1.2.1.19.{interface_index}', port)
@@ -215,53 +298,35 @@ async def get_wireless_stats(ip, brand, community, port=161, interface_index=Non
 
     if brand_key not in OIDS: return stats
     
-    # 2. Busca Gerencial por OIDs conhecidas
+    # 2. Busca Gerencial por OIDs conhecidas, com a instância que respondeu memorizada por equipamento
+    # (sem equipment_id, ex: scanner de rede, sonda tudo como antes)
+    device = str(equipment_id) if equipment_id is not None else None
     if stats['signal_dbm'] is None:
-        for oid in OIDS[brand_key].get('signal', []):
-            # Tenta Get Direto (.0) ou Walk First (fallback para índices dinâmicos)
-            sig = await get_snmp_value(ip, community, f"{oid}.0", port) # Tenta .0 primeiro
-            if sig is None:
-                sig = await get_snmp_value(ip, community, oid, port) # Tenta puro
-            if sig is None:
-                # Tenta explicitamente com o índice 1 (comum em Ubiquiti)
-                sig = await get_snmp_value(ip, community, f"{oid}.1", port)
-            if sig is None:
-                sig = await get_snmp_walk_first(ip, community, oid, port) # Tenta walk
-                
-            if sig is not None and isinstance(sig, (int, float)) and sig != 0:
-                # Validação de sinal Realista: -100 a -10 dBm
-                # Isso evita que códigos de status (ex: 1, 2, 5) sejam confundidos com sinal
-                candidate = int(sig) if sig < 0 else -int(sig)
-                if -100 <= candidate <= -10:
-                    stats['signal_dbm'] = candidate
-                    break
+        stats['signal_dbm'] = await _learned_metric(ip, community, port, device, 'signal', OIDS[brand_key].get('signal', []), _as_signal, prefetched)
                 
     if stats['ccq'] is None:
-        for oid in OIDS[brand_key].get('ccq', []):
-            ccq = await get_snmp_value(ip, community, f"{oid}.0", port)
-            if ccq is None:
-                ccq = await get_snmp_value(ip, community, oid, port)
-            if ccq is None:
-                ccq = await get_snmp_walk_first(ip, community, oid, port)
-                
-            if ccq is not None and isinstance(ccq, (int, float)):
-                stats['ccq'] = int(ccq)
-                break
+        stats['ccq'] = await _learned_metric(ip, community, port, device, 'ccq', OIDS[brand_key].get('ccq', []), _as_ccq, prefetched)
                 
     return stats
 
-async def get_connected_clients_count(ip, brand, community, port=161):
+def _clients_oids(brand_key):
+    oids = OIDS.get(brand_key, {}).get('clients', [])
+    return [oids] if isinstance(oids, str) else oids
+
+def clients_plan_oids(brand):
+    return [instance for oid in _clients_oids((brand or '').lower()) for instance in (f"{oid}.0", oid)]
+
+async def get_connected_clients_count(ip, brand, community, port=161, prefetched=None):
     brand_key = brand.lower()
     if brand_key not in OIDS: return None
-    oids = OIDS[brand_key].get('clients', [])
-    if isinstance(oids, str): oids = [oids]
+    oids = _clients_oids(brand_key)
     
     for oid in oids:
         # Para APs, o total pode ser a soma de múltiplas interfaces ou um OID central
         # Primeiro tentamos o OID direto
-        count = await get_snmp_value(ip, community, f"{oid}.0", port)
+        count = await get_snmp_value(ip, community, f"{oid}.0", port, prefetched=prefetched)
         if count is None:
-            count = await get_snmp_value(ip, community, oid, port)
+            count = await get_snmp_value(ip, community, oid, port, prefetched=prefetched)
         
         # Se falhar, tentamos dar um walk para ver se é uma tabela de interfaces
         if count is None:
@@ -276,18 +341,32 @@ async def get_connected_clients_count(ip, brand, community, port=161):
             
     return None
 
-async def get_health_stats(ip, brand, community, port=161):
+HEALTH_OIDS = {
+    'mikrotik': [
+        '1.3.6.1.2.1.25.3.3.1.2.1',       # CPU
+        '1.3.6.1.4.1.14988.1.1.3.11.0',    # Temp
+        '1.3.6.1.4.1.14988.1.1.3.8.0'      # Voltage
+    ],
+    'ubiquiti': [
+        '1.3.6.1.4.1.41112.1.4.1.1.11.1', # Voltage AC v1
+        '1.3.6.1.4.1.41112.1.4.1.1.11.0', # Voltage AC v0
+        '1.3.6.1.4.1.41112.1.4.1.1.2.0'   # Temp (Alternative)
+    ],
+    'intelbras': [
+        '1.3.6.1.4.1.32761.3.1.1.1.2.0'   # Voltage (APC Series)
+    ]
+}
+
+def health_plan_oids(brand):
+    return list(HEALTH_OIDS.get((brand or '').lower(), []))
+
+async def get_health_stats(ip, brand, community, port=161, prefetched=None):
     stats = {'cpu_usage': None, 'memory_usage': None, 'disk_usage': None, 'temperature': None, 'voltage': None}
     brand_key = brand.lower()
     
     if brand_key == 'mikrotik':
         # Batch Get for Mikrotik Health
-        oids = [
-            '1.3.6.1.2.1.25.3.3.1.2.1',       # CPU
-            '1.3.6.1.4.1.14988.1.1.3.11.0',    # Temp
-            '1.3.6.1.4.1.14988.1.1.3.8.0'      # Voltage
-        ]
-        results = await _snmp_get(ip, community, oids, port)
+        results = await _snmp_get(ip, community, HEALTH_OIDS['mikrotik'], port, prefetched=prefetched)
         if results and len(results) >= 3:
             cpu = results[0][1]
             temp = results[1][1]
@@ -299,12 +378,7 @@ async def get_health_stats(ip, brand, community, port=161):
             
     elif brand_key == 'ubiquiti':
         # Batch Get for UBNT (Attempt common OIDs)
-        oids = [
-            '1.3.6.1.4.1.41112.1.4.1.1.11.1', # Voltage AC v1
-            '1.3.6.1.4.1.41112.1.4.1.1.11.0', # Voltage AC v0
-            '1.3.6.1.4.1.41112.1.4.1.1.2.0'   # Temp (Alternative)
-        ]
-        results = await _snmp_get(ip, community, oids, port)
+        results = await _snmp_get(ip, community, HEALTH_OIDS['ubiquiti'], port, prefetched=prefetched)
         if results:
             # Check Voltages
             volt_raw = None
@@ -328,7 +402,7 @@ async def get_health_stats(ip, brand, community, port=161):
 
     elif brand_key == 'intelbras':
         # Voltage (APC Series)
-        volt_raw = await get_snmp_value(ip, community, '1.3.6.1.4.1.32761.3.1.1.1.2.0', port)
+        volt_raw = await get_snmp_value(ip, community, HEALTH_OIDS['intelbras'][0], port, prefetched=prefetched)
         if volt_raw is not None and isinstance(volt_raw, int):
              stats['voltage'] = round(float(volt_raw) / 10.0, 1) if volt_raw > 100 else float(volt_raw)
 
@@ -0,0 +1,52 @@
+"""
+Arquivos de estado compartilhados entre processos (collector -> API).
+
+O collector e a API rodam em processos separados; dados "vivos" pequenos
+(métricas, estado de circuit breakers, caches aprendidos) são publicados como
+JSON num diretório de estado com escrita atômica (arquivo temporário +
+os.replace), então o leitor nunca vê um arquivo pela metade.
+"""
+import json
+import os
+import tempfile
+import time
+from typing import Any, Optional
+
+_project_root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".."))
+STATE_DIR = os.environ.get("ISP_MONITOR_STATE_DIR", os.path.join(_project_root, "data", "state"))
+
+
+def state_path(name: str) -> str:
+    return os.path.join(STATE_DIR, name)
+
+
+def atomic_write_json(name: str, data: Any):
+    """Grava `data` em STATE_DIR/name de forma atômica."""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{name}.", dir=STATE_DIR)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"), default=str)
+        os.replace(tmp, state_path(name))
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def load_json(name: str, default: Any = None) -> Any:
+    try:
+        with open(state_path(name), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def file_age(name: str) -> Optional[float]:
+    """Segundos desde a última escrita (None se o arquivo não existe)."""
+    try:
+        return time.time() - os.path.getmtime(state_path(name))
+    except OSError:
+        return None
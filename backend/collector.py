@@ -18,13 +18,19 @@ from backend.app.services.topology import run_topology_discovery
 from backend.app.services.security_audit import security_audit_job
 from backend.app.services.capacity_planning import capacity_planning_job
 from backend.app.services.backup_service import backup_scheduler_loop
+from backend.app.services.perf_metrics import metrics_publisher
+from backend.app.services.spool import spool_replayer
 from backend.app.database import AsyncSessionLocal
 from backend.app.models import Parameters
 
-# Configure Loguru
-logger.remove() # Remove default stderr handler (level=DEBUG)
-logger.add(sys.stderr, level="INFO") # Re-add stderr with level=INFO
-logger.add("collector_supervisor.log", rotation="1 MB", retention="5 days", level="INFO")
+def configure_logging():
+    """
+    Só no processo principal: os shards do pinger (multiprocessing spawn) reimportam
+    este módulo como __mp_main__ e não podem abrir o mesmo arquivo com rotação.
+    """
+    logger.remove() # Remove default stderr handler (level=DEBUG)
+    logger.add(sys.stderr, level="INFO") # Re-add stderr with level=INFO
+    logger.add("collector_supervisor.log", rotation="1 MB", retention="5 days", level="INFO")
 
 async def topology_loop():
     """Roda descoberta de topologia a cada 30 minutos"""
@@ -253,6 +259,9 @@ async def main():
         try:
             async with engine.begin() as conn:
                 await conn.run_sync(Base.metadata.create_all)
+                # Colunas novas em tabelas existentes (ex: estatísticas de RTT do latency_history)
+                from backend.app.database_validator import add_missing_columns
+                await add_missing_columns(conn)
             logger.info("[COLLECTOR] ✅ Conexão estabelecida e esquema do banco verificado.")
             db_ok = True
             break
@@ -308,6 +317,8 @@ async def main():
     start_task("Security Audit", security_audit_job())
     start_task("Capacity Planning", capacity_planning_job())
     start_task("Backup Service", backup_scheduler_loop())
+    start_task("Perf Metrics", metrics_publisher())  # 📈 Snapshot de performance para a API
+    start_task("Spool Replay", spool_replayer())  # 💾 Reaplica no banco o que foi gravado em disco durante quedas
     
     logger.info(f"[SUPERVISOR] {len(active_tasks)} tarefas iniciais disparadas.")
 
@@ -349,6 +360,8 @@ async def main():
                     elif name == "Capacity Planning": new_coro = capacity_planning_job()
                     elif name == "Backup Service": new_coro = backup_scheduler_loop()
                     elif name == "Auto Priority Monitor": new_coro = start_auto_priority_loop()
+                    elif name == "Perf Metrics": new_coro = metrics_publisher()
+                    elif name == "Spool Replay": new_coro = spool_replayer()
                     
                     if new_coro:
                          # Launch restart delay as a separate task? 
@@ -378,6 +391,7 @@ async def main():
         logger.info("[SUPERVISOR] Todas as tarefas encerradas.")
 
 if __name__ == "__main__":
+    configure_logging()
     try:
         # Policy fix for Windows
         if sys.platform == 'win32':
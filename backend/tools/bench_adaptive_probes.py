@@ -0,0 +1,74 @@
+"""
+Benchmark: probes fixos (count=3) x adaptativos (1 probe + rajada na falha e a
+rajada periódica de FULL_BURST_EVERY ciclos).
+
+Pinga N alvos em 127.0.0.0/8 (respondem) misturados com uma fração de alvos
+mortos em 192.0.2.0/24 (TEST-NET, não respondem) e compara, por ciclo, os probes
+enviados pelo motor ICMP, o tempo de CPU do processo e a fração das amostras que
+sai com jitter (as de 1 probe ficam sem).
+Precisa de root (socket RAW) ou de net.ipv4.ping_group_range liberado.
+
+Uso: python backend/tools/bench_adaptive_probes.py [N_ALVOS] [FRAÇÃO_MORTOS] [CICLOS]
+"""
+import asyncio
+import os
+import sys
+import time
+sys.path.append(os.getcwd())
+
+from backend.app.services.icmp_engine import get_icmp_engine
+from backend.app.services.pinger_shards import probe_hosts, build_batch, CHUNK_SIZE, ESCALATION_COUNT, FULL_BURST_EVERY
+
+TIMEOUT = 0.5
+
+
+def make_targets(n, dead_fraction):
+    dead = int(n * dead_fraction)
+    alive = [f"127.{(i >> 8) & 255}.{i & 255}.1" for i in range(1, n - dead + 1)]
+    return alive + [f"192.0.2.{1 + i % 254}" for i in range(dead)]
+
+
+async def cycle(engine, ips, adaptive, slot):
+    sem = asyncio.Semaphore(50)
+    escalated = jitter = 0
+
+    async def chunk(part):
+        nonlocal escalated, jitter
+        async with sem:
+            results, esc = await probe_hosts(engine.multiping, part, TIMEOUT, adaptive, ESCALATION_COUNT,
+                                             frozenset(), FULL_BURST_EVERY, slot)
+            escalated += esc
+            jitter += sum(1 for st in build_batch(results, {}).stats() if st[3] == st[3])
+
+    await asyncio.gather(*[chunk(ips[i:i + CHUNK_SIZE]) for i in range(0, len(ips), CHUNK_SIZE)])
+    return escalated, jitter
+
+
+async def run(ips, adaptive, cycles):
+    engine = get_icmp_engine(privileged=True)
+    sent0, cpu0, wall0 = engine.sent, time.process_time(), time.perf_counter()
+    escalated = jitter = 0
+    for slot in range(cycles):
+        esc, jit = await cycle(engine, ips, adaptive, slot)
+        escalated += esc
+        jitter += jit
+    return ((engine.sent - sent0) / cycles, (time.process_time() - cpu0) / cycles, (time.perf_counter() - wall0) / cycles,
+            escalated / cycles, jitter / (cycles * len(ips)))
+
+
+async def main(n, dead_fraction, cycles):
+    ips = make_targets(n, dead_fraction)
+    fixed = await run(ips, False, cycles)
+    adaptive = await run(ips, True, cycles)
+    print(f"--- {n} alvos ({dead_fraction:.0%} sem resposta), média de {cycles} ciclos ---")
+    for label, (sent, cpu, wall, esc, jit) in (("fixo (3)", fixed), ("adaptativo", adaptive)):
+        print(f"{label:>11}: {sent:8,.0f} probes/ciclo  CPU {cpu * 1000:7.1f} ms  parede {wall * 1000:7.1f} ms  "
+              f"escalados {esc:6,.0f}  com jitter {jit:4.0%}")
+    print(f"Redução: probes {1 - adaptive[0] / fixed[0]:.0%}, CPU {1 - adaptive[1] / fixed[1]:.0%}")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    dead_fraction = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    cycles = int(sys.argv[3]) if len(sys.argv) > 3 else FULL_BURST_EVERY
+    asyncio.run(main(n, dead_fraction, cycles))
@@ -0,0 +1,65 @@
+"""
+Benchmark: escala do Pinger multi-processo (ShardPool) com o número de shards.
+
+Pinga alvos em 127.0.0.0/8 (o loopback responde qualquer endereço do /8 no
+Linux), um alvo por /24 para a cadência por sub-rede não limitar o teste, e mede
+quantos probes por segundo voltam ao processo escritor para 1..N shards.
+Precisa de root (socket RAW) ou de net.ipv4.ping_group_range liberado.
+
+Uso: python backend/tools/bench_pinger_shards.py [N_ALVOS] [SEGUNDOS] [MAX_SHARDS]
+"""
+import asyncio
+import os
+import sys
+import time
+sys.path.append(os.getcwd())
+
+from backend.app.services.pinger_shards import ShardPool
+
+INTERVAL = 0.5  # Mínimo aceito pelo PingScheduler: deixa os shards presos em CPU
+
+
+def loopback_targets(n):
+    return {f"127.{(i >> 8) & 255}.{i & 255}.1": 0 for i in range(1, n + 1)}
+
+
+async def run(shards, targets, seconds):
+    samples = 0
+    replies = 0
+    probes = 0
+
+    def on_batch(batch):
+        nonlocal samples, replies, probes
+        samples += len(batch)
+        replies += sum(batch.online)
+        probes += sum(st[4] for st in batch.stats())
+
+    pool = ShardPool(shards, on_batch)
+    pool.start()
+    pool.configure(INTERVAL, INTERVAL, 1e6, 1.0)
+    pool.assign(targets)
+    await asyncio.sleep(3)  # Sobe os processos e espalha as fases
+    base = samples, replies, probes
+    t0 = time.monotonic()
+    await asyncio.sleep(seconds)
+    elapsed = time.monotonic() - t0
+    done = samples - base[0], replies - base[1], probes - base[2]
+    await asyncio.to_thread(pool.stop)
+    return tuple(v / elapsed for v in done)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    max_shards = int(sys.argv[3]) if len(sys.argv) > 3 else (os.cpu_count() or 1)
+    targets = loopback_targets(n)
+
+    print(f"--- {n} alvos, intervalo {INTERVAL}s (demanda {n / INTERVAL:,.0f} amostras/s), {os.cpu_count()} CPUs ---")
+    base = None
+    shards = 1
+    while shards <= max_shards:
+        samples_s, replies_s, probes_s = asyncio.run(run(shards, targets, seconds))
+        base = base or probes_s
+        print(f"{shards:2d} shard(s): {probes_s:10,.0f} probes/s  ({samples_s:8,.0f} amostras/s, "
+              f"{replies_s / max(samples_s, 1) * 100:5.1f}% online)  [{probes_s / base:.2f}x]")
+        shards *= 2
@@ -0,0 +1,73 @@
+"""
+Benchmark: leitura de tráfego via API RouterOS, conexão por leitura (librouteros
+em thread, como era) x routeros_pool (sessão reaproveitada).
+
+Sobe N servidores de teste num subprocesso com latência simulada e mede ciclos de
+monitor-traffic `once` em todos, em paralelo. Reporta tempo de parede, CPU do
+processo por leitura e conexões/logins feitos no servidor.
+
+Uso: python backend/tools/bench_routeros_pool.py [N_AGENTES] [CICLOS] [LATENCIA_MS]
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import time
+sys.path.append(os.getcwd())
+
+from backend.app.services.routeros_pool import routeros_pool
+
+BASE_PORT = 18728
+
+
+def _librouteros_once(port):
+    from librouteros import connect
+    api = connect(username='admin', password='admin', host='127.0.0.1', port=port, timeout=5)
+    try:
+        return list(api('/interface/monitor-traffic', interface='ether1', once=True))
+    finally:
+        api.close()
+
+
+async def per_poll(port):
+    return await asyncio.to_thread(_librouteros_once, port)
+
+
+async def pooled(port):
+    return await routeros_pool.call('127.0.0.1', 'admin', 'admin', '/interface/monitor-traffic',
+                                    port=port, interface='ether1', once=True)
+
+
+async def bench(name, fn, agents, cycles):
+    await asyncio.gather(*[fn(BASE_PORT + n) for n in range(min(agents, 5))])  # Aquecimento
+    wall, cpu, ok = time.perf_counter(), time.process_time(), 0
+    for _ in range(cycles):
+        results = await asyncio.gather(*[fn(BASE_PORT + n) for n in range(agents)], return_exceptions=True)
+        ok += sum(1 for r in results if isinstance(r, list) and r)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    reads = agents * cycles
+    print(f"{name:12s} {reads} leituras em {wall:.2f}s ({wall / cycles * 1000:.0f} ms/ciclo) | "
+          f"CPU {cpu / reads * 1e6:.0f} us/leitura | ok {ok}/{reads}")
+
+
+async def main():
+    agents = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    cycles = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    latency = sys.argv[3] if len(sys.argv) > 3 else "20"
+    proc = subprocess.Popen([sys.executable, "backend/tools/routeros_responder.py", "--port", str(BASE_PORT),
+                             "--agents", str(agents), "--latency-ms", latency], stdout=subprocess.PIPE, text=True)
+    try:
+        proc.stdout.readline()  # Espera os servidores subirem
+        try:
+            import librouteros  # noqa: F401
+            await bench("por-leitura", per_poll, agents, cycles)
+        except ImportError:
+            print("librouteros não instalado: pulando o modo conexão por leitura")
+        await bench("pool", pooled, agents, cycles)
+    finally:
+        routeros_pool.close_all()
+        proc.terminate()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""
+Benchmark: hlapi do pysnmp x cliente nativo (snmp_client) contra o snmp_responder.
+
+Sobe N agentes de teste num subprocesso (a CPU deles não entra na conta) e mede,
+para cada backend, um ciclo no formato do snmp_monitor: um GET de ~10 OIDs por
+equipamento, em paralelo sob o semáforo. Reporta tempo de parede, CPU do
+processo por requisição e a listagem de 200 interfaces (bulk_walk).
+
+Uso: python backend/tools/bench_snmp_client.py [N_AGENTES] [CICLOS]
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import time
+sys.path.append(os.getcwd())
+
+import backend.app.services.snmp as snmp
+
+BASE_PORT = 17161
+OIDS = ['1.3.6.1.2.1.1.3.0', '1.3.6.1.2.1.25.3.3.1.2.1', '1.3.6.1.4.1.14988.1.1.3.11.0',
+        '1.3.6.1.4.1.14988.1.1.1.2.1.3.1', '1.3.6.1.2.1.31.1.1.1.6.1', '1.3.6.1.2.1.31.1.1.1.10.1',
+        '1.3.6.1.2.1.2.2.1.10.1', '1.3.6.1.2.1.2.2.1.16.1', '1.3.6.1.2.1.1.5.0', '1.3.6.1.2.1.1.1.0']
+
+
+async def cycle(agents, concurrency):
+    sem = asyncio.Semaphore(concurrency)
+    ok = 0
+
+    async def one(port):
+        nonlocal ok
+        async with sem:
+            errorIndication, errorStatus, _, varBinds = await snmp.snmp_command(
+                'get', '127.0.0.1', port, 'public', 1, OIDS, timeout=2.0)
+            if not errorIndication and not errorStatus and len(varBinds) == len(OIDS):
+                ok += 1
+
+    await asyncio.gather(*[one(BASE_PORT + n) for n in range(agents)])
+    return ok
+
+
+async def bench(native, agents, cycles, concurrency):
+    snmp.NATIVE_SNMP = native
+    await cycle(min(agents, 5), concurrency)  # Aquecimento (engine/socket, caches)
+    wall, cpu, ok = time.perf_counter(), time.process_time(), 0
+    for _ in range(cycles):
+        ok += await cycle(agents, concurrency)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    requests = agents * cycles
+
+    t = time.perf_counter()
+    rows = await snmp.bulk_walk('127.0.0.1', 'public', [snmp.IF_DESCR], BASE_PORT)
+    walk_ms = (time.perf_counter() - t) * 1000
+    name = "nativo" if native else "pysnmp"
+    print(f"{name:7s} conc={concurrency:<4d} {requests} GETs em {wall:.2f}s ({requests / wall:.0f}/s) | "
+          f"CPU {cpu / requests * 1e6:.0f} us/GET | ok {ok}/{requests} | ifDescr {len(rows)} linhas em {walk_ms:.1f} ms")
+
+
+async def main():
+    agents = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    cycles = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    proc = subprocess.Popen([sys.executable, "backend/tools/snmp_responder.py", "--port", str(BASE_PORT),
+                             "--agents", str(agents), "--interfaces", "200"], stdout=subprocess.PIPE, text=True)
+    try:
+        proc.stdout.readline()  # Espera os agentes subirem
+        await bench(False, agents, cycles, 30)
+        await bench(True, agents, cycles, 30)
+        await bench(True, agents, cycles, 100)
+    finally:
+        proc.terminate()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+"""
+Micro-benchmark: alvos em dict (formato antigo) x TargetStore/ResultBatch.
+
+Mede memória (tracemalloc) dos alvos e o custo de CPU de um ciclo completo:
+enfileirar os resultados e aplicar a lógica de fail_count/status do flush.
+
+Uso: python backend/tools/bench_target_store.py [N_ALVOS]
+"""
+import asyncio
+import sys
+import os
+import time
+import tracemalloc
+sys.path.append(os.getcwd())
+
+from backend.app.services.target_store import TargetStore, ResultBatch
+
+CHUNK = 10
+DOWN_COUNT = 3
+
+
+def ips_for(n):
+    return [f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}" for i in range(n)]
+
+
+def build_dicts(ips):
+    # Formato antigo: dict por alvo + índice id_to_ip separado
+    targets, id_to_ip = {}, {}
+    for i, ip in enumerate(ips):
+        targets[ip] = {"type": "equipment", "id": i, "name": f"Device {i}", "status": True,
+                       "fail_count": 0, "parent_id": None, "tower_id": i % 50, "priority": False}
+        id_to_ip[("equipment", i)] = ip
+    return targets, id_to_ip
+
+
+def build_store(ips):
+    store = TargetStore()
+    for i, ip in enumerate(ips):
+        store.upsert(ip, "equipment", i, f"Device {i}", True, None, i % 50, False)
+    return store
+
+
+def measure(builder, ips):
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    obj = builder(ips)
+    size = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return obj, size
+
+
+async def cycle_dicts(state, ips):
+    targets = state[0]
+    q = asyncio.Queue()
+    for k, ip in enumerate(ips):
+        await q.put({"ip": ip, "is_online": k % 7 != 0, "latency": 3.2, "packet_loss": 0.0,
+                     "timestamp": time.time(), "sched_lateness": 0.0})
+    while not q.empty():
+        item = q.get_nowait()
+        t = targets.get(item["ip"])
+        if not item["is_online"]:
+            t["fail_count"] = t.get("fail_count", 0) + 1
+        else:
+            t["fail_count"] = 0
+        if t["fail_count"] >= DOWN_COUNT:
+            t["status"] = False
+        elif item["is_online"]:
+            t["status"] = True
+
+
+async def cycle_store(store, ips):
+    q = asyncio.Queue()
+    for c in range(0, len(ips), CHUNK):
+        batch = ResultBatch(time.time())
+        for k in range(c, min(c + CHUNK, len(ips))):
+            batch.append(ips[k], k % 7 != 0, 3.2, 0.0)
+        await q.put(batch)
+    while not q.empty():
+        batch = q.get_nowait()
+        for ip, is_online, latency, loss in batch.rows():
+            t = store.get(ip)
+            if not is_online:
+                t.fail_count += 1
+            else:
+                t.fail_count = 0
+            if t.fail_count >= DOWN_COUNT:
+                t.status = False
+            elif is_online:
+                t.status = True
+
+
+def bench(cycle, obj, ips, rounds=5):
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        asyncio.run(cycle(obj, ips))
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    ips = ips_for(n)
+
+    targets, dict_mem = measure(build_dicts, ips)
+    store, store_mem = measure(build_store, ips)
+    dict_cpu = bench(cycle_dicts, targets, ips)
+    store_cpu = bench(cycle_store, store, ips)
+
+    print(f"--- {n} alvos ---")
+    print(f"Memória  dict: {dict_mem / 1024 / 1024:7.2f} MB ({dict_mem / n:.0f} B/alvo)")
+    print(f"Memória store: {store_mem / 1024 / 1024:7.2f} MB ({store_mem / n:.0f} B/alvo)  [{dict_mem / store_mem:.1f}x menor]")
+    print(f"Ciclo    dict: {dict_cpu * 1000:7.1f} ms ({dict_cpu / n * 1e6:.2f} us/amostra)")
+    print(f"Ciclo   store: {store_cpu * 1000:7.1f} ms ({store_cpu / n * 1e6:.2f} us/amostra)  [{dict_cpu / store_cpu:.1f}x mais rápido]")
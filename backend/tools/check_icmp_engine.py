@@ -0,0 +1,141 @@
+"""
+Verificação manual do motor ICMP de socket único (services/icmp_engine.py).
+
+Sem equipamentos: usa a faixa de loopback (127.0.0.0/8 responde inteira no Linux)
+e, com root e o `ip` disponível, um network namespace descartável.
+
+1. demux: N endereços de loopback x M probes em voo ao mesmo tempo, em dois
+   motores com prefixos de id diferentes (como dois shards do pinger). Cada motor
+   tem que receber exatamente o que enviou: resposta do outro motor (mesmo
+   socket RAW vê tudo) ou de outro (id, seq) não pode ser casada.
+2. timeout: um endereço que não responde (padrão 198.51.100.1, TEST-NET-2) tem
+   que voltar None dentro do timeout, sem sobrar nada pendente.
+3. --netns: roda 1 e 2 dentro de um namespace novo, ligado por um par veth a um
+   segundo namespace: 10.99.0.1/24 aqui, 10.99.0.3 do outro lado (entra no demux,
+   respostas vindas de um enlace de verdade) e 10.99.0.2 sem ninguém (ARP sem
+   resposta: o timeout determinístico).
+
+Uso: python backend/tools/check_icmp_engine.py [--hosts 50] [--count 20] [--silent 198.51.100.1]
+                                               [--extra IP ...] [--netns]
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+sys.path.append(os.getcwd())
+
+from backend.app.services.icmp_engine import IcmpEngine
+
+NETNS = "isp-monitor-icmp-check"
+PEER_NETNS = NETNS + "-peer"
+
+
+async def check_demux(hosts: int, count: int, extra=()) -> bool:
+    addresses = [f"127.0.{i // 250}.{i % 250 + 1}" for i in range(hosts)] + list(extra)
+    engines = [IcmpEngine(ident_prefix=0x11), IcmpEngine(ident_prefix=0x22)]
+    for engine in engines:
+        engine.start()
+    try:
+        started = time.perf_counter()
+        results = await asyncio.gather(*[
+            engine.multiping(addresses, count=count, interval=0.0, timeout=2.0) for engine in engines
+        ])
+        elapsed = time.perf_counter() - started
+        ok = True
+        for engine, hosts_result in zip(engines, results):
+            lost = [h.address for h in hosts_result if h.packets_received != count]
+            st = engine.stats()
+            kind = "RAW" if engine._socks and next(iter(engine._socks.values())).raw else "DGRAM"
+            print(f"  motor id=0x{engine._ident:04x} ({kind}): enviados {st['sent']} recebidos {st['received']} "
+                  f"pendentes {st['inflight']} | rtt máx {max(h.max_rtt for h in hosts_result):.2f} ms")
+            if st["sent"] != len(addresses) * count or st["received"] != st["sent"] or st["inflight"] or lost:
+                ok = False
+                print(f"  FALHA: {len(lost)} hosts com perda ({lost[:5]}...)" if lost else "  FALHA: contadores divergentes")
+        print(f"  {2 * len(addresses) * count} probes em {elapsed * 1000:.0f} ms")
+        return ok
+    finally:
+        for engine in engines:
+            engine.close()
+
+
+async def check_timeout(address: str, timeout: float = 1.0) -> bool:
+    engine = IcmpEngine()
+    engine.start()
+    try:
+        started = time.perf_counter()
+        rtts = await asyncio.gather(*[engine.probe(address, timeout=timeout) for _ in range(5)])
+        elapsed = time.perf_counter() - started
+        st = engine.stats()
+        print(f"  {address}: {rtts} em {elapsed * 1000:.0f} ms (enviados {st['sent']}, pendentes {st['inflight']})")
+        if any(r is not None for r in rtts):
+            print(f"  FALHA: {address} respondeu; passe um endereço mudo com --silent")
+            return False
+        if st["sent"] == 0:
+            print("  AVISO: envio recusado (sem rota): None imediato, o timer não foi exercitado")
+        return elapsed < timeout + 0.5 and st["inflight"] == 0
+    finally:
+        engine.close()
+
+
+async def run(args) -> bool:
+    extra = f" + {', '.join(args.extra)}" if args.extra else ""
+    print(f"[1] demux (id, seq): {args.hosts} hosts de loopback{extra} x {args.count} probes, 2 motores")
+    ok_demux = await check_demux(args.hosts, args.count, args.extra)
+    print(f"    {'OK' if ok_demux else 'FALHOU'}")
+    print(f"[2] timeout: {args.silent}")
+    ok_timeout = await check_timeout(args.silent)
+    print(f"    {'OK' if ok_timeout else 'FALHOU'}")
+    return ok_demux and ok_timeout
+
+
+def run_in_netns(args) -> int:
+    """Cria os namespaces (par veth), reexecuta este script dentro do primeiro e remove tudo."""
+    def ip(ns, *cmd):
+        subprocess.run(["ip", "netns", "exec", ns, "ip", *cmd], check=True)
+
+    for ns in (NETNS, PEER_NETNS):
+        subprocess.run(["ip", "netns", "del", ns], stderr=subprocess.DEVNULL)
+        subprocess.run(["ip", "netns", "add", ns], check=True)
+    try:
+        ip(NETNS, "link", "add", "veth0", "type", "veth", "peer", "name", "veth1")
+        ip(NETNS, "link", "set", "veth1", "netns", PEER_NETNS)
+        for ns, dev, addr in ((NETNS, "veth0", "10.99.0.1/24"), (PEER_NETNS, "veth1", "10.99.0.3/24")):
+            ip(ns, "link", "set", "lo", "up")
+            ip(ns, "addr", "add", addr, "dev", dev)
+            ip(ns, "link", "set", dev, "up")
+        cmd = ["ip", "netns", "exec", NETNS, sys.executable, os.path.abspath(__file__),
+               "--hosts", str(args.hosts), "--count", str(args.count), "--silent", "10.99.0.2", "--extra", "10.99.0.3"]
+        print(f"== netns {NETNS} (veth0 10.99.0.1/24 <-> {PEER_NETNS} veth1 10.99.0.3) ==", flush=True)
+        return subprocess.run(cmd).returncode
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"Namespace indisponível ({e}): pulado")
+        return 0
+    finally:
+        for ns in (NETNS, PEER_NETNS):
+            subprocess.run(["ip", "netns", "del", ns], stderr=subprocess.DEVNULL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verificação do motor ICMP (loopback / netns)")
+    parser.add_argument("--hosts", type=int, default=50)
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--silent", default="198.51.100.1", help="Endereço que não responde (teste de timeout)")
+    parser.add_argument("--extra", nargs="*", default=[], help="Endereços que respondem, somados ao demux")
+    parser.add_argument("--netns", action="store_true", help="Também roda dentro de um namespace novo (root + iproute2)")
+    args = parser.parse_args()
+
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    ok = asyncio.run(run(args))
+    if args.netns:
+        if not sys.platform.startswith("linux") or os.geteuid() != 0:
+            print("--netns exige Linux e root: pulado")
+        else:
+            ok = run_in_netns(args) == 0 and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
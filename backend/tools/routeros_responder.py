@@ -0,0 +1,178 @@
+"""
+Servidor de API RouterOS de mentira para testes e benchmarks (sem Mikrotik real).
+
+Fala o protocolo da API (porta 8728) com o encoder do routeros_pool: login novo
+(name/password) ou antigo (desafio MD5, --legacy-login), /system/identity/print,
+/interface/print, /system/resource/print e /system/health/print (com interval=,
+contínuos), /interface/monitor-traffic (com `once` ou contínuo, uma resposta
+por segundo até o /cancel) e respostas com .tag. Várias instâncias podem
+subir em portas seguidas (--agents), uma por "equipamento".
+
+Uso: python backend/tools/routeros_responder.py [--port 18728] [--agents 1] [--user admin] [--password admin]
+                                                [--legacy-login] [--latency-ms 0]
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import sys
+sys.path.append(os.getcwd())
+
+from backend.app.services.routeros_pool import encode_sentence, read_sentence, parse_reply
+
+
+class RouterOsResponder:
+    def __init__(self, user: str = 'admin', password: str = 'admin', legacy_login: bool = False,
+                 latency: float = 0.0, interfaces: int = 8, seed: int = 0, interval: float = 1.0):
+        self.user = user
+        self.password = password
+        self.legacy_login = legacy_login
+        self.latency = latency
+        self.interval = interval
+        rng = random.Random(seed)
+        self.rates = {f'ether{i}': rng.randint(1, 900) * 1_000_000 for i in range(1, interfaces + 1)}
+        self.connections = 0
+        self.logins = 0
+        self.commands = 0
+
+    def resource(self) -> dict:
+        return {'cpu-load': str(random.randint(1, 30)), 'free-memory': '805306368', 'total-memory': '1073741824',
+                'free-hdd-space': '100663296', 'total-hdd-space': '134217728', 'uptime': '3d4h'}
+
+    def health(self) -> dict:
+        return {'voltage': f"{random.uniform(23.8, 24.2):.1f}", 'temperature': str(random.randint(35, 40))}
+
+    def traffic(self, name: str) -> dict:
+        rate = self.rates[name]
+        jitter = random.uniform(0.9, 1.1)
+        return {'name': name, 'rx-bits-per-second': str(int(rate * jitter)),
+                'tx-bits-per-second': str(int(rate * jitter / 4))}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        logged_in, challenge = False, None
+        streams = {}
+
+        def send(reply: str, attrs: dict = None, tag: str = None):
+            words = [reply] + [f"={k}={v}" for k, v in (attrs or {}).items()]
+            if tag is not None:
+                words.append(f".tag={tag}")
+            writer.write(encode_sentence(words))
+
+        async def stream(tag, row, interval):
+            try:
+                while True:
+                    send('!re', row(), tag)
+                    await asyncio.sleep(interval)
+            except asyncio.CancelledError:
+                send('!trap', {'category': '2', 'message': 'interrupted'}, tag)
+                send('!done', tag=tag)
+                raise
+
+        try:
+            while True:
+                words = await read_sentence(reader)
+                if not words:
+                    continue
+                cmd, args, tag = parse_reply(words)
+                self.commands += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+
+                if cmd == '/login':
+                    if 'password' in args and not self.legacy_login:
+                        ok = args.get('name') == self.user and args['password'] == self.password
+                    elif 'response' in args and challenge:
+                        digest = hashlib.md5(b'\x00' + self.password.encode() + challenge).hexdigest()
+                        ok = args.get('name') == self.user and args['response'] == '00' + digest
+                    else:
+                        challenge = os.urandom(16)
+                        send('!done', {'ret': challenge.hex()}, tag)
+                        continue
+                    if ok:
+                        logged_in = True
+                        self.logins += 1
+                        send('!done', tag=tag)
+                    else:
+                        send('!trap', {'message': 'invalid user name or password (6)'}, tag)
+                        send('!done', tag=tag)
+                elif not logged_in:
+                    send('!fatal', {'message': 'not logged in'})
+                    break
+                elif cmd == '/system/identity/print':
+                    send('!re', {'name': 'responder'}, tag)
+                    send('!done', tag=tag)
+                elif cmd == '/interface/print':
+                    for name in self.rates:
+                        send('!re', {'name': name, 'type': 'ether', 'running': 'true'}, tag)
+                    send('!done', tag=tag)
+                elif cmd == '/interface/monitor-traffic':
+                    names = [n for n in args.get('interface', '').split(',') if n]
+                    unknown = [n for n in names if n not in self.rates]
+                    if not names or unknown:
+                        send('!trap', {'message': f"no such item ({','.join(unknown)})"}, tag)
+                        send('!done', tag=tag)
+                    elif 'once' in args:
+                        for name in names:
+                            send('!re', self.traffic(name), tag)
+                        send('!done', tag=tag)
+                    else:
+                        for name in names:
+                            task = asyncio.create_task(stream(tag, lambda n=name: self.traffic(n), self.interval))
+                            streams.setdefault(tag, []).append(task)
+                elif cmd in ('/system/resource/print', '/system/health/print'):
+                    row = self.resource if cmd == '/system/resource/print' else self.health
+                    if 'interval' in args:
+                        streams.setdefault(tag, []).append(asyncio.create_task(stream(tag, row, float(args['interval']))))
+                    else:
+                        send('!re', row(), tag)
+                        send('!done', tag=tag)
+                elif cmd == '/cancel':
+                    for task in streams.pop(args.get('tag'), []):
+                        task.cancel()
+                    send('!done', tag=tag)
+                else:
+                    send('!trap', {'message': 'no such command'}, tag)
+                    send('!done', tag=tag)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for tasks in streams.values():
+                for task in tasks:
+                    task.cancel()
+            writer.close()
+
+
+async def serve(host: str = '127.0.0.1', port: int = 18728, agents: int = 1, **kwargs):
+    """Sobe `agents` servidores em portas seguidas; devolve (servers, respondedores)."""
+    servers, responders = [], []
+    for n in range(agents):
+        responder = RouterOsResponder(seed=n, **kwargs)
+        servers.append(await asyncio.start_server(responder.handle, host, port + n))
+        responders.append(responder)
+    return servers, responders
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="API RouterOS de teste")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=18728)
+    parser.add_argument('--agents', type=int, default=1)
+    parser.add_argument('--user', default='admin')
+    parser.add_argument('--password', default='admin')
+    parser.add_argument('--legacy-login', action='store_true')
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    args = parser.parse_args()
+    await serve(args.host, args.port, args.agents, user=args.user, password=args.password,
+                legacy_login=args.legacy_login, latency=args.latency_ms / 1000)
+    print(f"RouterOS responder: {args.agents} agente(s) em {args.host}:{args.port}-{args.port + args.agents - 1}", flush=True)
+    while True:
+        await asyncio.sleep(3600)
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
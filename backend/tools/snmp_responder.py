@@ -0,0 +1,198 @@
+"""
+Agente SNMP v1/v2c de mentira para testes e benchmarks (sem equipamento real).
+
+Responde GET, GETNEXT e GETBULK com a BER do snmp_client sobre uma MIB sintética:
+grupo system, ifTable/ifXTable com N interfaces (contadores andando com o
+tempo), tabela de vizinhos MNDP e uma OID de sinal. Várias instâncias podem
+subir em portas seguidas (--agents), uma por "equipamento".
+
+Uso: python backend/tools/snmp_responder.py [--port 16161] [--agents 1] [--interfaces 200]
+                                             [--community public] [--v1-only] [--latency-ms 0] [--loss 0]
+"""
+import argparse
+import asyncio
+import bisect
+import os
+import random
+import sys
+import time
+sys.path.append(os.getcwd())
+
+from backend.app.services.snmp_client import (
+    GET, GETNEXT, GETBULK, RESPONSE, decode_message, encode_message, encode_varbind,
+    Integer, Counter32, Counter64, TimeTicks, OctetString, IpAddress, ObjectName,
+    NoSuchObject, NoSuchInstance, EndOfMibView, Null,
+)
+
+NO_SUCH_NAME = 2
+
+
+def _key(oid: str):
+    return tuple(int(x) for x in oid.split('.'))
+
+
+def synthetic_mib(interfaces: int = 200, seed: int = 0) -> dict:
+    """{oid: valor ou callable} de um switch/rádio com `interfaces` portas."""
+    started = time.time()
+    rng = random.Random(seed)
+    mib = {
+        '1.3.6.1.2.1.1.1.0': OctetString(b'RouterOS CCR2004 (stand-in)'),
+        '1.3.6.1.2.1.1.2.0': ObjectName('1.3.6.1.4.1.14988.1'),
+        '1.3.6.1.2.1.1.3.0': lambda: TimeTicks(int((time.time() - started) * 100)),
+        '1.3.6.1.2.1.1.5.0': OctetString(b'responder'),
+        '1.3.6.1.2.1.25.3.3.1.2.1': Integer(12),
+        '1.3.6.1.4.1.14988.1.1.3.11.0': Integer(41),
+        '1.3.6.1.4.1.14988.1.1.1.2.1.3.1': Integer(-58),  # Sinal
+    }
+    for i in range(1, interfaces + 1):
+        rate = rng.randint(1, 120) * 125_000  # bytes/s
+        mib[f'1.3.6.1.2.1.2.2.1.2.{i}'] = OctetString(f'ether{i}'.encode())
+        mib[f'1.3.6.1.2.1.2.2.1.3.{i}'] = Integer(6)
+        mib[f'1.3.6.1.2.1.2.2.1.10.{i}'] = lambda r=rate: Counter32(int((time.time() - started) * r) & 0xFFFFFFFF)
+        mib[f'1.3.6.1.2.1.2.2.1.16.{i}'] = lambda r=rate: Counter32(int((time.time() - started) * r / 4) & 0xFFFFFFFF)
+        mib[f'1.3.6.1.2.1.31.1.1.1.6.{i}'] = lambda r=rate: Counter64(int((time.time() - started) * r))
+        mib[f'1.3.6.1.2.1.31.1.1.1.10.{i}'] = lambda r=rate: Counter64(int((time.time() - started) * r / 4))
+    for i in range(1, 9):
+        mib[f'1.3.6.1.4.1.14988.1.1.11.1.1.3.{i}'] = IpAddress(bytes((10, 0, 0, i)))
+        mib[f'1.3.6.1.4.1.14988.1.1.11.1.1.6.{i}'] = OctetString(f'vizinho-{i}'.encode())
+    return mib
+
+
+class SnmpResponder:
+    def __init__(self, mib: dict, community: str = 'public', v1_only: bool = False,
+                 latency: float = 0.0, loss: float = 0.0):
+        self.mib = mib
+        self.order = sorted(mib, key=_key)
+        self.keys = [_key(oid) for oid in self.order]
+        self.community = community
+        self.v1_only = v1_only
+        self.latency = latency
+        self.loss = loss
+        self.requests = 0
+
+    def _value(self, oid):
+        value = self.mib[oid]
+        return value() if callable(value) else value
+
+    def _next(self, oid: str):
+        i = bisect.bisect_right(self.keys, _key(oid))
+        return self.order[i] if i < len(self.order) else None
+
+    def answer(self, data: bytes):
+        """Resposta codificada para uma requisição, ou None (descarta, como um agente real)."""
+        version, community, pdu_type, request_id, a, b, varbinds = decode_message(data)
+        if community != self.community or (self.v1_only and version != 0):
+            return None
+        if pdu_type == GETBULK and version == 0:
+            return None
+        self.requests += 1
+        oids = [str(name) for name, _ in varbinds]
+        out, status, index = [], 0, 0
+
+        if pdu_type == GET:
+            for i, oid in enumerate(oids):
+                if oid in self.mib:
+                    out.append((oid, self._value(oid)))
+                elif version == 0:
+                    status, index = NO_SUCH_NAME, i + 1
+                    break
+                else:
+                    parent = oid.rsplit('.', 1)[0]
+                    known = any(o.startswith(parent + '.') for o in self.order)
+                    out.append((oid, NoSuchInstance() if known else NoSuchObject()))
+        elif pdu_type == GETNEXT:
+            for i, oid in enumerate(oids):
+                nxt = self._next(oid)
+                if nxt is None:
+                    if version == 0:
+                        status, index = NO_SUCH_NAME, i + 1
+                        break
+                    out.append((oid, EndOfMibView()))
+                else:
+                    out.append((nxt, self._value(nxt)))
+        elif pdu_type == GETBULK:
+            non_repeaters, repetitions = max(0, a), max(0, b)
+            for oid in oids[:non_repeaters]:
+                nxt = self._next(oid)
+                out.append((nxt, self._value(nxt)) if nxt else (oid, EndOfMibView()))
+            cursor = oids[non_repeaters:]
+            for _ in range(repetitions):
+                if not cursor:
+                    break
+                row = []
+                for j, oid in enumerate(cursor):
+                    nxt = self._next(oid) if oid is not None else None
+                    row.append((nxt, self._value(nxt)) if nxt else (oid or oids[non_repeaters + j], EndOfMibView()))
+                    cursor[j] = nxt
+                out.extend(row)
+                if all(c is None for c in cursor):
+                    break
+        else:
+            return None
+
+        if status:
+            out = [(str(name), Null()) for name, _ in varbinds]  # v1: erro devolve os varbinds da requisição
+        encoded = [encode_varbind(oid, value) for oid, value in out]
+        return encode_message(version, community, RESPONSE, request_id, status, index, encoded)
+
+
+class _Protocol(asyncio.DatagramProtocol):
+    def __init__(self, responder: SnmpResponder):
+        self.responder = responder
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if self.responder.loss and random.random() < self.responder.loss:
+            return
+        try:
+            reply = self.responder.answer(data)
+        except Exception:
+            return  # Pacote malformado: agente real também ignora
+        if reply is None:
+            return
+        if self.responder.latency:
+            asyncio.get_running_loop().call_later(self.responder.latency, self.transport.sendto, reply, addr)
+        else:
+            self.transport.sendto(reply, addr)
+
+
+async def serve(host: str = '127.0.0.1', port: int = 16161, agents: int = 1, **kwargs):
+    """Sobe `agents` respondedores em portas seguidas; devolve (transports, respondedores)."""
+    loop = asyncio.get_running_loop()
+    interfaces = kwargs.pop('interfaces', 200)
+    transports, responders = [], []
+    for n in range(agents):
+        responder = SnmpResponder(synthetic_mib(interfaces, seed=n), **kwargs)
+        transport, _ = await loop.create_datagram_endpoint(lambda r=responder: _Protocol(r), local_addr=(host, port + n))
+        transports.append(transport)
+        responders.append(responder)
+    return transports, responders
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Agente SNMP de teste")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=16161)
+    parser.add_argument('--agents', type=int, default=1)
+    parser.add_argument('--interfaces', type=int, default=200)
+    parser.add_argument('--community', default='public')
+    parser.add_argument('--v1-only', action='store_true')
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--loss', type=float, default=0.0)
+    args = parser.parse_args()
+    _, responders = await serve(args.host, args.port, args.agents, interfaces=args.interfaces,
+                                community=args.community, v1_only=args.v1_only,
+                                latency=args.latency_ms / 1000, loss=args.loss)
+    print(f"SNMP responder: {args.agents} agente(s) em {args.host}:{args.port}-{args.port + args.agents - 1}", flush=True)
+    while True:
+        await asyncio.sleep(3600)
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
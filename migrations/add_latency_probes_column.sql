@@ -0,0 +1,7 @@
+-- Add probes column to latency_history
+-- Adaptive probing sends 1 probe to healthy hosts and 1 + burst to hosts that miss it,
+-- so loss must be aggregated weighted by probes: SUM(packet_loss * probes) / SUM(probes)
+
+ALTER TABLE latency_history ADD COLUMN IF NOT EXISTS probes INTEGER;
+
+COMMENT ON COLUMN latency_history.probes IS 'ICMP probes sent in the cycle (NULL = legacy fixed count of 3)';
@@ -0,0 +1,10 @@
+-- Add RTT statistics columns to latency_history
+-- latency keeps the calibrated minimum RTT; these come from the same probe vector (3 probes per cycle)
+
+ALTER TABLE latency_history ADD COLUMN IF NOT EXISTS avg_latency DOUBLE PRECISION;
+ALTER TABLE latency_history ADD COLUMN IF NOT EXISTS max_latency DOUBLE PRECISION;
+ALTER TABLE latency_history ADD COLUMN IF NOT EXISTS mdev DOUBLE PRECISION;
+ALTER TABLE latency_history ADD COLUMN IF NOT EXISTS jitter DOUBLE PRECISION;
+
+COMMENT ON COLUMN latency_history.mdev IS 'Standard deviation of the RTTs in the cycle (same as ping mdev), ms';
+COMMENT ON COLUMN latency_history.jitter IS 'Mean absolute difference between consecutive RTTs, ms';